@@ -0,0 +1,36 @@
+"""add embedding cache table
+
+Revision ID: 5b1f0c7d2e8a
+Revises: cec7ec36c505
+Create Date: 2025-06-12 09:41:17.204531
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "5b1f0c7d2e8a"
+down_revision = "cec7ec36c505"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "embedding_cache",
+        sa.Column("cache_key", sa.String(), primary_key=True),
+        sa.Column("model_name", sa.String(), nullable=False, index=True),
+        sa.Column("embedding", sa.LargeBinary(), nullable=False),
+        sa.Column(
+            "last_used",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            index=True,
+            server_default=sa.func.now(),
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("embedding_cache")
@@ -0,0 +1,228 @@
+import asyncio
+from collections import deque
+from collections.abc import Callable
+from collections.abc import Sequence
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import Generic
+from typing import TypeVar
+
+import numpy as np
+from prometheus_client import Gauge
+from prometheus_client import Histogram
+
+from onyx.utils.logger import setup_logger
+
+logger = setup_logger()
+
+T = TypeVar("T")
+
+batch_queue_depth_gauge = Gauge(
+    "model_server_batch_queue_depth",
+    "Items waiting to be batched for a local model",
+    ["batcher"],
+)
+batch_in_flight_gauge = Gauge(
+    "model_server_batches_in_flight",
+    "Batches currently running on a local model",
+    ["batcher"],
+)
+batch_size_histogram = Histogram(
+    "model_server_batch_size",
+    "Number of items per local model forward pass",
+    ["batcher"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+
+@dataclass
+class _PendingRequest(Generic[T]):
+    items: list[T]
+    future: asyncio.Future = field(repr=False)
+
+
+class MicroBatcher(Generic[T]):
+    """Merges concurrent requests for one local model into shared model calls.
+
+    Requests are queued until `max_batch_size` items are waiting or the oldest one
+    has waited `max_wait` seconds, then the queued items are sorted by `length`
+    (less padding per forward pass), passed to `run_batch` in the default executor
+    and the results are handed back to each request in its original order. At most
+    `concurrency` batches run at the same time, while one runs the next one fills up.
+    A single request larger than `max_batch_size` is never split. When a merged batch
+    fails, its requests are retried one by one so only the failing ones get the error.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        run_batch: Callable[[list[T]], Sequence[Any] | np.ndarray],
+        max_batch_size: int,
+        max_wait: float,
+        concurrency: int = 1,
+        length: Callable[[T], int] | None = None,
+    ) -> None:
+        self.name = name
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.concurrency = max(1, concurrency)
+        self.length = length
+
+        self._pending: deque[_PendingRequest[T]] = deque()
+        self._pending_items = 0
+        self._wakeup: asyncio.Event | None = None
+        self._workers: list[asyncio.Task] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._pending_items
+
+    async def submit(self, items: list[T]) -> Sequence[Any] | np.ndarray:
+        if not items:
+            return []
+
+        if self.max_batch_size <= 0:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self.run_batch, items
+            )
+
+        self._ensure_workers()
+        assert self._wakeup is not None
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._pending.append(_PendingRequest(items=items, future=future))
+        self._pending_items += len(items)
+        batch_queue_depth_gauge.labels(batcher=self.name).set(self._pending_items)
+        self._wakeup.set()
+        return await future
+
+    def _ensure_workers(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+
+        # First use, or the previous event loop is gone (e.g. between tests)
+        if self._loop is not None and not self._loop.is_closed():
+            for worker in self._workers:
+                worker.cancel()
+        self._pending.clear()
+        self._pending_items = 0
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            loop.create_task(self._work()) for _ in range(self.concurrency)
+        ]
+
+    def _take_batch(self) -> list[_PendingRequest[T]]:
+        batch: list[_PendingRequest[T]] = []
+        batch_items = 0
+        while self._pending:
+            request = self._pending[0]
+            if batch and batch_items + len(request.items) > self.max_batch_size:
+                break
+            self._pending.popleft()
+            if request.future.done():
+                # the caller went away, e.g. the client disconnected
+                self._pending_items -= len(request.items)
+                continue
+            batch.append(request)
+            batch_items += len(request.items)
+            self._pending_items -= len(request.items)
+
+        batch_queue_depth_gauge.labels(batcher=self.name).set(self._pending_items)
+        return batch
+
+    async def _work(self) -> None:
+        assert self._loop is not None and self._wakeup is not None
+        loop = self._loop
+        wakeup = self._wakeup
+        while True:
+            while not self._pending:
+                wakeup.clear()
+                await wakeup.wait()
+
+            deadline = loop.time() + self.max_wait
+            while self._pending_items < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = self._take_batch()
+            if batch:
+                await self._run(batch)
+
+    async def _run(self, batch: list[_PendingRequest[T]]) -> None:
+        items = [item for request in batch for item in request.items]
+        order = list(range(len(items)))
+        if self.length:
+            length = self.length
+            order.sort(key=lambda idx: length(items[idx]), reverse=True)
+
+        batch_in_flight_gauge.labels(batcher=self.name).inc()
+        batch_size_histogram.labels(batcher=self.name).observe(len(items))
+        try:
+            sorted_results = await asyncio.get_running_loop().run_in_executor(
+                None, self.run_batch, [items[idx] for idx in order]
+            )
+            if len(sorted_results) != len(items):
+                raise RuntimeError(
+                    f"{self.name} returned {len(sorted_results)} results "
+                    f"for {len(items)} inputs"
+                )
+            results = _unsort(sorted_results, order)
+        except Exception as e:
+            if len(batch) == 1:
+                if not batch[0].future.done():
+                    batch[0].future.set_exception(e)
+                return
+            # Don't let one bad input fail the requests it was merged with
+            logger.warning(
+                f"Batch of {len(items)} items failed for {self.name}, "
+                f"retrying its {len(batch)} requests one by one: {e}"
+            )
+            for request in batch:
+                await self._run_alone(request)
+            return
+        finally:
+            batch_in_flight_gauge.labels(batcher=self.name).dec()
+
+        start = 0
+        for request in batch:
+            end = start + len(request.items)
+            if not request.future.done():
+                request.future.set_result(results[start:end])
+            start = end
+
+    async def _run_alone(self, request: _PendingRequest[T]) -> None:
+        if request.future.done():
+            return
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                None, self.run_batch, request.items
+            )
+        except Exception as e:
+            if not request.future.done():
+                request.future.set_exception(e)
+            return
+        if not request.future.done():
+            request.future.set_result(results)
+
+
+def _unsort(
+    sorted_results: Sequence[Any] | np.ndarray, order: list[int]
+) -> list[Any] | np.ndarray:
+    if isinstance(sorted_results, np.ndarray):
+        return sorted_results[np.argsort(order)]
+
+    results: list[Any] = [None] * len(order)
+    for position, idx in enumerate(order):
+        results[idx] = sorted_results[position]
+    return results
@@ -1,5 +1,6 @@
 import asyncio
 import json
+import threading
 import time
 from types import TracebackType
 from typing import cast
@@ -7,6 +8,7 @@ from typing import Optional
 
 import aioboto3  # type: ignore
 import httpx
+import numpy as np
 import openai
 import vertexai  # type: ignore
 import voyageai  # type: ignore
@@ -14,6 +16,7 @@ from cohere import AsyncClient as CohereAsyncClient
 from fastapi import APIRouter
 from fastapi import HTTPException
 from fastapi import Request
+from fastapi import Response
 from google.oauth2 import service_account  # type: ignore
 from litellm import aembedding
 from litellm.exceptions import RateLimitError
@@ -23,6 +26,7 @@ from sentence_transformers import SentenceTransformer  # type: ignore
 from vertexai.language_models import TextEmbeddingInput  # type: ignore
 from vertexai.language_models import TextEmbeddingModel  # type: ignore
 
+from model_server.batching import MicroBatcher
 from model_server.constants import DEFAULT_COHERE_MODEL
 from model_server.constants import DEFAULT_OPENAI_MODEL
 from model_server.constants import DEFAULT_VERTEX_MODEL
@@ -34,8 +38,12 @@ from model_server.utils import simple_log_function_time
 from onyx.utils.logger import setup_logger
 from shared_configs.configs import API_BASED_EMBEDDING_TIMEOUT
 from shared_configs.configs import INDEXING_ONLY
+from shared_configs.configs import MODEL_SERVER_BATCH_CONCURRENCY
+from shared_configs.configs import MODEL_SERVER_BATCH_WAIT_MS
+from shared_configs.configs import MODEL_SERVER_MAX_BATCH_SIZE
 from shared_configs.configs import OPENAI_EMBEDDING_TIMEOUT
 from shared_configs.configs import VERTEXAI_EMBEDDING_LOCAL_BATCH_SIZE
+from shared_configs.enums import EmbeddingDType
 from shared_configs.enums import EmbedTextType
 from shared_configs.enums import RerankerProvider
 from shared_configs.model_server_models import Embedding
@@ -44,6 +52,7 @@ from shared_configs.model_server_models import EmbedResponse
 from shared_configs.model_server_models import RerankRequest
 from shared_configs.model_server_models import RerankResponse
 from shared_configs.utils import batch_list
+from shared_configs.utils import pack_embeddings
 
 
 logger = setup_logger()
@@ -52,6 +61,10 @@ router = APIRouter(prefix="/encoder")
 
 _GLOBAL_MODELS_DICT: dict[str, "SentenceTransformer"] = {}
 _RERANK_MODEL: Optional["CrossEncoder"] = None
+# Local models are loaded from the batchers' executor threads, load each one only once
+_MODEL_LOAD_LOCK = threading.Lock()
+_EMBEDDING_BATCHERS: dict[tuple[str, int, bool], MicroBatcher[str]] = {}
+_RERANK_BATCHERS: dict[str, MicroBatcher[tuple[str, str]]] = {}
 
 # If we are not only indexing, dont want retry very long
 _RETRY_DELAY = 10 if INDEXING_ONLY else 0.1
@@ -375,36 +388,37 @@ def get_embedding_model(
 
     global _GLOBAL_MODELS_DICT  # A dictionary to store models
 
-    if model_name not in _GLOBAL_MODELS_DICT:
-        logger.notice(f"Loading {model_name}")
-        # Some model architectures that aren't built into the Transformers or Sentence
-        # Transformer need to be downloaded to be loaded locally. This does not mean
-        # data is sent to remote servers for inference, however the remote code can
-        # be fairly arbitrary so only use trusted models
-        model = SentenceTransformer(
-            model_name_or_path=model_name,
-            trust_remote_code=True,
-        )
-        model.max_seq_length = max_context_length
-        _GLOBAL_MODELS_DICT[model_name] = model
-    elif max_context_length != _GLOBAL_MODELS_DICT[model_name].max_seq_length:
-        _GLOBAL_MODELS_DICT[model_name].max_seq_length = max_context_length
+    with _MODEL_LOAD_LOCK:
+        if model_name not in _GLOBAL_MODELS_DICT:
+            logger.notice(f"Loading {model_name}")
+            # Some model architectures that aren't built into the Transformers or
+            # Sentence Transformer need to be downloaded to be loaded locally. This
+            # does not mean data is sent to remote servers for inference, however the
+            # remote code can be fairly arbitrary so only use trusted models
+            model = SentenceTransformer(
+                model_name_or_path=model_name,
+                trust_remote_code=True,
+            )
+            model.max_seq_length = max_context_length
+            _GLOBAL_MODELS_DICT[model_name] = model
+        elif max_context_length != _GLOBAL_MODELS_DICT[model_name].max_seq_length:
+            _GLOBAL_MODELS_DICT[model_name].max_seq_length = max_context_length
 
-    return _GLOBAL_MODELS_DICT[model_name]
+        return _GLOBAL_MODELS_DICT[model_name]
 
 
 def get_local_reranking_model(
     model_name: str,
 ) -> CrossEncoder:
     global _RERANK_MODEL
-    if _RERANK_MODEL is None:
-        logger.notice(f"Loading {model_name}")
-        model = CrossEncoder(model_name)
-        _RERANK_MODEL = model
-    return _RERANK_MODEL
+    with _MODEL_LOAD_LOCK:
+        if _RERANK_MODEL is None:
+            logger.notice(f"Loading {model_name}")
+            model = CrossEncoder(model_name)
+            _RERANK_MODEL = model
+        return _RERANK_MODEL
 
 
-@simple_log_function_time()
 async def embed_text(
     texts: list[str],
     text_type: EmbedTextType,
@@ -420,6 +434,90 @@ async def embed_text(
     reduced_dimension: int | None,
     gpu_type: str = "UNKNOWN",
 ) -> list[Embedding]:
+    embeddings = await embed_text_vectors(
+        texts=texts,
+        text_type=text_type,
+        model_name=model_name,
+        deployment_name=deployment_name,
+        max_context_length=max_context_length,
+        normalize_embeddings=normalize_embeddings,
+        api_key=api_key,
+        provider_type=provider_type,
+        prefix=prefix,
+        api_url=api_url,
+        api_version=api_version,
+        reduced_dimension=reduced_dimension,
+        gpu_type=gpu_type,
+    )
+    return _embeddings_as_lists(embeddings)
+
+
+def _embeddings_as_lists(embeddings: np.ndarray | list[Embedding]) -> list[Embedding]:
+    return [
+        embedding if isinstance(embedding, list) else embedding.tolist()
+        for embedding in embeddings
+    ]
+
+
+def _get_embedding_batcher(
+    model_name: str, max_context_length: int, normalize_embeddings: bool
+) -> MicroBatcher[str]:
+    key = (model_name, max_context_length, normalize_embeddings)
+    if key not in _EMBEDDING_BATCHERS:
+
+        def _encode(texts: list[str]) -> np.ndarray:
+            local_model = get_embedding_model(
+                model_name=model_name, max_context_length=max_context_length
+            )
+            return local_model.encode(texts, normalize_embeddings=normalize_embeddings)
+
+        _EMBEDDING_BATCHERS[key] = MicroBatcher(
+            name=f"embed:{model_name}:{max_context_length}:{normalize_embeddings}",
+            run_batch=_encode,
+            max_batch_size=MODEL_SERVER_MAX_BATCH_SIZE,
+            max_wait=MODEL_SERVER_BATCH_WAIT_MS / 1000,
+            concurrency=MODEL_SERVER_BATCH_CONCURRENCY,
+            length=len,
+        )
+    return _EMBEDDING_BATCHERS[key]
+
+
+def _get_rerank_batcher(model_name: str) -> MicroBatcher[tuple[str, str]]:
+    if model_name not in _RERANK_BATCHERS:
+
+        def _predict(pairs: list[tuple[str, str]]) -> list[float]:
+            cross_encoder = get_local_reranking_model(model_name)
+            return cross_encoder.predict(pairs).tolist()  # type: ignore
+
+        _RERANK_BATCHERS[model_name] = MicroBatcher(
+            name=f"rerank:{model_name}",
+            run_batch=_predict,
+            max_batch_size=MODEL_SERVER_MAX_BATCH_SIZE,
+            max_wait=MODEL_SERVER_BATCH_WAIT_MS / 1000,
+            concurrency=MODEL_SERVER_BATCH_CONCURRENCY,
+            length=lambda pair: len(pair[0]) + len(pair[1]),
+        )
+    return _RERANK_BATCHERS[model_name]
+
+
+@simple_log_function_time()
+async def embed_text_vectors(
+    texts: list[str],
+    text_type: EmbedTextType,
+    model_name: str | None,
+    deployment_name: str | None,
+    max_context_length: int,
+    normalize_embeddings: bool,
+    api_key: str | None,
+    provider_type: EmbeddingProvider | None,
+    prefix: str | None,
+    api_url: str | None,
+    api_version: str | None,
+    reduced_dimension: int | None,
+    gpu_type: str = "UNKNOWN",
+) -> np.ndarray | list[Embedding]:
+    """Same as embed_text, but local model embeddings are returned as the array the
+    model produced instead of being converted to Python floats."""
     if not all(texts):
         logger.error("Empty strings provided for embedding")
         raise ValueError("Empty strings are not allowed for embedding.")
@@ -486,20 +584,12 @@ async def embed_text(
 
         prefixed_texts = [f"{prefix}{text}" for text in texts] if prefix else texts
 
-        local_model = get_embedding_model(
-            model_name=model_name, max_context_length=max_context_length
-        )
-        # Run CPU-bound embedding in a thread pool
-        embeddings_vectors = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: local_model.encode(
-                prefixed_texts, normalize_embeddings=normalize_embeddings
-            ),
-        )
-        embeddings = [
-            embedding if isinstance(embedding, list) else embedding.tolist()
-            for embedding in embeddings_vectors
-        ]
+        # Merged with concurrent requests for the same model, run in a thread pool
+        embeddings = await _get_embedding_batcher(
+            model_name=model_name,
+            max_context_length=max_context_length,
+            normalize_embeddings=normalize_embeddings,
+        ).submit(prefixed_texts)
 
         elapsed = time.monotonic() - start
         logger.info(
@@ -525,12 +615,11 @@ async def embed_text(
 
 @simple_log_function_time()
 async def local_rerank(query: str, docs: list[str], model_name: str) -> list[float]:
-    cross_encoder = get_local_reranking_model(model_name)
-    # Run CPU-bound reranking in a thread pool
-    return await asyncio.get_event_loop().run_in_executor(
-        None,
-        lambda: cross_encoder.predict([(query, doc) for doc in docs]).tolist(),  # type: ignore
+    # Merged with concurrent requests for the same model, run in a thread pool
+    scores = await _get_rerank_batcher(model_name).submit(
+        [(query, doc) for doc in docs]
     )
+    return list(scores)
 
 
 async def cohere_rerank_api(
@@ -612,9 +701,31 @@ async def route_bi_encoder_embed(
     return await process_embed_request(embed_request, request.app.state.gpu_type)
 
 
+@router.post("/bi-encoder-embed-binary")
+async def route_bi_encoder_embed_binary(
+    request: Request,
+    embed_request: EmbedRequest,
+    dtype: EmbeddingDType = EmbeddingDType.FLOAT32,
+) -> Response:
+    """Same as /bi-encoder-embed, but the embeddings are returned as one packed
+    little endian buffer, with the shape and dtype in the response headers."""
+    embeddings = await _embed_request_vectors(embed_request, request.app.state.gpu_type)
+    content, headers = pack_embeddings(embeddings, dtype)
+    return Response(
+        content=content, media_type="application/octet-stream", headers=headers
+    )
+
+
 async def process_embed_request(
     embed_request: EmbedRequest, gpu_type: str = "UNKNOWN"
 ) -> EmbedResponse:
+    embeddings = await _embed_request_vectors(embed_request, gpu_type)
+    return EmbedResponse(embeddings=_embeddings_as_lists(embeddings))
+
+
+async def _embed_request_vectors(
+    embed_request: EmbedRequest, gpu_type: str
+) -> np.ndarray | list[Embedding]:
     if not embed_request.texts:
         raise HTTPException(status_code=400, detail="No texts to be embedded")
 
@@ -629,7 +740,7 @@ async def process_embed_request(
         else:
             prefix = None
 
-        embeddings = await embed_text(
+        return await embed_text_vectors(
             texts=embed_request.texts,
             model_name=embed_request.model_name,
             deployment_name=embed_request.deployment_name,
@@ -644,7 +755,6 @@ async def process_embed_request(
             prefix=prefix,
             gpu_type=gpu_type,
         )
-        return EmbedResponse(embeddings=embeddings)
     except AuthenticationError as e:
         # Handle authentication errors consistently
         logger.error(f"Authentication error: {e.provider}")
@@ -1,6 +1,8 @@
 import time
 import traceback
 from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import closing
 from datetime import datetime
 from datetime import timedelta
 from datetime import timezone
@@ -14,6 +16,7 @@ from onyx.background.indexing.checkpointing_utils import get_latest_valid_checkp
 from onyx.background.indexing.checkpointing_utils import save_checkpoint
 from onyx.background.indexing.memory_tracer import MemoryTracer
 from onyx.configs.app_configs import INDEX_BATCH_SIZE
+from onyx.configs.app_configs import INDEXING_PIPELINE_QUEUE_SIZE
 from onyx.configs.app_configs import INDEXING_SIZE_WARNING_THRESHOLD
 from onyx.configs.app_configs import INDEXING_TRACER_INTERVAL
 from onyx.configs.app_configs import INTEGRATION_TESTS_MODE
@@ -25,6 +28,7 @@ from onyx.connectors.connector_runner import ConnectorRunner
 from onyx.connectors.exceptions import ConnectorValidationError
 from onyx.connectors.exceptions import UnexpectedValidationError
 from onyx.connectors.factory import instantiate_connector
+from onyx.connectors.models import ConnectorCheckpoint
 from onyx.connectors.models import ConnectorFailure
 from onyx.connectors.models import Document
 from onyx.connectors.models import IndexAttemptMetadata
@@ -470,13 +474,92 @@ def _run_indexing(
                 error for error in unresolved_errors if error.entity_id
             ]
 
-        while checkpoint.has_more:
-            logger.info(
-                f"Running '{ctx.source.value}' connector with checkpoint: {checkpoint}"
+        def _fetch_document_batches(
+            checkpoint: ConnectorCheckpoint,
+        ) -> Iterator[
+            tuple[
+                list[Document] | None,
+                ConnectorFailure | None,
+                ConnectorCheckpoint | None,
+            ]
+        ]:
+            # NOTE: runs ahead of the indexing of the batches it yields, the checkpoints
+            # are only saved once everything before them has been indexed
+            while checkpoint.has_more:
+                logger.info(
+                    f"Running '{ctx.source.value}' connector with checkpoint: {checkpoint}"
+                )
+                for document_batch, failure, next_checkpoint in connector_runner.run(
+                    checkpoint
+                ):
+                    if next_checkpoint:
+                        checkpoint = next_checkpoint
+                    yield document_batch, failure, next_checkpoint
+
+        fetched_batch_num = 0
+
+        def _prepare_document_batch(
+            item: tuple[
+                list[Document] | None,
+                ConnectorFailure | None,
+                ConnectorCheckpoint | None,
+            ],
+        ) -> tuple[list[Document], IndexAttemptMetadata] | None:
+            nonlocal fetched_batch_num
+
+            document_batch = item[0]
+            # below is all document processing logic, so if no batch we can just continue
+            if document_batch is None:
+                return None
+
+            batch_description = []
+
+            doc_batch_cleaned = strip_null_characters(document_batch)
+            for doc in doc_batch_cleaned:
+                batch_description.append(doc.to_short_descriptor())
+
+                doc_size = 0
+                for section in doc.sections:
+                    if isinstance(section, TextSection) and section.text is not None:
+                        doc_size += len(section.text)
+
+                if doc_size > INDEXING_SIZE_WARNING_THRESHOLD:
+                    logger.warning(
+                        f"Document size: doc='{doc.to_short_descriptor()}' "
+                        f"size={doc_size} "
+                        f"threshold={INDEXING_SIZE_WARNING_THRESHOLD}"
+                    )
+
+            logger.debug(f"Indexing batch of documents: {batch_description}")
+
+            # batches are indexed concurrently, so each one gets its own metadata
+            batch_attempt_md = index_attempt_md.model_copy(
+                update={
+                    # Generate an ID that can be used to correlate activity between here
+                    # and the embedding model server
+                    "request_id": make_randomized_onyx_request_id("CIX"),
+                    "structured_id": f"{tenant_id}:{ctx.cc_pair_id}:{index_attempt_id}:{fetched_batch_num}",
+                    "batch_num": fetched_batch_num + 1,  # use 1-index for this
+                }
             )
-            for document_batch, failure, next_checkpoint in connector_runner.run(
-                checkpoint
-            ):
+            fetched_batch_num += 1
+            return doc_batch_cleaned, batch_attempt_md
+
+        # real work happens here!
+        # the pipeline is closed explicitly, so its stage threads are stopped and
+        # waited for however the loop ends (stop signal, failed attempt, ...)
+        with closing(
+            indexing_pipeline.index_batches(
+                _fetch_document_batches(checkpoint),
+                get_batch=_prepare_document_batch,
+                max_buffered=INDEXING_PIPELINE_QUEUE_SIZE,
+            )
+        ) as indexed_batches:
+            for (
+                document_batch,
+                failure,
+                next_checkpoint,
+            ), index_pipeline_result in indexed_batches:
                 # Check if connector is disabled mid run and stop if so unless it's the secondary
                 # index being built. We want to populate it even for paused connectors
                 # Often paused connectors are sources that aren't updated frequently but the
@@ -512,50 +595,26 @@ def _run_indexing(
                         total_failures, document_count, batch_num, failure
                     )
 
-                # save the new checkpoint (if one is provided)
+                # a new checkpoint is provided once the connector is done with the
+                # previous one, and every batch before it has been indexed
                 if next_checkpoint:
                     checkpoint = next_checkpoint
 
-                # below is all document processing logic, so if no batch we can just continue
-                if document_batch is None:
-                    continue
-
-                batch_description = []
-
-                # Generate an ID that can be used to correlate activity between here
-                # and the embedding model server
-                doc_batch_cleaned = strip_null_characters(document_batch)
-                for doc in doc_batch_cleaned:
-                    batch_description.append(doc.to_short_descriptor())
+                    # `make sure the checkpoints aren't getting too large`at some regular interval
+                    CHECKPOINT_SIZE_CHECK_INTERVAL = 100
+                    if batch_num % CHECKPOINT_SIZE_CHECK_INTERVAL == 0:
+                        check_checkpoint_size(checkpoint)
 
-                    doc_size = 0
-                    for section in doc.sections:
-                        if (
-                            isinstance(section, TextSection)
-                            and section.text is not None
-                        ):
-                            doc_size += len(section.text)
-
-                    if doc_size > INDEXING_SIZE_WARNING_THRESHOLD:
-                        logger.warning(
-                            f"Document size: doc='{doc.to_short_descriptor()}' "
-                            f"size={doc_size} "
-                            f"threshold={INDEXING_SIZE_WARNING_THRESHOLD}"
+                    # save latest checkpoint
+                    with get_session_with_current_tenant() as db_session_temp:
+                        save_checkpoint(
+                            db_session=db_session_temp,
+                            index_attempt_id=index_attempt_id,
+                            checkpoint=checkpoint,
                         )
 
-                logger.debug(f"Indexing batch of documents: {batch_description}")
-
-                index_attempt_md.request_id = make_randomized_onyx_request_id("CIX")
-                index_attempt_md.structured_id = (
-                    f"{tenant_id}:{ctx.cc_pair_id}:{index_attempt_id}:{batch_num}"
-                )
-                index_attempt_md.batch_num = batch_num + 1  # use 1-index for this
-
-                # real work happens here!
-                index_pipeline_result = indexing_pipeline(
-                    document_batch=doc_batch_cleaned,
-                    index_attempt_metadata=index_attempt_md,
-                )
+                if document_batch is None or index_pipeline_result is None:
+                    continue
 
                 batch_num += 1
                 net_doc_change += index_pipeline_result.new_docs
@@ -616,7 +675,7 @@ def _run_indexing(
                     )
 
                 if callback:
-                    callback.progress("_run_indexing", len(doc_batch_cleaned))
+                    callback.progress("_run_indexing", len(document_batch))
 
                 # Add telemetry for indexing progress
                 optional_telemetry(
@@ -631,20 +690,22 @@ def _run_indexing(
                     tenant_id=tenant_id,
                 )
 
-                memory_tracer.increment_and_maybe_trace()
+            memory_tracer.increment_and_maybe_trace()
 
-            # `make sure the checkpoints aren't getting too large`at some regular interval
-            CHECKPOINT_SIZE_CHECK_INTERVAL = 100
-            if batch_num % CHECKPOINT_SIZE_CHECK_INTERVAL == 0:
-                check_checkpoint_size(checkpoint)
-
-            # save latest checkpoint
-            with get_session_with_current_tenant() as db_session_temp:
-                save_checkpoint(
-                    db_session=db_session_temp,
-                    index_attempt_id=index_attempt_id,
-                    checkpoint=checkpoint,
-                )
+        embedding_cache_data: dict[str, int | float] = {}
+        embedding_cache = embedding_model.embedding_cache
+        if embedding_cache is not None:
+            logger.info(
+                f"Embedding cache: index_attempt={index_attempt_id} "
+                f"hits={embedding_cache.hits} lookups={embedding_cache.lookups} "
+                f"hit_ratio={embedding_cache.hit_ratio:.2%}"
+            )
+            embedding_cache_data = {
+                "embedding_cache_hits": embedding_cache.hits,
+                "embedding_cache_lookups": embedding_cache.lookups,
+                "embedding_cache_hit_ratio": embedding_cache.hit_ratio,
+            }
+            embedding_cache.prune()
 
         optional_telemetry(
             record_type=RecordType.INDEXING_COMPLETE,
@@ -655,6 +716,7 @@ def _run_indexing(
                 "total_chunks": chunk_count,
                 "time_elapsed_seconds": time.monotonic() - start_time,
                 "source": ctx.source.value,
+                **embedding_cache_data,
             },
             tenant_id=tenant_id,
         )
@@ -566,6 +566,11 @@ INDEXING_EMBEDDING_MODEL_NUM_THREADS = int(
 # exception without aborting the attempt.
 INDEXING_EXCEPTION_LIMIT = int(os.environ.get("INDEXING_EXCEPTION_LIMIT") or 0)
 
+# Connector fetch, chunking, embedding and document index writes run as concurrent
+# stages; each stage keeps at most this many batches ready for the next one.
+# 0 runs every batch through all the stages before fetching the next one.
+INDEXING_PIPELINE_QUEUE_SIZE = int(os.environ.get("INDEXING_PIPELINE_QUEUE_SIZE", "2"))
+
 # Maximum file size in a document to be indexed
 MAX_DOCUMENT_CHARS = int(os.environ.get("MAX_DOCUMENT_CHARS") or 5_000_000)
 MAX_FILE_SIZE_BYTES = int(
@@ -583,6 +588,23 @@ AVERAGE_SUMMARY_EMBEDDINGS = (
 
 MAX_TOKENS_FOR_FULL_INCLUSION = 4096
 
+# Reuse passage embeddings of chunks whose embedded text did not change since they
+# were last indexed with the same embedding model settings (stored in Postgres)
+ENABLE_EMBEDDING_CACHE = (
+    os.environ.get("ENABLE_EMBEDDING_CACHE", "true").lower() == "true"
+)
+# Cached embeddings not used by any indexing run for this many days are deleted
+EMBEDDING_CACHE_TTL_DAYS = int(os.environ.get("EMBEDDING_CACHE_TTL_DAYS") or 30)
+# Query embeddings kept in memory per process, 0 disables the query embedding cache
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE") or 2048)
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = int(
+    os.environ.get("QUERY_EMBEDDING_CACHE_TTL_SECONDS") or 3600
+)
+# Also share cached query embeddings between processes through Redis
+QUERY_EMBEDDING_CACHE_USE_REDIS = (
+    os.environ.get("QUERY_EMBEDDING_CACHE_USE_REDIS", "").lower() == "true"
+)
+
 #####
 # Miscellaneous
 #####
@@ -49,6 +49,12 @@ BATCH_SIZE_ENCODE_CHUNKS_FOR_API_EMBEDDING_SERVICES = EMBEDDING_BATCH_SIZE or 51
 # For score display purposes, only way is to know the expected ranges
 CROSS_ENCODER_RANGE_MAX = 1
 CROSS_ENCODER_RANGE_MIN = 0
+# Embeddings are fetched from the model server as packed binary vectors of this type
+# (float32 or float16, which halves the payload at a small precision cost).
+# Set to "json" to get them as JSON floats instead.
+MODEL_SERVER_EMBEDDING_DTYPE = (
+    os.environ.get("MODEL_SERVER_EMBEDDING_DTYPE") or "float32"
+).lower()
 
 
 #####
@@ -0,0 +1,100 @@
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from typing import cast
+
+import numpy as np
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import CursorResult
+from sqlalchemy.orm import Session
+
+from onyx.db.models import EmbeddingCache
+from shared_configs.model_server_models import Embedding
+
+# last_used only needs to be precise enough for pruning after days of disuse, so hits
+# refresh it at most this often instead of turning every lookup into a write
+_LAST_USED_REFRESH_INTERVAL = timedelta(hours=6)
+
+
+def _to_bytes(embedding: Embedding) -> bytes:
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+
+def _from_bytes(data: bytes) -> Embedding:
+    return np.frombuffer(data, dtype=np.float32).tolist()
+
+
+def fetch_cached_embeddings(
+    db_session: Session, cache_keys: list[str]
+) -> dict[str, Embedding]:
+    """Returns the cached embeddings found for the given keys. Entries whose last_used
+    is older than _LAST_USED_REFRESH_INTERVAL are marked as used, so they are not
+    pruned while still being hit."""
+    if not cache_keys:
+        return {}
+
+    rows = db_session.execute(
+        select(
+            EmbeddingCache.cache_key,
+            EmbeddingCache.embedding,
+            EmbeddingCache.last_used,
+        ).where(EmbeddingCache.cache_key.in_(cache_keys))
+    ).all()
+
+    refresh_before = datetime.now(timezone.utc) - _LAST_USED_REFRESH_INTERVAL
+    stale_keys = [
+        cache_key for cache_key, _, last_used in rows if last_used < refresh_before
+    ]
+    if stale_keys:
+        db_session.execute(
+            update(EmbeddingCache)
+            .where(EmbeddingCache.cache_key.in_(stale_keys))
+            .values(last_used=func.now())
+        )
+        db_session.commit()
+    return {cache_key: _from_bytes(embedding) for cache_key, embedding, _ in rows}
+
+
+def upsert_cached_embeddings(
+    db_session: Session, model_name: str, embeddings: dict[str, Embedding]
+) -> None:
+    """NOTE: this function is Postgres specific. Not all DBs support the ON CONFLICT clause."""
+    if not embeddings:
+        return
+
+    insert_stmt = insert(EmbeddingCache).values(
+        [
+            {
+                "cache_key": cache_key,
+                "model_name": model_name,
+                "embedding": _to_bytes(embedding),
+            }
+            for cache_key, embedding in embeddings.items()
+        ]
+    )
+    on_conflict_stmt = insert_stmt.on_conflict_do_update(
+        index_elements=["cache_key"],
+        set_={
+            "embedding": insert_stmt.excluded.embedding,
+            "last_used": func.now(),
+        },
+    )
+    db_session.execute(on_conflict_stmt)
+    db_session.commit()
+
+
+def delete_cached_embeddings_not_used_since(
+    db_session: Session, cutoff: datetime
+) -> int:
+    result = cast(
+        CursorResult,
+        db_session.execute(
+            delete(EmbeddingCache).where(EmbeddingCache.last_used < cutoff)
+        ),
+    )
+    db_session.commit()
+    return result.rowcount
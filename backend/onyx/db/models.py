@@ -1297,6 +1297,22 @@ class ChunkStats(Base):
     )
 
 
+class EmbeddingCache(Base):
+    """Passage embeddings keyed by a hash of the embedding model settings and the
+    exact text that was embedded, so unchanged chunks are not embedded again"""
+
+    __tablename__ = "embedding_cache"
+
+    # sha256 hex digest, see onyx.indexing.embedding_cache.embedding_cache_key
+    cache_key: Mapped[str] = mapped_column(String, primary_key=True)
+    model_name: Mapped[str] = mapped_column(String, nullable=False, index=True)
+    # float32 vector
+    embedding: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    last_used: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True, default=func.now()
+    )
+
+
 class Tag(Base):
     __tablename__ = "tag"
 
@@ -3,9 +3,11 @@ from abc import ABC
 from abc import abstractmethod
 from collections import defaultdict
 
+from onyx.configs.app_configs import ENABLE_EMBEDDING_CACHE
 from onyx.connectors.models import ConnectorFailure
 from onyx.connectors.models import DocumentFailure
 from onyx.db.models import SearchSettings
+from onyx.indexing.embedding_cache import ChunkEmbeddingCache
 from onyx.indexing.indexing_heartbeat import IndexingHeartbeatInterface
 from onyx.indexing.models import ChunkEmbedding
 from onyx.indexing.models import DocAwareChunk
@@ -93,6 +95,7 @@ class DefaultIndexingEmbedder(IndexingEmbedder):
         deployment_name: str | None = None,
         reduced_dimension: int | None = None,
         callback: IndexingHeartbeatInterface | None = None,
+        embedding_cache: ChunkEmbeddingCache | None = None,
     ):
         super().__init__(
             model_name,
@@ -107,6 +110,29 @@ class DefaultIndexingEmbedder(IndexingEmbedder):
             reduced_dimension,
             callback,
         )
+        self.embedding_cache = embedding_cache
+
+    def _encode_passages(
+        self,
+        texts: list[str],
+        large_chunks_present: bool = False,
+        tenant_id: str | None = None,
+        request_id: str | None = None,
+    ) -> list[Embedding]:
+        def encode(texts_to_embed: list[str]) -> list[Embedding]:
+            return self.embedding_model.encode(
+                texts=texts_to_embed,
+                text_type=EmbedTextType.PASSAGE,
+                large_chunks_present=large_chunks_present,
+                tenant_id=tenant_id,
+                request_id=request_id,
+            )
+
+        if self.embedding_cache is None:
+            return encode(texts)
+        return self.embedding_cache.embed(
+            texts, encode, large_chunks_present=large_chunks_present
+        )
 
     @log_function_time()
     def embed_chunks(
@@ -143,9 +169,8 @@ class DefaultIndexingEmbedder(IndexingEmbedder):
                     raise RuntimeError("Large chunk contains mini chunks")
                 flat_chunk_texts.extend(chunk.mini_chunk_texts)
 
-        embeddings = self.embedding_model.encode(
-            texts=flat_chunk_texts,
-            text_type=EmbedTextType.PASSAGE,
+        embeddings = self._encode_passages(
+            flat_chunk_texts,
             large_chunks_present=large_chunks_present,
             tenant_id=tenant_id,
             request_id=request_id,
@@ -163,9 +188,8 @@ class DefaultIndexingEmbedder(IndexingEmbedder):
         # Cache the Title embeddings to only have to do it once
         title_embed_dict: dict[str, Embedding] = {}
         if chunk_titles_list:
-            title_embeddings = self.embedding_model.encode(
+            title_embeddings = self._encode_passages(
                 chunk_titles_list,
-                text_type=EmbedTextType.PASSAGE,
                 tenant_id=tenant_id,
                 request_id=request_id,
             )
@@ -237,6 +261,17 @@ class DefaultIndexingEmbedder(IndexingEmbedder):
             deployment_name=search_settings.deployment_name,
             reduced_dimension=search_settings.reduced_dimension,
             callback=callback,
+            embedding_cache=(
+                ChunkEmbeddingCache(
+                    model_name=search_settings.model_name,
+                    normalize=search_settings.normalize,
+                    passage_prefix=search_settings.passage_prefix,
+                    provider_type=search_settings.provider_type,
+                    reduced_dimension=search_settings.reduced_dimension,
+                )
+                if ENABLE_EMBEDDING_CACHE
+                else None
+            ),
         )
 
 
@@ -0,0 +1,118 @@
+import hashlib
+import json
+from collections.abc import Callable
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+from onyx.configs.app_configs import EMBEDDING_CACHE_TTL_DAYS
+from onyx.db.embedding_cache import delete_cached_embeddings_not_used_since
+from onyx.db.embedding_cache import fetch_cached_embeddings
+from onyx.db.embedding_cache import upsert_cached_embeddings
+from onyx.db.engine import get_session_with_current_tenant
+from onyx.utils.logger import setup_logger
+from shared_configs.enums import EmbeddingProvider
+from shared_configs.model_server_models import Embedding
+
+logger = setup_logger()
+
+
+def embedding_cache_key(model_settings: str, text: str) -> str:
+    return hashlib.sha256(f"{model_settings}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class ChunkEmbeddingCache:
+    """Passage embeddings keyed by a hash of the embedding model settings (model name,
+    normalize flag, passage prefix, provider, reduced dimension) and the exact text sent
+    to the model, which for chunks includes the title prefix and metadata suffix.
+
+    `embed` only sends the texts that are neither cached nor repeated within the call to
+    the model server. The cache is best effort: if Postgres cannot be reached, everything
+    is embedded as if it was empty. It uses its own sessions so that the indexing
+    pipeline's transaction is never committed early.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        normalize: bool,
+        passage_prefix: str | None,
+        provider_type: EmbeddingProvider | None,
+        reduced_dimension: int | None,
+    ):
+        self.model_name = model_name
+        self._model_settings = json.dumps(
+            [
+                model_name,
+                normalize,
+                passage_prefix or "",
+                provider_type.value if provider_type else None,
+                reduced_dimension,
+            ]
+        )
+        self.lookups = 0
+        self.hits = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def key(self, text: str, large_chunks_present: bool = False) -> str:
+        # Texts may be trimmed to a longer context when large chunks are in the batch
+        settings = self._model_settings
+        if large_chunks_present:
+            settings = f"{settings}:large"
+        return embedding_cache_key(settings, text)
+
+    def embed(
+        self,
+        texts: list[str],
+        encode: Callable[[list[str]], list[Embedding]],
+        large_chunks_present: bool = False,
+    ) -> list[Embedding]:
+        keys = [self.key(text, large_chunks_present) for text in texts]
+
+        cached: dict[str, Embedding] = {}
+        try:
+            with get_session_with_current_tenant() as db_session:
+                cached = fetch_cached_embeddings(db_session, list(set(keys)))
+        except Exception:
+            logger.exception("Embedding cache lookup failed, embedding all texts")
+
+        miss_keys: list[str] = []
+        miss_texts: list[str] = []
+        seen_misses: set[str] = set()
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in seen_misses:
+                seen_misses.add(key)
+                miss_keys.append(key)
+                miss_texts.append(text)
+
+        self.lookups += len(texts)
+        self.hits += len(texts) - len(miss_texts)
+
+        if miss_texts:
+            new_embeddings = dict(zip(miss_keys, encode(miss_texts)))
+            try:
+                with get_session_with_current_tenant() as db_session:
+                    upsert_cached_embeddings(
+                        db_session, self.model_name, new_embeddings
+                    )
+            except Exception:
+                logger.exception("Failed to store embeddings in the embedding cache")
+            cached.update(new_embeddings)
+
+        return [cached[key] for key in keys]
+
+    def prune(self) -> None:
+        """Deletes cached embeddings that were not used for EMBEDDING_CACHE_TTL_DAYS,
+        including the ones of embedding models that are no longer in use."""
+        cutoff = datetime.now(timezone.utc) - timedelta(days=EMBEDDING_CACHE_TTL_DAYS)
+        try:
+            with get_session_with_current_tenant() as db_session:
+                deleted = delete_cached_embeddings_not_used_since(db_session, cutoff)
+        except Exception:
+            logger.exception("Failed to prune the embedding cache")
+            return
+        if deleted:
+            logger.info(f"Pruned {deleted} stale entries from the embedding cache")
@@ -1,7 +1,8 @@
 from collections import defaultdict
 from collections.abc import Callable
-from functools import partial
-from typing import Protocol
+from collections.abc import Generator
+from collections.abc import Iterator
+from typing import TypeVar
 
 from pydantic import BaseModel
 from pydantic import ConfigDict
@@ -86,6 +87,7 @@ from onyx.prompts.chat_prompts import CONTEXTUAL_RAG_PROMPT1
 from onyx.prompts.chat_prompts import CONTEXTUAL_RAG_PROMPT2
 from onyx.prompts.chat_prompts import DOCUMENT_SUMMARY_PROMPT
 from onyx.utils.logger import setup_logger
+from onyx.utils.threadpool_concurrency import prefetch_in_background
 from onyx.utils.threadpool_concurrency import run_functions_tuples_in_parallel
 from onyx.utils.timing import log_function_time
 from shared_configs.configs import (
@@ -95,6 +97,8 @@ from shared_configs.configs import (
 
 logger = setup_logger()
 
+T = TypeVar("T")
+
 
 class DocumentBatchPrepareContext(BaseModel):
     updatable_docs: list[Document]
@@ -116,12 +120,21 @@ class IndexingPipelineResult(BaseModel):
     failures: list[ConnectorFailure]
 
 
-class IndexingPipelineProtocol(Protocol):
-    def __call__(
-        self,
-        document_batch: list[Document],
-        index_attempt_metadata: IndexAttemptMetadata,
-    ) -> IndexingPipelineResult: ...
+class ChunkedDocBatch(BaseModel):
+    """A document batch after the chunking stage. `ctx` is None when none of the
+    documents needed to be (re)indexed."""
+
+    document_batch: list[Document]
+    filtered_documents: list[Document]
+    index_attempt_metadata: IndexAttemptMetadata
+    ctx: DocumentBatchPrepareContext | None
+    chunks: list[DocAwareChunk] = []
+
+
+class EmbeddedDocBatch(ChunkedDocBatch):
+    chunks_with_embeddings: list[IndexChunk] = []
+    embedding_failures: list[ConnectorFailure] = []
+    chunk_content_scores: list[float] = []
 
 
 def _upsert_documents_in_db(
@@ -292,32 +305,38 @@ def index_doc_batch_with_handler(
             llm=llm,
         )
     except Exception as e:
-        # don't log the batch directly, it's too much text
-        document_ids = [doc.id for doc in document_batch]
-        logger.exception(f"Failed to index document batch: {document_ids}")
-
-        index_pipeline_result = IndexingPipelineResult(
-            new_docs=0,
-            total_docs=len(document_batch),
-            total_chunks=0,
-            failures=[
-                ConnectorFailure(
-                    failed_document=DocumentFailure(
-                        document_id=document.id,
-                        document_link=(
-                            document.sections[0].link if document.sections else None
-                        ),
-                    ),
-                    failure_message=str(e),
-                    exception=e,
-                )
-                for document in document_batch
-            ],
-        )
+        index_pipeline_result = _handle_doc_batch_exception(document_batch, e)
 
     return index_pipeline_result
 
 
+def _handle_doc_batch_exception(
+    document_batch: list[Document], e: Exception
+) -> IndexingPipelineResult:
+    # don't log the batch directly, it's too much text
+    document_ids = [doc.id for doc in document_batch]
+    logger.exception(f"Failed to index document batch: {document_ids}")
+
+    return IndexingPipelineResult(
+        new_docs=0,
+        total_docs=len(document_batch),
+        total_chunks=0,
+        failures=[
+            ConnectorFailure(
+                failed_document=DocumentFailure(
+                    document_id=document.id,
+                    document_link=(
+                        document.sections[0].link if document.sections else None
+                    ),
+                ),
+                failure_message=str(e),
+                exception=e,
+            )
+            for document in document_batch
+        ],
+    )
+
+
 def index_doc_batch_prepare(
     documents: list[Document],
     index_attempt_metadata: IndexAttemptMetadata,
@@ -697,36 +716,19 @@ def add_contextual_summaries(
 
 
 @log_function_time(debug_only=True)
-def index_doc_batch(
+def chunk_doc_batch(
     *,
     document_batch: list[Document],
     chunker: Chunker,
-    embedder: IndexingEmbedder,
-    information_content_classification_model: InformationContentClassificationModel,
-    document_index: DocumentIndex,
     index_attempt_metadata: IndexAttemptMetadata,
     db_session: Session,
-    tenant_id: str,
     enable_contextual_rag: bool = False,
     llm: LLM | None = None,
     ignore_time_skip: bool = False,
     filter_fnc: Callable[[list[Document]], list[Document]] = filter_documents,
-) -> IndexingPipelineResult:
-    """Takes different pieces of the indexing pipeline and applies it to a batch of documents
-    Note that the documents should already be batched at this point so that it does not inflate the
-    memory requirements
-
-    Returns a tuple where the first element is the number of new docs and the
-    second element is the number of chunks."""
-
-    no_access = DocumentAccess.build(
-        user_emails=[],
-        user_groups=[],
-        external_user_emails=[],
-        external_user_group_ids=[],
-        is_public=False,
-    )
-
+) -> ChunkedDocBatch:
+    """First stage of the indexing pipeline: upserts the documents into Postgres
+    and chunks the ones that changed (image sections and contextual RAG included)."""
     filtered_documents = filter_fnc(document_batch)
 
     ctx = index_doc_batch_prepare(
@@ -736,21 +738,11 @@ def index_doc_batch(
         db_session=db_session,
     )
     if not ctx:
-        # even though we didn't actually index anything, we should still
-        # mark them as "completed" for the CC Pair in order to make the
-        # counts match
-        mark_document_as_indexed_for_cc_pair__no_commit(
-            connector_id=index_attempt_metadata.connector_id,
-            credential_id=index_attempt_metadata.credential_id,
-            document_ids=[doc.id for doc in filtered_documents],
-            db_session=db_session,
-        )
-        db_session.commit()
-        return IndexingPipelineResult(
-            new_docs=0,
-            total_docs=len(filtered_documents),
-            total_chunks=0,
-            failures=[],
+        return ChunkedDocBatch(
+            document_batch=document_batch,
+            filtered_documents=filtered_documents,
+            index_attempt_metadata=index_attempt_metadata,
+            ctx=None,
         )
 
     # Convert documents to IndexingDocument objects with processed section
@@ -770,7 +762,6 @@ def index_doc_batch(
     # NOTE: no special handling for failures here, since the chunker is not
     # a common source of failure for the indexing pipeline
     chunks: list[DocAwareChunk] = chunker.chunk(ctx.indexable_docs)
-    llm_tokenizer: BaseTokenizer | None = None
 
     # contextual RAG
     if enable_contextual_rag:
@@ -789,13 +780,37 @@ def index_doc_batch(
             chunk_token_limit=chunker.chunk_token_limit * 2,
         )
 
+    return ChunkedDocBatch(
+        document_batch=document_batch,
+        filtered_documents=filtered_documents,
+        index_attempt_metadata=index_attempt_metadata,
+        ctx=ctx,
+        chunks=chunks,
+    )
+
+
+@log_function_time(debug_only=True)
+def embed_doc_batch(
+    *,
+    chunked_batch: ChunkedDocBatch,
+    embedder: IndexingEmbedder,
+    information_content_classification_model: InformationContentClassificationModel,
+    tenant_id: str,
+) -> EmbeddedDocBatch:
+    """Second stage of the indexing pipeline: embeds the chunks and computes their
+    information content boost."""
+    if not chunked_batch.ctx:
+        return EmbeddedDocBatch(**dict(chunked_batch))
+
+    chunks = chunked_batch.chunks
+
     logger.debug("Starting embedding")
     chunks_with_embeddings, embedding_failures = (
         embed_chunks_with_failure_handling(
             chunks=chunks,
             embedder=embedder,
             tenant_id=tenant_id,
-            request_id=index_attempt_metadata.request_id,
+            request_id=chunked_batch.index_attempt_metadata.request_id,
         )
         if chunks
         else ([], [])
@@ -809,6 +824,58 @@ def index_doc_batch(
         else [1.0] * len(chunks_with_embeddings)
     )
 
+    return EmbeddedDocBatch(
+        **dict(chunked_batch),
+        chunks_with_embeddings=chunks_with_embeddings,
+        embedding_failures=embedding_failures,
+        chunk_content_scores=chunk_content_scores,
+    )
+
+
+@log_function_time(debug_only=True)
+def write_doc_batch(
+    *,
+    embedded_batch: EmbeddedDocBatch,
+    document_index: DocumentIndex,
+    db_session: Session,
+    tenant_id: str,
+    large_chunks_enabled: bool,
+) -> IndexingPipelineResult:
+    """Last stage of the indexing pipeline: writes the chunks to the document index
+    and commits the per-document bookkeeping to Postgres."""
+    no_access = DocumentAccess.build(
+        user_emails=[],
+        user_groups=[],
+        external_user_emails=[],
+        external_user_group_ids=[],
+        is_public=False,
+    )
+
+    ctx = embedded_batch.ctx
+    filtered_documents = embedded_batch.filtered_documents
+    index_attempt_metadata = embedded_batch.index_attempt_metadata
+    if not ctx:
+        # even though we didn't actually index anything, we should still
+        # mark them as "completed" for the CC Pair in order to make the
+        # counts match
+        mark_document_as_indexed_for_cc_pair__no_commit(
+            connector_id=index_attempt_metadata.connector_id,
+            credential_id=index_attempt_metadata.credential_id,
+            document_ids=[doc.id for doc in filtered_documents],
+            db_session=db_session,
+        )
+        db_session.commit()
+        return IndexingPipelineResult(
+            new_docs=0,
+            total_docs=len(filtered_documents),
+            total_chunks=0,
+            failures=[],
+        )
+
+    chunks_with_embeddings = embedded_batch.chunks_with_embeddings
+    embedding_failures = embedded_batch.embedding_failures
+    chunk_content_scores = embedded_batch.chunk_content_scores
+
     updatable_ids = [doc.id for doc in ctx.updatable_docs]
     updatable_chunk_data = [
         UpdatableChunkData(
@@ -861,6 +928,7 @@ def index_doc_batch(
             for document_id in updatable_ids
         }
 
+        llm_tokenizer: BaseTokenizer | None = None
         try:
             llm, _ = get_default_llms()
 
@@ -949,7 +1017,7 @@ def index_doc_batch(
                 doc_id_to_previous_chunk_cnt=doc_id_to_previous_chunk_cnt,
                 doc_id_to_new_chunk_cnt=doc_id_to_new_chunk_cnt,
                 tenant_id=tenant_id,
-                large_chunks_enabled=chunker.enable_large_chunks,
+                large_chunks_enabled=large_chunks_enabled,
             ),
         )
 
@@ -1046,6 +1114,217 @@ def index_doc_batch(
     return result
 
 
+@log_function_time(debug_only=True)
+def index_doc_batch(
+    *,
+    document_batch: list[Document],
+    chunker: Chunker,
+    embedder: IndexingEmbedder,
+    information_content_classification_model: InformationContentClassificationModel,
+    document_index: DocumentIndex,
+    index_attempt_metadata: IndexAttemptMetadata,
+    db_session: Session,
+    tenant_id: str,
+    enable_contextual_rag: bool = False,
+    llm: LLM | None = None,
+    ignore_time_skip: bool = False,
+    filter_fnc: Callable[[list[Document]], list[Document]] = filter_documents,
+) -> IndexingPipelineResult:
+    """Takes different pieces of the indexing pipeline and applies it to a batch of documents
+    Note that the documents should already be batched at this point so that it does not inflate the
+    memory requirements
+
+    Returns a tuple where the first element is the number of new docs and the
+    second element is the number of chunks."""
+    chunked_batch = chunk_doc_batch(
+        document_batch=document_batch,
+        chunker=chunker,
+        index_attempt_metadata=index_attempt_metadata,
+        db_session=db_session,
+        enable_contextual_rag=enable_contextual_rag,
+        llm=llm,
+        ignore_time_skip=ignore_time_skip,
+        filter_fnc=filter_fnc,
+    )
+    embedded_batch = embed_doc_batch(
+        chunked_batch=chunked_batch,
+        embedder=embedder,
+        information_content_classification_model=information_content_classification_model,
+        tenant_id=tenant_id,
+    )
+    return write_doc_batch(
+        embedded_batch=embedded_batch,
+        document_index=document_index,
+        db_session=db_session,
+        tenant_id=tenant_id,
+        large_chunks_enabled=chunker.enable_large_chunks,
+    )
+
+
+class IndexingPipeline:
+    """Indexes document batches. Calling it indexes one batch end to end.
+
+    `index_batches` runs the stages (connector fetch, chunking, embedding and
+    document index writes) concurrently in a bounded producer/consumer pipeline, so
+    that e.g. the next batch is chunked and embedded while the previous one is being
+    written. Writes and their Postgres bookkeeping still happen on the calling thread,
+    one batch at a time and in order, with the pipeline's `db_session`.
+    """
+
+    def __init__(
+        self,
+        *,
+        chunker: Chunker,
+        embedder: IndexingEmbedder,
+        information_content_classification_model: InformationContentClassificationModel,
+        document_index: DocumentIndex,
+        db_session: Session,
+        tenant_id: str,
+        ignore_time_skip: bool = False,
+        enable_contextual_rag: bool = False,
+        llm: LLM | None = None,
+    ):
+        self.chunker = chunker
+        self.embedder = embedder
+        self.information_content_classification_model = (
+            information_content_classification_model
+        )
+        self.document_index = document_index
+        self.db_session = db_session
+        self.tenant_id = tenant_id
+        self.ignore_time_skip = ignore_time_skip
+        self.enable_contextual_rag = enable_contextual_rag
+        self.llm = llm
+
+    def __call__(
+        self,
+        document_batch: list[Document],
+        index_attempt_metadata: IndexAttemptMetadata,
+    ) -> IndexingPipelineResult:
+        return index_doc_batch_with_handler(
+            chunker=self.chunker,
+            embedder=self.embedder,
+            information_content_classification_model=self.information_content_classification_model,
+            document_index=self.document_index,
+            document_batch=document_batch,
+            index_attempt_metadata=index_attempt_metadata,
+            db_session=self.db_session,
+            tenant_id=self.tenant_id,
+            ignore_time_skip=self.ignore_time_skip,
+            enable_contextual_rag=self.enable_contextual_rag,
+            llm=self.llm,
+        )
+
+    def _chunk_stage(
+        self,
+        items: Iterator[T],
+        get_batch: Callable[[T], tuple[list[Document], IndexAttemptMetadata] | None],
+    ) -> Iterator[tuple[T, ChunkedDocBatch | IndexingPipelineResult | None]]:
+        for item in items:
+            batch = get_batch(item)
+            if batch is None:
+                yield item, None
+                continue
+
+            document_batch, index_attempt_metadata = batch
+            try:
+                # this stage runs alongside the writes, so it can't share their session
+                with get_session_with_current_tenant() as db_session:
+                    chunked_batch: ChunkedDocBatch | IndexingPipelineResult = (
+                        chunk_doc_batch(
+                            document_batch=document_batch,
+                            chunker=self.chunker,
+                            index_attempt_metadata=index_attempt_metadata,
+                            db_session=db_session,
+                            enable_contextual_rag=self.enable_contextual_rag,
+                            llm=self.llm,
+                            ignore_time_skip=self.ignore_time_skip,
+                        )
+                    )
+            except Exception as e:
+                chunked_batch = _handle_doc_batch_exception(document_batch, e)
+            yield item, chunked_batch
+
+    def _embed_stage(
+        self,
+        chunked_items: Iterator[
+            tuple[T, ChunkedDocBatch | IndexingPipelineResult | None]
+        ],
+    ) -> Iterator[tuple[T, EmbeddedDocBatch | IndexingPipelineResult | None]]:
+        for item, chunked_batch in chunked_items:
+            if not isinstance(chunked_batch, ChunkedDocBatch):
+                yield item, chunked_batch
+                continue
+
+            try:
+                embedded_batch: EmbeddedDocBatch | IndexingPipelineResult = (
+                    embed_doc_batch(
+                        chunked_batch=chunked_batch,
+                        embedder=self.embedder,
+                        information_content_classification_model=self.information_content_classification_model,
+                        tenant_id=self.tenant_id,
+                    )
+                )
+            except Exception as e:
+                embedded_batch = _handle_doc_batch_exception(
+                    chunked_batch.document_batch, e
+                )
+            yield item, embedded_batch
+
+    def index_batches(
+        self,
+        items: Iterator[T],
+        get_batch: Callable[[T], tuple[list[Document], IndexAttemptMetadata] | None],
+        max_buffered: int,
+    ) -> Generator[tuple[T, IndexingPipelineResult | None], None, None]:
+        """Indexes the document batches found in `items` and yields every item, in
+        order, with its result (None for items without a batch, e.g. checkpoints).
+
+        `get_batch` is called from the chunking stage. Each stage keeps at most
+        `max_buffered` items ready ahead of the next one; 0 indexes sequentially.
+        A failure to index a batch is reported in its result, while an exception
+        raised by `items` itself is re-raised here once the previous items are done.
+        Closing the returned generator stops the stages and waits for their threads.
+        """
+        if max_buffered <= 0:
+            for item in items:
+                batch = get_batch(item)
+                yield item, (self(*batch) if batch is not None else None)
+            return
+
+        fetched_items = prefetch_in_background(items, max_buffered)
+        chunked_items = prefetch_in_background(
+            self._chunk_stage(fetched_items, get_batch), max_buffered
+        )
+        embedded_items = prefetch_in_background(
+            self._embed_stage(chunked_items), max_buffered
+        )
+        try:
+            for item, embedded_batch in embedded_items:
+                if not isinstance(embedded_batch, EmbeddedDocBatch):
+                    yield item, embedded_batch
+                    continue
+
+                try:
+                    result = write_doc_batch(
+                        embedded_batch=embedded_batch,
+                        document_index=self.document_index,
+                        db_session=self.db_session,
+                        tenant_id=self.tenant_id,
+                        large_chunks_enabled=self.chunker.enable_large_chunks,
+                    )
+                except Exception as e:
+                    result = _handle_doc_batch_exception(
+                        embedded_batch.document_batch, e
+                    )
+                yield item, result
+        finally:
+            # Outermost first: closing a stage waits for its thread, so the stage it
+            # reads from is no longer being iterated when it is closed in turn
+            for stage in (embedded_items, chunked_items, fetched_items):
+                stage.close()
+
+
 def build_indexing_pipeline(
     *,
     embedder: IndexingEmbedder,
@@ -1056,7 +1335,7 @@ def build_indexing_pipeline(
     chunker: Chunker | None = None,
     ignore_time_skip: bool = False,
     callback: IndexingHeartbeatInterface | None = None,
-) -> IndexingPipelineProtocol:
+) -> IndexingPipeline:
     """Builds a pipeline which takes in a list (batch) of docs and indexes them."""
     all_search_settings = get_active_search_settings(db_session)
     if (
@@ -1089,8 +1368,7 @@ def build_indexing_pipeline(
         callback=callback,
     )
 
-    return partial(
-        index_doc_batch_with_handler,
+    return IndexingPipeline(
         chunker=chunker,
         embedder=embedder,
         information_content_classification_model=information_content_classification_model,
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import cast
+
+import numpy as np
+
+from onyx.configs.app_configs import QUERY_EMBEDDING_CACHE_SIZE
+from onyx.configs.app_configs import QUERY_EMBEDDING_CACHE_TTL_SECONDS
+from onyx.configs.app_configs import QUERY_EMBEDDING_CACHE_USE_REDIS
+from onyx.db.models import SearchSettings
+from onyx.natural_language_processing.search_nlp_models import EmbeddingModel
+from onyx.redis.redis_pool import get_redis_client
+from onyx.utils.logger import setup_logger
+from shared_configs.configs import MODEL_SERVER_HOST
+from shared_configs.configs import MODEL_SERVER_PORT
+from shared_configs.contextvars import get_current_tenant_id
+from shared_configs.enums import EmbedTextType
+from shared_configs.model_server_models import Embedding
+
+logger = setup_logger()
+
+_REDIS_KEY_PREFIX = "query_embedding"
+# Search settings are rarely changed, this only bounds the leftovers of old ones
+_MAX_CACHED_EMBEDDING_MODELS = 32
+
+
+class QueryEmbeddingCache:
+    """A thread safe LRU of query embeddings whose entries expire after `ttl` seconds."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, Embedding]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Embedding | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, embedding = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return embedding
+
+    def set(self, key: str, embedding: Embedding) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_query_embedding_cache = QueryEmbeddingCache(
+    max_entries=QUERY_EMBEDDING_CACHE_SIZE, ttl=QUERY_EMBEDDING_CACHE_TTL_SECONDS
+)
+_embedding_models: dict[tuple, EmbeddingModel] = {}
+_embedding_models_lock = threading.Lock()
+
+
+def _search_settings_version(search_settings: SearchSettings) -> tuple:
+    return (
+        search_settings.id,
+        search_settings.model_name,
+        search_settings.normalize,
+        search_settings.query_prefix,
+        search_settings.passage_prefix,
+        search_settings.provider_type,
+        search_settings.api_key,
+        search_settings.api_url,
+        search_settings.api_version,
+        search_settings.deployment_name,
+        search_settings.reduced_dimension,
+    )
+
+
+def get_query_embedding_model(search_settings: SearchSettings) -> EmbeddingModel:
+    """Process wide EmbeddingModel for the given search settings, rebuilt only when
+    one of the settings it depends on changes."""
+    version = _search_settings_version(search_settings)
+    with _embedding_models_lock:
+        model = _embedding_models.get(version)
+        if model is None:
+            if len(_embedding_models) >= _MAX_CACHED_EMBEDDING_MODELS:
+                _embedding_models.clear()
+            model = EmbeddingModel.from_db_model(
+                search_settings=search_settings,
+                server_host=MODEL_SERVER_HOST,
+                server_port=MODEL_SERVER_PORT,
+            )
+            _embedding_models[version] = model
+        return model
+
+
+def normalize_query_text(query: str) -> str:
+    # whitespace does not change the meaning of a query, case might
+    return " ".join(query.split())
+
+
+def query_embedding_cache_key(search_settings: SearchSettings, query: str) -> str:
+    # Only what changes the vectors, the api key or url of a provider do not
+    model_settings = [
+        search_settings.model_name,
+        search_settings.provider_type.value if search_settings.provider_type else None,
+        search_settings.normalize,
+        search_settings.query_prefix or "",
+        search_settings.reduced_dimension,
+    ]
+    return hashlib.sha256(
+        f"{json.dumps(model_settings)}\x00{query}".encode("utf-8")
+    ).hexdigest()
+
+
+def _redis_key(tenant_id: str, cache_key: str) -> str:
+    # mget and pipeline bypass TenantRedis' key prefixing, so the tenant goes in here
+    return f"{_REDIS_KEY_PREFIX}:{tenant_id}:{cache_key}"
+
+
+def _fetch_from_redis(tenant_id: str, cache_keys: list[str]) -> dict[str, Embedding]:
+    try:
+        values = cast(
+            list[bytes | None],
+            get_redis_client().mget([_redis_key(tenant_id, key) for key in cache_keys]),
+        )
+    except Exception:
+        logger.exception("Failed to fetch query embeddings from Redis")
+        return {}
+    return {
+        key: np.frombuffer(value, dtype=np.float32).tolist()
+        for key, value in zip(cache_keys, values)
+        if value
+    }
+
+
+def _store_in_redis(tenant_id: str, embeddings: dict[str, Embedding]) -> None:
+    try:
+        pipe = get_redis_client().pipeline(transaction=False)
+        for key, embedding in embeddings.items():
+            pipe.set(
+                _redis_key(tenant_id, key),
+                np.asarray(embedding, dtype=np.float32).tobytes(),
+                ex=int(QUERY_EMBEDDING_CACHE_TTL_SECONDS),
+            )
+        pipe.execute()
+    except Exception:
+        logger.exception("Failed to store query embeddings in Redis")
+
+
+def embed_queries(
+    queries: list[str], search_settings: SearchSettings
+) -> list[Embedding]:
+    """Query embeddings for the given search settings. Repeated queries (equal after
+    whitespace normalization) are served from an in-process TTL LRU, then from Redis
+    if QUERY_EMBEDDING_CACHE_USE_REDIS is set, and only the rest is sent to the
+    model server, once per distinct query. Normalization only applies to the cache
+    key, the model gets the query text as given."""
+    if QUERY_EMBEDDING_CACHE_SIZE <= 0:
+        return get_query_embedding_model(search_settings).encode(
+            queries, text_type=EmbedTextType.QUERY
+        )
+
+    tenant_id = get_current_tenant_id()
+    keys = [
+        query_embedding_cache_key(search_settings, normalize_query_text(query))
+        for query in queries
+    ]
+
+    found: dict[str, Embedding] = {}
+    for key in keys:
+        embedding = _query_embedding_cache.get(f"{tenant_id}:{key}")
+        if embedding is not None:
+            found[key] = embedding
+
+    if QUERY_EMBEDDING_CACHE_USE_REDIS:
+        missing_keys = list({key for key in keys if key not in found})
+        if missing_keys:
+            from_redis = _fetch_from_redis(tenant_id, missing_keys)
+            for key, embedding in from_redis.items():
+                _query_embedding_cache.set(f"{tenant_id}:{key}", embedding)
+            found.update(from_redis)
+
+    miss_keys: list[str] = []
+    miss_queries: list[str] = []
+    for key, query in zip(keys, queries):
+        if key not in found and key not in miss_keys:
+            miss_keys.append(key)
+            miss_queries.append(query)
+
+    if miss_queries:
+        new_embeddings = dict(
+            zip(
+                miss_keys,
+                get_query_embedding_model(search_settings).encode(
+                    miss_queries, text_type=EmbedTextType.QUERY
+                ),
+            )
+        )
+        for key, embedding in new_embeddings.items():
+            _query_embedding_cache.set(f"{tenant_id}:{key}", embedding)
+        if QUERY_EMBEDDING_CACHE_USE_REDIS:
+            _store_in_redis(tenant_id, new_embeddings)
+        found.update(new_embeddings)
+
+    return [found[key] for key in keys]
@@ -7,6 +7,7 @@ from functools import partial
 from functools import wraps
 from typing import Any
 
+import numpy as np
 import requests
 from httpx import HTTPError
 from requests import JSONDecodeError
@@ -22,6 +23,7 @@ from onyx.configs.model_configs import (
     BATCH_SIZE_ENCODE_CHUNKS_FOR_API_EMBEDDING_SERVICES,
 )
 from onyx.configs.model_configs import DOC_EMBEDDING_CONTEXT_SIZE
+from onyx.configs.model_configs import MODEL_SERVER_EMBEDDING_DTYPE
 from onyx.db.models import SearchSettings
 from onyx.indexing.indexing_heartbeat import IndexingHeartbeatInterface
 from onyx.natural_language_processing.exceptions import (
@@ -34,6 +36,7 @@ from shared_configs.configs import INDEXING_MODEL_SERVER_HOST
 from shared_configs.configs import INDEXING_MODEL_SERVER_PORT
 from shared_configs.configs import MODEL_SERVER_HOST
 from shared_configs.configs import MODEL_SERVER_PORT
+from shared_configs.enums import EmbeddingDType
 from shared_configs.enums import EmbeddingProvider
 from shared_configs.enums import EmbedTextType
 from shared_configs.enums import RerankerProvider
@@ -49,10 +52,42 @@ from shared_configs.model_server_models import IntentResponse
 from shared_configs.model_server_models import RerankRequest
 from shared_configs.model_server_models import RerankResponse
 from shared_configs.utils import batch_list
+from shared_configs.utils import unpack_embeddings
 
 logger = setup_logger()
 
 
+# How long to use JSON embeddings after finding a model server without the binary
+# embedding endpoint, e.g. an older one during a rollout
+_BINARY_EMBEDDING_RETRY_SECONDS = 300
+
+
+def _get_default_embedding_dtype() -> EmbeddingDType | None:
+    if MODEL_SERVER_EMBEDDING_DTYPE == "json":
+        return None
+    try:
+        return EmbeddingDType(MODEL_SERVER_EMBEDDING_DTYPE)
+    except ValueError:
+        logger.warning(
+            f"Unknown MODEL_SERVER_EMBEDDING_DTYPE={MODEL_SERVER_EMBEDDING_DTYPE!r}, "
+            f"using {EmbeddingDType.FLOAT32.value}"
+        )
+        return EmbeddingDType.FLOAT32
+
+
+DEFAULT_EMBEDDING_DTYPE = _get_default_embedding_dtype()
+
+
+def _is_route_not_found(response: Response) -> bool:
+    """True for FastAPI's 404 for an unknown route, as opposed to any other 404."""
+    if response.status_code != 404:
+        return False
+    try:
+        return response.json() == {"detail": "Not Found"}
+    except ValueError:
+        return False
+
+
 WARM_UP_STRINGS = [
     "Onyx is amazing!",
     "Check out our easy deployment guide at",
@@ -95,6 +130,7 @@ class EmbeddingModel:
         api_version: str | None = None,
         deployment_name: str | None = None,
         reduced_dimension: int | None = None,
+        embedding_dtype: EmbeddingDType | None = DEFAULT_EMBEDDING_DTYPE,
     ) -> None:
         self.api_key = api_key
         self.provider_type = provider_type
@@ -111,16 +147,23 @@ class EmbeddingModel:
             model_name=model_name, provider_type=provider_type
         )
         self.callback = callback
+        # None means the embeddings are sent back as JSON floats
+        self.embedding_dtype = embedding_dtype
+        # JSON is used until then when the model server has no binary endpoint
+        self.binary_embeddings_retry_at = 0.0
 
         model_server_url = build_model_server_url(server_host, server_port)
         self.embed_server_endpoint = f"{model_server_url}/encoder/bi-encoder-embed"
+        self.embed_binary_server_endpoint = (
+            f"{model_server_url}/encoder/bi-encoder-embed-binary"
+        )
 
     def _make_model_server_request(
         self,
         embed_request: EmbedRequest,
         tenant_id: str | None = None,
         request_id: str | None = None,
-    ) -> EmbedResponse:
+    ) -> np.ndarray | list[Embedding]:
         def _make_request() -> Response:
             headers = {}
             if tenant_id:
@@ -129,11 +172,29 @@ class EmbeddingModel:
             if request_id:
                 headers["X-Onyx-Request-ID"] = request_id
 
-            response = requests.post(
-                self.embed_server_endpoint,
-                headers=headers,
-                json=embed_request.model_dump(),
-            )
+            embedding_dtype = self.embedding_dtype
+            if embedding_dtype and time.monotonic() >= self.binary_embeddings_retry_at:
+                response = requests.post(
+                    self.embed_binary_server_endpoint,
+                    headers=headers,
+                    params={"dtype": embedding_dtype.value},
+                    json=embed_request.model_dump(),
+                )
+                if _is_route_not_found(response):
+                    logger.warning(
+                        "Model server has no binary embedding endpoint, using JSON "
+                        f"embeddings for the next {_BINARY_EMBEDDING_RETRY_SECONDS}s"
+                    )
+                    self.binary_embeddings_retry_at = (
+                        time.monotonic() + _BINARY_EMBEDDING_RETRY_SECONDS
+                    )
+                    return _make_request()
+            else:
+                response = requests.post(
+                    self.embed_server_endpoint,
+                    headers=headers,
+                    json=embed_request.model_dump(),
+                )
             # signify that this is a rate limit error
             if response.status_code == 429:
                 raise ModelServerRateLimitError(response.text)
@@ -160,7 +221,11 @@ class EmbeddingModel:
 
         try:
             response = final_make_request_func()
-            return EmbedResponse(**response.json())
+            if response.headers.get("content-type", "").startswith(
+                "application/octet-stream"
+            ):
+                return unpack_embeddings(response.content, response.headers)
+            return EmbedResponse(**response.json()).embeddings
         except requests.HTTPError as e:
             if not response:
                 raise HTTPError("HTTP error occurred - response is None.") from e
@@ -217,7 +282,7 @@ class EmbeddingModel:
             )
 
             start_time = time.time()
-            response = self._make_model_server_request(
+            batch_embeddings = self._make_model_server_request(
                 embed_request, tenant_id=tenant_id, request_id=request_id
             )
             end_time = time.time()
@@ -227,7 +292,10 @@ class EmbeddingModel:
                 f"EmbeddingModel.process_batch: Batch {batch_idx}/{batch_len} processing time: {processing_time:.2f} seconds"
             )
 
-            return batch_idx, response.embeddings
+            # one C level conversion per batch rather than parsing every float
+            if isinstance(batch_embeddings, np.ndarray):
+                return batch_idx, batch_embeddings.tolist()
+            return batch_idx, batch_embeddings
 
         # only multi thread if:
         #   1. num_threads is greater than 1
@@ -1,9 +1,11 @@
 import collections.abc
 import contextvars
 import copy
+import queue
 import threading
 import uuid
 from collections.abc import Callable
+from collections.abc import Generator
 from collections.abc import Iterator
 from collections.abc import MutableMapping
 from collections.abc import Sequence
@@ -384,3 +386,66 @@ def parallel_yield(gens: list[Iterator[R]], max_workers: int = 10) -> Iterator[R
                     )
                     next_ind += 1
                 del future_to_index[future]
+
+
+_PREFETCH_DONE = object()
+
+
+def prefetch_in_background(
+    gen: Iterator[R], max_buffered: int
+) -> Generator[R, None, None]:
+    """
+    Runs `gen` in a background thread and yields its items in order, with at most
+    `max_buffered` items produced ahead of the consumer (backpressure). Chaining calls
+    turns a series of generators into a pipeline whose stages run concurrently.
+
+    Exceptions raised by `gen` are re-raised to the consumer in place of the item that
+    failed. If the consumer stops early, closing the returned generator stops the
+    background thread once the item it is currently producing is done, and waits for
+    it to close `gen`.
+    Like the other helpers here, contextvars are propagated to the background thread.
+    """
+    buffer: queue.Queue[tuple[Any, BaseException | None]] = queue.Queue(
+        maxsize=max(1, max_buffered)
+    )
+    stopped = threading.Event()
+
+    def _put(entry: tuple[Any, BaseException | None]) -> bool:
+        while not stopped.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce() -> None:
+        try:
+            for item in gen:
+                if not _put((item, None)):
+                    break
+            else:
+                _put((_PREFETCH_DONE, None))
+        except BaseException as e:
+            _put((_PREFETCH_DONE, e))
+        finally:
+            close = getattr(gen, "close", None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(
+        target=contextvars.copy_context().run, args=(_produce,), daemon=True
+    )
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if error is not None:
+                raise error
+            if item is _PREFETCH_DONE:
+                return
+            yield cast(R, item)
+    finally:
+        stopped.set()
+        if thread is not threading.current_thread():
+            thread.join()
@@ -50,6 +50,16 @@ DISABLE_RERANK_FOR_STREAMING = (
 # model. If torch finds more threads on its own, this value is not used.
 MIN_THREADS_ML_MODELS = int(os.environ.get("MIN_THREADS_ML_MODELS") or 1)
 
+# Concurrent embedding / reranking requests to the same local model are merged into
+# batches of up to this many texts, waiting at most MODEL_SERVER_BATCH_WAIT_MS for
+# the batch to fill up. 0 runs every request on its own.
+MODEL_SERVER_MAX_BATCH_SIZE = int(os.environ.get("MODEL_SERVER_MAX_BATCH_SIZE") or 64)
+MODEL_SERVER_BATCH_WAIT_MS = float(os.environ.get("MODEL_SERVER_BATCH_WAIT_MS") or 5)
+# Batches run at the same time per local model, more than 1 mostly helps on GPUs
+MODEL_SERVER_BATCH_CONCURRENCY = int(
+    os.environ.get("MODEL_SERVER_BATCH_CONCURRENCY") or 1
+)
+
 # Model server that has indexing only set will throw exception if used for reranking
 # or intent classification
 INDEXING_ONLY = os.environ.get("INDEXING_ONLY", "").lower() == "true"
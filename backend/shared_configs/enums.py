@@ -19,3 +19,10 @@ class RerankerProvider(str, Enum):
 class EmbedTextType(str, Enum):
     QUERY = "query"
     PASSAGE = "passage"
+
+
+class EmbeddingDType(str, Enum):
+    """Cell type of embeddings sent by the model server as packed binary vectors."""
+
+    FLOAT32 = "float32"
+    FLOAT16 = "float16"
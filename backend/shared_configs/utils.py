@@ -1,5 +1,11 @@
+from collections.abc import Mapping
 from typing import TypeVar
 
+import numpy as np
+
+from shared_configs.enums import EmbeddingDType
+from shared_configs.model_server_models import Embedding
+
 
 T = TypeVar("T")
 
@@ -9,3 +15,31 @@ def batch_list(
     batch_size: int,
 ) -> list[list[T]]:
     return [lst[i : i + batch_size] for i in range(0, len(lst), batch_size)]
+
+
+EMBEDDING_SHAPE_HEADER = "X-Onyx-Embedding-Shape"
+EMBEDDING_DTYPE_HEADER = "X-Onyx-Embedding-Dtype"
+
+
+def pack_embeddings(
+    embeddings: np.ndarray | list[Embedding], dtype: EmbeddingDType
+) -> tuple[bytes, dict[str, str]]:
+    """Packs the embeddings into a little endian buffer plus the headers needed
+    to unpack it."""
+    vectors = np.asarray(embeddings, dtype=np.dtype(dtype.value).newbyteorder("<"))
+    if vectors.ndim != 2:
+        raise ValueError(
+            f"Expected a 2D array of embeddings, got shape {vectors.shape}"
+        )
+    headers = {
+        EMBEDDING_SHAPE_HEADER: ",".join(str(dim) for dim in vectors.shape),
+        EMBEDDING_DTYPE_HEADER: dtype.value,
+    }
+    return vectors.tobytes(), headers
+
+
+def unpack_embeddings(data: bytes, headers: Mapping[str, str]) -> np.ndarray:
+    """Inverse of pack_embeddings, the returned array is a read only view of data."""
+    dtype = np.dtype(EmbeddingDType(headers[EMBEDDING_DTYPE_HEADER]).value)
+    shape = tuple(int(dim) for dim in headers[EMBEDDING_SHAPE_HEADER].split(","))
+    return np.frombuffer(data, dtype=dtype.newbyteorder("<")).reshape(shape)
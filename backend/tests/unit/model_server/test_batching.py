@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from model_server.batching import MicroBatcher
+
+
+@pytest.mark.asyncio
+async def test_micro_batcher_merges_concurrent_requests() -> None:
+    calls: list[list[str]] = []
+
+    def run_batch(texts: list[str]) -> list[str]:
+        calls.append(texts)
+        return [text.upper() for text in texts]
+
+    batcher = MicroBatcher(
+        name="test-merge", run_batch=run_batch, max_batch_size=8, max_wait=0.05
+    )
+    results = await asyncio.gather(
+        batcher.submit(["a", "b"]), batcher.submit(["c"]), batcher.submit(["d", "e"])
+    )
+
+    assert [list(result) for result in results] == [["A", "B"], ["C"], ["D", "E"]]
+    assert calls == [["a", "b", "c", "d", "e"]]
+    assert batcher.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_micro_batcher_sorts_by_length_and_scatters_back() -> None:
+    calls: list[list[str]] = []
+
+    def run_batch(texts: list[str]) -> list[int]:
+        calls.append(texts)
+        return [len(text) for text in texts]
+
+    batcher = MicroBatcher(
+        name="test-sort",
+        run_batch=run_batch,
+        max_batch_size=8,
+        max_wait=0.05,
+        length=len,
+    )
+    results = await asyncio.gather(
+        batcher.submit(["aa", "a"]), batcher.submit(["aaaa", "aaa"])
+    )
+
+    assert calls == [["aaaa", "aaa", "aa", "a"]]
+    assert [list(result) for result in results] == [[2, 1], [4, 3]]
+
+
+@pytest.mark.asyncio
+async def test_micro_batcher_respects_max_batch_size() -> None:
+    calls: list[list[int]] = []
+
+    def run_batch(items: list[int]) -> list[int]:
+        calls.append(items)
+        return items
+
+    batcher = MicroBatcher(
+        name="test-size", run_batch=run_batch, max_batch_size=3, max_wait=0.05
+    )
+    results = await asyncio.gather(*(batcher.submit([i, i]) for i in range(3)))
+
+    assert [list(result) for result in results] == [[0, 0], [1, 1], [2, 2]]
+    # a request never gets split, so each batch only fits one of them
+    assert calls == [[0, 0], [1, 1], [2, 2]]
+
+
+@pytest.mark.asyncio
+async def test_micro_batcher_only_fails_requests_with_bad_inputs() -> None:
+    calls: list[list[int]] = []
+
+    def run_batch(items: list[int]) -> list[int]:
+        calls.append(items)
+        if -1 in items:
+            raise ValueError("bad input")
+        return items
+
+    batcher = MicroBatcher(
+        name="test-failure", run_batch=run_batch, max_batch_size=8, max_wait=0.05
+    )
+    results = await asyncio.gather(
+        batcher.submit([1]),
+        batcher.submit([2, -1]),
+        batcher.submit([3]),
+        return_exceptions=True,
+    )
+
+    assert results[0] == [1]
+    assert isinstance(results[1], ValueError)
+    assert results[2] == [3]
+    # the merged batch, then each request on its own
+    assert calls == [[1, 2, -1, 3], [1], [2, -1], [3]]
+
+
+@pytest.mark.asyncio
+async def test_micro_batcher_concurrency() -> None:
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    def run_batch(items: list[int]) -> list[int]:
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        time.sleep(0.1)
+        with lock:
+            running -= 1
+        return items
+
+    batcher = MicroBatcher(
+        name="test-concurrency",
+        run_batch=run_batch,
+        max_batch_size=1,
+        max_wait=0,
+        concurrency=2,
+    )
+    await asyncio.gather(*(batcher.submit([i]) for i in range(4)))
+
+    assert max_running == 2
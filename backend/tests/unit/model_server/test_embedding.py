@@ -7,6 +7,7 @@ from unittest.mock import AsyncMock
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
+import numpy as np
 import pytest
 from httpx import AsyncClient
 from litellm.exceptions import RateLimitError
@@ -15,9 +16,12 @@ from model_server.encoders import CloudEmbedding
 from model_server.encoders import embed_text
 from model_server.encoders import local_rerank
 from model_server.encoders import process_embed_request
+from model_server.encoders import route_bi_encoder_embed_binary
+from shared_configs.enums import EmbeddingDType
 from shared_configs.enums import EmbeddingProvider
 from shared_configs.enums import EmbedTextType
 from shared_configs.model_server_models import EmbedRequest
+from shared_configs.utils import unpack_embeddings
 
 
 @pytest.fixture
@@ -165,9 +169,9 @@ async def test_rate_limit_handling() -> None:
 
 @pytest.mark.asyncio
 async def test_concurrent_embeddings() -> None:
-    def mock_encode(*args: Any, **kwargs: Any) -> List[List[float]]:
+    def mock_encode(texts: list[str], **kwargs: Any) -> List[List[float]]:
         time.sleep(5)
-        return [[0.1, 0.2, 0.3]]
+        return [[0.1, 0.2, 0.3] for _ in texts]
 
     test_req = EmbedRequest(
         texts=["test"],
@@ -200,3 +204,29 @@ async def test_concurrent_embeddings() -> None:
         # However, the developer may still introduce unnecessary blocking above the mock and this test will
         # still pass as long as it's less than (7 - 5) / 5 seconds
         assert end_time - start_time < 7
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("dtype", [EmbeddingDType.FLOAT32, EmbeddingDType.FLOAT16])
+async def test_bi_encoder_embed_binary(dtype: EmbeddingDType) -> None:
+    test_req = EmbedRequest(
+        texts=["test1", "test2"],
+        model_name="fake-local-model",
+        max_context_length=512,
+        normalize_embeddings=True,
+        text_type=EmbedTextType.PASSAGE,
+    )
+    vectors = np.array([[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]], dtype=np.float32)
+
+    with patch("model_server.encoders.get_embedding_model") as mock_get_model:
+        mock_get_model.return_value.encode.return_value = vectors
+        request = MagicMock()
+        request.app.state.gpu_type = "UNKNOWN"
+
+        response = await route_bi_encoder_embed_binary(request, test_req, dtype)
+
+    assert response.media_type == "application/octet-stream"
+    result = unpack_embeddings(bytes(response.body), response.headers)
+    assert result.shape == (2, 3)
+    assert result.dtype == np.dtype(dtype.value)
+    np.testing.assert_allclose(result, vectors, rtol=1e-3)
@@ -8,6 +8,7 @@ from onyx.configs.constants import DocumentSource
 from onyx.connectors.models import Document
 from onyx.connectors.models import TextSection
 from onyx.indexing.embedder import DefaultIndexingEmbedder
+from onyx.indexing.embedding_cache import ChunkEmbeddingCache
 from onyx.indexing.models import ChunkEmbedding
 from onyx.indexing.models import DocAwareChunk
 from onyx.indexing.models import IndexChunk
@@ -21,6 +22,27 @@ def mock_embedding_model() -> Generator[Mock, None, None]:
         yield mock
 
 
+def _make_chunk(source_doc: Document, content: str, chunk_id: int) -> DocAwareChunk:
+    return DocAwareChunk(
+        chunk_id=chunk_id,
+        blurb=content,
+        content=content,
+        source_links={0: "link1"},
+        section_continuation=False,
+        source_document=source_doc,
+        title_prefix="Title: ",
+        metadata_suffix_semantic="",
+        metadata_suffix_keyword="",
+        mini_chunk_texts=None,
+        large_chunk_reference_ids=[],
+        large_chunk_id=None,
+        image_file_name=None,
+        chunk_context="",
+        doc_summary="",
+        contextual_rag_reserved_tokens=200,
+    )
+
+
 @pytest.mark.parametrize(
     "chunk_context, doc_summary",
     [("Test chunk context", "Test document summary"), ("", "")],
@@ -98,8 +120,81 @@ def test_default_indexing_embedder_embed_chunks(
     )
     # Same for title only embedding call
     mock_embedding_model.return_value.encode.assert_any_call(
-        ["Test Document"],
+        texts=["Test Document"],
         text_type=EmbedTextType.PASSAGE,
+        large_chunks_present=False,
         tenant_id=None,
         request_id=None,
     )
+
+
+def test_default_indexing_embedder_embedding_cache(mock_embedding_model: Mock) -> None:
+    store: dict[str, list[float]] = {}
+
+    def fetch(_db_session: Mock, cache_keys: list[str]) -> dict[str, list[float]]:
+        return {key: store[key] for key in cache_keys if key in store}
+
+    def upsert(
+        _db_session: Mock, _model_name: str, embeddings: dict[str, list[float]]
+    ) -> None:
+        store.update(embeddings)
+
+    embedding_cache = ChunkEmbeddingCache(
+        model_name="test-model",
+        normalize=True,
+        passage_prefix=None,
+        provider_type=EmbeddingProvider.OPENAI,
+        reduced_dimension=None,
+    )
+    embedder = DefaultIndexingEmbedder(
+        model_name="test-model",
+        normalize=True,
+        query_prefix=None,
+        passage_prefix=None,
+        provider_type=EmbeddingProvider.OPENAI,
+        embedding_cache=embedding_cache,
+    )
+    source_doc = Document(
+        id="test_doc",
+        source=DocumentSource.WEB,
+        semantic_identifier="Test Document",
+        metadata={},
+        doc_updated_at=None,
+        sections=[TextSection(text="Unchanged. Changed.", link="link1")],
+    )
+    # A previous run embedded the unchanged chunk and the title
+    store[embedding_cache.key("Title: Unchanged")] = [1.0, 1.0]
+    store[embedding_cache.key("Test Document")] = [9.0, 9.0]
+
+    mock_embedding_model.return_value.encode.side_effect = [[[2.0, 2.0]]]
+
+    with patch("onyx.indexing.embedding_cache.get_session_with_current_tenant"), patch(
+        "onyx.indexing.embedding_cache.fetch_cached_embeddings", side_effect=fetch
+    ), patch(
+        "onyx.indexing.embedding_cache.upsert_cached_embeddings", side_effect=upsert
+    ):
+        result = embedder.embed_chunks(
+            [
+                _make_chunk(source_doc, "Unchanged", 0),
+                _make_chunk(source_doc, "Changed", 1),
+                _make_chunk(source_doc, "Changed", 2),
+            ]
+        )
+
+    # Only the changed text is sent to the model server, once
+    mock_embedding_model.return_value.encode.assert_called_once_with(
+        texts=["Title: Changed"],
+        text_type=EmbedTextType.PASSAGE,
+        large_chunks_present=False,
+        tenant_id=None,
+        request_id=None,
+    )
+    assert [chunk.embeddings.full_embedding for chunk in result] == [
+        [1.0, 1.0],
+        [2.0, 2.0],
+        [2.0, 2.0],
+    ]
+    assert all(chunk.title_embedding == [9.0, 9.0] for chunk in result)
+    assert store[embedding_cache.key("Title: Changed")] == [2.0, 2.0]
+    assert embedding_cache.lookups == 4
+    assert embedding_cache.hits == 3
@@ -1,3 +1,7 @@
+import itertools
+import threading
+import time
+from collections.abc import Iterator
 from typing import Any
 from typing import cast
 from typing import List
@@ -10,12 +14,17 @@ from onyx.configs.app_configs import MAX_DOCUMENT_CHARS
 from onyx.connectors.models import Document
 from onyx.connectors.models import DocumentSource
 from onyx.connectors.models import ImageSection
+from onyx.connectors.models import IndexAttemptMetadata
 from onyx.connectors.models import TextSection
 from onyx.indexing.chunker import Chunker
 from onyx.indexing.embedder import DefaultIndexingEmbedder
 from onyx.indexing.indexing_pipeline import _get_aggregated_chunk_boost_factor
 from onyx.indexing.indexing_pipeline import add_contextual_summaries
+from onyx.indexing.indexing_pipeline import ChunkedDocBatch
+from onyx.indexing.indexing_pipeline import EmbeddedDocBatch
 from onyx.indexing.indexing_pipeline import filter_documents
+from onyx.indexing.indexing_pipeline import IndexingPipeline
+from onyx.indexing.indexing_pipeline import IndexingPipelineResult
 from onyx.indexing.indexing_pipeline import process_image_sections
 from onyx.indexing.models import ChunkEmbedding
 from onyx.indexing.models import IndexChunk
@@ -338,3 +347,110 @@ def test_contextual_rag(
             count += 1
         assert chunk.doc_summary == doc_summary
         assert chunk.chunk_context == chunk_context
+
+
+@pytest.mark.parametrize("max_buffered", [0, 2])
+def test_index_batches_keeps_order(max_buffered: int) -> None:
+    metadata = IndexAttemptMetadata(connector_id=1, credential_id=1)
+    items = ["a", "checkpoint", "b", "c"]
+
+    def get_batch(item: str) -> tuple[list[Document], IndexAttemptMetadata] | None:
+        if item == "checkpoint":
+            return None
+        return [create_test_document(doc_id=item)], metadata
+
+    def chunk(document_batch: list[Document], **kwargs: Any) -> ChunkedDocBatch:
+        return ChunkedDocBatch(
+            document_batch=document_batch,
+            filtered_documents=document_batch,
+            index_attempt_metadata=metadata,
+            ctx=None,
+        )
+
+    def embed(chunked_batch: ChunkedDocBatch, **kwargs: Any) -> EmbeddedDocBatch:
+        if chunked_batch.document_batch[0].id == "b":
+            raise RuntimeError("Embedding failed")
+        return EmbeddedDocBatch(**dict(chunked_batch))
+
+    written: list[str] = []
+
+    def write(
+        embedded_batch: EmbeddedDocBatch, **kwargs: Any
+    ) -> IndexingPipelineResult:
+        written.append(embedded_batch.document_batch[0].id)
+        return IndexingPipelineResult(
+            new_docs=1, total_docs=1, total_chunks=1, failures=[]
+        )
+
+    pipeline = IndexingPipeline(
+        chunker=Mock(enable_large_chunks=False),
+        embedder=Mock(),
+        information_content_classification_model=Mock(),
+        document_index=Mock(),
+        db_session=Mock(),
+        tenant_id="test",
+    )
+    with patch(
+        "onyx.indexing.indexing_pipeline.get_session_with_current_tenant"
+    ), patch(
+        "onyx.indexing.indexing_pipeline.chunk_doc_batch", side_effect=chunk
+    ), patch(
+        "onyx.indexing.indexing_pipeline.embed_doc_batch", side_effect=embed
+    ), patch(
+        "onyx.indexing.indexing_pipeline.write_doc_batch", side_effect=write
+    ):
+        results = list(
+            pipeline.index_batches(
+                iter(items), get_batch=get_batch, max_buffered=max_buffered
+            )
+        )
+
+    assert [item for item, _ in results] == items
+    assert results[1][1] is None
+    assert written == ["a", "c"]
+
+    # the failed batch is reported in its result, the other batches still go through
+    failed_result = results[2][1]
+    assert failed_result is not None
+    assert failed_result.total_chunks == 0
+    assert [
+        failure.failed_document.document_id
+        for failure in failed_result.failures
+        if failure.failed_document
+    ] == ["b"]
+    assert results[3][1] == IndexingPipelineResult(
+        new_docs=1, total_docs=1, total_chunks=1, failures=[]
+    )
+
+
+def test_index_batches_close_waits_for_stage_threads() -> None:
+    fetched: list[int] = []
+    source_closed = threading.Event()
+
+    def items() -> Iterator[int]:
+        try:
+            for i in itertools.count():
+                fetched.append(i)
+                yield i
+        finally:
+            source_closed.set()
+
+    pipeline = IndexingPipeline(
+        chunker=Mock(enable_large_chunks=False),
+        embedder=Mock(),
+        information_content_classification_model=Mock(),
+        document_index=Mock(),
+        db_session=Mock(),
+        tenant_id="test",
+    )
+    results = pipeline.index_batches(
+        items(), get_batch=lambda item: None, max_buffered=2
+    )
+    assert next(results) == (0, None)
+    results.close()
+
+    # every stage has stopped by the time close returns
+    assert source_closed.is_set()
+    fetched_at_close = len(fetched)
+    time.sleep(0.2)
+    assert len(fetched) == fetched_at_close
@@ -0,0 +1,125 @@
+from collections.abc import Generator
+from unittest.mock import Mock
+from unittest.mock import patch
+
+import pytest
+
+from onyx.natural_language_processing import query_embeddings
+from onyx.natural_language_processing.query_embeddings import embed_queries
+from onyx.natural_language_processing.query_embeddings import (
+    get_query_embedding_model,
+)
+from onyx.natural_language_processing.query_embeddings import QueryEmbeddingCache
+from shared_configs.enums import EmbedTextType
+
+
+def _search_settings(model_name: str = "test-model") -> Mock:
+    search_settings = Mock()
+    search_settings.id = 1
+    search_settings.model_name = model_name
+    search_settings.normalize = True
+    search_settings.query_prefix = "query: "
+    search_settings.passage_prefix = "passage: "
+    search_settings.provider_type = None
+    search_settings.api_key = None
+    search_settings.api_url = None
+    search_settings.api_version = None
+    search_settings.deployment_name = None
+    search_settings.reduced_dimension = None
+    return search_settings
+
+
+@pytest.fixture
+def mock_embedding_model() -> Generator[Mock, None, None]:
+    query_embeddings._query_embedding_cache.clear()
+    query_embeddings._embedding_models.clear()
+    with patch(
+        "onyx.natural_language_processing.query_embeddings.EmbeddingModel"
+    ) as mock:
+        mock.from_db_model.return_value.encode.side_effect = lambda texts, text_type: [
+            [float(len(text))] for text in texts
+        ]
+        yield mock
+    query_embeddings._query_embedding_cache.clear()
+    query_embeddings._embedding_models.clear()
+
+
+def test_query_embedding_cache_evicts_least_recently_used() -> None:
+    cache = QueryEmbeddingCache(max_entries=2, ttl=60)
+    cache.set("a", [1.0])
+    cache.set("b", [2.0])
+    assert cache.get("a") == [1.0]
+
+    cache.set("c", [3.0])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0]
+    assert cache.get("c") == [3.0]
+
+
+def test_query_embedding_cache_expires_entries() -> None:
+    cache = QueryEmbeddingCache(max_entries=2, ttl=60)
+    with patch("onyx.natural_language_processing.query_embeddings.time") as mock_time:
+        mock_time.monotonic.return_value = 100.0
+        cache.set("a", [1.0])
+        mock_time.monotonic.return_value = 159.0
+        assert cache.get("a") == [1.0]
+        mock_time.monotonic.return_value = 160.0
+        assert cache.get("a") is None
+
+
+def test_embed_queries_only_encodes_misses(mock_embedding_model: Mock) -> None:
+    search_settings = _search_settings()
+    encode = mock_embedding_model.from_db_model.return_value.encode
+
+    assert embed_queries(["hello  world", "foo"], search_settings) == [
+        [12.0],
+        [3.0],
+    ]
+    # The model gets the text as given, only the cache key is normalized
+    encode.assert_called_once_with(
+        ["hello  world", "foo"], text_type=EmbedTextType.QUERY
+    )
+
+    # Whitespace differences and repeats within a call hit the cache
+    encode.reset_mock()
+    assert embed_queries([" hello world ", "bar", "bar"], search_settings) == [
+        [12.0],
+        [3.0],
+        [3.0],
+    ]
+    encode.assert_called_once_with(["bar"], text_type=EmbedTextType.QUERY)
+
+    # Another model never reuses these vectors
+    encode.reset_mock()
+    embed_queries(["foo"], _search_settings(model_name="other-model"))
+    encode.assert_called_once_with(["foo"], text_type=EmbedTextType.QUERY)
+
+
+def test_query_embedding_model_is_reused(mock_embedding_model: Mock) -> None:
+    search_settings = _search_settings()
+    model = get_query_embedding_model(search_settings)
+    assert get_query_embedding_model(search_settings) is model
+    assert mock_embedding_model.from_db_model.call_count == 1
+
+    search_settings.reduced_dimension = 256
+    get_query_embedding_model(search_settings)
+    assert mock_embedding_model.from_db_model.call_count == 2
+
+
+def test_redis_entries_are_per_tenant(mock_embedding_model: Mock) -> None:
+    with (
+        patch.object(query_embeddings, "QUERY_EMBEDDING_CACHE_USE_REDIS", True),
+        patch.object(query_embeddings, "get_redis_client") as get_redis_client,
+        patch.object(
+            query_embeddings, "get_current_tenant_id", return_value="tenant_a"
+        ),
+    ):
+        redis_client = get_redis_client.return_value
+        redis_client.mget.return_value = [None]
+        embed_queries(["foo"], _search_settings())
+
+    key = query_embeddings.query_embedding_cache_key(_search_settings(), "foo")
+    redis_client.mget.assert_called_once_with([f"query_embedding:tenant_a:{key}"])
+    stored_key = redis_client.pipeline.return_value.set.call_args.args[0]
+    assert stored_key == f"query_embedding:tenant_a:{key}"
@@ -0,0 +1,109 @@
+from unittest.mock import Mock
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from httpx import HTTPError
+from requests import Response
+
+from onyx.natural_language_processing.search_nlp_models import EmbeddingModel
+from shared_configs.enums import EmbeddingDType
+from shared_configs.enums import EmbedTextType
+from shared_configs.utils import pack_embeddings
+
+
+def _embedding_model(embedding_dtype: EmbeddingDType | None) -> EmbeddingModel:
+    with patch("onyx.natural_language_processing.search_nlp_models.get_tokenizer"):
+        return EmbeddingModel(
+            server_host="localhost",
+            server_port=9000,
+            model_name="fake-local-model",
+            normalize=True,
+            query_prefix=None,
+            passage_prefix=None,
+            api_key=None,
+            api_url=None,
+            provider_type=None,
+            embedding_dtype=embedding_dtype,
+        )
+
+
+def _response(
+    status_code: int, content: bytes, headers: dict[str, str] | None = None
+) -> Response:
+    response = Response()
+    response.status_code = status_code
+    response._content = content
+    response.headers.update(headers or {"content-type": "application/json"})
+    return response
+
+
+@pytest.mark.parametrize("dtype", [EmbeddingDType.FLOAT32, EmbeddingDType.FLOAT16])
+def test_encode_with_binary_embeddings(dtype: EmbeddingDType) -> None:
+    vectors = np.array([[0.5, 0.25], [0.125, 1.0]])
+    content, headers = pack_embeddings(vectors, dtype)
+    headers["content-type"] = "application/octet-stream"
+    model = _embedding_model(dtype)
+
+    with patch(
+        "onyx.natural_language_processing.search_nlp_models.requests.post",
+        return_value=_response(200, content, headers),
+    ) as mock_post:
+        embeddings = model.encode(["a", "b"], text_type=EmbedTextType.QUERY)
+
+    assert embeddings == vectors.tolist()
+    assert mock_post.call_args.args[0] == model.embed_binary_server_endpoint
+    assert mock_post.call_args.kwargs["params"] == {"dtype": dtype.value}
+
+
+def test_encode_falls_back_to_json_embeddings() -> None:
+    model = _embedding_model(EmbeddingDType.FLOAT32)
+    vectors = np.array([[0.5, 0.25]])
+    content, headers = pack_embeddings(vectors, EmbeddingDType.FLOAT32)
+    headers["content-type"] = "application/octet-stream"
+    mock_post = Mock(
+        side_effect=[
+            _response(404, b'{"detail": "Not Found"}'),
+            _response(200, b'{"embeddings": [[0.1, 0.2]]}'),
+            _response(200, b'{"embeddings": [[0.3, 0.4]]}'),
+            _response(200, content, headers),
+        ]
+    )
+
+    with (
+        patch(
+            "onyx.natural_language_processing.search_nlp_models.requests.post",
+            mock_post,
+        ),
+        patch(
+            "onyx.natural_language_processing.search_nlp_models.time.monotonic"
+        ) as mock_monotonic,
+    ):
+        mock_monotonic.return_value = 1000.0
+        assert model.encode(["a"], text_type=EmbedTextType.QUERY) == [[0.1, 0.2]]
+        # the model server without the binary endpoint is not asked again for a while
+        assert model.encode(["b"], text_type=EmbedTextType.QUERY) == [[0.3, 0.4]]
+        mock_monotonic.return_value = 2000.0
+        assert model.encode(["c"], text_type=EmbedTextType.QUERY) == [[0.5, 0.25]]
+
+    assert [call.args[0] for call in mock_post.call_args_list] == [
+        model.embed_binary_server_endpoint,
+        model.embed_server_endpoint,
+        model.embed_server_endpoint,
+        model.embed_binary_server_endpoint,
+    ]
+    assert model.embedding_dtype == EmbeddingDType.FLOAT32
+
+
+def test_encode_does_not_fall_back_on_other_404s() -> None:
+    model = _embedding_model(EmbeddingDType.FLOAT32)
+
+    with patch(
+        "onyx.natural_language_processing.search_nlp_models.requests.post",
+        return_value=_response(404, b"<html>no such host</html>"),
+    ) as mock_post:
+        with pytest.raises(HTTPError):
+            model.encode(["a"], text_type=EmbedTextType.QUERY)
+
+    assert mock_post.call_count == 1
+    assert model.binary_embeddings_retry_at == 0.0
@@ -8,6 +8,7 @@ from concurrent.futures import ThreadPoolExecutor
 import pytest
 
 from onyx.utils.threadpool_concurrency import parallel_yield
+from onyx.utils.threadpool_concurrency import prefetch_in_background
 from onyx.utils.threadpool_concurrency import run_in_background
 from onyx.utils.threadpool_concurrency import run_with_timeout
 from onyx.utils.threadpool_concurrency import ThreadSafeDict
@@ -389,3 +390,76 @@ def test_parallel_yield_non_blocking() -> None:
     # Verify no values are missing
     assert len(results) == 300  # Should have all values from 0 to 299
     assert sorted(results) == list(range(300))
+
+
+def test_prefetch_in_background_keeps_order_and_context() -> None:
+    """Test that items come back in order, produced with the caller's contextvars"""
+    test_context_var.set("prefetch")
+
+    def gen() -> Iterator[tuple[int, str]]:
+        for i in range(20):
+            yield i, test_context_var.get()
+
+    assert list(prefetch_in_background(gen(), max_buffered=3)) == [
+        (i, "prefetch") for i in range(20)
+    ]
+
+
+def test_prefetch_in_background_bounds_buffer() -> None:
+    """Test that the producer never gets more than max_buffered items ahead"""
+    produced: list[int] = []
+
+    def gen() -> Iterator[int]:
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    results = prefetch_in_background(gen(), max_buffered=2)
+    assert next(results) == 0
+    time.sleep(0.3)
+    # 1 consumed, 2 buffered, 1 waiting to be buffered
+    assert len(produced) <= 4
+
+    results.close()
+    time.sleep(0.3)
+    assert len(produced) <= 4
+
+
+def test_prefetch_in_background_propagates_exceptions_in_order() -> None:
+    """Test that an exception is raised after the items produced before it"""
+
+    def gen() -> Iterator[int]:
+        yield 1
+        yield 2
+        raise ValueError("Producer failure")
+
+    results: list[int] = []
+    with pytest.raises(ValueError, match="Producer failure"):
+        for item in prefetch_in_background(gen(), max_buffered=1):
+            results.append(item)
+    assert results == [1, 2]
+
+
+def test_prefetch_in_background_stages_overlap() -> None:
+    """Test that chained stages run concurrently"""
+
+    def stage(items: Iterator[int], delay: float) -> Iterator[int]:
+        for item in items:
+            time.sleep(delay)
+            yield item
+
+    start = time.monotonic()
+    results = list(
+        stage(
+            prefetch_in_background(
+                stage(prefetch_in_background(stage(iter(range(10)), 0.05), 2), 0.05),
+                2,
+            ),
+            0.05,
+        )
+    )
+    elapsed = time.monotonic() - start
+
+    assert results == list(range(10))
+    # sequentially this would take 10 * 3 * 0.05 = 1.5 seconds
+    assert elapsed < 1.2
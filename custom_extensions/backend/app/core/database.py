@@ -135,6 +135,23 @@ async def init_database():
         await execute_query("CREATE INDEX IF NOT EXISTS idx_product_access_product_id ON product_access(product_id)")
         await execute_query("CREATE INDEX IF NOT EXISTS idx_product_access_workspace_id ON product_access(workspace_id)")
         
+        # Denormalized product_access resolved per member (see app/services/access_index.py)
+        await execute_query("""
+            CREATE TABLE IF NOT EXISTS user_product_access (
+                user_key VARCHAR(255) NOT NULL,
+                product_id INTEGER NOT NULL,
+                workspace_id INTEGER NOT NULL REFERENCES workspaces(id) ON DELETE CASCADE,
+                PRIMARY KEY (user_key, product_id, workspace_id)
+            )
+        """)
+        await execute_query("CREATE INDEX IF NOT EXISTS idx_user_product_access_product ON user_product_access(product_id)")
+        await execute_query("CREATE INDEX IF NOT EXISTS idx_user_product_access_workspace ON user_product_access(workspace_id)")
+        
+        # Reconcile with grants written outside the services (scripts, older deploys)
+        from app.services.access_index import UserProductAccessIndex
+        await UserProductAccessIndex.rebuild()
+        UserProductAccessIndex.start_reconciler()
+        
         logger.info("Database tables created successfully")
         
     except Exception as e:
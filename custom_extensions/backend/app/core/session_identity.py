@@ -0,0 +1,173 @@
+# custom_extensions/backend/app/core/session_identity.py
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class OnyxIdentity:
+    """Identity of the Onyx user behind a session cookie, as reported by /me."""
+    user_id: str
+    email: str
+    role: str
+
+
+class SessionIdentityResolver:
+    """
+    Resolves Onyx session cookies to user identities.
+
+    Lookups go through one pooled httpx client, results are kept in a TTL/LRU
+    cache keyed by a hash of the cookie (the raw cookie is never stored), and
+    concurrent lookups for the same cookie share a single /me round trip.
+    Failed lookups are never cached.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        cookie_name: str,
+        ttl_seconds: float = 60.0,
+        max_entries: int = 10000,
+        timeout: float = 10.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.cookie_name = cookie_name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.timeout = timeout
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._entries: "OrderedDict[str, tuple[float, OnyxIdentity]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Bumped on every invalidation so a lookup that started before the
+        # invalidation cannot repopulate the cache with stale data.
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(session_cookie: str) -> str:
+        return hashlib.sha256(session_cookie.encode("utf-8")).hexdigest()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            )
+        return self._client
+
+    def _get_cached(self, key: str) -> Optional[OnyxIdentity]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, identity = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return identity
+
+    def _store(self, key: str, identity: OnyxIdentity) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, identity)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _fetch(self, session_cookie: str) -> OnyxIdentity:
+        response = await self._get_client().get(
+            f"{self.base_url}/me",
+            cookies={self.cookie_name: session_cookie},
+        )
+        response.raise_for_status()
+        user_data = response.json()
+        user_id = user_data.get("userId") or user_data.get("id")
+        return OnyxIdentity(
+            user_id=str(user_id) if user_id else "",
+            email=user_data.get("email") or "",
+            role=user_data.get("role") or "",
+        )
+
+    async def resolve(self, session_cookie: str) -> OnyxIdentity:
+        """
+        Return the identity for a session cookie.
+
+        Raises the underlying httpx errors (HTTPStatusError / RequestError) so
+        callers can keep mapping them to their own HTTP responses.
+        """
+        key = self._key(session_cookie)
+        identity = self._get_cached(key)
+        if identity is not None:
+            self.hits += 1
+            return identity
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        task = asyncio.ensure_future(self._lookup(key, session_cookie, self._generation))
+        self._inflight[key] = task
+        # Shielded so a cancelled caller does not abort the lookup other
+        # requests are waiting on.
+        return await asyncio.shield(task)
+
+    async def _lookup(self, key: str, session_cookie: str, generation: int) -> OnyxIdentity:
+        try:
+            identity = await self._fetch(session_cookie)
+            if identity.user_id and generation == self._generation:
+                self._store(key, identity)
+            return identity
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate_session(self, session_cookie: str) -> None:
+        """Drop the cached identity for one session (e.g. on logout)."""
+        self._generation += 1
+        self.invalidations += 1
+        self._entries.pop(self._key(session_cookie), None)
+
+    def invalidate_user(self, user_id: str) -> int:
+        """Drop every cached session of a user (e.g. after a role change). Returns the number removed."""
+        self._generation += 1
+        self.invalidations += 1
+        stale = [key for key, (_, identity) in self._entries.items() if identity.user_id == str(user_id)]
+        for key in stale:
+            self._entries.pop(key, None)
+        return len(stale)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self.invalidations += 1
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries,
+        }
+
+    async def aclose(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
@@ -0,0 +1,167 @@
+# custom_extensions/backend/app/services/access_index.py
+import asyncio
+import logging
+import os
+from typing import List, Optional, Sequence
+
+from app.core.database import fetch_all, fetch_val, get_connection
+
+logger = logging.getLogger(__name__)
+
+# How often the reconciler checks whether a refresh failed and the index needs a rebuild
+ACCESS_INDEX_RECONCILE_SECONDS = int(os.getenv("ACCESS_INDEX_RECONCILE_SECONDS", "60"))
+
+# Every (member, product) pair granted through product_access, resolved against
+# workspace membership and roles. Roles are targeted by id or by name.
+_RESOLVED_GRANTS_SQL = """
+    INSERT INTO user_product_access (user_key, product_id, workspace_id)
+    SELECT DISTINCT wm.user_id, pa.product_id, pa.workspace_id
+    FROM product_access pa
+    INNER JOIN workspace_members wm ON wm.workspace_id = pa.workspace_id AND wm.status = 'active'
+    LEFT JOIN workspace_roles wr ON wr.id = wm.role_id
+    WHERE (
+        pa.access_type = 'workspace'
+        OR (pa.access_type = 'role' AND (pa.target_id = CAST(wm.role_id AS TEXT) OR pa.target_id = wr.name))
+        OR (pa.access_type = 'individual' AND pa.target_id = wm.user_id)
+    )
+    {scope}
+    ON CONFLICT DO NOTHING
+"""
+
+
+class UserProductAccessIndex:
+    """
+    Maintains user_product_access: one row per (user key, product, workspace)
+    for every product a workspace member can open through product_access.
+    A user key is the value stored in workspace_members.user_id (UUID or email).
+
+    WorkspaceService, RoleService and ProductAccessService call the refresh
+    methods after each mutation; each refresh recomputes only the affected
+    slice in one transaction, serialized per workspace. The mutation is already
+    committed by then, so a failed refresh is logged instead of raised and the
+    reconciler started by init_database rebuilds the whole index shortly after.
+    """
+
+    _needs_rebuild = False
+    _reconciler: Optional[asyncio.Task] = None
+
+    @staticmethod
+    async def _refresh(workspace_id: Optional[int], delete_filter: str, grant_filter: str, *args) -> None:
+        async with get_connection() as conn:
+            async with conn.transaction():
+                if workspace_id is not None:
+                    await conn.execute(
+                        "SELECT pg_advisory_xact_lock(hashtext('user_product_access'), $1)", workspace_id
+                    )
+                await conn.execute(f"DELETE FROM user_product_access {delete_filter}", *args)
+                await conn.execute(_RESOLVED_GRANTS_SQL.format(scope=grant_filter), *args)
+
+    @staticmethod
+    async def _refresh_or_defer(workspace_id: int, delete_filter: str, grant_filter: str, *args) -> None:
+        try:
+            await UserProductAccessIndex._refresh(workspace_id, delete_filter, grant_filter, *args)
+        except Exception as e:
+            UserProductAccessIndex._needs_rebuild = True
+            logger.error(f"[ACCESS_INDEX] Refresh failed for workspace {workspace_id}, deferring to the reconciler: {e}")
+
+    @staticmethod
+    async def rebuild() -> int:
+        """Recompute the whole index (startup reconciliation). Returns the row count."""
+        await UserProductAccessIndex._refresh(None, "", "")
+        count = await fetch_val("SELECT COUNT(*) FROM user_product_access")
+        logger.info(f"[ACCESS_INDEX] Rebuilt user_product_access ({count} rows)")
+        return count
+
+    @staticmethod
+    async def _reconcile_forever(interval: int) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            if not UserProductAccessIndex._needs_rebuild:
+                continue
+            # Cleared first, so a refresh failing during the rebuild triggers another one
+            UserProductAccessIndex._needs_rebuild = False
+            try:
+                await UserProductAccessIndex.rebuild()
+            except Exception as e:
+                UserProductAccessIndex._needs_rebuild = True
+                logger.error(f"[ACCESS_INDEX] Reconcile failed, retrying in {interval}s: {e}")
+
+    @staticmethod
+    def start_reconciler(interval: int = ACCESS_INDEX_RECONCILE_SECONDS) -> None:
+        """Start the background task that rebuilds the index after a failed refresh."""
+        task = UserProductAccessIndex._reconciler
+        if task is not None and not task.done():
+            return
+        UserProductAccessIndex._reconciler = asyncio.create_task(
+            UserProductAccessIndex._reconcile_forever(interval), name="access-index-reconciler"
+        )
+
+    @staticmethod
+    async def stop_reconciler() -> None:
+        task = UserProductAccessIndex._reconciler
+        UserProductAccessIndex._reconciler = None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    @staticmethod
+    async def refresh_workspace(workspace_id: int) -> None:
+        """After changes that can affect every member, e.g. a role rename."""
+        await UserProductAccessIndex._refresh_or_defer(
+            workspace_id, "WHERE workspace_id = $1", "AND pa.workspace_id = $1", workspace_id
+        )
+
+    @staticmethod
+    async def refresh_member(workspace_id: int, user_id: str) -> None:
+        """After a member is added, removed, or changes role or status."""
+        await UserProductAccessIndex._refresh_or_defer(
+            workspace_id,
+            "WHERE workspace_id = $1 AND user_key = $2",
+            "AND pa.workspace_id = $1 AND wm.user_id = $2",
+            workspace_id, user_id,
+        )
+
+    @staticmethod
+    async def refresh_product(workspace_id: int, product_id: int) -> None:
+        """After access to a product is granted or revoked."""
+        await UserProductAccessIndex._refresh_or_defer(
+            workspace_id,
+            "WHERE workspace_id = $1 AND product_id = $2",
+            "AND pa.workspace_id = $1 AND pa.product_id = $2",
+            workspace_id, product_id,
+        )
+
+    @staticmethod
+    async def has_access(product_id: int, user_keys: Sequence[str], workspace_id: Optional[int] = None) -> bool:
+        if workspace_id is None:
+            return await fetch_val(
+                "SELECT EXISTS (SELECT 1 FROM user_product_access WHERE user_key = ANY($1::text[]) AND product_id = $2)",
+                list(user_keys), product_id,
+            )
+        return await fetch_val(
+            """
+            SELECT EXISTS (
+                SELECT 1 FROM user_product_access
+                WHERE user_key = ANY($1::text[]) AND product_id = $2 AND workspace_id = $3
+            )
+            """,
+            list(user_keys), product_id, workspace_id,
+        )
+
+    @staticmethod
+    async def accessible_products(user_keys: Sequence[str], workspace_id: Optional[int] = None) -> List[int]:
+        if workspace_id is None:
+            rows = await fetch_all(
+                "SELECT DISTINCT product_id FROM user_product_access WHERE user_key = ANY($1::text[])",
+                list(user_keys),
+            )
+        else:
+            rows = await fetch_all(
+                "SELECT DISTINCT product_id FROM user_product_access WHERE user_key = ANY($1::text[]) AND workspace_id = $2",
+                list(user_keys), workspace_id,
+            )
+        return [row["product_id"] for row in rows]
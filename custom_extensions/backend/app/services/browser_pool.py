@@ -0,0 +1,287 @@
+# custom_extensions/backend/app/services/browser_pool.py
+import asyncio
+import logging
+import os
+from typing import Callable, Dict, List, Optional
+
+import pyppeteer
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+# Rough memory a single rendering page needs (Chromium renderer + our large
+# inlined slide HTML). Used to size concurrency from available memory.
+PAGE_MEMORY_BUDGET_MB = int(os.getenv("PDF_BROWSER_PAGE_MEMORY_MB", "300"))
+MIN_CONCURRENT_PAGES = 1
+MAX_CONCURRENT_PAGES = int(os.getenv("PDF_BROWSER_MAX_CONCURRENT_PAGES", "8"))
+MAX_PAGES_PER_BROWSER = int(os.getenv("PDF_BROWSER_MAX_PAGES", "200"))
+MAX_BROWSER_RSS_MB = int(os.getenv("PDF_BROWSER_MAX_RSS_MB", "1024"))
+
+
+def _available_memory_mb() -> Optional[int]:
+    if psutil is not None:
+        try:
+            return int(psutil.virtual_memory().available / (1024 * 1024))
+        except Exception:
+            pass
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except Exception:
+        pass
+    return None
+
+
+def default_page_concurrency() -> int:
+    """Concurrent pages the pool allows: PDF_BROWSER_CONCURRENCY if set, otherwise derived from free memory."""
+    configured = os.getenv("PDF_BROWSER_CONCURRENCY")
+    if configured:
+        try:
+            return max(MIN_CONCURRENT_PAGES, int(configured))
+        except ValueError:
+            logger.warning(f"[BROWSER_POOL] Ignoring invalid PDF_BROWSER_CONCURRENCY={configured!r}")
+    available_mb = _available_memory_mb()
+    if available_mb is None:
+        return 2
+    # Keep half of the free memory for the rest of the app.
+    return max(MIN_CONCURRENT_PAGES, min(MAX_CONCURRENT_PAGES, (available_mb // 2) // PAGE_MEMORY_BUDGET_MB))
+
+
+def _process_tree_rss_mb(pid: int) -> Optional[float]:
+    if psutil is None:
+        return None
+    try:
+        process = psutil.Process(pid)
+        rss = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return rss / (1024 * 1024)
+    except psutil.Error:
+        return None
+
+
+class _PooledBrowser:
+    def __init__(self, browser, slot_id: int):
+        self.browser = browser
+        self.slot_id = slot_id
+        self.pages_served = 0
+        self.active_pages = 0
+        self.retiring = False
+
+    @property
+    def pid(self) -> Optional[int]:
+        process = getattr(self.browser, "process", None)
+        return getattr(process, "pid", None)
+
+    def is_alive(self) -> bool:
+        process = getattr(self.browser, "process", None)
+        if process is not None and process.poll() is not None:
+            return False
+        connection = getattr(self.browser, "_connection", None)
+        if connection is not None and getattr(connection, "_connected", True) is False:
+            return False
+        return True
+
+
+class BrowserPool:
+    """
+    Long-lived pool of headless Chromium instances for PDF rendering.
+
+    Callers lease pages with `acquire_page()` / `release_page()` (or the
+    `page()` context manager). The number of pages rendering at once is capped
+    by `concurrency`; pages are spread over up to `max_browsers` browsers.
+    A browser is retired after `max_pages_per_browser` pages or once its
+    process tree exceeds `max_rss_mb`, and crashed browsers are replaced on the
+    next lease. Browsers are launched lazily, so the pool also works in scripts
+    that never call `start()`.
+    """
+
+    def __init__(
+        self,
+        launch_options_factory: Callable[[], dict],
+        concurrency: Optional[int] = None,
+        max_browsers: Optional[int] = None,
+        max_pages_per_browser: int = MAX_PAGES_PER_BROWSER,
+        max_rss_mb: int = MAX_BROWSER_RSS_MB,
+    ):
+        self._launch_options_factory = launch_options_factory
+        self.concurrency = concurrency or default_page_concurrency()
+        # Several pages share one browser; a second browser only helps spread
+        # crash/recycle impact once concurrency is large.
+        self.max_browsers = max_browsers or max(1, (self.concurrency + 3) // 4)
+        self.max_pages_per_browser = max_pages_per_browser
+        self.max_rss_mb = max_rss_mb
+
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._browsers: List[_PooledBrowser] = []
+        self._page_owner: Dict[int, _PooledBrowser] = {}
+        self._next_slot_id = 0
+        self._closed = False
+
+        self.launches = 0
+        self.recycled = 0
+        self.crashed = 0
+        self.pages_leased = 0
+
+    def _ensure_primitives(self) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._lock = asyncio.Lock()
+
+    async def start(self, prewarm: bool = True) -> None:
+        """Called from app startup; optionally launches the first browser so the first export is warm."""
+        self._closed = False
+        self._ensure_primitives()
+        logger.info(
+            f"[BROWSER_POOL] Starting (concurrency={self.concurrency}, max_browsers={self.max_browsers}, "
+            f"max_pages_per_browser={self.max_pages_per_browser}, max_rss_mb={self.max_rss_mb})"
+        )
+        if prewarm:
+            try:
+                async with self._lock:
+                    await self._launch_locked()
+            except Exception as e:
+                logger.warning(f"[BROWSER_POOL] Prewarm failed, browsers will launch on demand: {e}")
+
+    async def _launch_locked(self) -> _PooledBrowser:
+        browser = await pyppeteer.launch(**self._launch_options_factory())
+        pooled = _PooledBrowser(browser, self._next_slot_id)
+        self._next_slot_id += 1
+        self._browsers.append(pooled)
+        self.launches += 1
+        logger.info(f"[BROWSER_POOL] Launched browser #{pooled.slot_id} (pid={pooled.pid})")
+        return pooled
+
+    async def _close_browser(self, pooled: _PooledBrowser, reason: str) -> None:
+        if pooled in self._browsers:
+            self._browsers.remove(pooled)
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            logger.debug(f"[BROWSER_POOL] Error closing browser #{pooled.slot_id}: {e}")
+        logger.info(f"[BROWSER_POOL] Closed browser #{pooled.slot_id} ({reason}, served {pooled.pages_served} pages)")
+
+    async def _pick_browser_locked(self) -> _PooledBrowser:
+        for pooled in list(self._browsers):
+            if not pooled.is_alive():
+                self.crashed += 1
+                logger.warning(f"[BROWSER_POOL] Browser #{pooled.slot_id} is no longer alive, replacing it")
+                await self._close_browser(pooled, "crashed")
+
+        candidates = [b for b in self._browsers if not b.retiring]
+        if candidates:
+            least_loaded = min(candidates, key=lambda b: b.active_pages)
+            if least_loaded.active_pages == 0 or len(self._browsers) >= self.max_browsers:
+                return least_loaded
+        return await self._launch_locked()
+
+    def _should_retire(self, pooled: _PooledBrowser) -> Optional[str]:
+        if pooled.pages_served >= self.max_pages_per_browser:
+            return f"served {pooled.pages_served} pages"
+        if pooled.pid is not None and self.max_rss_mb:
+            rss_mb = _process_tree_rss_mb(pooled.pid)
+            if rss_mb is not None and rss_mb > self.max_rss_mb:
+                return f"rss {rss_mb:.0f}MB > {self.max_rss_mb}MB"
+        return None
+
+    async def acquire_page(self):
+        """Lease a fresh page. Blocks while `concurrency` pages are already out."""
+        if self._closed:
+            raise RuntimeError("Browser pool is closed")
+        self._ensure_primitives()
+        await self._semaphore.acquire()
+        try:
+            async with self._lock:
+                pooled = await self._pick_browser_locked()
+                pooled.active_pages += 1
+            try:
+                page = await pooled.browser.newPage()
+            except Exception:
+                pooled.active_pages -= 1
+                # A browser that cannot open pages is treated as crashed; retry once on a new one.
+                async with self._lock:
+                    self.crashed += 1
+                    await self._close_browser(pooled, "newPage failed")
+                    pooled = await self._pick_browser_locked()
+                    pooled.active_pages += 1
+                try:
+                    page = await pooled.browser.newPage()
+                except Exception:
+                    pooled.active_pages -= 1
+                    raise
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+        pooled.pages_served += 1
+        self.pages_leased += 1
+        self._page_owner[id(page)] = pooled
+        return page
+
+    async def release_page(self, page) -> None:
+        """Return a page leased with `acquire_page()`; closes it and recycles its browser if due."""
+        pooled = self._page_owner.pop(id(page), None)
+        try:
+            if page is not None and not page.isClosed():
+                await page.close()
+        except Exception as e:
+            logger.debug(f"[BROWSER_POOL] Error closing page: {e}")
+        finally:
+            if pooled is not None:
+                pooled.active_pages -= 1
+                async with self._lock:
+                    if not pooled.retiring:
+                        reason = self._should_retire(pooled)
+                        if reason:
+                            pooled.retiring = True
+                            logger.info(f"[BROWSER_POOL] Retiring browser #{pooled.slot_id}: {reason}")
+                    if pooled.retiring and pooled.active_pages == 0 and pooled in self._browsers:
+                        self.recycled += 1
+                        await self._close_browser(pooled, "recycled")
+                self._semaphore.release()
+
+    def page(self):
+        """`async with pool.page() as page:` convenience wrapper around acquire/release."""
+        return _PageLease(self)
+
+    async def close(self) -> None:
+        """Called from app shutdown."""
+        self._closed = True
+        for pooled in list(self._browsers):
+            await self._close_browser(pooled, "shutdown")
+        self._page_owner.clear()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "browsers": len(self._browsers),
+            "active_pages": sum(b.active_pages for b in self._browsers),
+            "pages_leased": self.pages_leased,
+            "launches": self.launches,
+            "recycled": self.recycled,
+            "crashed": self.crashed,
+        }
+
+
+class _PageLease:
+    def __init__(self, pool: BrowserPool):
+        self._pool = pool
+        self._page = None
+
+    async def __aenter__(self):
+        self._page = await self._pool.acquire_page()
+        return self._page
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._pool.release_page(self._page)
+        return False
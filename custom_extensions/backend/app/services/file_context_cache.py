@@ -0,0 +1,221 @@
+# custom_extensions/backend/app/services/file_context_cache.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Total size of cached contexts kept in Postgres / in this process before LRU eviction
+FILE_CONTEXT_CACHE_MAX_MB = int(os.getenv("FILE_CONTEXT_CACHE_MAX_MB", "512"))
+FILE_CONTEXT_MEMORY_CACHE_MB = int(os.getenv("FILE_CONTEXT_MEMORY_CACHE_MB", "32"))
+FILE_CONTEXT_EVICT_INTERVAL_SECONDS = 60
+
+FILE_CONTEXT_CACHE_DDL = """
+CREATE TABLE IF NOT EXISTS file_context_cache (
+    cache_key TEXT PRIMARY KEY,
+    onyx_file_id INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    context JSONB NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    last_used_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_file_context_cache_last_used ON file_context_cache (last_used_at);
+"""
+
+
+def file_context_cache_key(file_id: int, content_hash: str, prompt_version: str) -> str:
+    return hashlib.sha256(f"{file_id}:{content_hash}:{prompt_version}".encode()).hexdigest()
+
+
+class FileContextCache:
+    """
+    Extracted file contexts keyed by Onyx file ID + content hash + prompt version.
+
+    Postgres holds the shared copy (survives restarts, visible to every worker);
+    a small in-process LRU sits in front of it. Both are evicted least recently
+    used first once their total size passes the configured budget.
+    `get_or_extract` also shares in-flight extractions, so concurrent requests
+    for the same file in this process run the LLM extraction once.
+    """
+
+    def __init__(self, get_pool: Callable[[], Any]):
+        self._get_pool = get_pool
+        self._memory: "OrderedDict[str, Tuple[Dict[str, Any], int]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._last_eviction = 0.0
+        self._schema_ready = False
+        self.hits = 0
+        self.misses = 0
+
+    def _pool(self):
+        return self._get_pool()
+
+    async def ensure_schema(self) -> None:
+        pool = self._pool()
+        if pool is None or self._schema_ready:
+            return
+        async with pool.acquire() as conn:
+            await conn.execute(FILE_CONTEXT_CACHE_DDL)
+        self._schema_ready = True
+
+    def _remember(self, key: str, context: Dict[str, Any], size: int) -> None:
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= previous[1]
+        self._memory[key] = (context, size)
+        self._memory_bytes += size
+        budget = FILE_CONTEXT_MEMORY_CACHE_MB * 1024 * 1024
+        while self._memory_bytes > budget and self._memory:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        cached = self._memory.get(key)
+        if cached is not None:
+            self._memory.move_to_end(key)
+            return cached[0]
+        pool = self._pool()
+        if pool is None:
+            return None
+        try:
+            async with pool.acquire() as conn:
+                row = await conn.fetchrow(
+                    "UPDATE file_context_cache SET last_used_at = now() WHERE cache_key = $1 RETURNING context, size_bytes",
+                    key,
+                )
+        except Exception as e:
+            logger.warning(f"[FILE_CONTEXT_CACHE] Lookup failed, treating as miss: {e}")
+            return None
+        if row is None:
+            return None
+        context = row["context"]
+        if isinstance(context, str):
+            context = json.loads(context)
+        self._remember(key, context, row["size_bytes"])
+        return context
+
+    async def put(self, key: str, file_id: int, content_hash: str, prompt_version: str, context: Dict[str, Any]) -> None:
+        size = len(json.dumps(context))
+        self._remember(key, context, size)
+        pool = self._pool()
+        if pool is None:
+            return
+        try:
+            async with pool.acquire() as conn:
+                await conn.execute(
+                    """
+                    INSERT INTO file_context_cache (cache_key, onyx_file_id, content_hash, prompt_version, context, size_bytes)
+                    VALUES ($1, $2, $3, $4, $5, $6)
+                    ON CONFLICT (cache_key) DO UPDATE
+                    SET context = EXCLUDED.context, size_bytes = EXCLUDED.size_bytes, last_used_at = now()
+                    """,
+                    key, file_id, content_hash, prompt_version, context, size,
+                )
+            if time.monotonic() - self._last_eviction >= FILE_CONTEXT_EVICT_INTERVAL_SECONDS:
+                self._last_eviction = time.monotonic()
+                await self.evict()
+        except Exception as e:
+            logger.warning(f"[FILE_CONTEXT_CACHE] Failed to store context for file {file_id}: {e}")
+
+    async def evict(self) -> int:
+        """Delete the least recently used rows beyond FILE_CONTEXT_CACHE_MAX_MB; returns rows deleted."""
+        pool = self._pool()
+        if pool is None:
+            return 0
+        async with pool.acquire() as conn:
+            result = await conn.execute(
+                """
+                DELETE FROM file_context_cache
+                WHERE cache_key IN (
+                    SELECT cache_key FROM (
+                        SELECT cache_key,
+                               SUM(size_bytes) OVER (ORDER BY last_used_at DESC, cache_key) AS running_bytes
+                        FROM file_context_cache
+                    ) ranked
+                    WHERE running_bytes > $1
+                )
+                """,
+                FILE_CONTEXT_CACHE_MAX_MB * 1024 * 1024,
+            )
+        deleted = int(result.split()[-1])
+        if deleted:
+            logger.info(f"[FILE_CONTEXT_CACHE] Evicted {deleted} least recently used contexts")
+        return deleted
+
+    async def get_or_extract(
+        self,
+        file_id: int,
+        content_hash: str,
+        prompt_version: str,
+        extract: Callable[[], Awaitable[Dict[str, Any]]],
+        cacheable: Callable[[Dict[str, Any]], bool],
+    ) -> Dict[str, Any]:
+        """
+        Cached context for the file, or run `extract` (once per key across
+        concurrent callers) and store the result if `cacheable` accepts it.
+        """
+        key = file_context_cache_key(file_id, content_hash, prompt_version)
+        cached = await self.get(key)
+        if cached is not None:
+            self.hits += 1
+            logger.info(f"[FILE_CONTEXT_CACHE] Hit for file {file_id}")
+            return cached
+
+        # An extraction may have finished while the lookup was waiting on Postgres
+        if key in self._memory:
+            self.hits += 1
+            return self._memory[key][0]
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            logger.info(f"[FILE_CONTEXT_CACHE] Joining in-flight extraction for file {file_id}")
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        # Extract in a task of its own, so the caller that started it going away
+        # (e.g. a client disconnect) does not cancel it for everyone joining it
+        pending = asyncio.ensure_future(
+            self._extract_and_store(key, file_id, content_hash, prompt_version, extract, cacheable)
+        )
+        self._in_flight[key] = pending
+        pending.add_done_callback(lambda task: self._extraction_done(key, task))
+        return await asyncio.shield(pending)
+
+    async def _extract_and_store(
+        self,
+        key: str,
+        file_id: int,
+        content_hash: str,
+        prompt_version: str,
+        extract: Callable[[], Awaitable[Dict[str, Any]]],
+        cacheable: Callable[[Dict[str, Any]], bool],
+    ) -> Dict[str, Any]:
+        context = await extract()
+        if cacheable(context):
+            await self.put(key, file_id, content_hash, prompt_version, context)
+        return context
+
+    def _extraction_done(self, key: str, task: asyncio.Future) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Every caller may have gone away; mark the exception as retrieved
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "in_flight": len(self._in_flight),
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+        }
@@ -5,6 +5,9 @@ import logging
 from typing import Dict, List, Any, Optional
 from fastapi import HTTPException
 from app.core.database import get_connection
+from app.services.product_matcher import (
+    ProductMatcher, map_item_type_to_microproduct, parse_primary_list, parse_recommended_products_field
+)
 from app.services.pdf_generator import generate_presentation_pdf, generate_onepager_pdf
 from app.services.smartdrive_uploader import upload_file_to_smartdrive
 from app.services.nextcloud_share import create_public_download_link
@@ -89,11 +92,8 @@ async def export_course_outline_to_lms_format(
         if not row:
             raise HTTPException(status_code=404, detail="Course outline not found")
 
-        # Fetch all user's projects once for product resolution
-        all_projects = await connection.fetch(
-            "SELECT p.*, dt.microproduct_type, dt.component_name FROM projects p LEFT JOIN design_templates dt ON p.design_template_id = dt.id WHERE p.onyx_user_id = $1 ORDER BY p.created_at",
-            user_id
-        )
+    # Index the user's products once for product resolution (content is loaded per matched product)
+    matcher = await ProductMatcher.for_user(user_id, log_tag="[LMS-MATCH]")
 
     course_data = dict(row)
     outline_name = course_data.get('project_name')
@@ -127,280 +127,17 @@ async def export_course_outline_to_lms_format(
     sections = structure.get('sections') or []
     logger.info(f"[LMS] Outline parsed | sections={len(sections)} title='{main_title}'")
 
-    # NEW: Log a breakdown of available projects for matching
-    try:
-        _types_count: Dict[str, int] = {}
-        for p in all_projects:
-            t1 = (p.get('microproduct_type') or '').strip().lower()
-            t2 = (p.get('component_name') or '').strip().lower()
-            key = t1 or t2 or 'unknown'
-            _types_count[key] = _types_count.get(key, 0) + 1
-        logger.info(f"[LMS-MATCH] Projects available for user={user_id} | total={len(all_projects)} | by_type={_types_count}")
-        if all_projects:
-            sample = [
-                {
-                    'id': ap.get('id'),
-                    'project_name': ap.get('project_name'),
-                    'microproduct_name': ap.get('microproduct_name'),
-                    'microproduct_type': ap.get('microproduct_type'),
-                    'component_name': ap.get('component_name')
-                }
-                for ap in list(map(dict, all_projects))[:10]
-            ]
-            logger.info(f"[LMS-MATCH] Sample projects (up to 10): {sample}")
-    except Exception as _e:
-        logger.info(f"[LMS-MATCH] Failed to log project breakdown: {_e}")
-
-    def parse_primary_list(raw_primary) -> List[Dict[str, Any]]:
-        """Normalize primary into list of dicts with 'type'. Supports JSON strings."""
-        if raw_primary is None:
-            return []
-        # If already a list, coerce entries
-        if isinstance(raw_primary, list):
-            out: List[Dict[str, Any]] = []
-            for it in raw_primary:
-                if isinstance(it, dict):
-                    out.append(it)
-                elif isinstance(it, str):
-                    t = it.strip().strip('"').strip("'")
-                    out.append({"type": t})
-            return out
-        # If string, attempt json loads
-        if isinstance(raw_primary, str):
-            s = raw_primary.strip()
-            try:
-                if (s.startswith('[') and s.endswith(']')) or (s.startswith('{') and s.endswith('}')):
-                    parsed = json.loads(s)
-                    return parse_primary_list(parsed)
-            except Exception as e:
-                logger.info(f"[LMS] Failed JSON parse of primary string, fallback split. err={e}")
-            # Fallback: split by comma and strip brackets/quotes
-            s = s.strip('[]')
-            parts = [p.strip().strip('"').strip("'") for p in s.split(',') if p.strip()]
-            return [{"type": p} for p in parts if p]
-        # Unknown type -> empty
-        return []
-
-    def parse_recommended_products_field(value) -> List[str]:
-        if value is None:
-            return []
-        if isinstance(value, list):
-            return [str(v).strip().lower() for v in value if isinstance(v, (str,))]
-        if isinstance(value, str):
-            sv = value.strip()
-            try:
-                if sv.startswith('[') and sv.endswith(']'):
-                    arr = json.loads(sv)
-                    return [str(v).strip().lower() for v in arr if isinstance(v, (str,))]
-            except Exception as e:
-                logger.info(f"[LMS] Failed JSON parse of recommendedProducts, fallback split. err={e}")
-            sv = sv.strip('[]')
-            return [p.strip().strip('"').strip("'").lower() for p in sv.split(',') if p.strip()]
-        return []
-
-    def compute_candidate_score(proj: Dict[str, Any], outline_name: str, lesson_title: str, target_mtype: str) -> int:
-        score = 0
-        proj_name = (proj.get('project_name') or '').strip()
-        micro_name = (proj.get('microproduct_name') or '').strip() if proj.get('microproduct_name') else ''
-        mtype = (proj.get('microproduct_type') or '').strip()
-        if mtype != target_mtype:
-            return -1
-        # Strong matches
-        if lesson_title and proj_name == lesson_title:
-            score += 100
-        if lesson_title and proj_name.endswith(f": {lesson_title}"):
-            score += 95
-        if lesson_title and micro_name == lesson_title:
-            score += 90
-        if lesson_title and lesson_title in micro_name:
-            score += 80
-        # Outline-based matches (weaker)
-        if proj_name == outline_name and micro_name:
-            score += 40
-        if ': ' in proj_name and proj_name.split(': ')[0].strip() == outline_name:
-            score += 35
-        if proj_name.startswith('Quiz - ') and ': ' in proj_name:
-            quiz_part = proj_name.replace('Quiz - ', '', 1)
-            outline_part = quiz_part.split(': ')[0].strip()
-            if outline_part == outline_name:
-                score += 30
-        # Recency bonus
-        try:
-            if proj.get('created_at'):
-                score += 1
-        except Exception:
-            pass
-        logger.debug(f"[LMS-MATCH] score={score} for proj_id={proj.get('id')} name='{proj_name}' mtype='{mtype}' lesson='{lesson_title}'")
-        return score
+    logger.info(f"[LMS-MATCH] Projects available for user={user_id} | total={len(matcher.products)} | by_type={matcher.type_breakdown()}")
 
     # Remove scoring; implement deterministic matching and prevent duplicates
     used_product_ids: set = set()
 
-    def map_item_type_to_microproduct(item_type: str) -> Optional[List[str]]:
-        t = (item_type or '').strip().lower()
-        if t in ('presentation',):
-            return ['Slide Deck']
-        if t in ('one-pager', 'onepager'):
-            return ['One Pager', 'Text Presentation', 'PDF Lesson']
-        if t in ('quiz',):
-            return ['Quiz']
-        return None
-
     def normalize_item_type_output(item_type: str) -> str:
         t = (item_type or '').strip()
         if t == 'one-pager':
             return 'onepager'
         return t
 
-    def _type_aliases_for_group(group_type: str) -> List[str]:
-        g = (group_type or '').strip().lower()
-        if g == 'slide deck':
-            return ['slide deck', 'presentation', 'presentationdisplay', 'slidedeck']
-        if g == 'one pager':
-            return ['one pager', 'one-pager', 'onepager', 'text presentation', 'textpresentation', 'textpresentationdisplay', 'pdf lesson', 'pdflesson']
-        if g == 'text presentation':
-            return ['text presentation', 'textpresentation', 'textpresentationdisplay', 'one pager', 'one-pager', 'onepager']
-        if g == 'pdf lesson':
-            return ['pdf lesson', 'pdflesson', 'one pager', 'one-pager', 'onepager']
-        if g == 'quiz':
-            return ['quiz', 'quizdisplay']
-        return [g]
-
-    def project_type_matches(proj: Dict[str, Any], target_mtypes: List[str]) -> bool:
-        proj_types = [
-            (proj.get('microproduct_type') or '').strip().lower(),
-            (proj.get('component_name') or '').strip().lower(),
-        ]
-        aliases: List[str] = []
-        for t in target_mtypes or []:
-            aliases.extend(_type_aliases_for_group(t))
-        aliases_set = set(aliases)
-        result = any(pt in aliases_set for pt in proj_types if pt)
-        if result:
-            try:
-                logger.info(f"[LMS-MATCH] project_type_matches=True | proj_id={proj.get('id')} proj_types={proj_types} aliases={sorted(list(aliases_set))}")
-            except Exception:
-                pass
-        return result
-
-    # NEW: Fallback inference when no recommendations exist for a lesson
-    def infer_products_for_lesson(projects: List[Dict[str, Any]], outline_name: str, lesson_title: str, used_ids: set) -> List[Dict[str, Any]]:
-        matched: List[Dict[str, Any]] = []
-        if not lesson_title:
-            return matched
-        # Build expected names
-        base_name = f"{outline_name}: {lesson_title}"
-        prefixed_names = [
-            f"Presentation - {outline_name}: {lesson_title}",
-            f"Text Presentation - {outline_name}: {lesson_title}",
-            f"One Pager - {outline_name}: {lesson_title}",
-            f"PDF Lesson - {outline_name}: {lesson_title}",
-            f"Quiz - {outline_name}: {lesson_title}",
-        ]
-        for proj in projects:
-            pid = proj.get('id')
-            if pid in used_ids:
-                continue
-            pname = (proj.get('project_name') or '').strip()
-            mtype = (proj.get('microproduct_type') or '').strip().lower()
-            if not pname or mtype in ('training plan',):
-                continue
-            if pname == base_name or pname in prefixed_names:
-                matched.append(dict(proj))
-        logger.info(f"[LMS-MATCH] Inferred products for lesson='{lesson_title}': {[m.get('id') for m in matched]}")
-        return matched
-
-    def match_connected_product(projects: List[Dict[str, Any]], outline_name: str, lesson_title: str, desired_type: str) -> Optional[Dict[str, Any]]:
-        target_mtypes = map_item_type_to_microproduct(desired_type)
-        logger.info(f"[LMS-MATCH] desired_type='{desired_type}' -> target_mtypes='{target_mtypes}' lesson_title='{lesson_title}' outline='{outline_name}'")
-        if not target_mtypes or not lesson_title:
-            return None
-
-        def is_unused(proj_id: Any) -> bool:
-            return proj_id not in used_product_ids
-
-        def pname(proj: Dict[str, Any]) -> str:
-            return (proj.get('project_name') or '').strip()
-        def mname(proj: Dict[str, Any]) -> str:
-            return (proj.get('microproduct_name') or '').strip()
-
-        # NEW: Log candidate pool for this desired_type
-        try:
-            candidates = [
-                {
-                    'id': p.get('id'),
-                    'project_name': pname(p),
-                    'microproduct_name': mname(p),
-                    'types': [
-                        (p.get('microproduct_type') or '').strip().lower(),
-                        (p.get('component_name') or '').strip().lower()
-                    ],
-                    'used': not is_unused(p.get('id'))
-                }
-                for p in projects if project_type_matches(p, target_mtypes)
-            ]
-            logger.info(f"[LMS-MATCH] Candidate pool for desired_type='{desired_type}' lesson='{lesson_title}': {candidates}")
-        except Exception as _e:
-            logger.info(f"[LMS-MATCH] Failed to log candidate pool: {_e}")
-
-        # Pattern A (strongest): "Quiz - {outline}: {lesson}" for quizzes only
-        if 'Quiz' in (target_mtypes or []):
-            target_name = f"Quiz - {outline_name}: {lesson_title}"
-            for proj in projects:
-                if project_type_matches(proj, target_mtypes) and is_unused(proj.get('id')):
-                    if pname(proj) == target_name:
-                        logger.info(f"[LMS-MATCH] A quiz match -> id={proj.get('id')} name='{pname(proj)}'")
-                        return dict(proj)
-
-        # Pattern A2: type-prefixed names for other types
-        type_prefix_map = {
-            'Slide Deck': 'Presentation',
-            'One Pager': 'One Pager',
-            'Text Presentation': 'Text Presentation',
-            'PDF Lesson': 'PDF Lesson'
-        }
-        prefixes = [type_prefix_map[t] for t in (target_mtypes or []) if t in type_prefix_map]
-        if prefixes:
-            for pref in prefixes:
-                target_name_prefixed = f"{pref} - {outline_name}: {lesson_title}"
-                for proj in projects:
-                    if project_type_matches(proj, target_mtypes) and is_unused(proj.get('id')):
-                        if pname(proj) == target_name_prefixed:
-                            logger.info(f"[LMS-MATCH] A2 prefixed match -> id={proj.get('id')} name='{pname(proj)}'")
-                            return dict(proj)
-
-        # Pattern B: "{outline}: {lesson}"
-        target_name = f"{outline_name}: {lesson_title}"
-        for proj in projects:
-            if project_type_matches(proj, target_mtypes) and is_unused(proj.get('id')):
-                if pname(proj) == target_name:
-                    logger.info(f"[LMS-MATCH] B exact outline:lesson match -> id={proj.get('id')}")
-                    return dict(proj)
-
-        # Pattern C: microproduct_name equals lesson title
-        for proj in projects:
-            if project_type_matches(proj, target_mtypes) and is_unused(proj.get('id')):
-                if mname(proj) == lesson_title:
-                    logger.info(f"[LMS-MATCH] C microproduct_name match -> id={proj.get('id')}")
-                    return dict(proj)
-
-        # Pattern E (legacy): project_name == outline_name AND microproduct_name == lesson title
-        for proj in projects:
-            if project_type_matches(proj, target_mtypes) and is_unused(proj.get('id')):
-                if pname(proj) == outline_name and mname(proj) == lesson_title:
-                    logger.info(f"[LMS-MATCH] E outline+micro_name match -> id={proj.get('id')}")
-                    return dict(proj)
-
-        # Pattern D: project_name equals lesson title
-        for proj in projects:
-            if project_type_matches(proj, target_mtypes) and is_unused(proj.get('id')):
-                if pname(proj) == lesson_title:
-                    logger.info(f"[LMS-MATCH] D project_name match -> id={proj.get('id')}")
-                    return dict(proj)
-
-        logger.info(f"[LMS-MATCH] No deterministic match for lesson='{lesson_title}' type='{desired_type}' | used_ids={list(used_product_ids)}")
-        return None
-
     def normalize_public_link(url: Optional[str]) -> Optional[str]:
         if not url:
             return url
@@ -451,7 +188,7 @@ async def export_course_outline_to_lms_format(
 
                 # NEW: If still no primary, infer products by name patterns
                 if not primary:
-                    inferred = infer_products_for_lesson([dict(p) for p in all_projects], outline_name, lesson_title, used_product_ids)
+                    inferred = matcher.infer(outline_name, lesson_title, used_product_ids)
                     if inferred:
                         inferred_items: List[Dict[str, Any]] = []
                         for inf in inferred:
@@ -480,7 +217,7 @@ async def export_course_outline_to_lms_format(
                         item['uid'] = item.get('uid') or str(uuid.uuid4())
                         new_primary.append(item)
                         continue
-                    matched = match_connected_product([dict(p) for p in all_projects], outline_name, lesson_title, item_type_raw)
+                    matched = matcher.match(outline_name, lesson_title, item_type_raw, used_product_ids)
                     logger.info(f"[LMS] Match result for lesson='{lesson_title}' type='{item_type_raw}' => matched_id={getattr(matched,'get',lambda x:None)('id') if matched else None}")
                     if not matched:
                         logger.info(f"[LMS] No product found for lesson='{lesson_title}' type='{item_type_raw}', removing from recommendations")
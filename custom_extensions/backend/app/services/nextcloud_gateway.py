@@ -0,0 +1,415 @@
+# custom_extensions/backend/app/services/nextcloud_gateway.py
+import asyncio
+import logging
+import os
+import time
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from dataclasses import dataclass
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, unquote, urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Decrypted credentials are reused for this long (and dropped earlier when the account changes)
+SMARTDRIVE_CREDENTIALS_TTL_SECONDS = float(os.getenv("SMARTDRIVE_CREDENTIALS_TTL_SECONDS", "300"))
+# A cached listing younger than this is served without asking Nextcloud at all;
+# older ones are revalidated with a Depth 0 PROPFIND on the folder's etag
+SMARTDRIVE_LISTING_FRESH_SECONDS = float(os.getenv("SMARTDRIVE_LISTING_FRESH_SECONDS", "5"))
+SMARTDRIVE_LISTING_CACHE_MAX_ENTRIES = int(os.getenv("SMARTDRIVE_LISTING_CACHE_MAX_ENTRIES", "5000"))
+SMARTDRIVE_DAV_MAX_CONNECTIONS = int(os.getenv("SMARTDRIVE_DAV_MAX_CONNECTIONS", "32"))
+SMARTDRIVE_DAV_KEEPALIVE_SECONDS = 60.0
+
+DAV_FILES_PREFIX = "/remote.php/dav/files/"
+
+PROPFIND_LISTING_BODY = """<?xml version="1.0"?>
+<d:propfind xmlns:d="DAV:" xmlns:oc="http://owncloud.org/ns">
+    <d:prop>
+        <d:resourcetype/>
+        <d:getcontentlength/>
+        <d:getlastmodified/>
+        <d:getcontenttype/>
+        <d:getetag/>
+        <oc:checksums/>
+    </d:prop>
+</d:propfind>"""
+
+PROPFIND_ETAG_BODY = """<?xml version="1.0"?>
+<d:propfind xmlns:d="DAV:"><d:prop><d:getetag/></d:prop></d:propfind>"""
+
+
+@dataclass(frozen=True)
+class NextcloudCredentials:
+    username: str
+    password: str
+    base_url: str
+    user_root_prefix: str = ""
+
+    @property
+    def auth(self) -> Tuple[str, str]:
+        return (self.username, self.password)
+
+    @property
+    def webdav_base(self) -> str:
+        return f"{self.base_url}{DAV_FILES_PREFIX}{self.username}"
+
+
+class WebDAVError(Exception):
+    def __init__(self, status_code: int, text: str = ""):
+        super().__init__(f"WebDAV error {status_code}: {text[:400]}")
+        self.status_code = status_code
+        self.text = text
+
+
+def encode_dav_path(path: str) -> str:
+    """Percent-encode each path segment for WebDAV URLs, preserving slashes.
+    Ensures leading/trailing slash semantics are kept.
+    """
+    if path is None:
+        return "/"
+    is_abs = path.startswith("/")
+    is_dir = path.endswith("/")
+    parts = [seg for seg in path.split("/") if seg != ""]
+    encoded = "/".join(quote(seg, safe="") for seg in parts)
+    return ("/" if is_abs else "") + encoded + ("/" if is_dir and encoded else "")
+
+
+def _cache_path(path: str) -> str:
+    """Listing cache key for a folder: decoded, leading slash, no trailing slash."""
+    stripped = "/".join(seg for seg in (path or "/").split("/") if seg)
+    return "/" + stripped
+
+
+def _relative_path(href: str) -> str:
+    # href looks like: /smartdrive/remote.php/dav/files/username/Documents/file.txt
+    # We want just: /Documents/file.txt
+    if DAV_FILES_PREFIX not in href:
+        return unquote(href)
+    username_and_path = href.split(DAV_FILES_PREFIX, 1)[1]
+    path_parts = username_and_path.split("/", 1)
+    return unquote("/" + path_parts[1]) if len(path_parts) > 1 else "/"
+
+
+def _text(elem: ET.Element, tag: str) -> Optional[str]:
+    found = elem.find(f".//{{DAV:}}{tag}")
+    return found.text if found is not None else None
+
+
+def _entry(response: ET.Element) -> Optional[Dict[str, Any]]:
+    """One <d:response> as a listing entry (same shape the SmartDrive API always returned)."""
+    href = _text(response, "href")
+    if not href or href.endswith(DAV_FILES_PREFIX):
+        return None
+    relative_path = _relative_path(href)
+    name = relative_path.split("/")[-1] if not relative_path.endswith("/") else relative_path.split("/")[-2]
+    resourcetype = response.find(".//{DAV:}resourcetype")
+    size = _text(response, "getcontentlength")
+    etag = _text(response, "getetag")
+    if etag and etag.startswith('"') and etag.endswith('"'):
+        etag = etag[1:-1]
+    # e.g. "SHA1:... MD5:..."; only present when Nextcloud computed checksums for the file
+    checksum = response.find(".//{http://owncloud.org/ns}checksum")
+    return {
+        "name": name,
+        "path": relative_path,
+        "type": "directory" if resourcetype is not None and resourcetype.find(".//{DAV:}collection") is not None else "file",
+        "size": int(size) if size else None,
+        "modified": _text(response, "getlastmodified"),
+        "mime_type": _text(response, "getcontenttype"),
+        "etag": etag,
+        "checksum": checksum.text if checksum is not None and checksum.text else None,
+    }
+
+
+class MultiStatusParser:
+    """
+    Incremental parser for a PROPFIND 207 body.
+
+    Fed chunk by chunk as the response streams in; every <d:response> is turned
+    into an entry and cleared as soon as it ends, so a large folder is never
+    held as one document tree. The entry of the requested folder itself (if
+    any) is remembered as `folder`, its etag doubles as the folder's ctag:
+    Nextcloud changes a folder's etag whenever anything below it changes.
+    """
+
+    def __init__(self, folder_path: Optional[str] = None):
+        self._parser = ET.XMLPullParser(events=("end",))
+        self._folder_key = _cache_path(folder_path) if folder_path is not None else None
+        self.files: List[Dict[str, Any]] = []
+        self.folder: Optional[Dict[str, Any]] = None
+
+    def feed(self, data) -> None:
+        self._parser.feed(data)
+        self._drain()
+
+    def close(self) -> None:
+        self._parser.close()
+        self._drain()
+
+    def _drain(self) -> None:
+        for _, elem in self._parser.read_events():
+            if elem.tag != "{DAV:}response":
+                continue
+            entry = _entry(elem)
+            elem.clear()
+            if entry is None:
+                continue
+            if self._folder_key is not None and self.folder is None and _cache_path(entry["path"]) == self._folder_key:
+                self.folder = entry
+            if entry["name"]:
+                self.files.append(entry)
+
+
+@dataclass
+class _Listing:
+    etag: Optional[str]
+    files: List[Dict[str, Any]]
+    checked_at: float
+
+
+class NextcloudGateway:
+    """
+    Shared access to the users' Nextcloud (WebDAV) accounts:
+
+    - one keep-alive `httpx.AsyncClient` per base URL instead of a client
+      (and a TLS handshake) per request;
+    - decrypted credentials cached per Onyx user for SMARTDRIVE_CREDENTIALS_TTL_SECONDS;
+    - folder listings cached per Nextcloud user and folder, validated by the
+      folder's etag. Our own mutations and the Nextcloud webhook invalidate
+      the affected folders; anything else is caught by the etag check.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._credentials: Dict[str, Tuple[float, NextcloudCredentials]] = {}
+        self._credential_loads: Dict[str, asyncio.Future] = {}
+        self._listings: "OrderedDict[Tuple[str, str], _Listing]" = OrderedDict()
+        # Bumped on every invalidation, so a PROPFIND that raced a mutation is not cached
+        self._generations: Dict[str, int] = {}
+        self.listing_hits = 0
+        self.listing_revalidated = 0
+        self.listing_misses = 0
+
+    # --- connections ---
+
+    def client(self, base_url: str) -> httpx.AsyncClient:
+        """Pooled client for the scheme+host of `base_url`; pass per-request timeouts as needed."""
+        parts = urlsplit(base_url)
+        key = f"{parts.scheme}://{parts.netloc}"
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(60.0, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=SMARTDRIVE_DAV_MAX_CONNECTIONS,
+                    max_keepalive_connections=SMARTDRIVE_DAV_MAX_CONNECTIONS,
+                    keepalive_expiry=SMARTDRIVE_DAV_KEEPALIVE_SECONDS,
+                ),
+                # Shared by every user: never keep cookies a response sets
+                cookies=httpx.Cookies(CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))),
+            )
+            self._clients[key] = client
+        return client
+
+    async def aclose(self) -> None:
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.aclose()
+
+    # --- credentials ---
+
+    async def credentials(self, onyx_user_id: str, load: Callable[[], Awaitable[NextcloudCredentials]]) -> NextcloudCredentials:
+        """Cached credentials of the user, or `load()` them (once across concurrent callers)."""
+        key = str(onyx_user_id)
+        cached = self._credentials.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        pending = self._credential_loads.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        pending = asyncio.get_running_loop().create_future()
+        self._credential_loads[key] = pending
+        try:
+            creds = await load()
+            self._credentials[key] = (time.monotonic() + SMARTDRIVE_CREDENTIALS_TTL_SECONDS, creds)
+            pending.set_result(creds)
+            return creds
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            # Nobody may be waiting; mark the exception as retrieved
+            pending.exception()
+            raise
+        finally:
+            self._credential_loads.pop(key, None)
+
+    def invalidate_credentials(self, onyx_user_id: str) -> None:
+        """Forget a user's credentials (and their listings), e.g. after a password change."""
+        cached = self._credentials.pop(str(onyx_user_id), None)
+        if cached is not None:
+            self.invalidate_listings(cached[1].username)
+
+    # --- listings ---
+
+    async def _propfind(self, creds: NextcloudCredentials, dav_path: str, depth: str, body: str) -> MultiStatusParser:
+        url = f"{creds.webdav_base}{encode_dav_path(dav_path)}"
+        parser = MultiStatusParser(dav_path)
+        async with self.client(creds.base_url).stream(
+            "PROPFIND",
+            url,
+            auth=creds.auth,
+            headers={"Depth": depth, "Content-Type": "application/xml"},
+            content=body,
+        ) as response:
+            if response.status_code != 207:
+                await response.aread()
+                if response.status_code == 401:
+                    # The password may have been reset elsewhere; reload it next time
+                    for key, (_, cached) in list(self._credentials.items()):
+                        if cached.username == creds.username:
+                            self._credentials.pop(key, None)
+                raise WebDAVError(response.status_code, response.text)
+            async for chunk in response.aiter_bytes():
+                parser.feed(chunk)
+        parser.close()
+        return parser
+
+    def _remember(self, key: Tuple[str, str], listing: _Listing) -> None:
+        self._listings[key] = listing
+        self._listings.move_to_end(key)
+        while len(self._listings) > SMARTDRIVE_LISTING_CACHE_MAX_ENTRIES:
+            self._listings.popitem(last=False)
+
+    async def list_directory(
+        self,
+        creds: NextcloudCredentials,
+        path: str,
+        known_etag: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Entries of a folder (Depth 1), from the cache when its etag still matches.
+        `known_etag` is the folder's etag as seen in its parent listing; when it
+        matches the cached one no request is made at all.
+        Raises WebDAVError when Nextcloud does not answer 207.
+        """
+        dav_path = creds.user_root_prefix + path
+        key = (creds.username, _cache_path(dav_path))
+        cached = self._listings.get(key)
+        now = time.monotonic()
+        if cached is not None:
+            if (known_etag is not None and known_etag == cached.etag) or now - cached.checked_at < SMARTDRIVE_LISTING_FRESH_SECONDS:
+                self._listings.move_to_end(key)
+                self.listing_hits += 1
+                return cached.files
+            if cached.etag is not None:
+                head = await self._propfind(creds, dav_path, "0", PROPFIND_ETAG_BODY)
+                if head.folder is not None and head.folder.get("etag") == cached.etag:
+                    cached.checked_at = now
+                    self._listings.move_to_end(key)
+                    self.listing_revalidated += 1
+                    return cached.files
+
+        self.listing_misses += 1
+        generation = self._generations.get(creds.username, 0)
+        parsed = await self._propfind(creds, dav_path, "1", PROPFIND_LISTING_BODY)
+        etag = parsed.folder.get("etag") if parsed.folder is not None else None
+        if self._generations.get(creds.username, 0) == generation:
+            self._remember(key, _Listing(etag=etag, files=parsed.files, checked_at=time.monotonic()))
+        return parsed.files
+
+    async def walk(self, creds: NextcloudCredentials, path: str = "/", max_depth: int = 10) -> List[Dict[str, Any]]:
+        """
+        Every entry below `path`, folder by folder. A subfolder whose etag in its
+        parent's listing equals the cached one is unchanged, so it is served from
+        the cache without a request.
+        """
+        all_files: List[Dict[str, Any]] = []
+        visited = set()
+
+        async def traverse(folder: str, depth: int, known_etag: Optional[str]) -> None:
+            if depth > max_depth:
+                logger.warning(f"[SmartDrive] Max recursion depth reached for path: {folder}")
+                return
+            if _cache_path(folder) in visited:
+                return
+            visited.add(_cache_path(folder))
+            try:
+                files = await self.list_directory(creds, folder, known_etag=known_etag)
+            except WebDAVError as e:
+                logger.warning(f"[SmartDrive] PROPFIND {folder} failed: {e}")
+                return
+            for entry in files:
+                if _cache_path(entry["path"]) == _cache_path(folder):
+                    continue  # the folder itself
+                all_files.append(entry)
+                if entry["type"] == "directory":
+                    await traverse(entry["path"], depth + 1, entry.get("etag"))
+
+        await traverse(path, 0, None)
+        return all_files
+
+    def invalidate_listings(self, username: str, paths: Optional[Iterable[str]] = None) -> None:
+        """
+        Drop cached listings of a Nextcloud user: for each path the folder
+        itself, everything below it and every ancestor (their sizes and etags
+        change too); all of the user's folders when `paths` is None.
+        """
+        self._generations[username] = self._generations.get(username, 0) + 1
+        if paths is None:
+            stale = [key for key in self._listings if key[0] == username]
+        else:
+            targets = [_cache_path(p) for p in paths]
+            affected = set()
+            for target in targets:
+                parts = [seg for seg in target.split("/") if seg]
+                affected.update("/" + "/".join(parts[:i]) for i in range(len(parts) + 1))
+            stale = [
+                key for key in self._listings
+                if key[0] == username and (
+                    key[1] in affected or any(key[1].startswith(t.rstrip("/") + "/") for t in targets)
+                )
+            ]
+        for key in stale:
+            self._listings.pop(key, None)
+
+    def invalidate_from_webhook(self, payload: Dict[str, Any]) -> Optional[str]:
+        """
+        Drop listings touched by a Nextcloud webhook_listeners event; returns the
+        Nextcloud user it applied to. Node paths look like "/<uid>/files/<path>";
+        rename/copy events carry "source" and "target" nodes. Without a usable
+        path every listing of the user is dropped.
+        """
+        user = payload.get("user")
+        username = (user.get("uid") if isinstance(user, dict) else None) or payload.get("userId") or payload.get("uid")
+        if not username:
+            return None
+        event = payload.get("event") if isinstance(payload.get("event"), dict) else {}
+        paths: List[str] = []
+        for field in ("node", "source", "target"):
+            node = event.get(field)
+            node_path = node.get("path") if isinstance(node, dict) else None
+            if not node_path:
+                continue
+            prefix = f"/{username}/files"
+            if node_path.startswith(prefix):
+                paths.append(node_path[len(prefix):] or "/")
+        self.invalidate_listings(username, paths or None)
+        return username
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.listing_hits + self.listing_revalidated + self.listing_misses
+        return {
+            "clients": len(self._clients),
+            "credentials": len(self._credentials),
+            "listings": len(self._listings),
+            "listing_hits": self.listing_hits,
+            "listing_revalidated": self.listing_revalidated,
+            "listing_misses": self.listing_misses,
+            "hit_ratio": round((self.listing_hits + self.listing_revalidated) / lookups, 3) if lookups else None,
+        }
@@ -3,6 +3,7 @@ import httpx
 import os
 import xml.etree.ElementTree as ET
 import logging
+from typing import Optional, Tuple
 from fastapi import HTTPException
 from app.core.database import get_connection
 from app.utils.encryption import decrypt_password
@@ -13,9 +14,14 @@ logger = logging.getLogger(__name__)
 async def create_public_download_link(
     user_id: str,
     file_path: str,
-    expiry_days: int = None
+    expiry_days: int = None,
+    credentials: Optional[Tuple[str, str, str]] = None,
+    client: Optional[httpx.AsyncClient] = None,
 ) -> str:
-    """Create public download link via Nextcloud OCS API"""
+    """Create public download link via Nextcloud OCS API.
+    `credentials` (username, password, base_url) and a pooled `client` may be
+    passed by callers that already have them; otherwise both are set up here.
+    """
 
     logger.info(f"[OCS] Create public link start | user={user_id} path={file_path} expiry_days={expiry_days}")
 
@@ -25,18 +31,21 @@ async def create_public_download_link(
         except Exception:
             expiry_days = 365
 
-    async with get_connection() as connection:
-        account = await connection.fetchrow(
-            "SELECT * FROM smartdrive_accounts WHERE onyx_user_id = $1",
-            user_id
-        )
-        if not account or not account.get("nextcloud_username"):
-            logger.error("[OCS] Account not configured for user")
-            raise HTTPException(status_code=400, detail="SmartDrive not configured")
-
-        nextcloud_username = account["nextcloud_username"]
-        nextcloud_password = decrypt_password(account["nextcloud_password_encrypted"]) if account.get("nextcloud_password_encrypted") else None
-        nextcloud_base_url = account.get("nextcloud_base_url") or 'http://nc1.contentbuilder.ai:8080'
+    if credentials is not None:
+        nextcloud_username, nextcloud_password, nextcloud_base_url = credentials
+    else:
+        async with get_connection() as connection:
+            account = await connection.fetchrow(
+                "SELECT * FROM smartdrive_accounts WHERE onyx_user_id = $1",
+                user_id
+            )
+            if not account or not account.get("nextcloud_username"):
+                logger.error("[OCS] Account not configured for user")
+                raise HTTPException(status_code=400, detail="SmartDrive not configured")
+
+            nextcloud_username = account["nextcloud_username"]
+            nextcloud_password = decrypt_password(account["nextcloud_password_encrypted"]) if account.get("nextcloud_password_encrypted") else None
+            nextcloud_base_url = account.get("nextcloud_base_url") or 'http://nc1.contentbuilder.ai:8080'
 
     if not nextcloud_password:
         logger.error("[OCS] Missing password for user account")
@@ -55,36 +64,43 @@ async def create_public_download_link(
     }
     logger.info(f"[OCS] POST {ocs_url} data={data}")
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(
-            ocs_url,
-            data=data,
-            auth=(nextcloud_username, nextcloud_password),
-            headers={'OCS-APIRequest': 'true', 'Accept': 'application/xml'}
-        )
-        logger.info(f"[OCS] POST status={response.status_code}")
-
-        if response.status_code != 200:
-            snippet = response.text[:400] if hasattr(response, 'text') else ''
-            logger.error(f"[OCS] Failed to create public link | status={response.status_code} body={snippet}")
-            raise HTTPException(status_code=500, detail="Failed to create public link")
-
-        try:
-            root = ET.fromstring(response.content)
-            url_element = root.find('.//url')
-            logger.info(f"[OCS] XML parsed | url_found={url_element is not None}")
-        except Exception as parse_err:
-            logger.error(f"[OCS] XML parse error: {parse_err}")
-            raise HTTPException(status_code=500, detail="Could not parse OCS response")
-
-        if url_element is not None and url_element.text:
-            share_url = url_element.text
-            token = share_url.rstrip('/').split('/')[-1]
-            public_domain = os.environ.get("NEXTCLOUD_PUBLIC_SHARE_DOMAIN")
-            base_for_public = public_domain if public_domain else nextcloud_base_url
-            download_url = f"{base_for_public}/index.php/s/{token}/download"
-            logger.info(f"[OCS] Public link created | token={token} url={download_url}")
-            return download_url
-
-        logger.error("[OCS] Could not extract share URL from response")
-        raise HTTPException(status_code=500, detail="Could not extract share URL") 
\ No newline at end of file
+    if client is None:
+        async with httpx.AsyncClient(timeout=30.0) as own_client:
+            return await _create_share(own_client, ocs_url, data, nextcloud_username, nextcloud_password, nextcloud_base_url)
+    return await _create_share(client, ocs_url, data, nextcloud_username, nextcloud_password, nextcloud_base_url)
+
+
+async def _create_share(client: httpx.AsyncClient, ocs_url: str, data: dict, nextcloud_username: str, nextcloud_password: str, nextcloud_base_url: str) -> str:
+    response = await client.post(
+        ocs_url,
+        data=data,
+        auth=(nextcloud_username, nextcloud_password),
+        headers={'OCS-APIRequest': 'true', 'Accept': 'application/xml'},
+        timeout=30.0,
+    )
+    logger.info(f"[OCS] POST status={response.status_code}")
+
+    if response.status_code != 200:
+        snippet = response.text[:400] if hasattr(response, 'text') else ''
+        logger.error(f"[OCS] Failed to create public link | status={response.status_code} body={snippet}")
+        raise HTTPException(status_code=500, detail="Failed to create public link")
+
+    try:
+        root = ET.fromstring(response.content)
+        url_element = root.find('.//url')
+        logger.info(f"[OCS] XML parsed | url_found={url_element is not None}")
+    except Exception as parse_err:
+        logger.error(f"[OCS] XML parse error: {parse_err}")
+        raise HTTPException(status_code=500, detail="Could not parse OCS response")
+
+    if url_element is not None and url_element.text:
+        share_url = url_element.text
+        token = share_url.rstrip('/').split('/')[-1]
+        public_domain = os.environ.get("NEXTCLOUD_PUBLIC_SHARE_DOMAIN")
+        base_for_public = public_domain if public_domain else nextcloud_base_url
+        download_url = f"{base_for_public}/index.php/s/{token}/download"
+        logger.info(f"[OCS] Public link created | token={token} url={download_url}")
+        return download_url
+
+    logger.error("[OCS] Could not extract share URL from response")
+    raise HTTPException(status_code=500, detail="Could not extract share URL") 
\ No newline at end of file
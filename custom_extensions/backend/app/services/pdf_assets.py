@@ -0,0 +1,142 @@
+# custom_extensions/backend/app/services/pdf_assets.py
+import base64
+import logging
+import mimetypes
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Fonts every slide template uses: (file under static/fonts, CSS family, weight, local() fallback)
+EMBEDDED_FONTS = (
+    ("fonnts.com-Mont_Regular.ttf", "Mont Regular", 400, "local('Arial'), local('Helvetica')"),
+    ("fonnts.com-Mont_Bold.ttf", "Mont Bold", 700, "local('Arial Bold'), local('Helvetica Bold')"),
+)
+LARGE_ASSET_BYTES = 1024 * 1024
+
+
+class _Asset:
+    __slots__ = ("signature", "data", "mime_type", "_data_url")
+
+    def __init__(self, signature: Tuple[int, int], data: bytes, mime_type: str):
+        self.signature = signature
+        self.data = data
+        self.mime_type = mime_type
+        self._data_url: Optional[str] = None
+
+    @property
+    def data_url(self) -> str:
+        if self._data_url is None:
+            self._data_url = f"data:{self.mime_type};base64,{base64.b64encode(self.data).decode('utf-8')}"
+        return self._data_url
+
+
+class PdfAssetRegistry:
+    """
+    Fonts and static images used by the PDF templates, read from `static_dir`
+    once and memoized by path, size and mtime (so a replaced file is picked up
+    without a restart). Also keeps the prebuilt @font-face CSS blobs.
+    """
+
+    def __init__(self, static_dir: str):
+        self.static_dir = static_dir
+        self._assets: Dict[str, _Asset] = {}
+        self._fonts_css: Dict[Optional[str], Tuple[tuple, str]] = {}
+        self._lock = threading.Lock()
+
+        self.loads = 0
+        self.hits = 0
+
+    def _resolve(self, relative_path: str) -> Optional[str]:
+        path = os.path.normpath(os.path.join(self.static_dir, relative_path))
+        if os.path.commonpath([path, os.path.normpath(self.static_dir)]) != os.path.normpath(self.static_dir):
+            return None
+        return path
+
+    def get(self, relative_path: str, mime_type: Optional[str] = None) -> Optional[_Asset]:
+        """The asset at `relative_path` under the static dir, or None if it does not exist."""
+        path = self._resolve(relative_path)
+        if path is None:
+            logger.warning(f"[PDF_ASSETS] Refusing path outside static dir: {relative_path}")
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        signature = (stat.st_size, stat.st_mtime_ns)
+
+        asset = self._assets.get(path)
+        if asset is not None and asset.signature == signature:
+            self.hits += 1
+            return asset
+
+        with self._lock:
+            asset = self._assets.get(path)
+            if asset is not None and asset.signature == signature:
+                self.hits += 1
+                return asset
+            try:
+                with open(path, "rb") as asset_file:
+                    data = asset_file.read()
+            except OSError as e:
+                logger.error(f"[PDF_ASSETS] Failed to read {path}: {e}")
+                return None
+            if len(data) > LARGE_ASSET_BYTES:
+                logger.warning(f"[PDF_ASSETS] {relative_path} is large ({len(data)} bytes), this may impact PDF generation performance")
+            if mime_type is None:
+                mime_type, _ = mimetypes.guess_type(path)
+            asset = _Asset(signature, data, mime_type or "application/octet-stream")
+            self._assets[path] = asset
+            self.loads += 1
+            logger.info(f"[PDF_ASSETS] Loaded {relative_path} ({len(data)} bytes)")
+            return asset
+
+    def data_url(self, relative_path: str, mime_type: Optional[str] = None) -> str:
+        """base64 data URL for an asset, or "" if it does not exist."""
+        asset = self.get(relative_path, mime_type)
+        return asset.data_url if asset is not None else ""
+
+    def font_data_url(self, font_filename: str) -> str:
+        return self.data_url(os.path.join("fonts", font_filename), "font/truetype")
+
+    def fonts_css(self, url_prefix: Optional[str] = None) -> str:
+        """
+        @font-face CSS for EMBEDDED_FONTS. Fonts are inlined as data URLs unless
+        `url_prefix` is given, in which case they reference `{url_prefix}fonts/<file>`
+        (served from this registry by the browser pool's request interception).
+        Rebuilt only when a font file changes.
+        """
+        font_assets = [self.get(os.path.join("fonts", filename), "font/truetype") for filename, _, _, _ in EMBEDDED_FONTS]
+        signature = tuple(asset.signature if asset is not None else None for asset in font_assets)
+        cached = self._fonts_css.get(url_prefix)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        css = ""
+        for (filename, family, weight, fallback), asset in zip(EMBEDDED_FONTS, font_assets):
+            if asset is not None:
+                url = f"{url_prefix}fonts/{filename}" if url_prefix else asset.data_url
+                src = f"url('{url}') format('truetype')"
+            else:
+                logger.warning(f"[PDF_ASSETS] Font {filename} not found, using fallback for {family}")
+                src = fallback
+            css += f"""
+        @font-face {{
+          font-family: '{family}';
+          src: {src};
+          font-weight: {weight};
+          font-style: normal;
+          font-display: block;
+        }}
+        """
+        self._fonts_css[url_prefix] = (signature, css)
+        return css
+
+    def stats(self) -> dict:
+        return {
+            "assets": len(self._assets),
+            "bytes": sum(len(asset.data) for asset in self._assets.values()),
+            "loads": self.loads,
+            "hits": self.hits,
+        }
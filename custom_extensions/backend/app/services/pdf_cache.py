@@ -0,0 +1,218 @@
+# custom_extensions/backend/app/services/pdf_cache.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump when the rendering pipeline changes in a way the inputs below do not capture.
+PDF_CACHE_FORMAT_VERSION = "1"
+# Temp files older than this were left behind by a crashed render.
+STALE_TEMP_FILE_SECONDS = 3600
+
+
+def files_fingerprint(directories: Iterable[str]) -> str:
+    """Hash of (relative path, size, mtime) for every file under the given directories."""
+    digest = hashlib.sha256()
+    for directory in directories:
+        if not directory or not os.path.isdir(directory):
+            continue
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(files):
+                full_path = os.path.join(root, name)
+                try:
+                    stat = os.stat(full_path)
+                except OSError:
+                    continue
+                rel_path = os.path.relpath(full_path, directory)
+                digest.update(f"{rel_path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def content_key(
+    kind: str,
+    inputs: dict,
+    dependency_dirs: Iterable[str] = (),
+    dependency_fingerprint: Optional[str] = None,
+) -> str:
+    """
+    Cache key for a rendered document: hashes the render inputs (slide JSON,
+    theme, template version, ...) together with the template/font files they
+    are rendered with, so editing either produces a new key. Pass a
+    precomputed `dependency_fingerprint` when keying many documents at once.
+    """
+    if dependency_fingerprint is None:
+        dependency_fingerprint = files_fingerprint(dependency_dirs)
+    digest = hashlib.sha256()
+    digest.update(f"{PDF_CACHE_FORMAT_VERSION}\0{kind}\0".encode("utf-8"))
+    digest.update(json.dumps(inputs, sort_keys=True, default=str, ensure_ascii=False).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(dependency_fingerprint.encode("utf-8"))
+    return f"{kind}-{digest.hexdigest()[:40]}"
+
+
+class PdfCache:
+    """
+    Content-addressed, size-bounded PDF cache on local disk.
+
+    Entries are written to a temp file and renamed into place, so readers never
+    see a partial PDF, and concurrent requests for the same key share a single
+    render. Recency is tracked through file mtimes (touched on every hit) and
+    the least recently used PDFs are evicted once the directory exceeds
+    `max_bytes`. Eviction also covers PDFs written to the directory by other
+    code paths under their own filenames.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def path_for(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.pdf"
+
+    def temp_path_for(self, name: str) -> Path:
+        """A temp path inside the cache dir (same filesystem, so the final rename is atomic)."""
+        return self.cache_dir / f".{name}.{uuid.uuid4().hex[:8]}.tmp"
+
+    def _touch(self, key: str) -> Optional[Path]:
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Return the cached PDF for `key` (marking it recently used), or None."""
+        path = self._touch(key)
+        if path is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return path
+
+    async def get_or_render(self, key: str, render: Callable[[Path], Awaitable[None]]) -> Path:
+        """
+        Return the cached PDF for `key`, rendering it with `render(temp_path)` on a miss.
+        `render` must write the complete PDF to the path it is given.
+        """
+        cached = self._touch(key)
+        if cached is not None:
+            self.hits += 1
+            logger.info(f"[PDF_CACHE] Hit {key}")
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            logger.info(f"[PDF_CACHE] Waiting on in-flight render of {key}")
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        logger.info(f"[PDF_CACHE] Miss {key}, rendering")
+        task = asyncio.ensure_future(self._render_into_cache(key, render))
+        self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _render_into_cache(self, key: str, render: Callable[[Path], Awaitable[None]]) -> Path:
+        final_path = self.path_for(key)
+        temp_path = self.temp_path_for(key)
+        try:
+            await render(temp_path)
+            if not temp_path.exists():
+                raise RuntimeError(f"Renderer did not produce {temp_path}")
+            os.replace(temp_path, final_path)
+        finally:
+            self._inflight.pop(key, None)
+            try:
+                if temp_path.exists():
+                    temp_path.unlink()
+            except OSError:
+                pass
+        self.evict()
+        return final_path
+
+    def store(self, key: str, source_path: Path) -> Path:
+        """Atomically move an already rendered PDF into the cache as the entry for `key`."""
+        final_path = self.path_for(key)
+        os.replace(source_path, final_path)
+        self.evict()
+        return final_path
+
+    def store_file(self, source_path: Path, filename: str) -> Path:
+        """Atomically move an already rendered file into the cache dir under `filename`."""
+        final_path = self.cache_dir / filename
+        os.replace(source_path, final_path)
+        self.evict()
+        return final_path
+
+    def evict(self) -> None:
+        """Delete least recently used PDFs until the directory fits in `max_bytes`."""
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if not entry.is_file():
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    if entry.name.endswith(".tmp"):
+                        if time.time() - stat.st_mtime > STALE_TEMP_FILE_SECONDS:
+                            try:
+                                os.remove(entry.path)
+                            except OSError:
+                                pass
+                        continue
+                    if not entry.name.endswith(".pdf"):
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        except OSError as e:
+            logger.warning(f"[PDF_CACHE] Could not scan {self.cache_dir}: {e}")
+            return
+
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+            self.evicted_bytes += size
+        logger.info(f"[PDF_CACHE] Evicted down to {total} bytes ({self.evictions} evictions so far)")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "evicted_bytes": self.evicted_bytes,
+            "inflight": len(self._inflight),
+            "max_bytes": self.max_bytes,
+        }
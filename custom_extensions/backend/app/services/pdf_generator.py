@@ -16,7 +16,13 @@ from datetime import datetime
 import base64
 import mimetypes
 import math
-from typing import AsyncGenerator, Optional
+import io
+from collections import OrderedDict
+from typing import AsyncGenerator, Callable, List, Optional
+
+from app.services.browser_pool import BrowserPool
+from app.services.pdf_assets import PdfAssetRegistry
+from app.services.pdf_cache import PdfCache, content_key, files_fingerprint
 
 # Import pie chart generators
 try:
@@ -33,6 +39,7 @@ except ImportError:
     logger.warning("CSS pie chart generator not available")
 import functools
 import re
+import weakref
 
 # Attempt to import settings (as before)
 try:
@@ -68,6 +75,14 @@ image_fit_logger.setLevel(logging.INFO)
 
 PDF_CACHE_DIR = Path("/tmp/pdf_cache")
 PDF_CACHE_DIR.mkdir(exist_ok=True)
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+PDF_CACHE = PdfCache(PDF_CACHE_DIR, max_bytes=PDF_CACHE_MAX_BYTES)
+# Per-slide PDF fragments, merged into decks so an edit only re-renders the slides it touched
+PDF_SLIDE_CACHE_MAX_BYTES = int(os.getenv("PDF_SLIDE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+PDF_SLIDE_CACHE = PdfCache(PDF_CACHE_DIR / "slides", max_bytes=PDF_SLIDE_CACHE_MAX_BYTES)
+# Measured slide heights by slide cache key; kept in memory, survives fragment eviction
+SLIDE_HEIGHT_CACHE_MAX_ENTRIES = 20000
+_slide_height_cache: "OrderedDict[str, int]" = OrderedDict()
 
 CHROME_EXEC_PATH = '/usr/bin/chromium'
 
@@ -77,7 +92,6 @@ PDF_MAX_SLIDE_HEIGHT = 3000
 PDF_HEIGHT_SAFETY_MARGIN = 40
 PDF_GENERATION_TIMEOUT = 30000  # Reduced from 60s to 30s
 PDF_PAGE_TIMEOUT = 10000  # Reduced from 30s to 10s per page
-MAX_CONCURRENT_SLIDES = 2  # Reduced from 3 to 2 for stability
 BROWSER_MEMORY_LIMIT = 512  # Reduced from 1024 to 512 MB
 
 # --- Setup Jinja2 Environment ---
@@ -90,6 +104,30 @@ if not os.path.isdir(TEMPLATE_DIR):
     logger.error(f"Jinja2 TEMPLATE_DIR does not exist: {TEMPLATE_DIR}")
     os.makedirs(TEMPLATE_DIR, exist_ok=True)
 
+# Static assets (fonts, static images) baked into rendered PDFs; part of every PDF cache key
+STATIC_ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "static")
+PDF_CACHE_DEPENDENCY_DIRS = (TEMPLATE_DIR, STATIC_ASSETS_DIR)
+
+def slide_deck_cache_key(slides_data: list, theme: str, deck_template_version: Optional[str]) -> str:
+    """Content-addressed cache key for a rendered slide deck."""
+    return content_key(
+        "slide-deck",
+        {"slides": slides_data, "theme": theme, "deck_template_version": deck_template_version},
+        PDF_CACHE_DEPENDENCY_DIRS,
+    )
+
+def slide_fragment_cache_keys(slides_data: list, theme: str, deck_template_version: Optional[str]) -> List[str]:
+    """Cache key of every slide: its JSON (props, templateId, metadata), the theme and template version."""
+    fingerprint = files_fingerprint(PDF_CACHE_DEPENDENCY_DIRS)
+    return [
+        content_key(
+            "slide",
+            {"slide": slide_data, "theme": theme, "deck_template_version": deck_template_version},
+            dependency_fingerprint=fingerprint,
+        )
+        for slide_data in slides_data
+    ]
+
 jinja_env = Environment(
     loader=FileSystemLoader(TEMPLATE_DIR),
     autoescape=select_autoescape(['html', 'xml'])
@@ -109,123 +147,39 @@ jinja_env.filters['shuffle'] = shuffle_filter
 jinja_env.filters['cos'] = lambda x: math.cos(float(x))
 jinja_env.filters['sin'] = lambda x: math.sin(float(x))
 
+# Fonts and static images inlined into PDF templates, read once and memoized by path+mtime
+PDF_ASSETS = PdfAssetRegistry(STATIC_ASSETS_DIR)
+# Pooled pages fetch fonts from this origin; _serve_pdf_asset answers from PDF_ASSETS
+# instead of inlining the font data URLs into every slide's HTML.
+PDF_ASSET_URL_PREFIX = "https://pdf-assets.invalid/"
+
 # Add static image to base64 filter
 def static_image_to_base64(filename: str) -> str:
     """Convert a static image file to base64 data URL for PDF embedding."""
-    try:
-        current_dir = os.path.dirname(__file__)
-        root_dir = os.path.dirname(os.path.dirname(current_dir))
-        static_dir = os.path.join(root_dir, 'static')
-        image_path = os.path.join(static_dir, filename)
-        
-        if os.path.exists(image_path):
-            with open(image_path, 'rb') as image_file:
-                image_data = image_file.read()
-                image_base64 = base64.b64encode(image_data).decode('utf-8')
-                mime_type, _ = mimetypes.guess_type(image_path)
-                if not mime_type:
-                    mime_type = 'image/png'
-                return f"data:{mime_type};base64,{image_base64}"
-        else:
-            logger.warning(f"Static image not found: {image_path}")
-            return ""
-    except Exception as e:
-        logger.error(f"Failed to load static image {filename}: {e}")
-        return ""
+    data_url = PDF_ASSETS.data_url(filename)
+    if not data_url:
+        logger.warning(f"Static image not found: {filename}")
+    return data_url
 
 jinja_env.filters['static_image_base64'] = static_image_to_base64
 
 # Font embedding functions for PDF generation
 def get_font_as_base64(font_filename: str) -> str:
     """Convert a font file to base64 data URL for PDF embedding."""
-    try:
-        # Calculate the correct path to fonts from pdf_generator.py location
-        current_dir = os.path.dirname(__file__)  # app/services/
-        root_dir = os.path.dirname(os.path.dirname(current_dir))  # Go up 2 levels to root
-        fonts_dir = os.path.join(root_dir, 'static', 'fonts')
-        font_path = os.path.join(fonts_dir, font_filename)
-        
-        logger.info(f"🔤 Loading font: {font_path}")
-        
-        if os.path.exists(font_path):
-            with open(font_path, 'rb') as font_file:
-                font_data = font_file.read()
-                # Only create base64 if file is reasonable size (< 1MB)
-                if len(font_data) > 1024 * 1024:
-                    logger.warning(f"Font file {font_filename} is large ({len(font_data)} bytes), this may impact PDF generation performance")
-                
-                font_base64 = base64.b64encode(font_data).decode('utf-8')
-                data_url = f"data:font/truetype;base64,{font_base64}"
-                logger.info(f"✅ Font {font_filename} embedded successfully ({len(font_data)} bytes → {len(data_url)} chars)")
-                return data_url
-        else:
-            logger.warning(f"❌ Font file not found: {font_path}")
-            # Try to list available fonts for debugging
-            if os.path.exists(fonts_dir):
-                available_fonts = [f for f in os.listdir(fonts_dir) if f.endswith('.ttf')]
-                logger.info(f"Available fonts in {fonts_dir}: {available_fonts}")
-            return ""
-    except Exception as e:
-        logger.error(f"❌ Failed to load font {font_filename}: {e}", exc_info=True)
-        return ""
+    data_url = PDF_ASSETS.font_data_url(font_filename)
+    if not data_url:
+        logger.warning(f"❌ Font file not found: {font_filename}")
+    return data_url
 
 def get_embedded_fonts_css() -> str:
-    """Generate CSS with embedded fonts for PDF rendering."""
-    logger.info("🎨 Generating embedded fonts CSS for PDF rendering...")
-    
-    mont_regular_data = get_font_as_base64('fonnts.com-Mont_Regular.ttf')
-    mont_bold_data = get_font_as_base64('fonnts.com-Mont_Bold.ttf')
-    
-    css = ""
-    
-    if mont_regular_data:
-        css += f"""
-        @font-face {{
-          font-family: 'Mont Regular';
-          src: url('{mont_regular_data}') format('truetype');
-          font-weight: 400;
-          font-style: normal;
-          font-display: block;
-        }}
-        """
-    else:
-        # Fallback CSS if font embedding fails
-        css += """
-        @font-face {
-          font-family: 'Mont Regular';
-          src: local('Arial'), local('Helvetica');
-          font-weight: 400;
-          font-style: normal;
-          font-display: block;
-        }
-        """
-        logger.warning("Using fallback font for Mont Regular")
-    
-    if mont_bold_data:
-        css += f"""
-        @font-face {{
-          font-family: 'Mont Bold';
-          src: url('{mont_bold_data}') format('truetype');
-          font-weight: 700;
-          font-style: normal;
-          font-display: block;
-        }}
-        """
-    else:
-        # Fallback CSS if font embedding fails
-        css += """
-        @font-face {
-          font-family: 'Mont Bold';
-          src: local('Arial Bold'), local('Helvetica Bold');
-          font-weight: 700;
-          font-style: normal;
-          font-display: block;
-        }
-        """
-        logger.warning("Using fallback font for Mont Bold")
-    
-    logger.info(f"✅ Embedded fonts CSS generated successfully ({len(css)} characters total)")
-    return css
+    """CSS with the template fonts inlined as data URLs (for standalone HTML, e.g. SCORM packages)."""
+    return PDF_ASSETS.fonts_css()
+
+def _fonts_css_for_page(page) -> str:
+    """Font CSS for a page: fetched through asset routing on pooled pages, inlined otherwise."""
+    if page in _asset_routed_pages:
+        return PDF_ASSETS.fonts_css(PDF_ASSET_URL_PREFIX)
+    return get_embedded_fonts_css()
 
 # Timeout wrapper to prevent 504 Gateway Timeout errors
 def timeout_wrapper(timeout_seconds: int):
@@ -1131,6 +1085,58 @@ def get_browser_launch_options():
         'timeout': PDF_GENERATION_TIMEOUT
     }
 
+# Shared Chromium pool for every PDF path; started/closed by the app lifecycle in main.py
+BROWSER_POOL = BrowserPool(get_browser_launch_options)
+
+_asset_routed_pages = weakref.WeakSet()
+
+async def _serve_pdf_asset(request):
+    """Request interception handler: answer PDF_ASSET_URL_PREFIX URLs from PDF_ASSETS, pass everything else through."""
+    try:
+        if not request.url.startswith(PDF_ASSET_URL_PREFIX):
+            await request.continue_()
+            return
+        asset = PDF_ASSETS.get(request.url[len(PDF_ASSET_URL_PREFIX):])
+        if asset is None:
+            await request.respond({'status': 404, 'body': ''})
+            return
+        await request.respond({
+            'status': 200,
+            'contentType': asset.mime_type,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': asset.data,
+        })
+    except Exception as e:
+        logger.warning(f"Asset interception failed for {request.url}: {e}")
+        # Resolve the request anyway, otherwise the page waits for it until the render times out
+        try:
+            await request.abort()
+        except Exception as abort_error:
+            logger.debug(f"Could not abort intercepted request {request.url}: {abort_error}")
+
+async def _lease_page(browser=None):
+    """Open a page on the caller's browser, or lease one from BROWSER_POOL when no browser is given."""
+    if browser is not None:
+        return await browser.newPage()
+    page = await BROWSER_POOL.acquire_page()
+    try:
+        await page.setRequestInterception(True)
+        page.on('request', lambda request: asyncio.ensure_future(_serve_pdf_asset(request)))
+        _asset_routed_pages.add(page)
+    except Exception as e:
+        # Without interception the page still works with inlined fonts
+        logger.warning(f"Could not enable asset routing on pooled page, inlining fonts: {e}")
+    return page
+
+async def _return_page(page, browser=None):
+    """Counterpart of _lease_page."""
+    if page is None:
+        return
+    if browser is None:
+        await BROWSER_POOL.release_page(page)
+    elif not page.isClosed():
+        await page.close()
+
 async def generate_pdf_from_html_template(
     template_name: str,
     context_data: dict,
@@ -1138,25 +1144,49 @@ async def generate_pdf_from_html_template(
     use_cache: bool = True,
     landscape: bool = False
 ) -> str:
-    """Enhanced PDF generation with extensive logging for debugging."""
-    
+    """
+    Render a Jinja template to PDF.
+
+    With use_cache the PDF is stored under a key derived from the template,
+    context and template/asset files, so identical inputs are served from disk;
+    otherwise it is written to PDF_CACHE_DIR/output_filename.
+    """
     logger.info(f"=== STARTING ENHANCED PDF GENERATION ===")
     logger.info(f"Template: {template_name}")
     logger.info(f"Output filename: {output_filename}")
     logger.info(f"Landscape: {landscape}")
     logger.info(f"Context data keys: {list(context_data.keys()) if isinstance(context_data, dict) else 'Not a dict'}")
-    
-    pdf_path_in_cache = PDF_CACHE_DIR / output_filename
-    if use_cache and pdf_path_in_cache.exists():
-        logger.info(f"PDF CACHE: Serving cached PDF: {pdf_path_in_cache}")
-        return str(pdf_path_in_cache)
 
-    browser = None
+    async def _render(output_path: Path) -> None:
+        await _render_pdf_from_html_template(template_name, context_data, output_path, landscape)
+
+    if use_cache:
+        cache_key = content_key(
+            "template",
+            {"template": template_name, "context": context_data, "landscape": landscape},
+            PDF_CACHE_DEPENDENCY_DIRS,
+        )
+        return str(await PDF_CACHE.get_or_render(cache_key, _render))
+
+    temp_pdf_path = PDF_CACHE.temp_path_for(output_filename)
+    try:
+        await _render(temp_pdf_path)
+        return str(PDF_CACHE.store_file(temp_pdf_path, output_filename))
+    finally:
+        if temp_pdf_path.exists():
+            temp_pdf_path.unlink()
+
+async def _render_pdf_from_html_template(
+    template_name: str,
+    context_data: dict,
+    output_path: Path,
+    landscape: bool = False
+) -> None:
+    """Render `template_name` with `context_data` and write the PDF to `output_path`."""
     page = None
-    temp_pdf_path = os.path.join("/tmp", f"temp_html_pdf_{output_filename}")
+    temp_pdf_path = str(output_path)
 
-    logger.info(f"PDF GEN (from HTML template): Rendering template '{template_name}'")
-    logger.info(f"PDF GEN: Temp output at {temp_pdf_path}, final cache at {pdf_path_in_cache}")
+    logger.info(f"PDF GEN (from HTML template): Rendering template '{template_name}' to {temp_pdf_path}")
 
     try:
         # Log template rendering process
@@ -1290,13 +1320,9 @@ async def generate_pdf_from_html_template(
         raise HTTPException(status_code=500, detail=f"Failed to render PDF template: {e}")
 
     try:
-        # Log browser launch process
-        logger.info("=== BROWSER LAUNCH PHASE ===")
-        browser = await pyppeteer.launch(**get_browser_launch_options())
-        logger.info(f"Browser launched successfully. Version: {await browser.version()}")
-        
-        page = await browser.newPage()
-        logger.info("New page created successfully.")
+        logger.info("=== BROWSER PAGE PHASE ===")
+        page = await _lease_page()
+        logger.info("Page leased from browser pool.")
         
         # Set up console logging
         await page.evaluate("""
@@ -1562,17 +1588,9 @@ async def generate_pdf_from_html_template(
         })
         
         logger.info(f"PDF generated with dynamic page heights at {temp_pdf_path}")
-
-        if os.path.exists(pdf_path_in_cache): 
-            os.remove(pdf_path_in_cache)
-        os.rename(temp_pdf_path, pdf_path_in_cache)
-        logger.info(f"PDF moved to cache: {pdf_path_in_cache}")
-        return str(pdf_path_in_cache)
         
     except Exception as e:
         logger.error(f"Error during PDF generation: {e}", exc_info=True)
-        if browser and browser.process and browser.process.returncode is not None:
-             logger.error(f"Browser process exited with code: {browser.process.returncode}")
         if os.path.exists(temp_pdf_path):
             try: 
                 os.remove(temp_pdf_path)
@@ -1581,41 +1599,38 @@ async def generate_pdf_from_html_template(
         raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)[:200]}")
         
     finally:
-        if page and not page.isClosed(): 
-            await page.close()
-        if browser: 
-            await browser.close()
-            logger.info("Browser for HTML PDF closed.")
+        await _return_page(page)
 
 
 
 
 
 
-async def calculate_slide_dimensions(slide_data: dict, theme: str, browser=None, deck_template_version: Optional[str] = None) -> int:
+class SlideMeasurementError(Exception):
+    """Measuring a slide's height failed; PDF_MIN_SLIDE_HEIGHT would only be a guess."""
+
+async def calculate_slide_dimensions(slide_data: dict, theme: str, browser=None, deck_template_version: Optional[str] = None, raise_on_error: bool = False) -> int:
     """
     Calculate the exact height needed for a single slide.
     
     Args:
         slide_data: The slide data dictionary
         theme: The theme name
-        browser: Optional browser instance to reuse
+        browser: Optional browser instance to reuse; a pooled page is used when omitted
         deck_template_version: Optional deck template version (e.g., 'v2')
+        raise_on_error: Raise SlideMeasurementError instead of returning PDF_MIN_SLIDE_HEIGHT
+            when measuring fails, for callers that cache the result
     
     Returns:
         int: The calculated height in pixels
     """
-    should_close_browser = browser is None
     page = None
     
     # Get slide info for logging
     template_id = slide_data.get('templateId', 'unknown')
     
     try:
-        if browser is None:
-            browser = await pyppeteer.launch(**get_browser_launch_options())
-        
-        page = await browser.newPage()
+        page = await _lease_page(browser)
         
         # Set viewport to match slide width
         await page.setViewport({'width': 1174, 'height': 800})
@@ -1660,7 +1675,7 @@ async def calculate_slide_dimensions(slide_data: dict, theme: str, browser=None,
             'slide': safe_slide_data,
             'theme': theme,
             'slide_height': 600,  # Start with minimum height
-            'embedded_fonts_css': get_embedded_fonts_css()  # Add embedded fonts CSS
+            'embedded_fonts_css': _fonts_css_for_page(page)
         }
         
         # Render the single slide template
@@ -1804,13 +1819,12 @@ async def calculate_slide_dimensions(slide_data: dict, theme: str, browser=None,
         
     except Exception as e:
         logger.error(f"Error calculating slide dimensions for {template_id}: {e}", exc_info=True)
+        if raise_on_error:
+            raise SlideMeasurementError(f"Could not measure {template_id}: {e}") from e
         return PDF_MIN_SLIDE_HEIGHT
         
     finally:
-        if page and not page.isClosed():
-            await page.close()
-        if should_close_browser and browser:
-            await browser.close()
+        await _return_page(page, browser)
 
 async def generate_single_slide_pdf(slide_data: dict, theme: str, slide_height: int, output_path: str, browser=None, slide_index: int = None, template_id: str = None, deck_template_version: Optional[str] = None) -> bool:
     """
@@ -1821,7 +1835,7 @@ async def generate_single_slide_pdf(slide_data: dict, theme: str, slide_height:
         theme: The theme name
         slide_height: The calculated height for this slide
         output_path: Where to save the PDF
-        browser: Optional browser instance to reuse
+        browser: Optional browser instance to reuse; a pooled page is used when omitted
         slide_index: Optional slide index for logging (1-based)
         template_id: Optional template ID for logging
         deck_template_version: Optional deck template version (e.g., 'v2')
@@ -1839,7 +1853,6 @@ async def generate_single_slide_pdf(slide_data: dict, theme: str, slide_height:
     # Enable detailed logging for debugging
     await log_slide_data_structure(slide_data, slide_index, template_id)
     
-    should_close_browser = browser is None
     page = None
     
     # Get slide info for logging
@@ -1849,11 +1862,7 @@ async def generate_single_slide_pdf(slide_data: dict, theme: str, slide_height:
     try:
         logger.info(f"Starting PDF generation for {slide_info}{template_info} (height: {slide_height}px)")
         
-        if browser is None:
-            logger.info("Launching new browser instance")
-            browser = await pyppeteer.launch(**get_browser_launch_options())
-        
-        page = await browser.newPage()
+        page = await _lease_page(browser)
         logger.info("New page created")
         
         # Set up console logging
@@ -1924,7 +1933,7 @@ async def generate_single_slide_pdf(slide_data: dict, theme: str, slide_height:
             'slide': safe_slide_data,
             'theme': theme,
             'slide_height': slide_height,
-            'embedded_fonts_css': get_embedded_fonts_css()  # Add embedded fonts CSS
+            'embedded_fonts_css': _fonts_css_for_page(page)
         }
         
         # Generate pie chart CSS if needed
@@ -2348,58 +2357,66 @@ async def generate_single_slide_pdf(slide_data: dict, theme: str, slide_height:
         return False
         
     finally:
-        if page and not page.isClosed():
-            await page.close()
-        if should_close_browser and browser:
-            await browser.close()
+        await _return_page(page, browser)
 
-async def process_slide_batch(slides_batch: list, theme: str, browser=None, deck_template_version: Optional[str] = None) -> list:
+async def _cached_slide_height(cache_key: str, slide_data: dict, theme: str, slide_index: int, deck_template_version: Optional[str] = None) -> int:
     """
-    Process a batch of slides in parallel for better performance.
+    Measured height of a slide, reused across exports while the slide is unchanged.
+    Raises SlideMeasurementError when measuring fails, so no fallback height is cached.
+    """
+    height = _slide_height_cache.get(cache_key)
+    if height is not None:
+        _slide_height_cache.move_to_end(cache_key)
+        return height
     
-    Args:
-        slides_batch: List of (slide_data, slide_height, output_path, slide_index, template_id) tuples
-        theme: The theme name
-        browser: Optional browser instance to reuse
+    template_id = slide_data.get('templateId', 'unknown')
+    try:
+        height = await calculate_slide_dimensions(slide_data, theme, None, deck_template_version, raise_on_error=True)
+    except Exception as e:
+        logger.error(f"✗ Failed to calculate height for slide {slide_index + 1} ({template_id}): {e}")
+        if isinstance(e, SlideMeasurementError):
+            raise
+        raise SlideMeasurementError(str(e)) from e
+    logger.info(f"✓ Slide {slide_index + 1} ({template_id}) height calculated: {height}px")
+    
+    _slide_height_cache[cache_key] = height
+    while len(_slide_height_cache) > SLIDE_HEIGHT_CACHE_MAX_ENTRIES:
+        _slide_height_cache.popitem(last=False)
+    return height
+
+async def render_slide_fragment(cache_key: str, slide_data: dict, theme: str, slide_index: int, deck_template_version: Optional[str] = None) -> bytes:
+    """
+    Return the single-page PDF of one slide from PDF_SLIDE_CACHE, measuring and
+    rendering it on a pooled page only when this exact slide is not cached yet.
     
-    Returns:
-        list: List of successful output paths
+    When the slide cannot be measured it is rendered at PDF_MIN_SLIDE_HEIGHT into
+    a temp file that is read and removed right away, so a transient failure does
+    not keep the slide clipped in later exports.
     """
-    tasks = []
-    for slide_data, slide_height, output_path, slide_index, template_id in slides_batch:
-        # NOTE: We do NOT add _old suffix for PDF rendering because:
-        # 1. The Jinja PDF template doesn't have _old versions of templates
-        # 2. Old and new slides render the same way in PDF (colors are handled by theme)
-        # 3. The _old suffix is only for frontend React component selection
-        try:
-            effective_version = deck_template_version
-            if not effective_version:
-                effective_version = (slide_data or {}).get('metadata', {}).get('version')
-            
-            original_template_id = slide_data.get('templateId') if isinstance(slide_data, dict) else None
-            logger.info(f"🔍 PDF VERSION CHECK - Slide {slide_index}: deck_template_version={deck_template_version}, effective_version={effective_version}, templateId={original_template_id}")
-            
-            # PDF templates are version-agnostic - they use the base template ID
-            # Theme colors will be applied based on deck version elsewhere
-            logger.info(f"✅ PDF RENDERING - Slide {slide_index}: Using base template {original_template_id}")
-        except Exception as e:
-            logger.error(f"❌ PDF VERSION CHECK ERROR - Slide {slide_index}: {e}", exc_info=True)
-        task = generate_single_slide_pdf(slide_data, theme, slide_height, output_path, browser, slide_index, template_id, deck_template_version)
-        tasks.append(task)
+    template_id = slide_data.get('templateId', 'unknown')
     
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    async def _render_at(output_path: Path, slide_height: int) -> None:
+        success = await generate_single_slide_pdf(
+            slide_data, theme, slide_height, str(output_path), None, slide_index, template_id, deck_template_version
+        )
+        if not success:
+            raise RuntimeError(f"Slide {slide_index + 1} ({template_id}) did not render")
     
-    successful_paths = []
-    for i, result in enumerate(results):
-        slide_index = slides_batch[i][3] + 1  # Convert to 1-based index
-        template_id = slides_batch[i][4]
-        if isinstance(result, Exception):
-            logger.error(f"✗ Failed to generate slide {slide_index} ({template_id}): {result}", exc_info=True)
-        elif result:
-            successful_paths.append(slides_batch[i][2])  # output_path
-            logger.info(f"✓ Successfully generated slide {slide_index} ({template_id})")
+    async def _render(output_path: Path) -> None:
+        slide_height = await _cached_slide_height(cache_key, slide_data, theme, slide_index, deck_template_version)
+        await _render_at(output_path, slide_height)
     
-    return successful_paths
+    try:
+        return (await PDF_SLIDE_CACHE.get_or_render(cache_key, _render)).read_bytes()
+    except SlideMeasurementError:
+        logger.warning(f"Rendering slide {slide_index + 1} ({template_id}) at the fallback height without caching it")
+    
+    fallback_path = PDF_SLIDE_CACHE.temp_path_for(cache_key)
+    try:
+        await _render_at(fallback_path, PDF_MIN_SLIDE_HEIGHT)
+        return fallback_path.read_bytes()
+    finally:
+        fallback_path.unlink(missing_ok=True)
 
 @timeout_wrapper(120)  # 2 minute timeout to prevent 504 errors
 async def generate_slide_deck_pdf_with_progress(
@@ -2423,140 +2440,87 @@ async def generate_slide_deck_pdf_with_progress(
     # Always yield a start message to ensure this is detected as an async generator
     yield {'type': 'progress', 'message': 'Initializing PDF generation...', 'current': 0, 'total': len(slides_data)}
     
-    pdf_path_in_cache = PDF_CACHE_DIR / output_filename
+    cache_key = slide_deck_cache_key(slides_data, theme, None) if use_cache else None
+    cached_path = PDF_CACHE.lookup(cache_key) if cache_key else None
     
-    if use_cache and pdf_path_in_cache.exists():
+    if cached_path is not None:
         yield {'type': 'progress', 'message': 'Using cached PDF...', 'current': len(slides_data), 'total': len(slides_data)}
-        yield {'type': 'complete', 'message': 'Using cached PDF', 'path': str(pdf_path_in_cache), 'total_time': 0}
+        yield {'type': 'complete', 'message': 'Using cached PDF', 'path': str(cached_path), 'total_time': 0}
         return
     
     if not PDF_MERGER_AVAILABLE:
         yield {'type': 'error', 'message': 'PDF merging library not available'}
         return
     
-    browser = None
-    temp_pdf_paths = []
     start_time = time.time()
     
     try:
-        # Step 1: Calculate heights for all slides
-        yield {'type': 'progress', 'message': 'Calculating slide dimensions...', 'current': 0, 'total': len(slides_data)}
-        browser = await pyppeteer.launch(**get_browser_launch_options())
-        
-        slide_heights = []
         # Note: generate_slide_deck_pdf_with_progress doesn't have deck_template_version parameter
         # This is acceptable as it's a legacy function; the main flow uses generate_slide_deck_pdf_with_dynamic_height
-        for i, slide_data in enumerate(slides_data):
-            template_id = slide_data.get('templateId', 'unknown')
-            yield {'type': 'progress', 'message': f'Calculating dimensions for slide {i + 1}: {template_id}', 'current': i, 'total': len(slides_data)}
-            
-            try:
-                height = await calculate_slide_dimensions(slide_data, theme, browser, deck_template_version=None)
-                slide_heights.append(height)
-            except Exception as e:
-                logger.error(f"Failed to calculate height for slide {i + 1}: {e}")
-                slide_heights.append(PDF_MIN_SLIDE_HEIGHT)
-        
-        await browser.close()
-        browser = None
+        slide_keys = slide_fragment_cache_keys(slides_data, theme, None)
         
         yield {'type': 'progress', 'message': 'Starting individual slide generation...', 'current': 0, 'total': len(slides_data)}
         
-        # Step 2: Generate individual PDFs
-        slide_tasks = []
-        for i, (slide_data, slide_height) in enumerate(zip(slides_data, slide_heights)):
-            template_id = slide_data.get('templateId', 'unknown')
-            temp_pdf_path = f"/tmp/slide_{i}_{uuid.uuid4().hex[:8]}.pdf"
-            slide_tasks.append((slide_data, slide_height, temp_pdf_path, i, template_id))
-        
-        # Process slides in batches
-        batch_size = MAX_CONCURRENT_SLIDES
-        successful_paths = []
-        
-        for batch_start in range(0, len(slide_tasks), batch_size):
-            batch_end = min(batch_start + batch_size, len(slide_tasks))
-            batch = slide_tasks[batch_start:batch_end]
-            
-            yield {'type': 'progress', 'message': f'Processing batch {batch_start//batch_size + 1}/{(len(slide_tasks) + batch_size - 1)//batch_size}...', 'current': batch_start, 'total': len(slides_data)}
-            
-            batch_browser = await pyppeteer.launch(**get_browser_launch_options())
-            
+        # Render (or fetch from the slide cache) every slide concurrently, merging and reporting each as it finishes
+        async def _render(slide_data, slide_key, slide_index, template_id):
             try:
-                # Process each slide in the batch with individual progress updates
-                batch_results = []
-                for slide_data, slide_height, temp_pdf_path, slide_index, template_id in batch:
-                    yield {'type': 'progress', 'message': f'Generating slide {slide_index + 1}: {template_id}', 'current': slide_index + 1, 'total': len(slides_data), 'slide_index': slide_index, 'template_id': template_id}
-                    
-                    success = await generate_single_slide_pdf(
-                        slide_data, theme, slide_height, temp_pdf_path, batch_browser, slide_index, template_id, deck_template_version=None
-                    )
-                    
-                    if success:
-                        batch_results.append(temp_pdf_path)
-                        yield {'type': 'progress', 'message': f'✓ Generated slide {slide_index + 1}: {template_id}', 'current': slide_index + 1, 'total': len(slides_data), 'slide_index': slide_index, 'template_id': template_id}
-                    else:
-                        yield {'type': 'error', 'message': f'Failed to generate slide {slide_index + 1}: {template_id}'}
-                
-                successful_paths.extend(batch_results)
-                temp_pdf_paths.extend(batch_results)
-                
+                fragment = await render_slide_fragment(slide_key, slide_data, theme, slide_index, None)
             except Exception as e:
-                logger.error(f"Failed to process batch: {e}")
-                yield {'type': 'error', 'message': f'Failed to process slide batch: {str(e)[:200]}'}
-                return
-            finally:
-                await batch_browser.close()
-                gc.collect()
-        
-        if len(successful_paths) != len(slides_data):
-            yield {'type': 'error', 'message': f'Only {len(successful_paths)}/{len(slides_data)} slides were generated successfully'}
-            return
+                logger.error(f"✗ Failed to generate slide {slide_index + 1} ({template_id}): {e}")
+                fragment = None
+            return slide_index, template_id, fragment
         
-        # Step 3: Merge PDFs
-        yield {'type': 'progress', 'message': f'Merging {len(temp_pdf_paths)} slide PDFs...', 'current': len(slides_data), 'total': len(slides_data)}
+        render_tasks = [
+            asyncio.ensure_future(_render(slide_data, slide_key, i, slide_data.get('templateId', 'unknown')))
+            for i, (slide_data, slide_key) in enumerate(zip(slides_data, slide_keys))
+        ]
         
-        merger = PdfMerger()
+        merger = _InOrderSlideMerger()
+        merged_temp_path = PDF_CACHE.temp_path_for(output_filename)
         try:
-            for pdf_path in temp_pdf_paths:
-                if os.path.exists(pdf_path):
-                    merger.append(pdf_path)
-            
-            if os.path.exists(pdf_path_in_cache):
-                os.remove(pdf_path_in_cache)
-            
-            merger.write(str(pdf_path_in_cache))
-            merger.close()
-            
-            # Clean up temporary files
-            for temp_path in temp_pdf_paths:
-                try:
-                    if os.path.exists(temp_path):
-                        os.remove(temp_path)
-                except:
-                    pass
+            slides_done = 0
+            for finished in asyncio.as_completed(render_tasks):
+                slide_index, template_id, fragment = await finished
+                if fragment is None:
+                    yield {'type': 'error', 'message': f'Failed to generate slide {slide_index + 1}: {template_id}'}
+                    yield {'type': 'error', 'message': f'Only {slides_done}/{len(slides_data)} slides were generated successfully'}
+                    return
+                merger.add(slide_index, fragment)
+                slides_done += 1
+                yield {'type': 'progress', 'message': f'✓ Generated slide {slide_index + 1}: {template_id}', 'current': slides_done, 'total': len(slides_data), 'slide_index': slide_index, 'template_id': template_id}
+            
+            merger.write(merged_temp_path)
+            if cache_key:
+                final_path = PDF_CACHE.store(cache_key, merged_temp_path)
+            else:
+                final_path = PDF_CACHE.store_file(merged_temp_path, output_filename)
             
             total_time = time.time() - start_time
-            yield {'type': 'complete', 'message': f'PDF generation completed in {total_time:.2f}s', 'path': str(pdf_path_in_cache), 'total_time': total_time}
+            yield {'type': 'complete', 'message': f'PDF generation completed in {total_time:.2f}s', 'path': str(final_path), 'total_time': total_time}
             
         except Exception as e:
             logger.error(f"Failed to merge PDFs: {e}")
-            merger.close()
             yield {'type': 'error', 'message': f'Failed to merge PDFs: {str(e)[:200]}'}
             return
+        finally:
+            for task in render_tasks:
+                task.cancel()
+            merger.close()
+            if merged_temp_path.exists():
+                merged_temp_path.unlink()
+            gc.collect()
         
     except Exception as e:
         logger.error(f"Error in PDF generation: {e}")
         yield {'type': 'error', 'message': f'PDF generation failed: {str(e)[:200]}'}
-    finally:
-        if browser:
-            await browser.close()
 
 async def generate_slide_deck_pdf_with_dynamic_height(
     slides_data: list,
     theme: str,
     output_filename: str,
     use_cache: bool = True,
-    deck_template_version: Optional[str] = None
+    deck_template_version: Optional[str] = None,
+    progress_callback: Optional[Callable[[int, int, int, str], None]] = None
 ) -> str:
     """
     Generate a PDF slide deck with dynamic height per slide.
@@ -2567,158 +2531,132 @@ async def generate_slide_deck_pdf_with_dynamic_height(
         theme: The theme name
         output_filename: The output filename
         use_cache: Whether to use caching
+        progress_callback: Called as (slides_done, total_slides, slide_index, template_id)
+            whenever a slide is ready; not called when the whole deck is served from cache
     
     Returns:
-        str: Path to the generated PDF
+        str: Path to the generated PDF. With use_cache this is a content-addressed
+        cache entry (slides, theme, template version, template and font files);
+        otherwise PDF_CACHE_DIR/output_filename.
     """
-    pdf_path_in_cache = PDF_CACHE_DIR / output_filename
-    
     logger.info(f"🔍 PDF GENERATION START - deck_template_version={deck_template_version}, slides_count={len(slides_data)}, theme={theme}")
     
-    if use_cache and pdf_path_in_cache.exists():
-        logger.info(f"PDF CACHE: Serving cached PDF: {pdf_path_in_cache}")
-        return str(pdf_path_in_cache)
-    
     if not PDF_MERGER_AVAILABLE:
         raise HTTPException(status_code=500, detail="PDF merging library not available. Install PyPDF2 or pypdf.")
     
-    browser = None
-    temp_pdf_paths = []
+    async def _render(output_path: Path) -> None:
+        await _render_slide_deck_pdf(slides_data, theme, output_path, deck_template_version, progress_callback)
+    
+    if use_cache:
+        cache_key = slide_deck_cache_key(slides_data, theme, deck_template_version)
+        return str(await PDF_CACHE.get_or_render(cache_key, _render))
+    
+    temp_output_path = PDF_CACHE.temp_path_for(output_filename)
+    try:
+        await _render(temp_output_path)
+        return str(PDF_CACHE.store_file(temp_output_path, output_filename))
+    finally:
+        if temp_output_path.exists():
+            temp_output_path.unlink()
+
+class _InOrderSlideMerger:
+    """
+    Appends slide PDFs to a PdfMerger in slide order while slides finish out of
+    order. Slides are held as in-memory buffers, so the merge happens as
+    rendering progresses and is independent of later cache evictions.
+    """
+    
+    def __init__(self):
+        self.merger = PdfMerger()
+        self._pending = {}
+        self.merged_count = 0
+    
+    def add(self, slide_index: int, fragment: bytes) -> None:
+        self._pending[slide_index] = io.BytesIO(fragment)
+        while self.merged_count in self._pending:
+            self.merger.append(self._pending.pop(self.merged_count))
+            self.merged_count += 1
+    
+    def write(self, output_path: Path) -> None:
+        self.merger.write(str(output_path))
+    
+    def close(self) -> None:
+        self._pending.clear()
+        self.merger.close()
+
+async def _render_slide_deck_pdf(
+    slides_data: list,
+    theme: str,
+    output_path: Path,
+    deck_template_version: Optional[str] = None,
+    progress_callback: Optional[Callable[[int, int, int, str], None]] = None
+) -> None:
+    """
+    Merge the deck's slides into `output_path`. Slides come from PDF_SLIDE_CACHE,
+    so only slides that changed since the last export are measured and rendered,
+    and each slide is merged as soon as the slides before it are ready.
+    """
     start_time = time.time()
+    total_slides = len(slides_data)
     
     try:
-        logger.info(f"Generating slide deck PDF with {len(slides_data)} slides, theme: {theme}, version: {deck_template_version}")
-        
-        # Step 1: Calculate heights for all slides with a single browser instance
-        logger.info("Calculating slide heights...")
-        browser = await pyppeteer.launch(**get_browser_launch_options())
-        
-        slide_heights = []
-        for i, slide_data in enumerate(slides_data):
-            template_id = slide_data.get('templateId', 'unknown')
-            logger.info(f"Calculating height for slide {i + 1}/{len(slides_data)} (templateId: {template_id})")
-            try:
-                height = await calculate_slide_dimensions(slide_data, theme, browser, deck_template_version)
-                slide_heights.append(height)
-                logger.info(f"✓ Slide {i + 1} ({template_id}) height calculated: {height}px")
-            except Exception as e:
-                logger.error(f"✗ Failed to calculate height for slide {i + 1} ({template_id}): {e}", exc_info=True)
-                slide_heights.append(PDF_MIN_SLIDE_HEIGHT)
-        
-        # Close the height calculation browser to free memory
-        await browser.close()
-        browser = None
+        logger.info(f"Generating slide deck PDF with {total_slides} slides, theme: {theme}, version: {deck_template_version}")
         
-        # Step 2: Generate individual PDFs in batches for better performance
-        logger.info("Generating individual slide PDFs...")
+        slide_keys = slide_fragment_cache_keys(slides_data, theme, deck_template_version)
+        cached_count = sum(1 for slide_key in slide_keys if PDF_SLIDE_CACHE.path_for(slide_key).exists())
+        logger.info(
+            f"{cached_count}/{total_slides} slides cached, rendering the rest "
+            f"(up to {BROWSER_POOL.concurrency} concurrent pages)..."
+        )
         
-        # Create temporary paths for all slides
-        slide_tasks = []
-        for i, (slide_data, slide_height) in enumerate(zip(slides_data, slide_heights)):
+        async def _fragment(i, slide_data, slide_key):
             template_id = slide_data.get('templateId', 'unknown')
-            temp_pdf_path = f"/tmp/slide_{i}_{uuid.uuid4().hex[:8]}.pdf"
-            slide_tasks.append((slide_data, slide_height, temp_pdf_path, i, template_id))
-        
-        # Process slides in batches to avoid memory issues
-        batch_size = MAX_CONCURRENT_SLIDES
-        successful_paths = []
-        
-        for batch_start in range(0, len(slide_tasks), batch_size):
-            batch_end = min(batch_start + batch_size, len(slide_tasks))
-            batch = slide_tasks[batch_start:batch_end]
-            
-            logger.info(f"Processing batch {batch_start//batch_size + 1}/{(len(slide_tasks) + batch_size - 1)//batch_size} ({len(batch)} slides)")
-            
-            # Log batch details
-            for slide_data, slide_height, temp_pdf_path, slide_index, template_id in batch:
-                logger.info(f"  - Slide {slide_index + 1} ({template_id}): height={slide_height}px, output={temp_pdf_path}")
-            
-            # Launch a new browser for each batch to prevent memory accumulation
-            batch_browser = await pyppeteer.launch(**get_browser_launch_options())
-            
             try:
-                batch_results = await process_slide_batch(batch, theme, batch_browser, deck_template_version)
-                successful_paths.extend(batch_results)
-                temp_pdf_paths.extend(batch_results)
+                return i, template_id, await render_slide_fragment(slide_key, slide_data, theme, i, deck_template_version)
             except Exception as e:
-                logger.error(f"Failed to process batch: {e}", exc_info=True)
-                # Clean up any generated PDFs in this batch
-                for _, _, path, slide_index, template_id in batch:
-                    try:
-                        if os.path.exists(path):
-                            os.remove(path)
-                    except:
-                        pass
-                raise HTTPException(status_code=500, detail=f"Failed to process slide batch: {str(e)[:200]}")
-            finally:
-                await batch_browser.close()
-                # Force garbage collection after each batch
-                gc.collect()
-        
-        if len(successful_paths) != len(slides_data):
-            logger.error(f"Only {len(successful_paths)}/{len(slides_data)} slides were generated successfully")
-            # Clean up any generated PDFs
-            for path in temp_pdf_paths:
-                try:
-                    os.remove(path)
-                except:
-                    pass
-            raise HTTPException(status_code=500, detail=f"Failed to generate all slides. Only {len(successful_paths)}/{len(slides_data)} were successful.")
-        
-        # Step 3: Merge all PDFs into final document
-        logger.info(f"Merging {len(temp_pdf_paths)} slide PDFs...")
-        merger = PdfMerger()
+                logger.error(f"✗ Failed to generate slide {i + 1} ({template_id}): {e}", exc_info=True)
+                return i, template_id, None
         
+        render_tasks = [
+            asyncio.ensure_future(_fragment(i, slide_data, slide_key))
+            for i, (slide_data, slide_key) in enumerate(zip(slides_data, slide_keys))
+        ]
+        merger = _InOrderSlideMerger()
         try:
-            for pdf_path in temp_pdf_paths:
-                if os.path.exists(pdf_path):
-                    merger.append(pdf_path)
-                else:
-                    logger.warning(f"PDF file not found: {pdf_path}")
-            
-            # Write the merged PDF
-            if os.path.exists(pdf_path_in_cache):
-                os.remove(pdf_path_in_cache)
-            
-            merger.write(str(pdf_path_in_cache))
-            merger.close()
-            
+            slides_done = 0
+            for finished in asyncio.as_completed(render_tasks):
+                slide_index, template_id, fragment = await finished
+                if fragment is None:
+                    # The deck cannot be completed; stop waiting on the remaining slides
+                    raise HTTPException(status_code=500, detail=f"Failed to generate all slides. Slide {slide_index + 1} ({template_id}) failed.")
+                merger.add(slide_index, fragment)
+                slides_done += 1
+                if progress_callback:
+                    progress_callback(slides_done, total_slides, slide_index, template_id)
+            
+            merger.write(output_path)
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Failed to merge PDFs: {e}")
-            merger.close()
             raise HTTPException(status_code=500, detail=f"Failed to merge PDFs: {str(e)[:200]}")
-        
-        # Clean up temporary PDF files
-        for pdf_path in temp_pdf_paths:
-            try:
-                if os.path.exists(pdf_path):
-                    os.remove(pdf_path)
-            except Exception as e:
-                logger.warning(f"Failed to clean up temporary PDF {pdf_path}: {e}")
+        finally:
+            for task in render_tasks:
+                task.cancel()
+            merger.close()
+            gc.collect()
         
         total_time = time.time() - start_time
-        logger.info(f"Slide deck PDF generated successfully in {total_time:.2f}s: {pdf_path_in_cache}")
-        return str(pdf_path_in_cache)
+        logger.info(
+            f"Slide deck PDF generated successfully in {total_time:.2f}s "
+            f"({total_slides - cached_count} slides rendered): {output_path}"
+        )
         
     except Exception as e:
         logger.error(f"Error generating slide deck PDF: {e}", exc_info=True)
-        
-        # Clean up any generated PDFs
-        for path in temp_pdf_paths:
-            try:
-                if os.path.exists(path):
-                    os.remove(path)
-            except:
-                pass
-        
         raise HTTPException(status_code=500, detail=f"Failed to generate slide deck PDF: {str(e)[:200]}")
         
     finally:
-        if browser:
-            try:
-                await browser.close()
-            except:
-                pass
         # Force garbage collection
         gc.collect()
 
@@ -0,0 +1,212 @@
+# custom_extensions/backend/app/services/presentation_job_store.py
+import copy
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PRESENTATION_JOBS_DDL = """
+CREATE TABLE IF NOT EXISTS presentation_jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'queued',
+    progress REAL NOT NULL DEFAULT 0,
+    error TEXT,
+    video_url TEXT,
+    thumbnail_url TEXT,
+    slide_image_path TEXT,
+    request JSONB NOT NULL,
+    checkpoints JSONB NOT NULL DEFAULT '{}'::jsonb,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    lease_expires_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP NOT NULL,
+    completed_at TIMESTAMP,
+    last_heartbeat TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_presentation_jobs_claim ON presentation_jobs (status, created_at);
+"""
+
+# Columns written on every progress update by the worker that holds the lease
+JOB_STATE_FIELDS = (
+    "status", "progress", "error", "video_url", "thumbnail_url",
+    "slide_image_path", "completed_at", "last_heartbeat",
+)
+
+JobRow = Dict[str, Any]
+
+
+class PresentationJobStore:
+    """
+    Presentation jobs in Postgres, shared by every backend worker.
+
+    Workers `claim()` queued jobs (or jobs whose lease ran out because their
+    worker died) with FOR UPDATE SKIP LOCKED, keep the lease alive through
+    `save()`, and record per-stage `checkpoints` so the next claimant can
+    resume. Writes are fenced on `worker_id`: once a lease has been taken
+    over, the old worker's updates affect no rows and `save()` returns False.
+    """
+
+    def __init__(self, get_pool: Callable[[], Any]):
+        self._get_pool = get_pool
+
+    def _pool(self):
+        pool = self._get_pool()
+        if pool is None:
+            raise RuntimeError("Database pool is not available")
+        return pool
+
+    async def ensure_schema(self) -> None:
+        async with self._pool().acquire() as conn:
+            await conn.execute(PRESENTATION_JOBS_DDL)
+
+    async def create(self, job_id: str, request: dict, created_at: datetime) -> None:
+        async with self._pool().acquire() as conn:
+            await conn.execute(
+                "INSERT INTO presentation_jobs (job_id, status, request, created_at) VALUES ($1, 'queued', $2, $3)",
+                job_id, request, created_at,
+            )
+
+    async def claim(self, worker_id: str, lease_seconds: float) -> Optional[JobRow]:
+        """Take the oldest runnable job, or return None if there is none."""
+        async with self._pool().acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                UPDATE presentation_jobs
+                SET status = 'processing',
+                    worker_id = $1,
+                    lease_expires_at = now() + make_interval(secs => $2),
+                    attempts = attempts + 1
+                WHERE job_id = (
+                    SELECT job_id FROM presentation_jobs
+                    WHERE status = 'queued'
+                       OR (status = 'processing' AND lease_expires_at < now())
+                    ORDER BY created_at
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING *
+                """,
+                worker_id, float(lease_seconds),
+            )
+        return dict(row) if row is not None else None
+
+    async def save(
+        self,
+        job_id: str,
+        worker_id: str,
+        state: dict,
+        lease_seconds: float,
+        release: bool = False,
+    ) -> bool:
+        """Write the job state and extend the lease (or drop it with `release`). False if the lease was lost."""
+        async with self._pool().acquire() as conn:
+            result = await conn.execute(
+                """
+                UPDATE presentation_jobs
+                SET status = $3, progress = $4, error = $5, video_url = $6, thumbnail_url = $7,
+                    slide_image_path = $8, completed_at = $9, last_heartbeat = $10,
+                    worker_id = CASE WHEN $11::boolean THEN NULL ELSE worker_id END,
+                    lease_expires_at = CASE WHEN $11::boolean THEN NULL
+                                            ELSE now() + make_interval(secs => $12) END
+                WHERE job_id = $1 AND worker_id = $2
+                """,
+                job_id, worker_id, *(state.get(name) for name in JOB_STATE_FIELDS), release, float(lease_seconds),
+            )
+        return result.split()[-1] != "0"
+
+    async def save_checkpoint(self, job_id: str, worker_id: str, name: str, value: Any) -> bool:
+        async with self._pool().acquire() as conn:
+            result = await conn.execute(
+                """
+                UPDATE presentation_jobs
+                SET checkpoints = checkpoints || jsonb_build_object($3::text, $4::jsonb)
+                WHERE job_id = $1 AND worker_id = $2
+                """,
+                job_id, worker_id, name, value,
+            )
+        return result.split()[-1] != "0"
+
+    async def get(self, job_id: str) -> Optional[JobRow]:
+        async with self._pool().acquire() as conn:
+            row = await conn.fetchrow("SELECT * FROM presentation_jobs WHERE job_id = $1", job_id)
+        return dict(row) if row is not None else None
+
+    async def list(self, limit: int) -> List[JobRow]:
+        async with self._pool().acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT * FROM presentation_jobs ORDER BY created_at DESC LIMIT $1", limit
+            )
+        return [dict(row) for row in rows]
+
+    async def delete_older_than(self, cutoff: datetime) -> List[str]:
+        """Delete finished jobs created before `cutoff`; returns their IDs."""
+        async with self._pool().acquire() as conn:
+            rows = await conn.fetch(
+                "DELETE FROM presentation_jobs WHERE created_at < $1 AND status IN ('completed', 'failed') RETURNING job_id",
+                cutoff,
+            )
+        return [row["job_id"] for row in rows]
+
+
+class MemoryPresentationJobStore:
+    """
+    Same interface as PresentationJobStore, kept in process memory. Used when
+    the database is not configured (and by scripts), so jobs then do not
+    survive a restart and are only visible to this process.
+    """
+
+    def __init__(self):
+        self._rows: Dict[str, JobRow] = {}
+
+    async def ensure_schema(self) -> None:
+        return None
+
+    async def create(self, job_id: str, request: dict, created_at: datetime) -> None:
+        self._rows[job_id] = {
+            "job_id": job_id, "status": "queued", "progress": 0.0, "error": None,
+            "video_url": None, "thumbnail_url": None, "slide_image_path": None,
+            "request": request, "checkpoints": {}, "attempts": 0, "worker_id": None,
+            "created_at": created_at, "completed_at": None, "last_heartbeat": None,
+        }
+
+    async def claim(self, worker_id: str, lease_seconds: float) -> Optional[JobRow]:
+        queued = [row for row in self._rows.values() if row["status"] == "queued"]
+        if not queued:
+            return None
+        row = min(queued, key=lambda r: r["created_at"])
+        row.update(status="processing", worker_id=worker_id, attempts=row["attempts"] + 1)
+        return copy.deepcopy(row)
+
+    async def save(self, job_id: str, worker_id: str, state: dict, lease_seconds: float, release: bool = False) -> bool:
+        row = self._rows.get(job_id)
+        if row is None or row["worker_id"] != worker_id:
+            return False
+        row.update({name: state.get(name) for name in JOB_STATE_FIELDS})
+        if release:
+            row["worker_id"] = None
+        return True
+
+    async def save_checkpoint(self, job_id: str, worker_id: str, name: str, value: Any) -> bool:
+        row = self._rows.get(job_id)
+        if row is None or row["worker_id"] != worker_id:
+            return False
+        row["checkpoints"][name] = copy.deepcopy(value)
+        return True
+
+    async def get(self, job_id: str) -> Optional[JobRow]:
+        row = self._rows.get(job_id)
+        return copy.deepcopy(row) if row is not None else None
+
+    async def list(self, limit: int) -> List[JobRow]:
+        rows = sorted(self._rows.values(), key=lambda r: r["created_at"], reverse=True)
+        return [copy.deepcopy(row) for row in rows[:limit]]
+
+    async def delete_older_than(self, cutoff: datetime) -> List[str]:
+        deleted = [
+            job_id for job_id, row in self._rows.items()
+            if row["created_at"] < cutoff and row["status"] in ("completed", "failed")
+        ]
+        for job_id in deleted:
+            del self._rows[job_id]
+        return deleted
@@ -8,14 +8,17 @@ combining slide capture, avatar generation, and video composition.
 """
 
 import asyncio
+import concurrent.futures
 import logging
 import os
 import shutil
+import socket
 import subprocess
+import threading
 import uuid
 from pathlib import Path
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Any
+from dataclasses import asdict, dataclass, field, fields
 from datetime import datetime, timedelta
 import json
 
@@ -23,9 +26,33 @@ import json
 from .video_composer_service import video_composer_service, CompositionConfig
 from .video_generation_service import video_generation_service
 from .avatar_mask_service import AvatarMaskService
+from .presentation_job_store import (
+    JOB_STATE_FIELDS,
+    MemoryPresentationJobStore,
+    PresentationJobStore,
+)
 
 logger = logging.getLogger(__name__)
 
+# Presentations rendered at once by this process; each worker owns one thread with its own event loop
+PRESENTATION_WORKERS = max(1, int(os.getenv("PRESENTATION_WORKERS", "2")))
+# A job whose worker stops renewing its lease for this long is picked up (and resumed) by another worker
+PRESENTATION_JOB_LEASE_SECONDS = float(os.getenv("PRESENTATION_JOB_LEASE_SECONDS", "120"))
+PRESENTATION_JOB_MAX_ATTEMPTS = int(os.getenv("PRESENTATION_JOB_MAX_ATTEMPTS", "3"))
+PRESENTATION_QUEUE_POLL_SECONDS = float(os.getenv("PRESENTATION_QUEUE_POLL_SECONDS", "2"))
+
+# Per-thread event loop of the presentation workers (kept for the life of the thread)
+_worker_thread_state = threading.local()
+
+
+def _worker_thread_loop() -> asyncio.AbstractEventLoop:
+    loop = getattr(_worker_thread_state, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        _worker_thread_state.loop = loop
+    return loop
+
 @dataclass
 class PresentationRequest:
     """Request configuration for video presentation generation."""
@@ -61,11 +88,48 @@ class PresentationJob:
     created_at: datetime = None
     completed_at: Optional[datetime] = None
     last_heartbeat: Optional[datetime] = None  # Track last heartbeat to prevent timeouts
+    attempts: int = 0  # Times a worker has claimed this job (> 1 means it was resumed)
+    checkpoints: Dict[str, Any] = field(default_factory=dict)  # Finished stages, see _save_checkpoint
     
     def __post_init__(self):
         if self.created_at is None:
             self.created_at = datetime.now()
 
+
+def _request_to_dict(request: PresentationRequest) -> Dict[str, Any]:
+    data = asdict(request)
+    data["resolution"] = list(request.resolution)
+    return data
+
+
+def _request_from_dict(data: Dict[str, Any]) -> PresentationRequest:
+    known = {f.name for f in fields(PresentationRequest)}
+    kwargs = {key: value for key, value in data.items() if key in known}
+    if kwargs.get("resolution") is not None:
+        kwargs["resolution"] = tuple(kwargs["resolution"])
+    return PresentationRequest(**kwargs)
+
+
+def _job_from_row(row: Dict[str, Any]) -> PresentationJob:
+    return PresentationJob(
+        job_id=row["job_id"],
+        status=row["status"],
+        progress=row["progress"] or 0.0,
+        error=row["error"],
+        video_url=row["video_url"],
+        thumbnail_url=row["thumbnail_url"],
+        slide_image_path=row["slide_image_path"],
+        created_at=row["created_at"],
+        completed_at=row["completed_at"],
+        last_heartbeat=row["last_heartbeat"],
+        attempts=row.get("attempts") or 0,
+        checkpoints=dict(row.get("checkpoints") or {}),
+    )
+
+
+def _job_state(job: PresentationJob) -> Dict[str, Any]:
+    return {name: getattr(job, name) for name in JOB_STATE_FIELDS}
+
 class ProfessionalPresentationService:
     """Professional presentation generation service."""
     
@@ -73,14 +137,248 @@ class ProfessionalPresentationService:
         self.output_dir = Path("output/presentations")
         self.output_dir.mkdir(parents=True, exist_ok=True)
         
-        # Job tracking
+        # Job tracking: the store is the source of truth, self.jobs holds the jobs this process is running
+        self.store = MemoryPresentationJobStore()
         self.jobs: Dict[str, PresentationJob] = {}
-        
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = PRESENTATION_JOB_LEASE_SECONDS
+
+        # Worker pool (see start())
+        self._main_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._dispatchers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._persist_tasks: Dict[str, asyncio.Task] = {}
+        self._dirty_jobs: set = set()
+        self._stopping = False
+
         # Heartbeat configuration
         self.heartbeat_interval = 30  # Send heartbeat every 30 seconds
         self.heartbeat_tasks: Dict[str, asyncio.Task] = {}  # Track heartbeat tasks per job
-        
+
         logger.info("Professional Presentation Service initialized")
+
+    async def start(self, get_pool: Optional[Callable[[], Any]] = None, workers: int = PRESENTATION_WORKERS):
+        """
+        Start the worker pool. Called from app startup with the DB pool getter;
+        jobs are then kept in Postgres, so any backend worker can answer status
+        polls and pick up jobs left behind by a restarted one.
+        """
+        if self._main_loop is not None:
+            return
+        if get_pool is not None and get_pool() is not None:
+            store = PresentationJobStore(get_pool)
+            try:
+                await store.ensure_schema()
+                self.store = store
+            except Exception as e:
+                logger.error(f"🎬 [PRESENTATION_WORKERS] Could not prepare presentation_jobs table, keeping jobs in memory: {e}")
+        else:
+            logger.warning("🎬 [PRESENTATION_WORKERS] No database pool, presentation jobs are kept in memory only")
+
+        self._stopping = False
+        self._main_loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="presentation-worker")
+        self._dispatchers = [
+            asyncio.create_task(self._dispatch_jobs(slot), name=f"presentation-dispatch-{slot}")
+            for slot in range(workers)
+        ]
+        logger.info(f"🎬 [PRESENTATION_WORKERS] Started {workers} workers as {self.worker_id} ({type(self.store).__name__})")
+
+    async def stop(self):
+        """
+        Stop claiming jobs. Jobs still rendering are not interrupted or released:
+        their leases run out and another worker resumes them from their checkpoints.
+        """
+        self._stopping = True
+        for dispatcher in self._dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._dispatchers = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._main_loop = None
+        logger.info("🎬 [PRESENTATION_WORKERS] Stopped")
+
+    async def _dispatch_jobs(self, slot: int):
+        """One worker slot: claim a job, render it on the worker thread pool, repeat."""
+        while not self._stopping:
+            try:
+                row = await self.store.claim(self.worker_id, self.lease_seconds)
+            except Exception as e:
+                logger.error(f"🎬 [PRESENTATION_WORKERS] Slot {slot} failed to claim a job: {e}")
+                row = None
+
+            if row is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=PRESENTATION_QUEUE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            try:
+                await self._run_claimed_job(row)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"🎬 [PRESENTATION_WORKERS] Slot {slot} failed running job {row['job_id']}: {e}")
+
+    async def _run_claimed_job(self, row: Dict[str, Any]):
+        job = _job_from_row(row)
+        job_id = job.job_id
+        self.jobs[job_id] = job
+
+        if job.attempts > PRESENTATION_JOB_MAX_ATTEMPTS:
+            logger.error(f"🎬 [PRESENTATION_WORKERS] Job {job_id} failed after {job.attempts - 1} attempts, giving up")
+            self._update_job_status(
+                job_id,
+                status="failed",
+                error=f"Presentation rendering was interrupted {job.attempts - 1} times",
+                completed_at=datetime.now()
+            )
+            await self._finish_job(job_id)
+            return
+
+        if job.attempts > 1:
+            logger.info(f"🎬 [PRESENTATION_WORKERS] Resuming job {job_id} (attempt {job.attempts}) from checkpoints: {list(job.checkpoints.keys())}")
+        else:
+            logger.info(f"🎬 [PRESENTATION_WORKERS] Claimed job {job_id}")
+
+        request = _request_from_dict(row["request"])
+        lease_renewal = asyncio.create_task(self._renew_lease(job_id))
+        try:
+            await self._main_loop.run_in_executor(self._executor, self._run_job_in_thread, job_id, request)
+        except asyncio.CancelledError:
+            # Shutting down: keep the lease so the job is resumed elsewhere once it expires
+            lease_renewal.cancel()
+            raise
+        lease_renewal.cancel()
+        await self._finish_job(job_id)
+
+    def _run_job_in_thread(self, job_id: str, request: PresentationRequest):
+        """
+        Runs on a worker thread. Rendering still does blocking work (ffmpeg,
+        OpenCV), so it stays off the main event loop.
+        """
+        loop = _worker_thread_loop()
+        try:
+            loop.run_until_complete(self._process_presentation(job_id, request))
+        except Exception as e:
+            logger.error(f"Thread processing failed for {job_id}: {e}")
+            self._update_job_status(job_id, status="failed", error=str(e), completed_at=datetime.now())
+            loop.run_until_complete(self._stop_heartbeat(job_id))
+        finally:
+            pending = [task for task in asyncio.all_tasks(loop) if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+
+    async def _renew_lease(self, job_id: str):
+        """
+        Renews the lease from the main loop while the job renders, so blocking
+        steps on the worker thread cannot let it lapse.
+        """
+        interval = min(self.heartbeat_interval, self.lease_seconds / 3)
+        while True:
+            await asyncio.sleep(interval)
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job.last_heartbeat = datetime.now()
+            self._persist_soon(job_id)
+
+    async def _finish_job(self, job_id: str):
+        """Write the final state, release the lease and drop the local copy."""
+        pending_write = self._persist_tasks.get(job_id)
+        if pending_write is not None:
+            await pending_write
+        job = self.jobs.pop(job_id, None)
+        if job is None:
+            return
+        try:
+            if not await self.store.save(job_id, self.worker_id, _job_state(job), self.lease_seconds, release=True):
+                logger.warning(f"🎬 [PRESENTATION_WORKERS] Lease for job {job_id} was taken over before it finished")
+        except Exception as e:
+            logger.error(f"🎬 [PRESENTATION_WORKERS] Failed to store final state of job {job_id}: {e}")
+
+    def _schedule_persist(self, job_id: str):
+        """Queue a write of the job state to the store; callable from the worker threads."""
+        main_loop = self._main_loop
+        if main_loop is None or main_loop.is_closed():
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is main_loop:
+            self._persist_soon(job_id)
+        else:
+            main_loop.call_soon_threadsafe(self._persist_soon, job_id)
+
+    def _persist_soon(self, job_id: str):
+        # At most one write per job in flight; updates made meanwhile are coalesced into the next one
+        if job_id in self._persist_tasks:
+            self._dirty_jobs.add(job_id)
+            return
+        self._persist_tasks[job_id] = asyncio.create_task(self._persist_job(job_id))
+
+    async def _persist_job(self, job_id: str):
+        try:
+            while True:
+                self._dirty_jobs.discard(job_id)
+                job = self.jobs.get(job_id)
+                if job is None:
+                    return
+                try:
+                    if not await self.store.save(job_id, self.worker_id, _job_state(job), self.lease_seconds):
+                        logger.warning(f"🎬 [JOB_STATUS_UPDATE] Lease for job {job_id} is held by another worker, update not stored")
+                except Exception as e:
+                    logger.warning(f"🎬 [JOB_STATUS_UPDATE] Failed to store status of job {job_id}: {e}")
+                if job_id not in self._dirty_jobs:
+                    return
+        finally:
+            self._persist_tasks.pop(job_id, None)
+
+    async def _call_store(self, coro):
+        """Await a store coroutine on the main loop (the DB pool belongs to it)."""
+        main_loop = self._main_loop
+        if main_loop is None or asyncio.get_running_loop() is main_loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, main_loop))
+
+    async def _save_checkpoint(self, job_id: str, name: str, value: Any):
+        """
+        Record a finished stage so a resumed job can skip it. Checkpoints are
+        avatar_video_ids (Elai renders, reusable from any host) and per-slide
+        file paths under avatar_videos / slide_videos / segments (reused only
+        when the file is still on disk).
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        job.checkpoints[name] = value
+        try:
+            await self._call_store(self.store.save_checkpoint(job_id, self.worker_id, name, value))
+        except Exception as e:
+            logger.warning(f"🎬 [CHECKPOINT] Failed to store checkpoint {name} for job {job_id}: {e}")
+
+    async def _save_slide_checkpoint(self, job_id: str, stage: str, slide_index: int, path: str):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        stage_paths = dict(job.checkpoints.get(stage) or {})
+        stage_paths[str(slide_index)] = path
+        await self._save_checkpoint(job_id, stage, stage_paths)
+
+    def _checkpointed_file(self, job: PresentationJob, stage: str, slide_index: int) -> Optional[str]:
+        path = (job.checkpoints.get(stage) or {}).get(str(slide_index))
+        if path and os.path.exists(path):
+            return path
+        return None
     
     def _update_job_status(self, job_id: str, **kwargs):
         """
@@ -107,6 +405,8 @@ class ProfessionalPresentationService:
                 logger.info(f"🎬 [JOB_STATUS_UPDATE] Status changed: {old_status} → {kwargs['status']}")
             if 'progress' in kwargs:
                 logger.info(f"🎬 [JOB_STATUS_UPDATE] Progress updated: {old_progress}% → {kwargs['progress']}%")
+
+            self._schedule_persist(job_id)
     
     async def _start_heartbeat(self, job_id: str):
         """
@@ -197,19 +497,14 @@ class ProfessionalPresentationService:
             logger.info(f"  - voice_provider: {request.voice_provider}")
             logger.info("🎤 [PRESENTATION_SERVICE] ========== VOICE PARAMETERS LOGGED ==========")
             
-            # Create job tracking
-            job = PresentationJob(
-                job_id=job_id,
-                status="queued"
-            )
-            self.jobs[job_id] = job
+            # Queue the job; a worker (in this or any other backend process) claims it
+            if self._main_loop is None:
+                await self.start()
+            await self.store.create(job_id, _request_to_dict(request), datetime.now())
+            self._wakeup.set()
             
             logger.info(f"Created presentation job: {job_id}")
             
-            # Start background processing (completely detached)
-            loop = asyncio.get_event_loop()
-            loop.create_task(self._process_presentation_detached(job_id, request))
-            
             return job_id
             
         except Exception as e:
@@ -226,50 +521,11 @@ class ProfessionalPresentationService:
         Returns:
             Job status or None if not found
         """
-        return self.jobs.get(job_id)
-    
-    async def _process_presentation_detached(self, job_id: str, request: PresentationRequest):
-        """
-        Completely detached presentation processing that won't block any endpoints.
-        Runs in a separate thread to avoid blocking the main event loop.
-        """
-        import concurrent.futures
-        
-        def run_blocking_processing():
-            """Run the processing in a separate thread."""
-            try:
-                # Create a new event loop for this thread
-                import asyncio
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                # Run the processing
-                loop.run_until_complete(self._process_presentation(job_id, request))
-                
-            except Exception as e:
-                logger.error(f"Thread processing failed for {job_id}: {e}")
-                if job_id in self.jobs:
-                    self.jobs[job_id].status = "failed"
-                    self.jobs[job_id].error = str(e)
-                    self.jobs[job_id].completed_at = datetime.now()
-                    
-                # Stop heartbeat for failed job (run in the main event loop)
-                main_loop = asyncio.new_event_loop()
-                main_loop.run_until_complete(self._stop_heartbeat(job_id))
-                # CRITICAL FIX: Schedule cleanup for failed jobs too
-                main_loop.run_until_complete(
-                    self._schedule_job_cleanup(job_id, delay_minutes=5)
-                )
-                main_loop.close()
-            finally:
-                try:
-                    loop.close()
-                except:
-                    pass
-        
-        # Run in thread pool to avoid blocking main event loop
-        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
-        executor.submit(run_blocking_processing)
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job
+        row = await self.store.get(job_id)
+        return _job_from_row(row) if row is not None else None
     
     async def _process_presentation(self, job_id: str, request: PresentationRequest):
         """
@@ -447,10 +703,6 @@ class ProfessionalPresentationService:
                 logger.info(f"🎬 [FINAL_COMPLETION] Frontend should now receive completion status and trigger download")
                 logger.info(f"🎬 [FINAL_COMPLETION] *** COMPLETION PROCESS FINISHED FOR JOB {job_id} ***")
                 
-                # CRITICAL FIX: Schedule job cleanup after completion to prevent resource buildup
-                # Clean up completed job from memory after a delay to allow frontend to download
-                asyncio.create_task(self._schedule_job_cleanup(job_id, delay_minutes=30))
-                
             except Exception as e:
                 logger.error(f"Presentation processing failed: {e}")
                 raise
@@ -533,15 +785,20 @@ class ProfessionalPresentationService:
             
             # OPTIMIZATION: Generate avatar video FIRST to get actual duration
             logger.info(f"🎬 [SINGLE_SLIDE_PROCESSING] Step 1: Generating avatar video (to determine duration)")
-            avatar_video_path = await self._generate_avatar_video(
-                request.voiceover_texts,
-                request.avatar_code,
-                request.duration,
-                request.use_avatar_mask,
-                voice_id=request.voice_id,
-                voice_provider=request.voice_provider,
-                elai_background_color=elai_background_color
-            )
+            avatar_video_path = self._checkpointed_file(job, "avatar_videos", 0)
+            if avatar_video_path:
+                logger.info(f"🎬 [SINGLE_SLIDE_PROCESSING] Resuming: reusing avatar video from an earlier attempt")
+            else:
+                avatar_video_path = await self._generate_avatar_video(
+                    request.voiceover_texts,
+                    request.avatar_code,
+                    request.duration,
+                    request.use_avatar_mask,
+                    voice_id=request.voice_id,
+                    voice_provider=request.voice_provider,
+                    elai_background_color=elai_background_color
+                )
+                await self._save_slide_checkpoint(job_id, "avatar_videos", 0, avatar_video_path)
             self._update_job_status(job_id, progress=40.0)
             
             logger.info(f"🎬 [SINGLE_SLIDE_PROCESSING] Avatar video generated: {avatar_video_path}")
@@ -644,19 +901,31 @@ class ProfessionalPresentationService:
             # OPTIMIZATION: If not slide-only mode, initiate ALL avatar videos in parallel at once
             avatar_video_ids = []
             if not request.slide_only:
-                logger.info(f"🎬 [MULTI_SLIDE_PROCESSING] 🚀 OPTIMIZATION: Initiating all {len(slides_data)} avatar videos in parallel")
-                avatar_video_ids = await self._initiate_all_avatar_videos(
-                    slides_data=slides_data,
-                    avatar_code=request.avatar_code,
-                    voice_id=request.voice_id,
-                    voice_provider=request.voice_provider
-                )
-                logger.info(f"🎬 [MULTI_SLIDE_PROCESSING] ✅ All avatar videos rendering in parallel")
+                avatar_video_ids = job.checkpoints.get("avatar_video_ids") or []
+                if len(avatar_video_ids) == len(slides_data):
+                    logger.info(f"🎬 [MULTI_SLIDE_PROCESSING] Resuming: reusing {len(avatar_video_ids)} avatar videos initiated by an earlier attempt")
+                else:
+                    logger.info(f"🎬 [MULTI_SLIDE_PROCESSING] 🚀 OPTIMIZATION: Initiating all {len(slides_data)} avatar videos in parallel")
+                    avatar_video_ids = await self._initiate_all_avatar_videos(
+                        slides_data=slides_data,
+                        avatar_code=request.avatar_code,
+                        voice_id=request.voice_id,
+                        voice_provider=request.voice_provider
+                    )
+                    await self._save_checkpoint(job_id, "avatar_video_ids", list(avatar_video_ids))
+                    logger.info(f"🎬 [MULTI_SLIDE_PROCESSING] ✅ All avatar videos rendering in parallel")
             
             # Process each slide individually (avatar videos are already rendering in parallel)
             for slide_index, slide_data in enumerate(slides_data):
                 logger.info(f"🎬 [MULTI_SLIDE_PROCESSING] Processing slide {slide_index + 1}/{len(slides_data)}")
                 
+                segment_path = self._checkpointed_file(job, "segments", slide_index)
+                if segment_path:
+                    logger.info(f"🎬 [MULTI_SLIDE_PROCESSING] Resuming: slide {slide_index + 1} already composed: {segment_path}")
+                    individual_videos.append(segment_path)
+                    temp_files_to_cleanup.append(segment_path)
+                    continue
+                
                 # Update progress based on slide processing (more granular)
                 base_progress = 10 + (slide_index * 70 // len(slides_data))
                 self._update_job_status(job_id, progress=base_progress)
@@ -693,6 +962,7 @@ class ProfessionalPresentationService:
                     slide_video_path = slide_result["video_path"]
                     temp_files_to_cleanup.append(slide_video_path)
                     individual_videos.append(slide_video_path)
+                    await self._save_slide_checkpoint(job_id, "segments", slide_index, slide_video_path)
                     logger.info(f"🐛 [DEBUG_MODE] Slide {slide_index + 1} video generated (no avatar): {slide_video_path}")
                     continue
                 
@@ -705,13 +975,16 @@ class ProfessionalPresentationService:
                 logger.info(f"🎬 [MULTI_SLIDE_PROCESSING] Waiting for avatar for slide {slide_index + 1} - Progress: {avatar_start_progress}%")
                 
                 # Wait for the pre-initiated avatar video
-                avatar_video_path = await self._wait_for_avatar_video(
-                    video_id=avatar_video_ids[slide_index],
-                    job_id=job_id,
-                    slide_index=slide_index,
-                    start_progress=base_progress + 10,
-                    end_progress=base_progress + 30
-                )
+                avatar_video_path = self._checkpointed_file(job, "avatar_videos", slide_index)
+                if not avatar_video_path:
+                    avatar_video_path = await self._wait_for_avatar_video(
+                        video_id=avatar_video_ids[slide_index],
+                        job_id=job_id,
+                        slide_index=slide_index,
+                        start_progress=base_progress + 10,
+                        end_progress=base_progress + 30
+                    )
+                    await self._save_slide_checkpoint(job_id, "avatar_videos", slide_index, avatar_video_path)
                 temp_files_to_cleanup.append(avatar_video_path)
                 logger.info(f"🎬 [MULTI_SLIDE_PROCESSING] Avatar video for slide {slide_index + 1} ready: {avatar_video_path}")
                 
@@ -722,17 +995,20 @@ class ProfessionalPresentationService:
                 
                 # Generate slide video with MATCHING duration to avatar
                 logger.info(f"🎬 [MULTI_SLIDE_PROCESSING] Step 2: Generating slide video for slide {slide_index + 1} with matching duration ({avatar_duration:.2f}s)")
-                slide_result = await clean_video_generation_service.generate_avatar_slide_video(
-                    slide_props=slide_data,
-                    theme=request.theme or "dark-purple",
-                    slide_duration=avatar_duration,  # Use avatar duration instead of request.duration
-                    quality=request.quality
-                )
-                
-                if not slide_result["success"]:
-                    raise Exception(f"Slide {slide_index + 1} video generation failed: {slide_result['error']}")
-                
-                slide_video_path = slide_result["video_path"]
+                slide_video_path = self._checkpointed_file(job, "slide_videos", slide_index)
+                if not slide_video_path:
+                    slide_result = await clean_video_generation_service.generate_avatar_slide_video(
+                        slide_props=slide_data,
+                        theme=request.theme or "dark-purple",
+                        slide_duration=avatar_duration,  # Use avatar duration instead of request.duration
+                        quality=request.quality
+                    )
+                    
+                    if not slide_result["success"]:
+                        raise Exception(f"Slide {slide_index + 1} video generation failed: {slide_result['error']}")
+                    
+                    slide_video_path = slide_result["video_path"]
+                    await self._save_slide_checkpoint(job_id, "slide_videos", slide_index, slide_video_path)
                 temp_files_to_cleanup.append(slide_video_path)
                 logger.info(f"🎬 [MULTI_SLIDE_PROCESSING] Slide {slide_index + 1} video generated: {slide_video_path}")
                 
@@ -773,6 +1049,7 @@ class ProfessionalPresentationService:
                 
                 individual_videos.append(individual_video_path)
                 temp_files_to_cleanup.append(individual_video_path)
+                await self._save_slide_checkpoint(job_id, "segments", slide_index, individual_video_path)
                 logger.info(f"🎬 [MULTI_SLIDE_PROCESSING] Individual video for slide {slide_index + 1} composed: {individual_video_path}")
             
             self._update_job_status(job_id, progress=80.0)
@@ -2012,7 +2289,7 @@ class ProfessionalPresentationService:
         Returns:
             Path to video file or None if not found
         """
-        job = self.jobs.get(job_id)
+        job = await self.get_job_status(job_id)
         if not job or job.status != "completed":
             return None
         
@@ -2029,7 +2306,7 @@ class ProfessionalPresentationService:
         Returns:
             Path to thumbnail file or None if not found
         """
-        job = self.jobs.get(job_id)
+        job = await self.get_job_status(job_id)
         if not job or job.status != "completed":
             return None
         
@@ -2046,7 +2323,7 @@ class ProfessionalPresentationService:
         Returns:
             Path to slide image file or None if not found
         """
-        job = self.jobs.get(job_id)
+        job = await self.get_job_status(job_id)
         if not job:
             logger.warning(f"Job not found for slide image download: {job_id}")
             return None
@@ -2081,9 +2358,9 @@ class ProfessionalPresentationService:
         Returns:
             List of presentation jobs
         """
-        jobs = list(self.jobs.values())
-        jobs.sort(key=lambda x: x.created_at, reverse=True)
-        return jobs[:limit]
+        jobs = [_job_from_row(row) for row in await self.store.list(limit)]
+        # Jobs rendering here may be ahead of their last stored update
+        return [self.jobs.get(job.job_id, job) for job in jobs]
     
     async def cleanup_old_jobs(self, days: int = 7):
         """
@@ -2095,64 +2372,20 @@ class ProfessionalPresentationService:
         try:
             cutoff_date = datetime.now() - timedelta(days=days)
             
-            for job_id, job in list(self.jobs.items()):
-                if job.created_at < cutoff_date:
-                    # Remove job from tracking
-                    del self.jobs[job_id]
-                    
-                    # Remove associated files
-                    video_path = self.output_dir / f"presentation_{job_id}.mp4"
-                    thumbnail_path = self.output_dir / f"thumbnail_{job_id}.jpg"
-                    
-                    if video_path.exists():
-                        video_path.unlink()
-                    if thumbnail_path.exists():
-                        thumbnail_path.unlink()
-                    
-                    logger.info(f"Cleaned up old job: {job_id}")
+            for job_id in await self.store.delete_older_than(cutoff_date):
+                # Remove associated files
+                video_path = self.output_dir / f"presentation_{job_id}.mp4"
+                thumbnail_path = self.output_dir / f"thumbnail_{job_id}.jpg"
+                
+                if video_path.exists():
+                    video_path.unlink()
+                if thumbnail_path.exists():
+                    thumbnail_path.unlink()
+                
+                logger.info(f"Cleaned up old job: {job_id}")
             
         except Exception as e:
             logger.error(f"Job cleanup failed: {e}")
-    
-    async def _schedule_job_cleanup(self, job_id: str, delay_minutes: int = 30):
-        """
-        Schedule cleanup of a completed job after a delay.
-        
-        Args:
-            job_id: Job ID to clean up
-            delay_minutes: Minutes to wait before cleanup (default: 30)
-        """
-        try:
-            # Wait for the specified delay
-            await asyncio.sleep(delay_minutes * 60)
-            
-            # Check if job still exists and is completed
-            if job_id in self.jobs:
-                job = self.jobs[job_id]
-                if job.status in ["completed", "failed"]:
-                    logger.info(f"🧹 [CLEANUP] Starting scheduled cleanup for completed job: {job_id}")
-                    
-                    # Stop any remaining heartbeat tasks
-                    if job_id in self.heartbeat_tasks:
-                        self.heartbeat_tasks[job_id].cancel()
-                        del self.heartbeat_tasks[job_id]
-                        logger.info(f"🧹 [CLEANUP] Cleaned up heartbeat task for job {job_id}")
-                    
-                    # Remove job from memory
-                    del self.jobs[job_id]
-                    logger.info(f"🧹 [CLEANUP] Job {job_id} removed from memory after {delay_minutes} minutes")
-                    
-                    # Log current memory usage
-                    active_jobs = len(self.jobs)
-                    active_heartbeats = len(self.heartbeat_tasks)
-                    logger.info(f"🧹 [CLEANUP] Memory state: {active_jobs} active jobs, {active_heartbeats} heartbeat tasks")
-                else:
-                    logger.info(f"🧹 [CLEANUP] Job {job_id} is still {job.status}, skipping cleanup")
-            else:
-                logger.info(f"🧹 [CLEANUP] Job {job_id} already cleaned up")
-                
-        except Exception as e:
-            logger.error(f"🧹 [CLEANUP] Failed to clean up job {job_id}: {e}")
 
 # Global instance
 presentation_service = ProfessionalPresentationService()
@@ -6,7 +6,7 @@ from app.core.database import execute_query, fetch_one, fetch_all, fetch_val
 from app.models.workspace_models import (
     ProductAccess, ProductAccessCreate, AccessType, Permission
 )
-from app.services.role_service import RoleService
+from app.services.access_index import UserProductAccessIndex
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +41,7 @@ class ProductAccessService:
                 RETURNING id
             """, access_data.product_id, access_data.workspace_id, 
                  access_data.access_type, access_data.target_id, granted_by)
+            await UserProductAccessIndex.refresh_product(access_data.workspace_id, access_data.product_id)
             
             return await ProductAccessService.get_product_access(access_id)
             
@@ -141,7 +142,7 @@ class ProductAccessService:
             
             # Check if access exists and belongs to workspace
             existing_access = await fetch_one("""
-                SELECT id FROM product_access 
+                SELECT id, product_id FROM product_access 
                 WHERE id = $1 AND workspace_id = $2
             """, access_id, workspace_id)
             
@@ -153,6 +154,7 @@ class ProductAccessService:
                 DELETE FROM product_access 
                 WHERE id = $1
             """, access_id)
+            await UserProductAccessIndex.refresh_product(workspace_id, existing_access['product_id'])
             
             logger.info(f"Product access {access_id} revoked by {revoked_by}")
             return True
@@ -165,33 +167,7 @@ class ProductAccessService:
     async def check_user_product_access(product_id: int, user_id: str, workspace_id: int) -> bool:
         """Check if a user has access to a specific product in a workspace."""
         try:
-            # Check workspace-level access
-            workspace_access = await fetch_one("""
-                SELECT id FROM product_access 
-                WHERE product_id = $1 AND workspace_id = $2 AND access_type = 'workspace'
-            """, product_id, workspace_id)
-            
-            if workspace_access:
-                return True
-            
-            # Check role-level access
-            user_role = await RoleService._get_user_role(workspace_id, user_id)
-            if user_role:
-                role_access = await fetch_one("""
-                    SELECT id FROM product_access 
-                    WHERE product_id = $1 AND workspace_id = $2 AND access_type = 'role' AND target_id = $3
-                """, product_id, workspace_id, user_role.get('id'))
-                
-                if role_access:
-                    return True
-            
-            # Check individual access
-            individual_access = await fetch_one("""
-                SELECT id FROM product_access 
-                WHERE product_id = $1 AND workspace_id = $2 AND access_type = 'individual' AND target_id = $3
-            """, product_id, workspace_id, user_id)
-            
-            return individual_access is not None
+            return await UserProductAccessIndex.has_access(product_id, [user_id], workspace_id)
             
         except Exception as e:
             logger.error(f"Failed to check user product access: {e}")
@@ -201,38 +177,7 @@ class ProductAccessService:
     async def get_user_accessible_products(user_id: str, workspace_id: int) -> List[int]:
         """Get all product IDs that a user can access in a workspace."""
         try:
-            accessible_products = set()
-            
-            # Get workspace-level access
-            workspace_products = await fetch_all("""
-                SELECT DISTINCT product_id FROM product_access 
-                WHERE workspace_id = $1 AND access_type = 'workspace'
-            """, workspace_id)
-            
-            for row in workspace_products:
-                accessible_products.add(row['product_id'])
-            
-            # Get role-level access
-            user_role = await RoleService._get_user_role(workspace_id, user_id)
-            if user_role:
-                role_products = await fetch_all("""
-                    SELECT DISTINCT product_id FROM product_access 
-                    WHERE workspace_id = $1 AND access_type = 'role' AND target_id = $2
-                """, workspace_id, user_role.get('id'))
-                
-                for row in role_products:
-                    accessible_products.add(row['product_id'])
-            
-            # Get individual access
-            individual_products = await fetch_all("""
-                SELECT DISTINCT product_id FROM product_access 
-                WHERE workspace_id = $1 AND access_type = 'individual' AND target_id = $2
-            """, workspace_id, user_id)
-            
-            for row in individual_products:
-                accessible_products.add(row['product_id'])
-            
-            return list(accessible_products)
+            return await UserProductAccessIndex.accessible_products([user_id], workspace_id)
             
         except Exception as e:
             logger.error(f"Failed to get user accessible products: {e}")
@@ -302,6 +247,9 @@ class ProductAccessService:
                     if access:
                         granted_access.append(access)
             
+            if granted_access:
+                await UserProductAccessIndex.refresh_product(workspace_id, product_id)
+            
             logger.info(f"Bulk granted access to {len(granted_access)} targets for product {product_id}")
             return granted_access
             
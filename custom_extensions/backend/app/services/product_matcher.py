@@ -0,0 +1,244 @@
+# custom_extensions/backend/app/services/product_matcher.py
+import json
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.database import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Only what matching needs; content is loaded per matched product by the exporters
+PRODUCT_MATCH_QUERY = """
+    SELECT p.id, p.project_name, p.microproduct_name, p.created_at,
+           dt.microproduct_type, dt.component_name
+    FROM projects p
+    LEFT JOIN design_templates dt ON p.design_template_id = dt.id
+    WHERE p.onyx_user_id = $1
+    ORDER BY p.created_at
+"""
+
+# Microproduct types a recommended item type can be satisfied by
+ITEM_TYPE_MICROPRODUCTS: Dict[str, List[str]] = {
+    'presentation': ['Slide Deck'],
+    'one-pager': ['One Pager', 'Text Presentation', 'PDF Lesson'],
+    'onepager': ['One Pager', 'Text Presentation', 'PDF Lesson'],
+    'quiz': ['Quiz'],
+}
+
+# Name prefixes used when products are generated from an outline lesson
+TYPE_NAME_PREFIXES = {
+    'Slide Deck': 'Presentation',
+    'One Pager': 'One Pager',
+    'Text Presentation': 'Text Presentation',
+    'PDF Lesson': 'PDF Lesson',
+}
+INFERRED_NAME_PREFIXES = ['Presentation', 'Text Presentation', 'One Pager', 'PDF Lesson', 'Quiz']
+
+
+def map_item_type_to_microproduct(item_type: str) -> Optional[List[str]]:
+    return ITEM_TYPE_MICROPRODUCTS.get((item_type or '').strip().lower())
+
+
+def type_aliases_for_group(group_type: str) -> List[str]:
+    g = (group_type or '').strip().lower()
+    if g == 'slide deck':
+        return ['slide deck', 'presentation', 'presentationdisplay', 'slidedeck']
+    if g == 'one pager':
+        return ['one pager', 'one-pager', 'onepager', 'text presentation', 'textpresentation', 'textpresentationdisplay', 'pdf lesson', 'pdflesson']
+    if g == 'text presentation':
+        return ['text presentation', 'textpresentation', 'textpresentationdisplay', 'one pager', 'one-pager', 'onepager']
+    if g == 'pdf lesson':
+        return ['pdf lesson', 'pdflesson', 'one pager', 'one-pager', 'onepager']
+    if g == 'quiz':
+        return ['quiz', 'quizdisplay']
+    return [g]
+
+
+def parse_primary_list(raw_primary) -> List[Dict[str, Any]]:
+    """Normalize a lesson's primary recommendations into a list of dicts with 'type'. Supports JSON strings."""
+    if raw_primary is None:
+        return []
+    if isinstance(raw_primary, list):
+        out: List[Dict[str, Any]] = []
+        for it in raw_primary:
+            if isinstance(it, dict):
+                out.append(it)
+            elif isinstance(it, str):
+                t = it.strip().strip('"').strip("'")
+                out.append({"type": t})
+        return out
+    if isinstance(raw_primary, str):
+        s = raw_primary.strip()
+        try:
+            if (s.startswith('[') and s.endswith(']')) or (s.startswith('{') and s.endswith('}')):
+                parsed = json.loads(s)
+                return parse_primary_list(parsed)
+        except Exception:
+            pass
+        s = s.strip('[]')
+        parts = [p.strip().strip('"').strip("'") for p in s.split(',') if p.strip()]
+        return [{"type": p} for p in parts if p]
+    return []
+
+
+def parse_recommended_products_field(value) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(v).strip().lower() for v in value if isinstance(v, (str,))]
+    if isinstance(value, str):
+        sv = value.strip()
+        try:
+            if sv.startswith('[') and sv.endswith(']'):
+                arr = json.loads(sv)
+                return [str(v).strip().lower() for v in arr if isinstance(v, (str,))]
+        except Exception:
+            pass
+        sv = sv.strip('[]')
+        return [p.strip().strip('"').strip("'").lower() for p in sv.split(',') if p.strip()]
+    return []
+
+
+async def load_user_products(user_id: str) -> List[Dict[str, Any]]:
+    async with get_connection() as connection:
+        rows = await connection.fetch(PRODUCT_MATCH_QUERY, user_id)
+    return [dict(r) for r in rows]
+
+
+class _TypeGroup:
+    """Products of one target type family, indexed by normalized names (each list in created_at order)."""
+
+    def __init__(self):
+        self.products: List[Dict[str, Any]] = []
+        self.by_project_name: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_microproduct_name: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_both_names: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+
+    def add(self, product: Dict[str, Any], pname: str, mname: str) -> None:
+        self.products.append(product)
+        self.by_project_name.setdefault(pname, []).append(product)
+        self.by_microproduct_name.setdefault(mname, []).append(product)
+        self.by_both_names.setdefault((pname, mname), []).append(product)
+
+
+def _first_unused(products: Optional[List[Dict[str, Any]]], used_ids: set) -> Optional[Dict[str, Any]]:
+    for product in products or ():
+        if product.get('id') not in used_ids:
+            return product
+    return None
+
+
+class ProductMatcher:
+    """
+    Resolves outline lessons to the user's products for the SCORM and LMS exports.
+
+    Built once per export: every product is normalized and indexed by name for
+    each type family it belongs to, so a lesson is resolved with a handful of
+    dict lookups instead of a scan over all products per pattern. Results keep
+    the old precedence (quiz/prefixed name, "{outline}: {lesson}", microproduct
+    name, outline + microproduct name, project name) and, within a pattern,
+    the oldest unused product wins.
+    """
+
+    def __init__(self, products: Iterable[Dict[str, Any]], log_tag: str = "[PRODUCT-MATCH]"):
+        self.log_tag = log_tag
+        self.products: List[Dict[str, Any]] = list(products)
+        self._groups: Dict[Tuple[str, ...], _TypeGroup] = {}
+        self._aliases: Dict[Tuple[str, ...], set] = {}
+        for target_mtypes in ITEM_TYPE_MICROPRODUCTS.values():
+            key = tuple(target_mtypes)
+            if key in self._groups:
+                continue
+            self._groups[key] = _TypeGroup()
+            self._aliases[key] = {alias for t in target_mtypes for alias in type_aliases_for_group(t)}
+        # For inference: every non-training-plan product by project name
+        self._by_project_name: Dict[str, List[Dict[str, Any]]] = {}
+        self._positions: Dict[int, int] = {id(p): i for i, p in enumerate(self.products)}
+
+        for product in self.products:
+            pname = (product.get('project_name') or '').strip()
+            mname = (product.get('microproduct_name') or '').strip()
+            mtype = (product.get('microproduct_type') or '').strip().lower()
+            comp = (product.get('component_name') or '').strip().lower()
+            for key, aliases in self._aliases.items():
+                if (mtype and mtype in aliases) or (comp and comp in aliases):
+                    self._groups[key].add(product, pname, mname)
+            if pname and mtype != 'training plan':
+                self._by_project_name.setdefault(pname, []).append(product)
+
+    @classmethod
+    async def for_user(cls, user_id: str, log_tag: str = "[PRODUCT-MATCH]") -> "ProductMatcher":
+        return cls(await load_user_products(user_id), log_tag)
+
+    def type_breakdown(self) -> Dict[str, int]:
+        types_count: Dict[str, int] = {}
+        for p in self.products:
+            t1 = (p.get('microproduct_type') or '').strip().lower()
+            t2 = (p.get('component_name') or '').strip().lower()
+            key = t1 or t2 or 'unknown'
+            types_count[key] = types_count.get(key, 0) + 1
+        return types_count
+
+    def match(
+        self,
+        outline_name: str,
+        lesson_title: str,
+        desired_type: str,
+        used_ids: set,
+        fuzzy: bool = False,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        The product connected to `lesson_title` for a recommended item type, or None.
+        `fuzzy` adds a last-resort substring match between lesson title and project name.
+        """
+        target_mtypes = map_item_type_to_microproduct(desired_type)
+        if not target_mtypes or not lesson_title:
+            logger.info(f"{self.log_tag} No target types for desired_type='{desired_type}' or no lesson_title")
+            return None
+        group = self._groups[tuple(target_mtypes)]
+        logger.info(f"{self.log_tag} Looking for type='{desired_type}' (mtypes={target_mtypes}) for lesson='{lesson_title}' | {len(group.products)} candidates of this type")
+
+        lookups: List[Tuple[str, Optional[List[Dict[str, Any]]]]] = []
+        if 'Quiz' in target_mtypes:
+            lookups.append(("A (Quiz)", group.by_project_name.get(f"Quiz - {outline_name}: {lesson_title}")))
+        for t in target_mtypes:
+            if t in TYPE_NAME_PREFIXES:
+                lookups.append(("A2 (Prefixed)", group.by_project_name.get(f"{TYPE_NAME_PREFIXES[t]} - {outline_name}: {lesson_title}")))
+        lookups.append(("B (Outline:Lesson)", group.by_project_name.get(f"{outline_name}: {lesson_title}")))
+        lookups.append(("C (mname==lesson)", group.by_microproduct_name.get(lesson_title)))
+        lookups.append(("E (pname==outline AND mname==lesson)", group.by_both_names.get((outline_name, lesson_title))))
+        lookups.append(("D (pname==lesson)", group.by_project_name.get(lesson_title)))
+
+        for pattern, products in lookups:
+            product = _first_unused(products, used_ids)
+            if product is not None:
+                logger.info(f"{self.log_tag} ✓ Matched Pattern {pattern} id={product.get('id')}")
+                return dict(product)
+
+        if fuzzy:
+            # Substring match cannot be keyed; only reached when every exact pattern missed
+            lt = lesson_title.lower()
+            for product in group.products:
+                pn = (product.get('project_name') or '').strip().lower()
+                if (lt in pn or pn in lt) and product.get('id') not in used_ids:
+                    logger.info(f"{self.log_tag} ✓ Matched Pattern F (Fuzzy) id={product.get('id')}, pname='{product.get('project_name')}'")
+                    return dict(product)
+
+        logger.info(f"{self.log_tag} ✗ No match found for type='{desired_type}' lesson='{lesson_title}' outline='{outline_name}'")
+        return None
+
+    def infer(self, outline_name: str, lesson_title: str, used_ids: set) -> List[Dict[str, Any]]:
+        """Products named after the lesson ("{outline}: {lesson}" or a type-prefixed variant), oldest first."""
+        if not lesson_title:
+            return []
+        base_name = f"{outline_name}: {lesson_title}"
+        names = [base_name] + [f"{prefix} - {base_name}" for prefix in INFERRED_NAME_PREFIXES]
+        matches = [
+            product
+            for name in dict.fromkeys(names)
+            for product in self._by_project_name.get(name, ())
+            if product.get('id') not in used_ids
+        ]
+        matches.sort(key=lambda p: self._positions[id(p)])
+        logger.info(f"{self.log_tag} Inferred products for lesson='{lesson_title}': {[m.get('id') for m in matches]}")
+        return [dict(m) for m in matches]
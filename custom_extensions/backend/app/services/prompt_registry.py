@@ -0,0 +1,199 @@
+# custom_extensions/backend/app/services/prompt_registry.py
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# How often (at most) the assistant files are stat()ed for changes
+PROMPT_REGISTRY_RECHECK_SECONDS = float(os.getenv("PROMPT_REGISTRY_RECHECK_SECONDS", "5"))
+
+BASE_INSTRUCTIONS_FILE = "content_builder_base.txt"
+FALLBACK_INSTRUCTIONS = "You are ContentBuilder.ai assistant. Follow the instructions in the user message exactly."
+
+# Wizard product name -> product-specific instruction file
+PRODUCT_INSTRUCTION_FILES: Dict[str, str] = {
+    'slides deck': 'content_builder_presentation.txt',
+    'lesson presentation': 'content_builder_presentation.txt',
+    'video lesson presentation': 'content_builder_presentation.txt',
+    'video lesson slides deck': 'content_builder_presentation.txt',
+    'text presentation': 'content_builder_onepager.txt',
+    'quiz': 'content_builder_quiz.txt',
+    'course outline': 'content_builder_outline.txt',
+    'video lesson script': 'content_builder_video.txt',
+}
+
+
+@dataclass(frozen=True)
+class _PromptFile:
+    text: str
+    sha256: str
+    mtime_ns: int
+    size: int
+
+
+@dataclass(frozen=True)
+class SystemPrompt:
+    """An assembled system message; `prefix_hash` identifies it byte for byte."""
+    text: str
+    prefix_hash: str
+    tokens: int
+    files: Tuple[str, ...]
+
+
+class PromptRegistry:
+    """
+    Assistant instruction files from `custom_assistants/`, read and hashed once.
+
+    Files are re-stat()ed at most every PROMPT_REGISTRY_RECHECK_SECONDS and
+    reloaded only when their mtime or size changed, so edits still apply
+    without a restart. `system_prompt()` memoizes the assembled system message
+    per (files, suffix) and content hashes: as long as nothing changed on disk
+    every request gets the very same string, which keeps the prompt prefix
+    identical for provider-side prompt caching.
+    """
+
+    def __init__(self, directory: str = "custom_assistants", encoding_name: str = "o200k_base"):
+        self.directory = directory
+        self._encoding_name = encoding_name
+        self._encoding = None
+        self._files: Dict[str, _PromptFile] = {}
+        self._assembled: Dict[Tuple, SystemPrompt] = {}
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _read(self, name: str, stat: os.stat_result) -> _PromptFile:
+        with open(self._path(name), 'r', encoding='utf-8') as f:
+            text = f.read()
+        return _PromptFile(
+            text=text,
+            sha256=hashlib.sha256(text.encode('utf-8')).hexdigest(),
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+        )
+
+    def load(self) -> int:
+        """Read every .txt file under the directory (startup preload). Returns the number of files loaded."""
+        files: Dict[str, _PromptFile] = {}
+        for root, _, names in os.walk(self.directory):
+            for filename in names:
+                if not filename.endswith('.txt'):
+                    continue
+                name = os.path.relpath(os.path.join(root, filename), self.directory).replace(os.sep, '/')
+                try:
+                    files[name] = self._read(name, os.stat(self._path(name)))
+                except OSError as e:
+                    logger.warning(f"[PROMPT_REGISTRY] Could not load {name}: {e}")
+        with self._lock:
+            self._files = files
+            self._assembled.clear()
+            self._last_check = time.monotonic()
+        logger.info(
+            f"[PROMPT_REGISTRY] Loaded {len(files)} assistant files from {self.directory}: "
+            + ", ".join(f"{name}={f.sha256[:12]}" for name, f in sorted(files.items()))
+        )
+        return len(files)
+
+    def _recheck(self) -> None:
+        """Reload files whose mtime/size changed since they were read; picks up new and deleted files too."""
+        now = time.monotonic()
+        if now - self._last_check < PROMPT_REGISTRY_RECHECK_SECONDS:
+            return
+        with self._lock:
+            if now - self._last_check < PROMPT_REGISTRY_RECHECK_SECONDS:
+                return
+            self._last_check = now
+            changed = []
+            for name, current in list(self._files.items()):
+                try:
+                    stat = os.stat(self._path(name))
+                except OSError:
+                    del self._files[name]
+                    changed.append(name)
+                    continue
+                if stat.st_mtime_ns == current.mtime_ns and stat.st_size == current.size:
+                    continue
+                try:
+                    reloaded = self._read(name, stat)
+                except OSError as e:
+                    logger.warning(f"[PROMPT_REGISTRY] Could not reload {name}, keeping previous version: {e}")
+                    continue
+                if reloaded.sha256 != current.sha256:
+                    changed.append(name)
+                self._files[name] = reloaded
+            if changed:
+                self._assembled.clear()
+                logger.info(f"[PROMPT_REGISTRY] Reloaded changed assistant files: {changed}")
+
+    def get(self, name: str) -> Optional[str]:
+        """Text of one assistant file (path relative to the directory), or None if it does not exist."""
+        self._recheck()
+        prompt_file = self._files.get(name)
+        if prompt_file is None:
+            # Files added after startup are picked up on first use
+            try:
+                prompt_file = self._read(name, os.stat(self._path(name)))
+            except OSError:
+                return None
+            with self._lock:
+                self._files[name] = prompt_file
+        return prompt_file.text
+
+    def count_tokens(self, text: str) -> int:
+        if self._encoding is None:
+            try:
+                self._encoding = tiktoken.get_encoding(self._encoding_name)
+            except Exception:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+        return len(self._encoding.encode(text or ""))
+
+    def system_prompt(self, product: Optional[str] = None, suffix: str = "") -> SystemPrompt:
+        """
+        Base instructions, then the product-specific file (if the wizard product
+        has one), then `suffix`, which must itself be constant per call site.
+        """
+        self._recheck()
+        product_file = PRODUCT_INSTRUCTION_FILES.get((product or '').strip().lower())
+        names = (BASE_INSTRUCTIONS_FILE,) + ((product_file,) if product_file else ())
+        key = (names, suffix)
+        assembled = self._assembled.get(key)
+        if assembled is not None:
+            return assembled
+
+        base = self.get(BASE_INSTRUCTIONS_FILE)
+        if base is None:
+            logger.warning(f"[PROMPT_REGISTRY] Base file not found: {self._path(BASE_INSTRUCTIONS_FILE)}")
+            # Not memoized, so the file is picked up as soon as it appears
+            return SystemPrompt(FALLBACK_INSTRUCTIONS, hashlib.sha256(FALLBACK_INSTRUCTIONS.encode('utf-8')).hexdigest(), 0, ())
+        parts = [base]
+        used = [BASE_INSTRUCTIONS_FILE]
+        if product_file:
+            product_text = self.get(product_file)
+            if product_text is None:
+                logger.warning(f"[PROMPT_REGISTRY] Product file not found: {self._path(product_file)}")
+            else:
+                parts.append(product_text)
+                used.append(product_file)
+        text = "\n\n".join(parts) + suffix
+        assembled = SystemPrompt(
+            text=text,
+            prefix_hash=hashlib.sha256(text.encode('utf-8')).hexdigest(),
+            tokens=self.count_tokens(text),
+            files=tuple(used),
+        )
+        with self._lock:
+            self._assembled[key] = assembled
+        logger.info(
+            f"[PROMPT_REGISTRY] Assembled system prompt files={list(used)} suffix_len={len(suffix)} "
+            f"| prefix_hash={assembled.prefix_hash[:16]} tokens={assembled.tokens} chars={len(text)}"
+        )
+        return assembled
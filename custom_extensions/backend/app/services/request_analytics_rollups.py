@@ -0,0 +1,404 @@
+# custom_extensions/backend/app/services/request_analytics_rollups.py
+import asyncio
+import bisect
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.services.request_analytics_writer import REQUEST_ANALYTICS_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Minute buckets back the "last hour" view only; hour buckets are kept indefinitely
+REQUEST_ANALYTICS_MINUTE_RETENTION_HOURS = int(os.getenv("REQUEST_ANALYTICS_MINUTE_RETENTION_HOURS", "48"))
+REQUEST_ANALYTICS_ROLLUP_PRUNE_INTERVAL_SECONDS = 300
+REQUEST_ANALYTICS_BACKFILL_PREFETCH = 5000
+# How often a flush retries setting up the rollup tables after that failed
+REQUEST_ANALYTICS_ROLLUP_SCHEMA_RETRY_SECONDS = 60
+
+# Upper bounds (ms) of the latency histogram buckets; one extra bucket counts
+# everything slower. Changing these requires rebuilding the rollup tables.
+LATENCY_BUCKET_BOUNDS_MS = (
+    5, 10, 25, 50, 75, 100, 150, 200, 300, 400, 500, 750,
+    1000, 1500, 2000, 3000, 5000, 7500, 10000, 15000, 20000,
+    30000, 45000, 60000, 90000, 120000, 180000, 300000,
+)
+LATENCY_BUCKETS = len(LATENCY_BUCKET_BOUNDS_MS) + 1
+
+ROLLUP_MINUTE_TABLE = "request_analytics_rollup_minute"
+ROLLUP_HOUR_TABLE = "request_analytics_rollup_hour"
+ROLLUP_USER_HOUR_TABLE = "request_analytics_rollup_user_hour"
+
+_ROLLUP_COLUMNS_DDL = """
+    bucket TIMESTAMP WITH TIME ZONE NOT NULL,
+    endpoint TEXT NOT NULL,
+    method TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    request_count BIGINT NOT NULL,
+    error_count BIGINT NOT NULL,
+    timeout_count BIGINT NOT NULL,
+    response_time_sum BIGINT NOT NULL,
+    response_time_min INTEGER NOT NULL,
+    response_time_max INTEGER NOT NULL,
+    data_bytes BIGINT NOT NULL,
+    ai_parser_requests BIGINT NOT NULL,
+    ai_parser_token_rows BIGINT NOT NULL,
+    ai_parser_tokens_sum BIGINT NOT NULL,
+    ai_parser_tokens_min INTEGER,
+    ai_parser_tokens_max INTEGER,
+    latency_histogram BIGINT[] NOT NULL,
+    PRIMARY KEY (bucket, endpoint, method, status_code)
+"""
+
+REQUEST_ANALYTICS_ROLLUPS_DDL = f"""
+CREATE TABLE IF NOT EXISTS {ROLLUP_MINUTE_TABLE} ({_ROLLUP_COLUMNS_DDL});
+CREATE TABLE IF NOT EXISTS {ROLLUP_HOUR_TABLE} ({_ROLLUP_COLUMNS_DDL});
+CREATE TABLE IF NOT EXISTS {ROLLUP_USER_HOUR_TABLE} (
+    bucket TIMESTAMP WITH TIME ZONE NOT NULL,
+    user_id TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    method TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    request_count BIGINT NOT NULL,
+    response_time_sum BIGINT NOT NULL,
+    last_request TIMESTAMP WITH TIME ZONE NOT NULL,
+    PRIMARY KEY (bucket, user_id, endpoint, method, status_code)
+);
+CREATE TABLE IF NOT EXISTS request_analytics_rollup_state (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    incremental_from TIMESTAMP WITH TIME ZONE NOT NULL,
+    backfilled_at TIMESTAMP WITH TIME ZONE
+);
+CREATE INDEX IF NOT EXISTS idx_request_analytics_errors_recent
+    ON request_analytics (created_at DESC) WHERE error_message IS NOT NULL OR status_code >= 400;
+"""
+
+_ROLLUP_UPSERT_SQL = """
+    INSERT INTO {table} AS r (
+        bucket, endpoint, method, status_code, request_count, error_count, timeout_count,
+        response_time_sum, response_time_min, response_time_max, data_bytes,
+        ai_parser_requests, ai_parser_token_rows, ai_parser_tokens_sum,
+        ai_parser_tokens_min, ai_parser_tokens_max, latency_histogram
+    )
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17)
+    ON CONFLICT (bucket, endpoint, method, status_code) DO UPDATE SET
+        request_count = r.request_count + EXCLUDED.request_count,
+        error_count = r.error_count + EXCLUDED.error_count,
+        timeout_count = r.timeout_count + EXCLUDED.timeout_count,
+        response_time_sum = r.response_time_sum + EXCLUDED.response_time_sum,
+        response_time_min = LEAST(r.response_time_min, EXCLUDED.response_time_min),
+        response_time_max = GREATEST(r.response_time_max, EXCLUDED.response_time_max),
+        data_bytes = r.data_bytes + EXCLUDED.data_bytes,
+        ai_parser_requests = r.ai_parser_requests + EXCLUDED.ai_parser_requests,
+        ai_parser_token_rows = r.ai_parser_token_rows + EXCLUDED.ai_parser_token_rows,
+        ai_parser_tokens_sum = r.ai_parser_tokens_sum + EXCLUDED.ai_parser_tokens_sum,
+        ai_parser_tokens_min = LEAST(r.ai_parser_tokens_min, EXCLUDED.ai_parser_tokens_min),
+        ai_parser_tokens_max = GREATEST(r.ai_parser_tokens_max, EXCLUDED.ai_parser_tokens_max),
+        latency_histogram = ARRAY(
+            SELECT h.a + h.b
+            FROM unnest(r.latency_histogram, EXCLUDED.latency_histogram) WITH ORDINALITY AS h(a, b, i)
+            ORDER BY h.i
+        )
+"""
+
+_USER_ROLLUP_UPSERT_SQL = f"""
+    INSERT INTO {ROLLUP_USER_HOUR_TABLE} AS r (
+        bucket, user_id, endpoint, method, status_code, request_count, response_time_sum, last_request
+    )
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+    ON CONFLICT (bucket, user_id, endpoint, method, status_code) DO UPDATE SET
+        request_count = r.request_count + EXCLUDED.request_count,
+        response_time_sum = r.response_time_sum + EXCLUDED.response_time_sum,
+        last_request = GREATEST(r.last_request, EXCLUDED.last_request)
+"""
+
+_COLUMN_INDEX = {name: i for i, name in enumerate(REQUEST_ANALYTICS_COLUMNS)}
+_ENDPOINT = _COLUMN_INDEX["endpoint"]
+_METHOD = _COLUMN_INDEX["method"]
+_USER_ID = _COLUMN_INDEX["user_id"]
+_STATUS = _COLUMN_INDEX["status_code"]
+_RESPONSE_TIME = _COLUMN_INDEX["response_time_ms"]
+_REQUEST_SIZE = _COLUMN_INDEX["request_size_bytes"]
+_RESPONSE_SIZE = _COLUMN_INDEX["response_size_bytes"]
+_ERROR = _COLUMN_INDEX["error_message"]
+_IS_AI_PARSER = _COLUMN_INDEX["is_ai_parser_request"]
+_AI_TOKENS = _COLUMN_INDEX["ai_parser_tokens"]
+_CREATED_AT = _COLUMN_INDEX["created_at"]
+
+RollupKey = Tuple[datetime, str, str, int]
+
+
+def is_timeout(status_code: int, error_message: Optional[str]) -> bool:
+    """Same rule as the dashboard's recent-errors `is_timeout` column."""
+    if status_code in (408, 504):
+        return True
+    message = (error_message or "").lower()
+    return "timeout" in message or "timed out" in message
+
+
+def latency_bucket(response_time_ms: int) -> int:
+    return bisect.bisect_left(LATENCY_BUCKET_BOUNDS_MS, response_time_ms)
+
+
+def histogram_percentile(histogram: Sequence[int], q: float, observed_min: Optional[float] = None, observed_max: Optional[float] = None) -> Optional[float]:
+    """
+    Approximate percentile from a latency histogram, interpolating linearly
+    inside the bucket that holds the rank and clamping to the observed range.
+    """
+    total = sum(histogram)
+    if total <= 0:
+        return None
+    rank = q * (total - 1)
+    seen = 0
+    for i, count in enumerate(histogram):
+        if count and seen + count > rank:
+            lower = LATENCY_BUCKET_BOUNDS_MS[i - 1] if i > 0 else 0
+            if i < len(LATENCY_BUCKET_BOUNDS_MS):
+                upper = LATENCY_BUCKET_BOUNDS_MS[i]
+            else:
+                upper = max(observed_max or lower, lower)
+            value = lower + (upper - lower) * ((rank - seen + 1) / count)
+            if observed_min is not None:
+                value = max(value, observed_min)
+            if observed_max is not None:
+                value = min(value, observed_max)
+            return float(value)
+        seen += count
+    return float(observed_max) if observed_max is not None else None
+
+
+def _truncate(ts: datetime, unit: str) -> datetime:
+    ts = ts.astimezone(timezone.utc) if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+    if unit == "minute":
+        return ts.replace(second=0, microsecond=0)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+class _Aggregate:
+    __slots__ = (
+        "request_count", "error_count", "timeout_count", "response_time_sum",
+        "response_time_min", "response_time_max", "data_bytes", "ai_parser_requests",
+        "ai_parser_token_rows", "ai_parser_tokens_sum", "ai_parser_tokens_min",
+        "ai_parser_tokens_max", "latency_histogram",
+    )
+
+    def __init__(self):
+        self.request_count = 0
+        self.error_count = 0
+        self.timeout_count = 0
+        self.response_time_sum = 0
+        self.response_time_min: Optional[int] = None
+        self.response_time_max: Optional[int] = None
+        self.data_bytes = 0
+        self.ai_parser_requests = 0
+        self.ai_parser_token_rows = 0
+        self.ai_parser_tokens_sum = 0
+        self.ai_parser_tokens_min: Optional[int] = None
+        self.ai_parser_tokens_max: Optional[int] = None
+        self.latency_histogram = [0] * LATENCY_BUCKETS
+
+    def add(self, row: Sequence[Any]) -> None:
+        status_code = row[_STATUS]
+        response_time = row[_RESPONSE_TIME] or 0
+        error_message = row[_ERROR]
+        self.request_count += 1
+        if error_message is not None:
+            self.error_count += 1
+        if is_timeout(status_code, error_message):
+            self.timeout_count += 1
+        self.response_time_sum += response_time
+        self.response_time_min = response_time if self.response_time_min is None else min(self.response_time_min, response_time)
+        self.response_time_max = response_time if self.response_time_max is None else max(self.response_time_max, response_time)
+        self.data_bytes += (row[_REQUEST_SIZE] or 0) + (row[_RESPONSE_SIZE] or 0)
+        if row[_IS_AI_PARSER]:
+            self.ai_parser_requests += 1
+        tokens = row[_AI_TOKENS]
+        if tokens is not None:
+            self.ai_parser_token_rows += 1
+            self.ai_parser_tokens_sum += tokens
+            self.ai_parser_tokens_min = tokens if self.ai_parser_tokens_min is None else min(self.ai_parser_tokens_min, tokens)
+            self.ai_parser_tokens_max = tokens if self.ai_parser_tokens_max is None else max(self.ai_parser_tokens_max, tokens)
+        self.latency_histogram[latency_bucket(response_time)] += 1
+
+    def record(self, key: RollupKey) -> Tuple[Any, ...]:
+        return (
+            *key, self.request_count, self.error_count, self.timeout_count,
+            self.response_time_sum, self.response_time_min, self.response_time_max, self.data_bytes,
+            self.ai_parser_requests, self.ai_parser_token_rows, self.ai_parser_tokens_sum,
+            self.ai_parser_tokens_min, self.ai_parser_tokens_max, self.latency_histogram,
+        )
+
+
+class _RollupBatch:
+    """Minute, hour and per-user hour aggregates of a set of request_analytics rows."""
+
+    def __init__(self, minute_cutoff: Optional[datetime] = None):
+        self.minute_cutoff = minute_cutoff
+        self.minutes: Dict[RollupKey, _Aggregate] = {}
+        self.hours: Dict[RollupKey, _Aggregate] = {}
+        self.users: Dict[Tuple[datetime, str, str, str, int], List[Any]] = {}
+
+    def add(self, row: Sequence[Any]) -> None:
+        created_at = row[_CREATED_AT]
+        endpoint, method, status_code = row[_ENDPOINT], row[_METHOD], row[_STATUS]
+        hour = _truncate(created_at, "hour")
+        hour_key = (hour, endpoint, method, status_code)
+        aggregate = self.hours.get(hour_key)
+        if aggregate is None:
+            aggregate = self.hours[hour_key] = _Aggregate()
+        aggregate.add(row)
+
+        if self.minute_cutoff is None or created_at >= self.minute_cutoff:
+            minute_key = (_truncate(created_at, "minute"), endpoint, method, status_code)
+            aggregate = self.minutes.get(minute_key)
+            if aggregate is None:
+                aggregate = self.minutes[minute_key] = _Aggregate()
+            aggregate.add(row)
+
+        user_id = row[_USER_ID]
+        if user_id is not None:
+            user_key = (hour, user_id, endpoint, method, status_code)
+            totals = self.users.get(user_key)
+            if totals is None:
+                self.users[user_key] = [1, row[_RESPONSE_TIME] or 0, created_at]
+            else:
+                totals[0] += 1
+                totals[1] += row[_RESPONSE_TIME] or 0
+                totals[2] = max(totals[2], created_at)
+
+    def __len__(self) -> int:
+        return len(self.hours)
+
+    async def write(self, conn) -> None:
+        if self.minutes:
+            await conn.executemany(
+                _ROLLUP_UPSERT_SQL.format(table=ROLLUP_MINUTE_TABLE),
+                [aggregate.record(key) for key, aggregate in self.minutes.items()],
+            )
+        if self.hours:
+            await conn.executemany(
+                _ROLLUP_UPSERT_SQL.format(table=ROLLUP_HOUR_TABLE),
+                [aggregate.record(key) for key, aggregate in self.hours.items()],
+            )
+        if self.users:
+            await conn.executemany(
+                _USER_ROLLUP_UPSERT_SQL,
+                [(*key, *totals) for key, totals in self.users.items()],
+            )
+
+
+class RequestAnalyticsRollups:
+    """
+    Minute and hour rollups of request_analytics by endpoint, method and
+    status (counts, errors, timeouts, latency sum/min/max and a latency
+    histogram for percentiles), plus per-user hourly counts.
+
+    Registered as a RequestAnalyticsWriter flush listener: each batch is
+    aggregated in memory and upserted in the same transaction as the raw rows.
+    Rows created before `incremental_from` (recorded when the rollups were
+    first deployed) are covered once by `backfill()` from request_analytics.
+    If `start()` fails at startup, flushes retry it until the tables are ready.
+    """
+
+    def __init__(self, get_pool: Callable[[], Any], backfill_settle_seconds: float = 0.0):
+        self._get_pool = get_pool
+        self.backfill_settle_seconds = backfill_settle_seconds
+        self.incremental_from: Optional[datetime] = None
+        self._last_prune = 0.0
+        self._last_start_attempt: Optional[float] = None
+        self.rows_rolled_up = 0
+
+    def _pool(self):
+        pool = self._get_pool()
+        if pool is None:
+            raise RuntimeError("Database pool is not available")
+        return pool
+
+    async def ensure_schema(self) -> None:
+        async with self._pool().acquire() as conn:
+            await conn.execute(REQUEST_ANALYTICS_ROLLUPS_DDL)
+            await conn.execute(
+                "INSERT INTO request_analytics_rollup_state (id, incremental_from) VALUES (1, now()) ON CONFLICT (id) DO NOTHING"
+            )
+            self.incremental_from = await conn.fetchval(
+                "SELECT incremental_from FROM request_analytics_rollup_state WHERE id = 1"
+            )
+
+    async def start(self) -> bool:
+        """
+        Ensure the rollup tables and schedule the one-time backfill. Returns
+        False (logged) when the schema could not be set up.
+        """
+        self._last_start_attempt = time.monotonic()
+        try:
+            await self.ensure_schema()
+        except Exception as e:
+            logger.error(f"[ANALYTICS_ROLLUPS] Could not ensure rollup tables, retrying on a later flush: {e}")
+            return False
+        # Rows recorded before the rollups existed are rolled up once, after in-flight batches land
+        asyncio.create_task(self.backfill(settle_seconds=self.backfill_settle_seconds))
+        return True
+
+    def _minute_cutoff(self) -> datetime:
+        return datetime.now(timezone.utc) - timedelta(hours=REQUEST_ANALYTICS_MINUTE_RETENTION_HOURS)
+
+    async def on_flush(self, conn, rows: Iterable[Sequence[Any]]) -> None:
+        """RequestAnalyticsWriter flush listener; runs inside the writer's transaction."""
+        if self.incremental_from is None:
+            if (
+                self._last_start_attempt is not None
+                and time.monotonic() - self._last_start_attempt < REQUEST_ANALYTICS_ROLLUP_SCHEMA_RETRY_SECONDS
+            ):
+                return
+            # This batch predates incremental_from, so the backfill covers it
+            if not await self.start():
+                return
+        batch = _RollupBatch()
+        for row in rows:
+            if row[_CREATED_AT] >= self.incremental_from:
+                batch.add(row)
+                self.rows_rolled_up += 1
+        await batch.write(conn)
+        if time.monotonic() - self._last_prune >= REQUEST_ANALYTICS_ROLLUP_PRUNE_INTERVAL_SECONDS:
+            self._last_prune = time.monotonic()
+            await conn.execute(f"DELETE FROM {ROLLUP_MINUTE_TABLE} WHERE bucket < $1", self._minute_cutoff())
+
+    async def backfill(self, settle_seconds: float = 0.0) -> int:
+        """
+        Roll up request_analytics rows created before `incremental_from`, once
+        per database. `settle_seconds` gives rows recorded just before that
+        instant time to be flushed first. Returns the number of rows read.
+        """
+        if self.incremental_from is None:
+            return 0
+        delay = settle_seconds - (datetime.now(timezone.utc) - self.incremental_from).total_seconds()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        rows_read = 0
+        try:
+            async with self._pool().acquire() as conn:
+                async with conn.transaction():
+                    state = await conn.fetchrow(
+                        "SELECT incremental_from, backfilled_at FROM request_analytics_rollup_state WHERE id = 1 FOR UPDATE"
+                    )
+                    if state is None or state["backfilled_at"] is not None:
+                        return 0
+                    logger.info(f"[ANALYTICS_ROLLUPS] Backfilling rollups from request_analytics before {state['incremental_from']}")
+                    batch = _RollupBatch(minute_cutoff=self._minute_cutoff())
+                    query = (
+                        f"SELECT {', '.join(REQUEST_ANALYTICS_COLUMNS)} FROM request_analytics "
+                        "WHERE created_at < $1"
+                    )
+                    async for record in conn.cursor(query, state["incremental_from"], prefetch=REQUEST_ANALYTICS_BACKFILL_PREFETCH):
+                        batch.add(tuple(record))
+                        rows_read += 1
+                    await batch.write(conn)
+                    await conn.execute("UPDATE request_analytics_rollup_state SET backfilled_at = now() WHERE id = 1")
+        except Exception as e:
+            logger.error(f"[ANALYTICS_ROLLUPS] Backfill failed, will retry on next startup: {e}")
+            return 0
+        logger.info(f"[ANALYTICS_ROLLUPS] Backfilled {rows_read} rows into {len(batch)} hourly rollups")
+        return rows_read
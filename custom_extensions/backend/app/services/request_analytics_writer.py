@@ -0,0 +1,225 @@
+# custom_extensions/backend/app/services/request_analytics_writer.py
+import asyncio
+import logging
+import random
+from datetime import datetime
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ANALYTICS_COLUMNS = (
+    "id", "endpoint", "method", "user_id", "status_code",
+    "response_time_ms", "request_size_bytes", "response_size_bytes",
+    "error_message", "is_ai_parser_request", "ai_parser_tokens",
+    "ai_parser_model", "ai_parser_project_name", "created_at",
+)
+
+AnalyticsRow = Tuple[Any, ...]
+FlushListener = Callable[[Any, List[AnalyticsRow]], Awaitable[None]]
+
+
+class RequestAnalyticsWriter:
+    """
+    Buffers request_analytics rows in a bounded in-process queue and writes
+    them in batches from a background task, so request handlers never hold a
+    pool connection for analytics.
+
+    A batch is flushed when `batch_size` rows are buffered or `flush_interval_ms`
+    has passed. Once the queue is past `high_watermark` of its capacity,
+    successful requests are sampled at `backpressure_sample_rate` (errors are
+    always kept); when it is full, new rows are dropped and counted.
+
+    Flush listeners run with the connection and the rows of every written
+    batch that were actually inserted (duplicate ids are skipped), in the same
+    transaction as the insert (see RequestAnalyticsRollups).
+    A failing listener is logged and rolled back on its own; the raw rows are kept.
+    """
+
+    def __init__(
+        self,
+        get_pool: Callable[[], Any],
+        max_queue_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval_ms: int = 1000,
+        high_watermark: float = 0.8,
+        backpressure_sample_rate: float = 0.1,
+    ):
+        self._get_pool = get_pool
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.high_watermark = high_watermark
+        self.backpressure_sample_rate = backpressure_sample_rate
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._flush_listeners: List[FlushListener] = []
+
+        self.enqueued = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+
+    def add_flush_listener(self, listener: FlushListener) -> None:
+        self._flush_listeners.append(listener)
+
+    def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._stopping = False
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run(), name="request-analytics-writer")
+        logger.info(
+            f"[ANALYTICS_WRITER] Started (batch_size={self.batch_size}, "
+            f"flush_interval_ms={int(self.flush_interval * 1000)}, max_queue_size={self.max_queue_size})"
+        )
+
+    def record(
+        self,
+        request_id: str,
+        endpoint: str,
+        method: str,
+        user_id: Optional[str],
+        status_code: int,
+        response_time_ms: int,
+        request_size_bytes: Optional[int],
+        response_size_bytes: Optional[int],
+        error_message: Optional[str],
+        created_at: datetime,
+        is_ai_parser_request: bool = False,
+        ai_parser_tokens: Optional[int] = None,
+        ai_parser_model: Optional[str] = None,
+        ai_parser_project_name: Optional[str] = None,
+    ) -> bool:
+        """Queue one row without blocking. Returns False if the row was sampled out or dropped."""
+        if self._queue is None or self._stopping:
+            self.dropped += 1
+            return False
+
+        depth = self._queue.qsize()
+        is_error = status_code >= 400 or error_message is not None
+        if (
+            not is_error
+            and depth >= self.max_queue_size * self.high_watermark
+            and random.random() >= self.backpressure_sample_rate
+        ):
+            self.sampled_out += 1
+            return False
+
+        row = (
+            request_id, endpoint, method, user_id, status_code,
+            response_time_ms, request_size_bytes, response_size_bytes,
+            error_message, is_ai_parser_request, ai_parser_tokens,
+            ai_parser_model, ai_parser_project_name, created_at,
+        )
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    async def _collect_batch(self) -> List[AnalyticsRow]:
+        """Wait up to one flush interval for rows; return early once a full batch is buffered."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        batch: List[AnalyticsRow] = []
+        while len(batch) < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _drain_nowait(self) -> List[AnalyticsRow]:
+        rows: List[AnalyticsRow] = []
+        while self._queue is not None and not self._queue.empty():
+            rows.append(self._queue.get_nowait())
+        return rows
+
+    async def _write(self, rows: List[AnalyticsRow]) -> None:
+        if not rows:
+            return
+        pool = self._get_pool()
+        if pool is None:
+            self.failed += len(rows)
+            logger.warning(f"[ANALYTICS_WRITER] DB pool unavailable, discarding {len(rows)} analytics rows")
+            return
+        try:
+            async with pool.acquire() as conn, conn.transaction():
+                inserted = rows
+                try:
+                    # Savepoint, so a failed COPY leaves the transaction usable
+                    async with conn.transaction():
+                        await conn.copy_records_to_table(
+                            "request_analytics", records=rows, columns=list(REQUEST_ANALYTICS_COLUMNS)
+                        )
+                except Exception as copy_error:
+                    # COPY aborts the whole batch on a single bad row; fall back to
+                    # conflict-tolerant inserts so one duplicate id does not cost the batch.
+                    # Row by row with RETURNING, so listeners only see the rows that went in.
+                    logger.warning(f"[ANALYTICS_WRITER] COPY failed, retrying row by row: {copy_error}")
+                    placeholders = ", ".join(f"${i}" for i in range(1, len(REQUEST_ANALYTICS_COLUMNS) + 1))
+                    insert = await conn.prepare(
+                        f"INSERT INTO request_analytics ({', '.join(REQUEST_ANALYTICS_COLUMNS)}) "
+                        f"VALUES ({placeholders}) ON CONFLICT (id) DO NOTHING RETURNING id"
+                    )
+                    inserted = [row for row in rows if await insert.fetchval(*row) is not None]
+                    if len(inserted) < len(rows):
+                        logger.warning(f"[ANALYTICS_WRITER] Skipped {len(rows) - len(inserted)} analytics rows with duplicate ids")
+                for listener in self._flush_listeners:
+                    try:
+                        async with conn.transaction():
+                            await listener(conn, inserted)
+                    except Exception as listener_error:
+                        logger.error(f"[ANALYTICS_WRITER] Flush listener failed for {len(inserted)} rows: {listener_error}")
+            self.written += len(inserted)
+            self.flushes += 1
+        except Exception as e:
+            self.failed += len(rows)
+            logger.error(f"[ANALYTICS_WRITER] Failed to write {len(rows)} analytics rows: {e}")
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            batch = await self._collect_batch()
+            await self._write(batch)
+
+    async def flush(self) -> None:
+        """Write everything currently queued."""
+        rows = self._drain_nowait()
+        while rows:
+            await self._write(rows[: self.batch_size])
+            rows = rows[self.batch_size:]
+
+    async def stop(self) -> None:
+        """Stop the background task and flush whatever is still queued."""
+        self._stopping = True
+        if self._task is not None:
+            # The loop notices the flag within one flush interval; no cancellation,
+            # so a batch that is already being written is not lost.
+            try:
+                await self._task
+            except Exception as e:
+                logger.error(f"[ANALYTICS_WRITER] Background task failed: {e}")
+            self._task = None
+        await self.flush()
+        logger.info(f"[ANALYTICS_WRITER] Stopped: {self.stats()}")
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_size": self.max_queue_size,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "sampled_out": self.sampled_out,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+        }
@@ -7,6 +7,7 @@ from app.models.workspace_models import (
     WorkspaceRole, WorkspaceRoleCreate, WorkspaceRoleUpdate,
     WorkspaceRoleWithMembers, Permission, DEFAULT_ROLES
 )
+from app.services.access_index import UserProductAccessIndex
 
 logger = logging.getLogger(__name__)
 
@@ -176,6 +177,10 @@ class RoleService:
                 """
                 
                 await execute_query(query, *params)
+                
+                # Product access can target a role by name
+                if role_data.name is not None and role_data.name != existing_role.name:
+                    await UserProductAccessIndex.refresh_workspace(workspace_id)
             
             return await RoleService.get_workspace_role(role_id, workspace_id)
             
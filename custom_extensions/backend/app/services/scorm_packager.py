@@ -1,9 +1,10 @@
 # custom_extensions/backend/app/services/scorm_packager.py
-import io
 import os
 import re
 import uuid
 import json
+import hashlib
+import tempfile
 import zipfile
 import logging
 import base64
@@ -17,6 +18,7 @@ import pathlib
 from fastapi import HTTPException
 
 from app.core.database import get_connection
+from app.services.product_matcher import ProductMatcher, parse_primary_list, parse_recommended_products_field
 import httpx
 
 # Reuse Jinja templates configured for PDF generation to produce HTML content
@@ -31,10 +33,18 @@ except Exception:
         return 660  # Fallback to 16:9 minimum
 
 from app.services.pdf_generator import generate_slide_deck_pdf_with_dynamic_height
-import pyppeteer
 
 logger = logging.getLogger(__name__)
 
+# Package ZIPs stay in memory up to this size, then spill to a temp file
+SCORM_SPOOL_MAX_MEMORY_MB = int(os.getenv("SCORM_SPOOL_MAX_MEMORY_MB", "32"))
+# Concurrent image downloads per package (one pooled client is shared by all SCOs)
+SCORM_ASSET_FETCH_CONCURRENCY = int(os.getenv("SCORM_ASSET_FETCH_CONCURRENCY", "8"))
+# SCOs rendered at the same time; slide measurement is further bounded by the browser pool
+SCORM_RENDER_CONCURRENCY = int(os.getenv("SCORM_RENDER_CONCURRENCY", "4"))
+# Images are stored once per package, keyed by content hash
+SCORM_SHARED_ASSETS_DIR = "assets"
+
 
 SCORM_2004_NS = {
     'imscp': 'http://www.imsglobal.org/xsd/imscp_v1p1',
@@ -60,148 +70,6 @@ async def _load_training_plan_row(course_outline_id: int, user_id: str) -> Dict[
         return dict(row)
 
 
-async def _load_all_user_projects(user_id: str) -> List[Dict[str, Any]]:
-    async with get_connection() as connection:
-        rows = await connection.fetch(
-            """
-            SELECT p.*, dt.microproduct_type, dt.component_name
-            FROM projects p
-            LEFT JOIN design_templates dt ON p.design_template_id = dt.id
-            WHERE p.onyx_user_id = $1
-            ORDER BY p.created_at
-            """,
-            user_id,
-        )
-        return [dict(r) for r in rows]
-
-
-def _map_item_type_to_microproduct(item_type: str) -> Optional[List[str]]:
-    t = (item_type or '').strip().lower()
-    if t in ('presentation',):
-        return ['Slide Deck']
-    if t in ('one-pager', 'onepager'):
-        return ['One Pager', 'Text Presentation', 'PDF Lesson']
-    if t in ('quiz',):
-        return ['Quiz']
-    return None
-
-
-def _type_aliases_for_group(group_type: str) -> List[str]:
-    g = (group_type or '').strip().lower()
-    if g == 'slide deck':
-        return ['slide deck', 'presentation', 'presentationdisplay', 'slidedeck']
-    if g == 'one pager':
-        return ['one pager', 'one-pager', 'onepager', 'text presentation', 'textpresentation', 'textpresentationdisplay', 'pdf lesson', 'pdflesson']
-    if g == 'text presentation':
-        return ['text presentation', 'textpresentation', 'textpresentationdisplay', 'one pager', 'one-pager', 'onepager']
-    if g == 'pdf lesson':
-        return ['pdf lesson', 'pdflesson', 'one pager', 'one-pager', 'onepager']
-    if g == 'quiz':
-        return ['quiz', 'quizdisplay']
-    return [g]
-
-
-def _project_type_matches(proj: Dict[str, Any], target_mtypes: List[str]) -> bool:
-    proj_types = [
-        (proj.get('microproduct_type') or '').strip().lower(),
-        (proj.get('component_name') or '').strip().lower(),
-    ]
-    aliases: List[str] = []
-    for t in target_mtypes or []:
-        aliases.extend(_type_aliases_for_group(t))
-    aliases_set = set(aliases)
-    return any(pt in aliases_set for pt in proj_types if pt)
-
-
-def _match_connected_product(projects: List[Dict[str, Any]], outline_name: str, lesson_title: str, desired_type: str, used_ids: set) -> Optional[Dict[str, Any]]:
-    target_mtypes = _map_item_type_to_microproduct(desired_type)
-    if not target_mtypes or not lesson_title:
-        logger.info(f"[SCORM-MATCH] No target types for desired_type='{desired_type}' or no lesson_title")
-        return None
-
-    def is_unused(proj_id: Any) -> bool:
-        return proj_id not in used_ids
-
-    def pname(proj: Dict[str, Any]) -> str:
-        return (proj.get('project_name') or '').strip()
-
-    def mname(proj: Dict[str, Any]) -> str:
-        return (proj.get('microproduct_name') or '').strip()
-
-    # Log available candidates for this type
-    candidates = [p for p in projects if _project_type_matches(p, target_mtypes) and is_unused(p.get('id'))]
-    logger.info(f"[SCORM-MATCH] Looking for type='{desired_type}' (mtypes={target_mtypes}) for lesson='{lesson_title}' | {len(candidates)} unused candidates")
-    if candidates and len(candidates) <= 5:
-        for c in candidates:
-            logger.info(f"[SCORM-MATCH]   Candidate: id={c.get('id')}, pname='{pname(c)}', mname='{mname(c)}', type={c.get('microproduct_type')}")
-
-    # Pattern A (quizzes)
-    if 'Quiz' in (target_mtypes or []):
-        target_name = f"Quiz - {outline_name}: {lesson_title}"
-        for proj in projects:
-            if _project_type_matches(proj, target_mtypes) and is_unused(proj.get('id')):
-                if pname(proj) == target_name:
-                    logger.info(f"[SCORM-MATCH] ✓ Matched Pattern A (Quiz) id={proj.get('id')}")
-                    return dict(proj)
-
-    # Pattern A2 (prefixed)
-    type_prefix_map = {
-        'Slide Deck': 'Presentation',
-        'One Pager': 'One Pager',
-        'Text Presentation': 'Text Presentation',
-        'PDF Lesson': 'PDF Lesson'
-    }
-    prefixes = [type_prefix_map[t] for t in (target_mtypes or []) if t in type_prefix_map]
-    for pref in prefixes:
-        target_name_prefixed = f"{pref} - {outline_name}: {lesson_title}"
-        for proj in projects:
-            if _project_type_matches(proj, target_mtypes) and is_unused(proj.get('id')):
-                if pname(proj) == target_name_prefixed:
-                    logger.info(f"[SCORM-MATCH] ✓ Matched Pattern A2 (Prefixed) id={proj.get('id')}, pattern='{target_name_prefixed}'")
-                    return dict(proj)
-
-    # Pattern B: "{outline}: {lesson}"
-    target_name = f"{outline_name}: {lesson_title}"
-    for proj in projects:
-        if _project_type_matches(proj, target_mtypes) and is_unused(proj.get('id')):
-            if pname(proj) == target_name:
-                logger.info(f"[SCORM-MATCH] ✓ Matched Pattern B (Outline:Lesson) id={proj.get('id')}")
-                return dict(proj)
-
-    # Pattern C: microproduct_name equals lesson title
-    for proj in projects:
-        if _project_type_matches(proj, target_mtypes) and is_unused(proj.get('id')):
-            if mname(proj) == lesson_title:
-                logger.info(f"[SCORM-MATCH] ✓ Matched Pattern C (mname==lesson) id={proj.get('id')}")
-                return dict(proj)
-
-    # Pattern E: project_name == outline AND microproduct_name == lesson
-    for proj in projects:
-        if _project_type_matches(proj, target_mtypes) and is_unused(proj.get('id')):
-            if pname(proj) == outline_name and mname(proj) == lesson_title:
-                logger.info(f"[SCORM-MATCH] ✓ Matched Pattern E (pname==outline AND mname==lesson) id={proj.get('id')}")
-                return dict(proj)
-
-    # Pattern D: project_name equals lesson title
-    for proj in projects:
-        if _project_type_matches(proj, target_mtypes) and is_unused(proj.get('id')):
-            if pname(proj) == lesson_title:
-                logger.info(f"[SCORM-MATCH] ✓ Matched Pattern D (pname==lesson) id={proj.get('id')}")
-                return dict(proj)
-
-    # Pattern F (NEW): Fuzzy match - project_name contains lesson title
-    for proj in projects:
-        if _project_type_matches(proj, target_mtypes) and is_unused(proj.get('id')):
-            pn = pname(proj).lower()
-            lt = lesson_title.lower()
-            if lt in pn or pn in lt:
-                logger.info(f"[SCORM-MATCH] ✓ Matched Pattern F (Fuzzy) id={proj.get('id')}, pname='{pname(proj)}'")
-                return dict(proj)
-
-    logger.warning(f"[SCORM-MATCH] ✗ No match found for type='{desired_type}' lesson='{lesson_title}' outline='{outline_name}'")
-    return None
-
-
 async def _load_product_content(product_id: int, user_id: str) -> Optional[Dict[str, Any]]:
     async with get_connection() as connection:
         row = await connection.fetchrow(
@@ -351,185 +219,178 @@ def _find_repo_root_with_static_images() -> str:
         return fallback
 
 
-async def _localize_images_to_assets(html: str, zip_file: zipfile.ZipFile, sco_dir: str) -> str:
-    """Rewrite image references to local assets and add them into the ZIP under sco_dir/assets/.
+class _PackageAssets:
+    """
+    Images shared by every SCO of one package.
+
+    Each source (URL or local path) is loaded at most once per package, HTTP
+    fetches go through one pooled client bounded by SCORM_ASSET_FETCH_CONCURRENCY,
+    and images are stored once under `assets/<content hash><ext>` no matter how
+    many SCOs (or different URLs) reference the same bytes.
+    """
+
+    def __init__(self, zip_file: zipfile.ZipFile, client: httpx.AsyncClient):
+        self.zip_file = zip_file
+        self.client = client
+        self.repo_root = _find_repo_root_with_static_images()
+        self.static_images_abs_path = os.path.join(self.repo_root, 'static_design_images')
+        self._fetch_limit = asyncio.Semaphore(SCORM_ASSET_FETCH_CONCURRENCY)
+        # source -> future of the zip path (None when the source is unusable); shared by concurrent SCOs
+        self._by_source: Dict[str, asyncio.Future] = {}
+        self._by_hash: Dict[str, str] = {}
+        self.assets_stored = 0
+        self.bytes_stored = 0
+        self.dedup_hits = 0
+
+    async def resolve(self, u: str) -> Optional[str]:
+        """Zip path of the asset for `u`, adding it to the package on first use."""
+        pending = self._by_source.get(u)
+        if pending is None:
+            pending = asyncio.ensure_future(self._load(u))
+            self._by_source[u] = pending
+        return await asyncio.shield(pending)
+
+    async def _fetch_http(self, url: str) -> Optional[bytes]:
+        try:
+            async with self._fetch_limit:
+                resp = await self.client.get(url)
+            if resp.status_code == 200 and resp.content:
+                return resp.content
+        except Exception as e:
+            logger.warning(f"[SCORM-ASSETS] HTTP fetch failed for {url}: {e}")
+        return None
+
+    def _read_local(self, path: str, source: str) -> Optional[bytes]:
+        if not os.path.exists(path):
+            logger.warning(f"[SCORM-ASSETS] Image not found ({source}): {path}")
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    async def _load(self, u: str) -> Optional[str]:
+        data: Optional[bytes] = None
+        source = 'unknown'
+        try:
+            if u.startswith('//'):
+                data = await self._fetch_http('https:' + u)
+                source = 'protocol-relative'
+            elif u.startswith('http://') or u.startswith('https://'):
+                data = await self._fetch_http(u)
+                source = 'absolute-http'
+            elif u.startswith('/static_design_images/'):
+                source = 'static-design-images'
+                data = self._read_local(os.path.join(self.static_images_abs_path, u.replace('/static_design_images/', '')), source)
+            elif u.startswith('static_design_images/'):
+                source = 'static-design-images-relative'
+                data = self._read_local(os.path.join(self.static_images_abs_path, u.replace('static_design_images/', '')), source)
+            elif u.startswith('/'):
+                source = 'repo-absolute'
+                data = self._read_local(os.path.join(self.repo_root, u.lstrip('/')), source)
+            else:
+                logger.warning(f"[SCORM-ASSETS] Unrecognized URL format: {u}")
+        except Exception as e:
+            logger.error(f"[SCORM-ASSETS] Error reading image {u}: {e}")
+
+        if not data:
+            return None
+        if len(data) < 1024 or not _has_valid_image_header(data):
+            logger.warning(f"[SCORM-ASSETS] Invalid image data for {u}: size={len(data)}")
+            return None
+
+        digest = hashlib.sha256(data).hexdigest()
+        existing = self._by_hash.get(digest)
+        if existing:
+            self.dedup_hits += 1
+            return existing
+
+        ext = _guess_image_ext(u, data)
+        asset_zip_path = f"{SCORM_SHARED_ASSETS_DIR}/{digest[:20]}{ext}"
+        # Raster formats are already compressed; deflating them again only costs CPU
+        compress_type = zipfile.ZIP_DEFLATED if ext == '.svg' else zipfile.ZIP_STORED
+        self.zip_file.writestr(asset_zip_path, data, compress_type=compress_type)
+        self._by_hash[digest] = asset_zip_path
+        self.assets_stored += 1
+        self.bytes_stored += len(data)
+        logger.info(f"[SCORM-ASSETS] ✅ Embedded {u} ({source}) as {asset_zip_path}")
+        return asset_zip_path
+
+
+def _has_valid_image_header(data: bytes) -> bool:
+    return (
+        data.startswith(b'\xff\xd8\xff') or
+        data.startswith(b'\x89PNG') or
+        data.startswith(b'GIF87a') or
+        data.startswith(b'GIF89a') or
+        data.startswith(b'<svg') or
+        data.startswith(b'RIFF')
+    )
+
+
+def _guess_image_ext(u: str, data: Optional[bytes]) -> str:
+    parsed = pathlib.PurePosixPath(u.split('?', 1)[0])
+    if parsed.suffix:
+        return parsed.suffix.lower()
+    if data:
+        if data.startswith(b'\xff\xd8\xff'):
+            return '.jpg'
+        if data.startswith(b'\x89PNG'):
+            return '.png'
+        if data.startswith(b'GIF'):
+            return '.gif'
+        if data.startswith(b'<svg'):
+            return '.svg'
+        if data.startswith(b'RIFF'):
+            return '.webp'
+    return '.jpg'
+
+
+_IMG_SRC_PATTERN = re.compile(r'(<img[^>]+src=["\'])([^"\']+)(["\'][^>]*>)', re.IGNORECASE)
+_CSS_URL_PATTERN = re.compile(r"(url\(\s*['\"]?)([^'\")]+)(['\"]?\s*\))", re.IGNORECASE)
+_STYLE_BG_PATTERN = re.compile(r'(background-image\s*:\s*url\(\s*[\'\"]?)([^\'\")]+)([\'\"]?\s*\))', re.IGNORECASE)
+
+
+async def _localize_images_to_assets(html: str, assets: _PackageAssets, sco_dir: str) -> str:
+    """Rewrite image references to the package's shared assets, adding each image to the ZIP once.
     - Handles <img src>, CSS url(), and inline style background-image
     - Supports http/https, protocol-less //, /static_design_images, static_design_images, and repo-absolute paths
     - Skips non-image resources (e.g., Google Fonts CSS)
     Returns updated HTML.
     """
     try:
-        repo_root = _find_repo_root_with_static_images()
-        static_images_abs_path = os.path.join(repo_root, 'static_design_images')
-        assets_prefix_in_zip = f"{sco_dir}/assets"
-        assets_href_prefix = "assets"
-
-        logger.info(f"[SCORM-ASSETS] Starting image localization for {sco_dir}")
-        logger.info(f"[SCORM-ASSETS] Repo root: {repo_root}")
-        logger.info(f"[SCORM-ASSETS] Static images path: {static_images_abs_path}")
-        logger.info(f"[SCORM-ASSETS] HTML length: {len(html)} characters")
-
-        img_src_pattern = re.compile(r'(<img[^>]+src=["\'])([^"\']+)(["\'][^>]*>)', re.IGNORECASE)
-        css_url_pattern = re.compile(r"(url\(\s*['\"]?)([^'\")]+)(['\"]?\s*\))", re.IGNORECASE)
-        style_bg_pattern = re.compile(r'(background-image\s*:\s*url\(\s*[\'\"]?)([^\'\")]+)([\'\"]?\s*\))', re.IGNORECASE)
-
         urls: List[str] = []
-        img_matches = list(img_src_pattern.finditer(html))
-        css_matches = list(css_url_pattern.finditer(html))
-        style_matches = list(style_bg_pattern.finditer(html))
-        logger.info(f"[SCORM-ASSETS] Found {len(img_matches)} <img> tags, {len(css_matches)} CSS url() references, {len(style_matches)} style background-image references")
-
-        for m in img_matches:
-            urls.append(m.group(2))
-        for m in css_matches:
-            urls.append(m.group(2))
-        for m in style_matches:
-            urls.append(m.group(2))
+        for pattern in (_IMG_SRC_PATTERN, _CSS_URL_PATTERN, _STYLE_BG_PATTERN):
+            urls.extend(m.group(2) for m in pattern.finditer(html))
 
         if not urls:
             logger.info(f"[SCORM-ASSETS] No image URLs found in HTML for {sco_dir}")
             return html
 
-        seen = set()
         unique_urls: List[str] = []
-        for u in urls:
-            if u not in seen:
-                seen.add(u)
-                unique_urls.append(u)
-
-        logger.info(f"[SCORM-ASSETS] Found {len(unique_urls)} unique image URLs for {sco_dir}: {unique_urls}")
-
-        url_to_local: Dict[str, str] = {}
-        asset_index = 1
-        embedded_count = 0
-        failed_count = 0
-
-        async def fetch_http(url: str) -> Optional[bytes]:
-            try:
-                async with httpx.AsyncClient(timeout=30.0) as client:
-                    resp = await client.get(url)
-                    if resp.status_code == 200 and resp.content:
-                        return resp.content
-            except Exception as e:
-                logger.warning(f"[SCORM-ASSETS] HTTP fetch failed for {url}: {e}")
-            return None
-
-        def is_non_image_resource(u: str) -> bool:
+        for u in dict.fromkeys(urls):
+            if not u or u.startswith('data:'):
+                continue
             lu = u.lower()
             if 'fonts.googleapis.com' in lu or lu.endswith('.css'):
-                return True
-            return False
-
-        def has_valid_header(data: bytes) -> bool:
-            return (
-                data.startswith(b'\xff\xd8\xff') or
-                data.startswith(b'\x89PNG') or
-                data.startswith(b'GIF87a') or
-                data.startswith(b'GIF89a') or
-                data.startswith(b'<svg') or
-                data.startswith(b'RIFF')
-            )
-
-        def guess_ext(u: str, data: Optional[bytes]) -> str:
-            parsed = pathlib.PurePosixPath(u)
-            if parsed.suffix:
-                return parsed.suffix.lower()
-            if data:
-                if data.startswith(b'\xff\xd8\xff'):
-                    return '.jpg'
-                if data.startswith(b'\x89PNG'):
-                    return '.png'
-                if data.startswith(b'GIF'):
-                    return '.gif'
-                if data.startswith(b'<svg'):
-                    return '.svg'
-                if data.startswith(b'RIFF'):
-                    return '.webp'
-            return '.jpg'
-
-        async def process_one(u: str):
-            nonlocal asset_index, embedded_count, failed_count
-            if not u or u.startswith('data:'):
-                return
-            if is_non_image_resource(u):
                 logger.info(f"[SCORM-ASSETS] Skipping non-image resource: {u}")
-                return
-
-            data: Optional[bytes] = None
-            source = 'unknown'
-            try:
-                if u.startswith('//'):
-                    data = await fetch_http('https:' + u)
-                    source = 'protocol-relative'
-                elif u.startswith('http://') or u.startswith('https://'):
-                    data = await fetch_http(u)
-                    source = 'absolute-http'
-                elif u.startswith('/static_design_images/'):
-                    path = os.path.join(static_images_abs_path, u.replace('/static_design_images/', ''))
-                    if os.path.exists(path):
-                        with open(path, 'rb') as f:
-                            data = f.read()
-                        source = 'static-design-images'
-                    else:
-                        logger.warning(f"[SCORM-ASSETS] Static image not found: {path}")
-                elif u.startswith('static_design_images/'):
-                    path = os.path.join(static_images_abs_path, u.replace('static_design_images/', ''))
-                    if os.path.exists(path):
-                        with open(path, 'rb') as f:
-                            data = f.read()
-                        source = 'static-design-images-relative'
-                    else:
-                        logger.warning(f"[SCORM-ASSETS] Static image not found (relative): {path}")
-                elif u.startswith('/'):
-                    path = os.path.join(repo_root, u.lstrip('/'))
-                    if os.path.exists(path):
-                        with open(path, 'rb') as f:
-                            data = f.read()
-                        source = 'repo-absolute'
-                    else:
-                        logger.warning(f"[SCORM-ASSETS] Repo image not found: {path}")
-                else:
-                    logger.warning(f"[SCORM-ASSETS] Unrecognized URL format: {u}")
-            except Exception as e:
-                logger.error(f"[SCORM-ASSETS] Error reading image {u}: {e}")
-
-            if not data:
-                failed_count += 1
-                return
-            if len(data) < 1024 or not has_valid_header(data):
-                logger.warning(f"[SCORM-ASSETS] Invalid image data for {u}: size={len(data)}")
-                failed_count += 1
-                return
-
-            ext = guess_ext(u, data)
-            local_name = f"img_{asset_index:03d}{ext}"
-            asset_index += 1
-            asset_zip_path = f"{assets_prefix_in_zip}/{local_name}"
-            asset_href = f"{assets_href_prefix}/{local_name}"
-
-            try:
-                zip_file.writestr(asset_zip_path, data)
-                url_to_local[u] = asset_href
-                embedded_count += 1
-                logger.info(f"[SCORM-ASSETS] ✅ Embedded {u} ({source}) as {local_name} -> {asset_zip_path}")
-            except Exception as e:
-                logger.error(f"[SCORM-ASSETS] Failed to write asset for {u}: {e}")
-                failed_count += 1
+                continue
+            unique_urls.append(u)
 
-        await asyncio.gather(*(process_one(u) for u in unique_urls))
-        logger.info(f"[SCORM-ASSETS] Image processing complete for {sco_dir}: {embedded_count} embedded, {failed_count} failed out of {len(unique_urls)} total")
+        logger.info(f"[SCORM-ASSETS] Localizing {len(unique_urls)} unique image URLs for {sco_dir}")
 
-        def repl_img(m: re.Match) -> str:
-            prefix, src, suffix = m.group(1), m.group(2), m.group(3)
-            return f"{prefix}{url_to_local.get(src, src)}{suffix}"
+        zip_paths = await asyncio.gather(*(assets.resolve(u) for u in unique_urls))
+        # SCO pages live in <sco_dir>/index.html, the shared assets one level up
+        url_to_local: Dict[str, str] = {
+            u: f"../{zip_path}" for u, zip_path in zip(unique_urls, zip_paths) if zip_path
+        }
+        logger.info(f"[SCORM-ASSETS] Image processing complete for {sco_dir}: {len(url_to_local)} embedded, {len(unique_urls) - len(url_to_local)} failed out of {len(unique_urls)} total")
 
-        def repl_css(m: re.Match) -> str:
+        def repl(m: re.Match) -> str:
             prefix, src, suffix = m.group(1), m.group(2), m.group(3)
             return f"{prefix}{url_to_local.get(src, src)}{suffix}"
 
-        html = img_src_pattern.sub(repl_img, html)
-        html = css_url_pattern.sub(repl_css, html)
-        html = style_bg_pattern.sub(repl_css, html)
+        html = _IMG_SRC_PATTERN.sub(repl, html)
+        html = _CSS_URL_PATTERN.sub(repl, html)
+        html = _STYLE_BG_PATTERN.sub(repl, html)
         return html
 
     except Exception as e:
@@ -546,7 +407,6 @@ async def _render_slide_deck_html_with_progress(
     Generator version that yields progress updates during slide height calculation.
     Yields: {"type": "progress", "message": "..."} or {"type": "complete", "html": "..."}
     """
-    browser = None
     try:
         # Extract version first to determine which template to use
         effective_version = None
@@ -580,41 +440,32 @@ async def _render_slide_deck_html_with_progress(
         theme = content.get('theme', 'dark-purple')
         embedded_fonts_css = get_embedded_fonts_css()
 
-        # Calculate heights for each slide with progress updates every 10 seconds
+        # Measure every slide on pooled browser pages (the pool bounds concurrency),
+        # sending a keep-alive progress update every 10 seconds
+        async def measure(i: int, slide_data: Dict[str, Any]) -> int:
+            template_id = slide_data.get('templateId', 'unknown')
+            try:
+                height = await calculate_slide_dimensions(slide_data, theme, None, effective_version)
+                logger.info(f"✓ SCORM Slide {i + 1}/{len(slides)} ({template_id}) height: {height}px")
+                return height
+            except Exception as e:
+                logger.error(f"✗ Failed to calculate height for slide {i + 1} ({template_id}): {e}")
+                return 660  # Fallback to 16:9 minimum
+
+        start_time = time.time()
+        height_tasks = [asyncio.ensure_future(measure(i, slide_data)) for i, slide_data in enumerate(slides)]
         try:
-            from app.services.pdf_generator import get_browser_launch_options
-            browser = await pyppeteer.launch(**get_browser_launch_options())
-            slide_heights = []
-            
-            start_time = time.time()
-            last_progress_time = start_time
-            
-            for i, slide_data in enumerate(slides):
-                template_id = slide_data.get('templateId', 'unknown')
-                try:
-                    height = await calculate_slide_dimensions(slide_data, theme, browser, effective_version)
-                    slide_heights.append(height)
-                    logger.info(f"✓ SCORM Slide {i + 1}/{len(slides)} ({template_id}) height: {height}px")
-                except Exception as e:
-                    logger.error(f"✗ Failed to calculate height for slide {i + 1} ({template_id}): {e}")
-                    slide_heights.append(660)  # Fallback to 16:9 minimum
-                
-                # Send keep-alive progress update every 10 seconds
-                current_time = time.time()
-                if current_time - last_progress_time >= 10:
-                    elapsed = int(current_time - start_time)
-                    yield {"type": "progress", "message": f"Processing slides... {i + 1}/{len(slides)} complete ({elapsed}s elapsed)"}
-                    last_progress_time = current_time
-                    
-            await browser.close()
-            browser = None
-            yield {"type": "progress", "message": f"All {len(slides)} slide dimensions calculated"}
-        except Exception as e:
-            logger.error(f"Failed to calculate slide heights: {e}, using default 660px for all")
-            slide_heights = [660] * len(slides)
-            if browser:
-                await browser.close()
-                browser = None
+            pending = set(height_tasks)
+            while pending:
+                _, pending = await asyncio.wait(pending, timeout=10)
+                if pending:
+                    elapsed = int(time.time() - start_time)
+                    yield {"type": "progress", "message": f"Processing slides... {len(slides) - len(pending)}/{len(slides)} complete ({elapsed}s elapsed)"}
+        finally:
+            for task in height_tasks:
+                task.cancel()
+        slide_heights = [task.result() for task in height_tasks]
+        yield {"type": "progress", "message": f"All {len(slides)} slide dimensions calculated"}
 
         injected_styles = ''
         stacked_bodies: List[str] = []
@@ -1323,80 +1174,73 @@ def _build_manifest_hierarchy(course_title: str, org_items: List[Dict[str, Any]]
     return header + items_xml + footer
 
 
-def _parse_primary_list(raw_primary) -> List[Dict[str, Any]]:
-    if raw_primary is None:
-        return []
-    if isinstance(raw_primary, list):
-        out: List[Dict[str, Any]] = []
-        for it in raw_primary:
-            if isinstance(it, dict):
-                out.append(it)
-            elif isinstance(it, str):
-                t = it.strip().strip('"').strip("'")
-                out.append({"type": t})
-        return out
-    if isinstance(raw_primary, str):
-        s = raw_primary.strip()
-        try:
-            if (s.startswith('[') and s.endswith(']')) or (s.startswith('{') and s.endswith('}')):
-                parsed = json.loads(s)
-                return _parse_primary_list(parsed)
-        except Exception:
-            pass
-        s = s.strip('[]')
-        parts = [p.strip().strip('"').strip("'") for p in s.split(',') if p.strip()]
-        return [{"type": p} for p in parts if p]
-    return []
-
-
-def _parse_recommended_products_field(value) -> List[str]:
-    if value is None:
-        return []
-    if isinstance(value, list):
-        return [str(v).strip().lower() for v in value if isinstance(v, (str,))]
-    if isinstance(value, str):
-        sv = value.strip()
-        try:
-            if sv.startswith('[') and sv.endswith(']'):
-                arr = json.loads(sv)
-                return [str(v).strip().lower() for v in arr if isinstance(v, (str,))]
-        except Exception:
-            pass
-        sv = sv.strip('[]')
-        return [p.strip().strip('"').strip("'").lower() for p in sv.split(',') if p.strip()]
-    return []
-
-
-def _infer_products_for_lesson(projects: List[Dict[str, Any]], outline_name: str, lesson_title: str, used_ids: set) -> List[Dict[str, Any]]:
-    matches: List[Dict[str, Any]] = []
-    if not lesson_title:
-        return matches
-    base_name = f"{outline_name}: {lesson_title}"
-    prefixed_names = [
-        f"Presentation - {outline_name}: {lesson_title}",
-        f"Text Presentation - {outline_name}: {lesson_title}",
-        f"One Pager - {outline_name}: {lesson_title}",
-        f"PDF Lesson - {outline_name}: {lesson_title}",
-        f"Quiz - {outline_name}: {lesson_title}",
-    ]
-    for proj in projects:
-        pid = proj.get('id')
-        if pid in used_ids:
-            continue
-        pname = (proj.get('project_name') or '').strip()
-        mtype = (proj.get('microproduct_type') or '').strip().lower()
-        if not pname or mtype in ('training plan',):
-            continue
-        if pname == base_name or pname in prefixed_names:
-            matches.append(dict(proj))
-    logger.info(f"[SCORM-MATCH] Inferred products for lesson='{lesson_title}': {[m.get('id') for m in matches]}")
-    return matches
+_SCO_KIND_TYPES = {
+    'onepager': ['pdf lesson', 'pdflesson', 'text presentation', 'textpresentation', 'one pager', 'one-pager', 'onepager'],
+    'presentation': ['slide deck', 'presentation', 'slidedeck', 'presentationdisplay'],
+    'quiz': ['quiz', 'quizdisplay'],
+}
+_SCO_KIND_LABELS = {'onepager': 'Onepager', 'presentation': 'Presentation', 'quiz': 'Quiz'}
+
+
+def _sco_kind(product: Dict[str, Any]) -> Optional[str]:
+    """'onepager', 'presentation' or 'quiz' for products that can be packaged as a SCO, else None."""
+    mtype = (product.get('microproduct_type') or '').strip().lower()
+    comp = (product.get('component_name') or '').strip().lower()
+    for kind, names in _SCO_KIND_TYPES.items():
+        if any(t in (mtype, comp) for t in names):
+            return kind
+    return None
+
+
+async def _render_sco_html(product: Dict[str, Any], kind: str, user_id: str, progress) -> str:
+    product_id = product['id']
+    try:
+        content = await _load_product_content(product_id, user_id)
+    except Exception as e:
+        logger.warning(f"[SCORM] Failed to load product content id={product_id}: {e}")
+        content = None
+    content_dict = content if isinstance(content, dict) else {}
+
+    if kind == 'onepager':
+        return _render_onepager_html(product, content_dict)
+    if kind == 'quiz':
+        return _render_quiz_html(product, content_dict)
+    body_html = _wrap_html_as_sco('Presentation', '<h1>Error rendering presentation</h1>')
+    async for slide_update in _render_slide_deck_html_with_progress(product, content_dict):
+        if slide_update["type"] == "progress":
+            progress(slide_update)  # Forward progress from slide rendering
+        elif slide_update["type"] == "complete":
+            body_html = slide_update["html"]
+    return body_html
+
+
+async def _package_sco(
+    sco: Dict[str, Any],
+    user_id: str,
+    z: zipfile.ZipFile,
+    assets: _PackageAssets,
+    progress,
+) -> None:
+    """Render one planned SCO, localize its images and write it into the package."""
+    product = sco['product']
+    product_id = product['id']
+    body_html = await _render_sco_html(product, sco['kind'], user_id, progress)
+    logger.info(f"[SCORM] Rendered {sco['kind']} HTML for product_id={product_id}, length={len(body_html)}")
+
+    sco_dir = f"sco_{product_id}"
+    body_html = await _localize_images_to_assets(body_html, assets, sco_dir)
+    z.writestr(sco['href'], body_html)
+    logger.info(f"[SCORM] Written SCO HTML to {sco['href']}")
 
 
 async def build_scorm_package_zip_with_progress(course_outline_id: int, user_id: str) -> AsyncGenerator[Dict[str, Any], None]:
     """
     Generator version that builds SCORM package and yields progress updates.
-    Yields: {"type": "progress", "message": "..."} or {"type": "complete", "filename": "...", "zip_bytes": b"..."}
+    Yields: {"type": "progress", "message": "..."} or
+            {"type": "complete", "filename": "...", "size": int, "file": <file object at offset 0>}
+
+    The ZIP is written to a spooled temporary file (in memory up to SCORM_SPOOL_MAX_MEMORY_MB,
+    then on disk). The consumer of the "complete" update owns the file and must close it.
     """
     yield {"type": "progress", "message": "Loading course outline..."}
     
@@ -1420,45 +1264,31 @@ async def build_scorm_package_zip_with_progress(course_outline_id: int, user_id:
 
     yield {"type": "progress", "message": f"Fetching products for '{main_title}'..."}
 
-    # Fetch all user projects for matching
-    all_projects = await _load_all_user_projects(user_id)
-    try:
-        types_count: Dict[str, int] = {}
-        for p in all_projects:
-            t1 = (p.get('microproduct_type') or '').strip().lower()
-            t2 = (p.get('component_name') or '').strip().lower()
-            key = t1 or t2 or 'unknown'
-            types_count[key] = types_count.get(key, 0) + 1
-        logger.info(f"[SCORM-MATCH] Projects for user={user_id} | total={len(all_projects)} | by_type={types_count}")
-        if all_projects:
-            sample = [
-                {
-                    'id': ap.get('id'),
-                    'project_name': ap.get('project_name'),
-                    'microproduct_name': ap.get('microproduct_name'),
-                    'microproduct_type': ap.get('microproduct_type'),
-                    'component_name': ap.get('component_name')
-                }
-                for ap in list(map(dict, all_projects))[:10]
-            ]
-            logger.info(f"[SCORM-MATCH] Sample projects (up to 10): {sample}")
-    except Exception as _e:
-        logger.info(f"[SCORM-MATCH] Failed to log project breakdown: {_e}")
-
-    # Build in-memory ZIP
-    zip_buffer = io.BytesIO()
-    z = zipfile.ZipFile(zip_buffer, mode='w', compression=zipfile.ZIP_DEFLATED)
-
-    # Collect SCO entries and hierarchical items
-    sco_entries: List[Tuple[str, str]] = []
+    # Index the user's products once (names and types only; content is loaded per matched SCO)
+    matcher = await ProductMatcher.for_user(user_id, log_tag="[SCORM-MATCH]")
+    logger.info(f"[SCORM-MATCH] Projects for user={user_id} | total={len(matcher.products)} | by_type={matcher.type_breakdown()}")
+
+    # Plan the package: match products to lessons (order matters for used_ids), render later
+    planned_scos: List[Dict[str, Any]] = []
     used_ids: set = set()
     org_items: List[Dict[str, Any]] = []
 
     sections = structure.get('sections') or []
     total_lessons = sum(len(s.get('lessons', [])) for s in sections if isinstance(s, dict))
-    processed_lessons = 0
 
-    yield {"type": "progress", "message": f"Processing {total_lessons} lessons..."}
+    yield {"type": "progress", "message": f"Matching products for {total_lessons} lessons..."}
+
+    def plan_sco(product: Dict[str, Any], kind: str, lesson_item: Dict[str, Any]) -> None:
+        product_id = product['id']
+        href = f"sco_{product_id}/index.html"
+        type_label = _SCO_KIND_LABELS[kind]
+        res_id = f"res-{type_label.lower()}-{product_id}"
+        planned_scos.append({'product': product, 'kind': kind, 'href': href, 'res_id': res_id})
+        lesson_item['children'].append({
+            'identifier': f"itm-{product_id}",
+            'title': type_label,
+            'res_id': res_id,
+        })
 
     for s_idx, section in enumerate(sections, start=1):
         if not isinstance(section, dict):
@@ -1474,22 +1304,20 @@ async def build_scorm_package_zip_with_progress(course_outline_id: int, user_id:
             if not isinstance(lesson, dict):
                 continue
             lesson_title = (lesson.get('title') or f"Lesson {l_idx}").strip()
-            processed_lessons += 1
-            yield {"type": "progress", "message": f"Processing lesson {processed_lessons}/{total_lessons}: {lesson_title}"}
             
             recs = lesson.get('recommended_content_types') or {}
             raw_primary = recs.get('primary')
             logger.info(f"[SCORM] Lesson '{lesson_title}' primary(raw)={raw_primary}")
-            primary = _parse_primary_list(raw_primary)
+            primary = parse_primary_list(raw_primary)
             logger.info(f"[SCORM] Lesson '{lesson_title}' primary(normalized)={primary}")
             if not primary:
                 rp = lesson.get('recommendedProducts') or lesson.get('recommended_products')
-                rp_list = _parse_recommended_products_field(rp)
+                rp_list = parse_recommended_products_field(rp)
                 logger.info(f"[SCORM] Lesson '{lesson_title}' fallback recommendedProducts={rp_list}")
                 if rp_list:
                     primary = [{"type": t} for t in rp_list if t in ("presentation","one-pager","onepager","quiz","video-lesson")]
             if not primary:
-                inferred = _infer_products_for_lesson([dict(p) for p in all_projects], outline_name, lesson_title, used_ids)
+                inferred = matcher.infer(outline_name, lesson_title, used_ids)
                 if inferred:
                     inferred_items: List[Dict[str, Any]] = []
                     for inf in inferred:
@@ -1524,99 +1352,34 @@ async def build_scorm_package_zip_with_progress(course_outline_id: int, user_id:
                 logger.info(f"[SCORM] Processing item type='{item_type_raw}' for lesson='{lesson_title}'")
                 if not item_type_raw:
                     continue
-                matched = _match_connected_product(all_projects, outline_name, lesson_title, item_type_raw, used_ids)
+                matched = matcher.match(outline_name, lesson_title, item_type_raw, used_ids, fuzzy=True)
                 logger.info(f"[SCORM] Match result for lesson='{lesson_title}' type='{item_type_raw}' => matched_id={(matched or {}).get('id') if isinstance(matched, dict) else None}")
                 if not matched:
                     continue
-                product_id = matched['id']
-                used_ids.add(product_id)
+                used_ids.add(matched['id'])
 
-                # Render product to HTML
-                mtype = (matched.get('microproduct_type') or '').strip().lower()
-                comp = (matched.get('component_name') or '').strip().lower()
-                try:
-                    content = await _load_product_content(product_id, user_id)
-                except Exception as e:
-                    logger.warning(f"[SCORM] Failed to load product content id={product_id}: {e}")
-                    content = None
-
-                title_for_sco = matched.get('project_name') or matched.get('microproduct_name') or lesson_title or 'Lesson'
-
-                type_label = None
-                if any(t in (mtype, comp) for t in ['pdf lesson', 'pdflesson', 'text presentation', 'textpresentation', 'one pager', 'one-pager', 'onepager']):
-                    type_label = 'Onepager'
-                    added_types_for_lesson.add('onepager')
-                    body_html = _render_onepager_html(matched, content if isinstance(content, dict) else {})
-                    logger.info(f"[SCORM] Rendered one-pager HTML for product_id={product_id}, length={len(body_html)}")
-                elif any(t in (mtype, comp) for t in ['slide deck', 'presentation', 'slidedeck', 'presentationdisplay']):
-                    # Use generator version to get progress updates
-                    content_dict = content if isinstance(content, dict) else {}
-                    async for slide_update in _render_slide_deck_html_with_progress(matched, content_dict):
-                        if slide_update["type"] == "progress":
-                            yield slide_update  # Forward progress from slide rendering
-                        elif slide_update["type"] == "complete":
-                            body_html = slide_update["html"]
-                    type_label = 'Presentation'
-                    added_types_for_lesson.add('presentation')
-                    logger.info(f"[SCORM] Rendered slide deck HTML for product_id={product_id}, length={len(body_html)}")
-                elif any(t in (mtype, comp) for t in ['quiz', 'quizdisplay']):
-                    body_html = _render_quiz_html(matched, content if isinstance(content, dict) else {})
-                    type_label = 'Quiz'
-                    added_types_for_lesson.add('quiz')
-                    logger.info(f"[SCORM] Rendered quiz HTML for product_id={product_id}, length={len(body_html)}")
-                else:
+                kind = _sco_kind(matched)
+                if not kind:
                     continue
-
-                # Localize images for ALL product types
-                sco_dir = f"sco_{product_id}"
-                logger.info(f"[SCORM] Starting image localization for product_id={product_id}, sco_dir={sco_dir}")
-                
-                html_sample = body_html[:1000] + "..." if len(body_html) > 1000 else body_html
-                logger.debug(f"[SCORM] HTML sample for product_id={product_id}: {html_sample}")
-                
-                body_html = await _localize_images_to_assets(body_html, z, sco_dir)
-                logger.info(f"[SCORM] Completed image localization for product_id={product_id}, final HTML length={len(body_html)}")
-
-                # Write SCO HTML into package
-                href = f"{sco_dir}/index.html"
-                res_id = f"res-{(type_label or 'sco').lower()}-{product_id}"
-                z.writestr(href, body_html)
-                logger.info(f"[SCORM] Written SCO HTML to {href}")
-                sco_entries.append((res_id, href))
-
-                # Add leaf item under lesson
-                lesson_item['children'].append({
-                    'identifier': f"itm-{product_id}",
-                    'title': (type_label or title_for_sco),
-                    'res_id': res_id,
-                })
+                added_types_for_lesson.add(kind)
+                plan_sco(matched, kind, lesson_item)
 
             # Also try to find and include any additional products for this lesson
             logger.info(f"[SCORM] Looking for additional unlisted products for lesson='{lesson_title}'")
-            additional_products = _infer_products_for_lesson([dict(p) for p in all_projects], outline_name, lesson_title, used_ids)
+            additional_products = matcher.infer(outline_name, lesson_title, used_ids)
             
             # Group additional products by type and keep only the newest of each type
             products_by_type: Dict[str, List[Dict[str, Any]]] = {}
             for prod in additional_products:
-                mtype = (prod.get('microproduct_type') or '').strip().lower()
-                comp = (prod.get('component_name') or '').strip().lower()
-                
-                if any(t in (mtype, comp) for t in ['pdf lesson', 'pdflesson', 'text presentation', 'textpresentation', 'one pager', 'one-pager', 'onepager']):
-                    type_key = 'onepager'
-                elif any(t in (mtype, comp) for t in ['slide deck', 'presentation', 'slidedeck', 'presentationdisplay']):
-                    type_key = 'presentation'
-                elif any(t in (mtype, comp) for t in ['quiz', 'quizdisplay']):
-                    type_key = 'quiz'
-                else:
+                type_key = _sco_kind(prod)
+                if not type_key:
                     continue
                 
                 if type_key in added_types_for_lesson:
                     logger.info(f"[SCORM] Skipping additional product id={prod.get('id')} type={type_key} - already have one from primary list")
                     continue
                 
-                if type_key not in products_by_type:
-                    products_by_type[type_key] = []
-                products_by_type[type_key].append(prod)
+                products_by_type.setdefault(type_key, []).append(prod)
             
             # For each type, keep only the newest product
             for type_key, prods in products_by_type.items():
@@ -1629,68 +1392,14 @@ async def build_scorm_package_zip_with_progress(course_outline_id: int, user_id:
                 if len(prods) > 1:
                     logger.info(f"[SCORM] Found {len(prods)} products of type '{type_key}' for lesson='{lesson_title}', keeping newest id={newest.get('id')}")
                 
-                additional_match = newest
-                product_id = additional_match['id']
+                product_id = newest['id']
                 if product_id in used_ids:
                     continue
                 
                 logger.info(f"[SCORM] Found additional product id={product_id} for lesson='{lesson_title}' (not in primary list)")
                 used_ids.add(product_id)
-
-                mtype = (additional_match.get('microproduct_type') or '').strip().lower()
-                comp = (additional_match.get('component_name') or '').strip().lower()
-                try:
-                    content = await _load_product_content(product_id, user_id)
-                except Exception as e:
-                    logger.warning(f"[SCORM] Failed to load product content id={product_id}: {e}")
-                    content = None
-
-                title_for_sco = additional_match.get('project_name') or additional_match.get('microproduct_name') or lesson_title or 'Lesson'
-
-                type_label = None
-                if any(t in (mtype, comp) for t in ['pdf lesson', 'pdflesson', 'text presentation', 'textpresentation', 'one pager', 'one-pager', 'onepager']):
-                    type_label = 'Onepager'
-                    added_types_for_lesson.add('onepager')
-                    body_html = _render_onepager_html(additional_match, content if isinstance(content, dict) else {})
-                    logger.info(f"[SCORM] Rendered one-pager HTML for product_id={product_id}, length={len(body_html)}")
-                elif any(t in (mtype, comp) for t in ['slide deck', 'presentation', 'slidedeck', 'presentationdisplay']):
-                    content_dict = content if isinstance(content, dict) else {}
-                    async for slide_update in _render_slide_deck_html_with_progress(additional_match, content_dict):
-                        if slide_update["type"] == "progress":
-                            yield slide_update
-                        elif slide_update["type"] == "complete":
-                            body_html = slide_update["html"]
-                    type_label = 'Presentation'
-                    added_types_for_lesson.add('presentation')
-                    logger.info(f"[SCORM] Rendered slide deck HTML for product_id={product_id}, length={len(body_html)}")
-                elif any(t in (mtype, comp) for t in ['quiz', 'quizdisplay']):
-                    body_html = _render_quiz_html(additional_match, content if isinstance(content, dict) else {})
-                    type_label = 'Quiz'
-                    added_types_for_lesson.add('quiz')
-                    logger.info(f"[SCORM] Rendered quiz HTML for product_id={product_id}, length={len(body_html)}")
-                else:
-                    continue
-
-                sco_dir = f"sco_{product_id}"
-                logger.info(f"[SCORM] Starting image localization for product_id={product_id}, sco_dir={sco_dir}")
-                
-                html_sample = body_html[:1000] + "..." if len(body_html) > 1000 else body_html
-                logger.debug(f"[SCORM] HTML sample for product_id={product_id}: {html_sample}")
-                
-                body_html = await _localize_images_to_assets(body_html, z, sco_dir)
-                logger.info(f"[SCORM] Completed image localization for product_id={product_id}, final HTML length={len(body_html)}")
-
-                href = f"{sco_dir}/index.html"
-                res_id = f"res-{(type_label or 'sco').lower()}-{product_id}"
-                z.writestr(href, body_html)
-                logger.info(f"[SCORM] Written SCO HTML to {href}")
-                sco_entries.append((res_id, href))
-
-                lesson_item['children'].append({
-                    'identifier': f"itm-{product_id}",
-                    'title': (type_label or title_for_sco),
-                    'res_id': res_id,
-                })
+                added_types_for_lesson.add(type_key)
+                plan_sco(newest, type_key, lesson_item)
 
             # Only add lesson if it has children
             if lesson_item['children']:
@@ -1700,35 +1409,81 @@ async def build_scorm_package_zip_with_progress(course_outline_id: int, user_id:
         if sec_item['children']:
             org_items.append(sec_item)
 
-    yield {"type": "progress", "message": "Generating SCORM manifest..."}
+    spool = tempfile.SpooledTemporaryFile(max_size=SCORM_SPOOL_MAX_MEMORY_MB * 1024 * 1024)
+    z = zipfile.ZipFile(spool, mode='w', compression=zipfile.ZIP_DEFLATED)
+    tasks: List[asyncio.Future] = []
+    try:
+        # Render SCOs concurrently; their progress and completions arrive through one queue
+        total_scos = len(planned_scos)
+        yield {"type": "progress", "message": f"Rendering {total_scos} learning objects..."}
+
+        updates: asyncio.Queue = asyncio.Queue()
+        render_limit = asyncio.Semaphore(SCORM_RENDER_CONCURRENCY)
+        limits = httpx.Limits(
+            max_connections=SCORM_ASSET_FETCH_CONCURRENCY,
+            max_keepalive_connections=SCORM_ASSET_FETCH_CONCURRENCY,
+        )
+        async with httpx.AsyncClient(timeout=30.0, limits=limits) as client:
+            assets = _PackageAssets(z, client)
 
-    # Build resources XML
-    resources_xml_parts: List[str] = []
-    for res_id, href in sco_entries:
-        resources_xml_parts.append(
-            f"<resource identifier=\"{res_id}\" type=\"webcontent\" adlcp:scormType=\"sco\" href=\"{_xml_escape(href)}\"><file href=\"{_xml_escape(href)}\"/></resource>"
+            async def render(sco: Dict[str, Any]) -> None:
+                try:
+                    async with render_limit:
+                        await _package_sco(sco, user_id, z, assets, updates.put_nowait)
+                finally:
+                    updates.put_nowait({"type": "sco_done", "sco": sco})
+
+            tasks = [asyncio.ensure_future(render(sco)) for sco in planned_scos]
+            completed = 0
+            while completed < total_scos:
+                update = await updates.get()
+                if update["type"] != "sco_done":
+                    yield update
+                    continue
+                completed += 1
+                product = update["sco"]["product"]
+                title = product.get('project_name') or product.get('microproduct_name') or 'Lesson'
+                yield {"type": "progress", "message": f"Packaged {completed}/{total_scos}: {title}"}
+            # Surface the first rendering failure, if any
+            await asyncio.gather(*tasks)
+
+        logger.info(
+            f"[SCORM-ASSETS] Package assets: {assets.assets_stored} stored ({assets.bytes_stored} bytes), "
+            f"{assets.dedup_hits} duplicates skipped"
         )
-    resources_xml = "".join(resources_xml_parts)
 
-    # Build manifest with hierarchy
-    manifest_xml = _build_manifest_hierarchy(main_title, org_items, resources_xml)
-    z.writestr("imsmanifest.xml", manifest_xml)
+        yield {"type": "progress", "message": "Generating SCORM manifest..."}
+
+        # Build resources XML
+        resources_xml_parts: List[str] = []
+        for sco in planned_scos:
+            res_id, href = sco['res_id'], sco['href']
+            resources_xml_parts.append(
+                f"<resource identifier=\"{res_id}\" type=\"webcontent\" adlcp:scormType=\"sco\" href=\"{_xml_escape(href)}\"><file href=\"{_xml_escape(href)}\"/></resource>"
+            )
+        resources_xml = "".join(resources_xml_parts)
+
+        # Build manifest with hierarchy
+        manifest_xml = _build_manifest_hierarchy(main_title, org_items, resources_xml)
+        z.writestr("imsmanifest.xml", manifest_xml)
 
-    # Log final ZIP contents for debugging
-    zip_contents = z.namelist()
-    logger.info(f"[SCORM] Final ZIP contents ({len(zip_contents)} files):")
-    for i, filename in enumerate(sorted(zip_contents)):
-        file_info = z.getinfo(filename)
-        logger.info(f"[SCORM]   {i+1:3d}. {filename} ({file_info.file_size} bytes)")
+        yield {"type": "progress", "message": "Finalizing SCORM package..."}
 
-    yield {"type": "progress", "message": "Finalizing SCORM package..."}
+        entry_count = len(z.infolist())
+        z.close()
+        size = spool.tell()
+        spool.seek(0)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        z.close()
+        spool.close()
+        raise
 
-    z.close()
-    zip_bytes = zip_buffer.getvalue()
     filename = f"{re.sub(r'[^A-Za-z0-9_-]+', '_', main_title) or 'course'}_scorm2004.zip"
-    logger.info(f"[SCORM] Package complete: {filename} ({len(zip_bytes)} bytes total)")
+    logger.info(f"[SCORM] Package complete: {filename} ({entry_count} files, {size} bytes total)")
     
-    yield {"type": "complete", "filename": filename, "zip_bytes": zip_bytes}
+    yield {"type": "complete", "filename": filename, "size": size, "file": spool}
 
 
 async def build_scorm_package_zip(course_outline_id: int, user_id: str) -> Tuple[str, bytes]:
@@ -1739,6 +1494,7 @@ async def build_scorm_package_zip(course_outline_id: int, user_id: str) -> Tuple
     """
     async for update in build_scorm_package_zip_with_progress(course_outline_id, user_id):
         if update["type"] == "complete":
-            return update["filename"], update["zip_bytes"]
+            with update["file"] as package_file:
+                return update["filename"], package_file.read()
     # Fallback
     raise HTTPException(status_code=500, detail="SCORM package generation failed") 
\ No newline at end of file
@@ -9,10 +9,11 @@ Replaces the dual-approach complexity with one robust solution.
 Key Features:
 - Pure OpenCV for video processing (no MoviePy dependencies)
 - Template-aware avatar scaling and positioning
-- Frame-by-frame composition with progress feedback
+- Vectorized, multi-process frame composition with progress feedback
 - Single method - no fallback complexity
 - Preserves original slide video as background canvas
-- FFmpeg for final audio merge with BROWSER-COMPATIBLE encoding
+- Composed frames piped straight into ffmpeg: one BROWSER-COMPATIBLE H.264
+  encode with the audio mux and faststart in the same pass
 
 CRITICAL FIX: Replaced -c:v copy with browser-compatible H.264 encoding
 """
@@ -24,12 +25,279 @@ import logging
 import os
 import subprocess
 import json
+import multiprocessing
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Tuple, Optional
 from pathlib import Path
 from datetime import datetime
 
+from app.services.video_encoding import FfmpegFrameSink
+
 logger = logging.getLogger(__name__)
 
+# Output canvas and the colour used when the slide video runs out of frames
+OUTPUT_WIDTH = 1920
+OUTPUT_HEIGHT = 1080
+FALLBACK_BACKGROUND_BGR = (17, 12, 53)  # Dark purple
+
+# Parallel composition: the timeline is cut into segments composed by a process pool
+COMPOSER_WORKERS = int(os.getenv("VIDEO_COMPOSER_WORKERS", "0")) or (os.cpu_count() or 1)
+MIN_FRAMES_PER_SEGMENT = int(os.getenv("VIDEO_COMPOSER_MIN_SEGMENT_FRAMES", "150"))
+# x264 quality level (see app.services.video_encoding); medium matches libx264's defaults
+COMPOSER_QUALITY = os.getenv("VIDEO_COMPOSER_QUALITY", "medium")
+
+# Alpha (0-255) -> fixed-point weight (0-256), so a fully opaque pixel keeps its exact value
+ALPHA_WEIGHT_LUT = (np.arange(256, dtype=np.uint16) + (np.arange(256, dtype=np.uint16) >> 7))
+
+_composer_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _hex_to_bgr(hex_color: str) -> tuple:
+    """Convert a hex color string ('#FFFFFF' or 'FFFFFF') to a BGR tuple for OpenCV."""
+    try:
+        hex_color = hex_color.lstrip('#')
+        r = int(hex_color[0:2], 16)
+        g = int(hex_color[2:4], 16)
+        b = int(hex_color[4:6], 16)
+        return (b, g, r)
+    except Exception as e:
+        logger.warning(f"🎬 [SIMPLE_COMPOSER] Invalid hex color '{hex_color}': {e}. Using white as default.")
+        return (255, 255, 255)
+
+
+def _shape_alpha(shape: str, width: int, height: int, border_width: int, border_color: str):
+    """
+    Alpha mask and border layer for a circular or arch avatar.
+
+    Returns (alpha, border_where, border_bgr): alpha is 255 inside the shape and
+    on its border, border_where marks border pixels and border_bgr holds their colour.
+    """
+    mask = np.zeros((height, width), dtype=np.uint8)
+    border = np.zeros((height, width, 4), dtype=np.uint8)
+    color = (*_hex_to_bgr(border_color), 255) if border_width > 0 else None
+
+    if shape == 'circle':
+        center = (width // 2, height // 2)
+        radius = min(width, height) // 2
+        cv2.circle(mask, center, radius, 255, -1)
+        if color:
+            cv2.circle(border, center, radius, color, border_width)
+    else:
+        # Arch: rounded top corners, straight sides and bottom (CSS border-radius: 50% 50% 0 0)
+        radius = width // 2
+        cv2.rectangle(mask, (0, radius), (width, height), 255, -1)
+        cv2.ellipse(mask, (radius, radius), (radius, radius), 0, 180, 270, 255, -1)
+        cv2.ellipse(mask, (radius, radius), (radius, radius), 0, 270, 360, 255, -1)
+        if color:
+            cv2.ellipse(border, (radius, radius), (radius, radius), 0, 180, 270, color, border_width)
+            cv2.ellipse(border, (radius, radius), (radius, radius), 0, 270, 360, color, border_width)
+            cv2.line(border, (0, radius), (0, height), color, border_width)
+            cv2.line(border, (width - 1, radius), (width - 1, height), color, border_width)
+            cv2.line(border, (0, height - 1), (width, height - 1), color, border_width)
+
+    if not color:
+        return mask, None, None
+    border_where = border[:, :, 3:] > 0
+    alpha = np.where(border_where[:, :, 0], 255, mask).astype(np.uint8)
+    return alpha, border_where, np.ascontiguousarray(border[:, :, :3])
+
+
+class AvatarOverlay:
+    """
+    Avatar placement for one composition, computed once: crop geometry, the
+    shape mask as fixed-point blend weights and the border layer. `apply`
+    then composites a frame in place with integer arithmetic only.
+    """
+
+    def __init__(self, avatar_config: dict, source_width: int, source_height: int):
+        self.x = avatar_config['x']
+        self.y = avatar_config['y']
+        self.width = avatar_config['width']
+        self.height = avatar_config['height']
+        self.shape = avatar_config.get('shape', 'rectangle')
+        self.source_size = (source_width, source_height)
+        self.fits = self.x + self.width <= OUTPUT_WIDTH and self.y + self.height <= OUTPUT_HEIGHT
+
+        background_color = avatar_config.get('backgroundColor')
+        self.background_bgr = _hex_to_bgr(background_color) if background_color else None
+
+        # Scale to the target height keeping the aspect ratio, then center-crop (or pad) the width
+        scaled_width = int(source_width * (self.height / source_height))
+        self.scaled_size = (scaled_width, self.height)
+        self.crop_x = (scaled_width - self.width) // 2 if scaled_width > self.width else None
+        self.pad_x = (self.width - scaled_width) // 2 if scaled_width < self.width else None
+        if self.pad_x is not None:
+            logger.warning(f"🎬 [SIMPLE_COMPOSER] Scaled width ({scaled_width}) < target width ({self.width}), padding required")
+
+        self.opaque = None
+        self.weight = None
+        self.inverse_weight = None
+        self.border_where = None
+        self.border_bgr = None
+        if self.shape in ('circle', 'arch'):
+            alpha, self.border_where, self.border_bgr = _shape_alpha(
+                self.shape, self.width, self.height,
+                avatar_config.get('borderWidth', 0), avatar_config.get('borderColor', '#ffffff')
+            )
+            if np.any((alpha > 0) & (alpha < 255)):
+                self.weight = ALPHA_WEIGHT_LUT[alpha][:, :, None]
+                self.inverse_weight = np.uint16(256) - self.weight
+            else:
+                # Binary mask: compositing is a masked copy
+                self.opaque = (alpha == 255)[:, :, None]
+
+    def crop(self, avatar_frame: np.ndarray) -> np.ndarray:
+        """Avatar frame scaled and cropped to the template size (aspect ratio preserved)."""
+        scaled = cv2.resize(avatar_frame, self.scaled_size)
+        if self.crop_x is not None:
+            return scaled[:, self.crop_x:self.crop_x + self.width]
+        if self.pad_x is not None:
+            padded = np.full((self.height, self.width, 3), FALLBACK_BACKGROUND_BGR, dtype=np.uint8)
+            padded[:, self.pad_x:self.pad_x + self.scaled_size[0]] = scaled
+            return padded
+        return scaled
+
+    def apply(self, background: np.ndarray, avatar_frame: np.ndarray) -> None:
+        """Composite one avatar frame onto `background` in place."""
+        if not self.fits:
+            return
+        x, y, w, h = self.x, self.y, self.width, self.height
+        if self.background_bgr is not None:
+            # Same area cv2.rectangle((x, y), (x + w, y + h), filled) paints: both corners inclusive
+            background[y:y + h + 1, x:x + w + 1] = self.background_bgr
+
+        avatar = self.crop(avatar_frame)
+        roi = background[y:y + h, x:x + w]
+        if self.border_where is not None:
+            avatar = np.where(self.border_where, self.border_bgr, avatar)
+
+        if self.opaque is not None:
+            np.copyto(roi, avatar, where=self.opaque)
+        elif self.weight is not None:
+            blend_fixed_point(roi, avatar, self.weight, self.inverse_weight)
+        else:
+            roi[...] = avatar
+
+
+def blend_fixed_point(roi: np.ndarray, overlay_bgr: np.ndarray, weight: np.ndarray, inverse_weight: np.ndarray) -> None:
+    """roi = (overlay * w + roi * (256 - w)) >> 8, computed in uint16 and written back into roi."""
+    blended = overlay_bgr.astype(np.uint16)
+    blended *= weight
+    background = roi.astype(np.uint16)
+    background *= inverse_weight
+    blended += background
+    blended >>= 8
+    roi[...] = blended
+
+
+def _seek(capture, frame_index: int) -> None:
+    """Position a capture at `frame_index`, decoding forward when the container seek is not exact."""
+    if frame_index <= 0:
+        return
+    capture.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+    if int(capture.get(cv2.CAP_PROP_POS_FRAMES)) == frame_index:
+        return
+    capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    for _ in range(frame_index):
+        if not capture.grab():
+            break
+
+
+def compose_segment(job: dict) -> dict:
+    """
+    Process-pool entry point: compose frames [start_frame, start_frame + frame_count)
+    of the slide and avatar videos and pipe them into an FfmpegFrameSink writing
+    job['output_path'] (with audio from job['audio_source_path'] when set).
+    """
+    cv2.setNumThreads(1)  # Parallelism comes from the pool; avoid oversubscribing cores
+    slide_cap = cv2.VideoCapture(job['slide_video_path'])
+    avatar_cap = cv2.VideoCapture(job['avatar_video_path'])
+    writer = FfmpegFrameSink(
+        job['output_path'], OUTPUT_WIDTH, OUTPUT_HEIGHT, job['fps'],
+        quality=job['quality'],
+        audio_source_path=job.get('audio_source_path'),
+        faststart=job.get('faststart', True),
+        threads=job.get('encoder_threads'),
+    )
+    frames_written = 0
+    try:
+        writer.open()
+        _seek(slide_cap, job['start_frame'])
+        _seek(avatar_cap, job['start_frame'])
+
+        overlay = None
+        while frames_written < job['frame_count']:
+            slide_ret, slide_frame = slide_cap.read()
+            avatar_ret, avatar_frame = avatar_cap.read()
+            if not slide_ret and not avatar_ret:
+                break
+
+            if slide_ret:
+                if slide_frame.shape[1] == OUTPUT_WIDTH and slide_frame.shape[0] == OUTPUT_HEIGHT:
+                    background = slide_frame
+                else:
+                    background = cv2.resize(slide_frame, (OUTPUT_WIDTH, OUTPUT_HEIGHT))
+            else:
+                background = np.full((OUTPUT_HEIGHT, OUTPUT_WIDTH, 3), FALLBACK_BACKGROUND_BGR, dtype=np.uint8)
+
+            if avatar_ret:
+                source_size = (avatar_frame.shape[1], avatar_frame.shape[0])
+                if overlay is None or overlay.source_size != source_size:
+                    overlay = AvatarOverlay(job['avatar_config'], *source_size)
+                overlay.apply(background, avatar_frame)
+
+            writer.write(background)
+            frames_written += 1
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        slide_cap.release()
+        avatar_cap.release()
+
+    return {'index': job['index'], 'frames': frames_written, 'output_path': job['output_path']}
+
+
+def plan_segments(total_frames: int, workers: int = COMPOSER_WORKERS, min_frames: int = MIN_FRAMES_PER_SEGMENT) -> list:
+    """Split [0, total_frames) into (start, count) segments, one per worker unless that makes them too short."""
+    segment_count = max(1, min(workers, total_frames // max(1, min_frames)))
+    base, remainder = divmod(total_frames, segment_count)
+    segments = []
+    start = 0
+    for index in range(segment_count):
+        count = base + (1 if index < remainder else 0)
+        segments.append((start, count))
+        start += count
+    return segments
+
+
+def _get_composer_pool() -> ProcessPoolExecutor:
+    global _composer_pool
+    if _composer_pool is None:
+        # spawn: forking the API process (threads, event loop, DB pool) is not safe
+        _composer_pool = ProcessPoolExecutor(
+            max_workers=COMPOSER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        logger.info(f"🎬 [SIMPLE_COMPOSER] Started composition pool with {COMPOSER_WORKERS} workers")
+    return _composer_pool
+
+
+def _reset_composer_pool() -> None:
+    global _composer_pool
+    if _composer_pool is not None:
+        _composer_pool.shutdown(wait=False, cancel_futures=True)
+    _composer_pool = None
+
+
+def shutdown_composer_pool() -> None:
+    """Stop the composition worker processes (app shutdown)."""
+    _reset_composer_pool()
+
+
 class SimpleVideoComposer:
     """
     Simple, reliable video composer using pure OpenCV.
@@ -61,11 +329,14 @@ class SimpleVideoComposer:
                            avatar_video_path: str, 
                            output_path: str,
                            progress_callback=None,
-                           avatar_position: dict = None) -> bool:
+                           avatar_position: dict = None,
+                           quality: str = None) -> bool:
         """
         Compose slide and avatar videos using OpenCV.
         
         Supports rectangular, circular, and arch avatars based on 'shape' property.
+        The composed frames, the avatar's audio and faststart are encoded in a
+        single ffmpeg pass.
         
         Args:
             slide_video_path: Path to slide video (from working pipeline)
@@ -79,6 +350,7 @@ class SimpleVideoComposer:
                            - Optional: borderWidth (pixels, for circular and arch avatars)
                            - Optional: borderColor (hex color string, for circular and arch avatars)
                            If not provided, uses default template position
+            quality: x264 quality level ('high', 'medium', 'low'); defaults to VIDEO_COMPOSER_QUALITY
             
         Returns:
             True if successful, False otherwise
@@ -110,38 +382,24 @@ class SimpleVideoComposer:
             logger.info(f"  - Slide: {slide_props}")
             logger.info(f"  - Avatar: {avatar_props}")
             
-            # Create temporary video without audio
-            temp_video_path = str(self.temp_dir / f"temp_composition_{int(datetime.now().timestamp())}.mp4")
-            
-            # Compose videos frame by frame
+            # Compose frames and encode them, with the avatar's audio, straight into the output
             success = await self._compose_frames(
                 slide_video_path, 
                 avatar_video_path, 
-                temp_video_path,
+                output_path,
                 slide_props,
                 avatar_props,
                 progress_callback,
-                active_avatar_config  # Pass custom avatar position
+                active_avatar_config,  # Pass custom avatar position
+                audio_source_path=avatar_video_path,
+                quality=quality or COMPOSER_QUALITY
             )
             
-            if not success:
-                logger.error("🎬 [SIMPLE_COMPOSER] Frame composition failed")
-                return False
-            
-            # Add audio from avatar video
-            success = await self._add_audio(temp_video_path, avatar_video_path, output_path)
-            
-            # Cleanup temporary file
-            try:
-                os.remove(temp_video_path)
-            except Exception as e:
-                logger.warning(f"Could not remove temp file: {e}")
-            
             if success:
                 logger.info(f"🎬 [SIMPLE_COMPOSER] Video composition completed successfully: {output_path}")
                 return True
             else:
-                logger.error("🎬 [SIMPLE_COMPOSER] Audio merge failed")
+                logger.error("🎬 [SIMPLE_COMPOSER] Frame composition failed")
                 return False
                 
         except Exception as e:
@@ -213,17 +471,25 @@ class SimpleVideoComposer:
                             slide_props: dict,
                             avatar_props: dict,
                             progress_callback=None,
-                            avatar_config: dict = None) -> bool:
+                            avatar_config: dict = None,
+                            audio_source_path: Optional[str] = None,
+                            quality: str = COMPOSER_QUALITY) -> bool:
         """
-        Compose videos frame by frame using OpenCV.
+        Compose the slide and avatar videos with OpenCV.
         
         This method:
         1. Uses slide video as full background canvas (1920x1080)
         2. Scales avatar to template dimensions (from avatar_config)
         3. Positions avatar at template coordinates (from avatar_config)
-        4. Overlays avatar onto slide frame by frame
+        4. Overlays avatar onto every slide frame (AvatarOverlay, mask and weights computed once)
         5. Supports rectangular, circular, and arch avatars based on 'shape' property
         
+        The timeline is split into segments that are composed in parallel by a
+        process pool (VIDEO_COMPOSER_WORKERS, default: CPU count), each piped into
+        its own H.264 encoder. A single segment is encoded with the audio from
+        `audio_source_path` and faststart directly into `output_path`; several
+        segments are joined by stream copy with the audio muxed in at that point.
+        
         Args:
             avatar_config: Dict with 'x', 'y', 'width', 'height' keys for avatar positioning.
                           Optional 'shape' key: 'circle' for circular mask, 'arch' for arch mask, 'rectangle' (default) for rectangular.
@@ -242,28 +508,24 @@ class SimpleVideoComposer:
         }.get(shape, 'rectangular')
         logger.info(f"🎬 [SIMPLE_COMPOSER] Frame composition using avatar config: {avatar_config}")
         logger.info(f"🎬 [SIMPLE_COMPOSER] Avatar shape: {shape.upper()} ({shape_desc})")
+        segment_paths = []
         try:
-            logger.info("🎬 [SIMPLE_COMPOSER] Starting frame-by-frame composition")
-            
-            # Open video captures
+            # Calculate total frames for progress tracking
             slide_cap = cv2.VideoCapture(slide_video_path)
             avatar_cap = cv2.VideoCapture(avatar_video_path)
-            
-            # Use slide video properties as base
-            output_width = 1920
-            output_height = 1080
-            output_fps = slide_props['fps']
-            
-            # Calculate total frames for progress tracking
             slide_frame_count = int(slide_cap.get(cv2.CAP_PROP_FRAME_COUNT))
             avatar_frame_count = int(avatar_cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            slide_cap.release()
+            avatar_cap.release()
+            
+            output_fps = slide_props['fps']
             
             # OPTIMIZATION: Use minimum frame count to avoid processing unnecessary frames
             # Previously used max() which caused processing of 1500 frames when avatar only had 140
             total_frames = min(slide_frame_count, avatar_frame_count)
             
             logger.info(f"🎬 [SIMPLE_COMPOSER] Frame composition setup:")
-            logger.info(f"  - Output dimensions: {output_width}x{output_height}")
+            logger.info(f"  - Output dimensions: {OUTPUT_WIDTH}x{OUTPUT_HEIGHT}")
             logger.info(f"  - Output FPS: {output_fps}")
             logger.info(f"  - Slide frames: {slide_frame_count}")
             logger.info(f"  - Avatar frames: {avatar_frame_count}")
@@ -282,122 +544,59 @@ class SimpleVideoComposer:
             else:
                 logger.info(f"🎬 [SIMPLE_COMPOSER] ✅ Frame counts match well (difference: {frame_diff_percent:.1f}%)")
             
-            # Define video codec and writer
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            video_writer = cv2.VideoWriter(output_path, fourcc, output_fps, (output_width, output_height))
-            
-            if not video_writer.isOpened():
-                logger.error("🎬 [SIMPLE_COMPOSER] Failed to open video writer")
+            if total_frames <= 0:
+                logger.error("🎬 [SIMPLE_COMPOSER] No frames to compose")
                 return False
             
-            frame_count = 0
+            segments = plan_segments(total_frames)
+            stem = f"{Path(output_path).stem}_{uuid.uuid4().hex[:8]}"
+            jobs = []
+            for index, (start_frame, frame_count) in enumerate(segments):
+                segment_path = output_path if len(segments) == 1 else str(self.temp_dir / f"{stem}_segment_{index:03d}.mp4")
+                if segment_path != output_path:
+                    segment_paths.append(segment_path)
+                jobs.append({
+                    'index': index,
+                    'slide_video_path': slide_video_path,
+                    'avatar_video_path': avatar_video_path,
+                    'output_path': segment_path,
+                    'start_frame': start_frame,
+                    'frame_count': frame_count,
+                    'fps': output_fps,
+                    'avatar_config': avatar_config,
+                    'quality': quality,
+                    # Audio and faststart are applied once, when segments are joined
+                    'audio_source_path': audio_source_path if len(segments) == 1 else None,
+                    'faststart': len(segments) == 1,
+                    # Segments encode side by side; split the cores between their encoders
+                    'encoder_threads': max(1, (os.cpu_count() or 1) // len(segments)) if len(segments) > 1 else None,
+                })
+            
+            logger.info(f"🎬 [SIMPLE_COMPOSER] Composing {total_frames} frames in {len(jobs)} segment(s) on {COMPOSER_WORKERS} worker(s)")
+            
+            loop = asyncio.get_running_loop()
+            pool = _get_composer_pool()
+            pending = [loop.run_in_executor(pool, compose_segment, job) for job in jobs]
+            frames_done = 0
             last_progress = -1
-            
-            logger.info("🎬 [SIMPLE_COMPOSER] Processing frames with CROPPING (not resizing) to maintain avatar aspect ratio...")
-            
-            while True:
-                # Read slide frame (background)
-                slide_ret, slide_frame = slide_cap.read()
-                
-                # Read avatar frame (overlay)
-                avatar_ret, avatar_frame = avatar_cap.read()
-                
-                # Break if we've reached the end of either video
-                if not slide_ret and not avatar_ret:
-                    break
-                
-                # Create background frame
-                if slide_ret:
-                    # Use slide frame as background, ensure it's 1920x1080
-                    background = cv2.resize(slide_frame, (output_width, output_height))
-                else:
-                    # If slide video ended, use last frame or create solid background
-                    background = np.full((output_height, output_width, 3), (17, 12, 53), dtype=np.uint8)  # Dark purple
-                
-                # Process avatar frame if available
-                if avatar_ret:
-                    # CRITICAL FIX: Crop avatar instead of resizing to maintain aspect ratio
-                    avatar_cropped = self._crop_avatar_to_template(avatar_frame, avatar_config)
-                    
-                    # Get position coordinates from config
-                    x = avatar_config['x']
-                    y = avatar_config['y']
-                    avatar_width = avatar_config['width']
-                    avatar_height = avatar_config['height']
-                    shape = avatar_config.get('shape', 'rectangle')  # ✅ NEW: Support circular avatars
-                    
-                    # Ensure avatar fits within bounds
-                    if x + avatar_width <= output_width and y + avatar_height <= output_height:
-                        # Draw background color behind avatar if specified
-                        if 'backgroundColor' in avatar_config and avatar_config['backgroundColor']:
-                            bg_color = self._hex_to_bgr(avatar_config['backgroundColor'])
-                            cv2.rectangle(background, (x, y), (x + avatar_width, y + avatar_height), bg_color, -1)
-                        
-                        # ✅ NEW: Apply mask based on shape
-                        if shape == 'circle':
-                            border_width = avatar_config.get('borderWidth', 0)
-                            border_color = avatar_config.get('borderColor', '#ffffff')
-                            
-                            # Apply circular mask with optional border
-                            avatar_processed = self._apply_circular_mask(
-                                avatar_cropped,
-                                border_width=border_width,
-                                border_color=border_color
-                            )
-                            
-                            # Use alpha compositing for circular avatar (preserves transparency)
-                            background = self._overlay_with_alpha(background, avatar_processed, x, y)
-                            
-                            if frame_count == 0:  # Log once on first frame
-                                logger.info(f"🎬 [SIMPLE_COMPOSER] ✅ Using CIRCULAR avatar (border: {border_width}px)")
-                        elif shape == 'arch':
-                            border_width = avatar_config.get('borderWidth', 0)
-                            border_color = avatar_config.get('borderColor', '#ffffff')
-                            
-                            # Apply arch mask with optional border
-                            avatar_processed = self._apply_arch_mask(
-                                avatar_cropped,
-                                border_width=border_width,
-                                border_color=border_color
-                            )
-                            
-                            # Use alpha compositing for arch avatar (preserves transparency)
-                            background = self._overlay_with_alpha(background, avatar_processed, x, y)
-                            
-                            if frame_count == 0:  # Log once on first frame
-                                logger.info(f"🎬 [SIMPLE_COMPOSER] ✅ Using ARCH avatar (border: {border_width}px)")
-                        else:
-                            # Simple rectangular overlay (existing method - backward compatible)
-                            background[y:y + avatar_height, 
-                                     x:x + avatar_width] = avatar_cropped
-                            
-                            if frame_count == 0:  # Log once on first frame
-                                logger.info(f"🎬 [SIMPLE_COMPOSER] ✅ Using RECTANGULAR avatar (default)")
-                    else:
-                        logger.warning(f"🎬 [SIMPLE_COMPOSER] Avatar position out of bounds: ({x}, {y})")
-                
-                # Write composed frame
-                video_writer.write(background)
-                frame_count += 1
-                
-                # Progress callback
-                if progress_callback and total_frames > 0:
-                    progress = int((frame_count / total_frames) * 100)
-                    if progress != last_progress and progress % 5 == 0:  # Report every 5%
-                        progress_callback(progress)
-                        last_progress = progress
-                        logger.info(f"🎬 [SIMPLE_COMPOSER] Frame composition progress: {progress}%")
-                
-                # Break if we've processed enough frames
-                if frame_count >= total_frames:
-                    break
-            
-            # Cleanup
-            slide_cap.release()
-            avatar_cap.release()
-            video_writer.release()
-            
-            logger.info(f"🎬 [SIMPLE_COMPOSER] Frame composition completed: {frame_count} frames processed")
+            try:
+                for finished in asyncio.as_completed(pending):
+                    result = await finished
+                    frames_done += result['frames']
+                    if progress_callback:
+                        progress = int((frames_done / total_frames) * 100)
+                        if progress != last_progress:
+                            progress_callback(progress)
+                            last_progress = progress
+                            logger.info(f"🎬 [SIMPLE_COMPOSER] Frame composition progress: {progress}%")
+            except BrokenProcessPool:
+                _reset_composer_pool()
+                raise
+            
+            logger.info(f"🎬 [SIMPLE_COMPOSER] Frame composition completed: {frames_done} frames processed")
+            
+            if segment_paths and not await self._concat_segments(segment_paths, output_path, audio_source_path):
+                return False
             
             # Verify output file
             if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
@@ -410,361 +609,51 @@ class SimpleVideoComposer:
         except Exception as e:
             logger.error(f"🎬 [SIMPLE_COMPOSER] Frame composition error: {str(e)}")
             return False
+        finally:
+            for segment_path in segment_paths:
+                try:
+                    if os.path.exists(segment_path):
+                        os.remove(segment_path)
+                except OSError as e:
+                    logger.warning(f"Could not remove segment file {segment_path}: {e}")
     
-    async def _add_audio(self, video_path: str, audio_source_path: str, output_path: str) -> bool:
+    async def _concat_segments(self, segment_paths: list, output_path: str, audio_source_path: Optional[str] = None) -> bool:
         """
-        Add audio from avatar video to the composed video using FFmpeg.
-        
-        CRITICAL FIX: Now uses browser-compatible H.264 encoding instead of copying video streams.
-        This fixes the issue where videos show only the first frame with audio playing.
-        
-        Args:
-            video_path: Path to video without audio
-            audio_source_path: Path to video with audio (avatar video)
-            output_path: Path for final output with audio
-            
-        Returns:
-            True if successful, False otherwise
+        Join H.264 segments into one file by stream copy (no re-encode), muxing
+        in AAC audio from `audio_source_path` and moving the index up front.
         """
+        list_path = str(Path(output_path).with_suffix('.segments.txt'))
         try:
-            logger.info("🎬 [SIMPLE_COMPOSER] Adding audio to composed video with BROWSER-COMPATIBLE encoding")
-            
-            # FIXED: Use browser-compatible H.264 encoding instead of copying video streams
-            cmd = [
-                'ffmpeg',
-                '-i', video_path,        # Video input (no audio)
-                '-i', audio_source_path, # Audio source (avatar video)
-                '-c:v', 'libx264',       # Use H.264 codec for browser compatibility
-                '-profile:v', 'baseline', # Ensure maximum browser compatibility
-                '-level', '3.0',         # H.264 level for web compatibility
-                '-pix_fmt', 'yuv420p',   # Standard pixel format for web
-                '-movflags', '+faststart', # Enable progressive download
-                '-c:a', 'aac',           # Encode audio as AAC
-                '-map', '0:v:0',         # Use video from first input
-                '-map', '1:a:0',         # Use audio from second input
-                '-shortest',             # End when shortest input ends
-                '-y',                    # Overwrite output
-                output_path
-            ]
+            with open(list_path, 'w') as list_file:
+                for segment_path in segment_paths:
+                    list_file.write(f"file '{os.path.abspath(segment_path)}'\n")
             
-            logger.info(f"🎬 [SIMPLE_COMPOSER] FFmpeg audio command (FIXED): {' '.join(cmd)}")
+            cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path]
+            if audio_source_path:
+                cmd += ['-i', audio_source_path, '-map', '0:v:0', '-map', '1:a:0?', '-c:v', 'copy', '-c:a', 'aac', '-shortest']
+            else:
+                cmd += ['-c', 'copy']
+            cmd += ['-movflags', '+faststart', '-y', output_path]
             
             process = await asyncio.create_subprocess_exec(
                 *cmd,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
-            
-            stdout, stderr = await process.communicate()
-            
+            _, stderr = await process.communicate()
             if process.returncode != 0:
-                logger.error(f"🎬 [SIMPLE_COMPOSER] Audio merge failed: {stderr.decode()}")
+                logger.error(f"🎬 [SIMPLE_COMPOSER] Segment concat failed: {stderr.decode()}")
                 return False
-            
-            logger.info("🎬 [SIMPLE_COMPOSER] Audio merge completed successfully with browser-compatible encoding")
-            
-            # Verify final output
-            if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-                file_size_mb = os.path.getsize(output_path) / (1024 * 1024)
-                logger.info(f"🎬 [SIMPLE_COMPOSER] Final video created: {file_size_mb:.2f} MB")
-                return True
-            else:
-                logger.error("🎬 [SIMPLE_COMPOSER] Final video not created or empty")
-                return False
-                
-        except Exception as e:
-            logger.error(f"🎬 [SIMPLE_COMPOSER] Audio merge error: {str(e)}")
-            return False
+            return True
+        finally:
+            try:
+                os.remove(list_path)
+            except OSError:
+                pass
     
     def _hex_to_bgr(self, hex_color: str) -> tuple:
-        """
-        Convert hex color string to BGR tuple for OpenCV.
-        
-        Args:
-            hex_color: Hex color string (e.g., '#FFFFFF' or 'FFFFFF')
-            
-        Returns:
-            BGR tuple (e.g., (255, 255, 255))
-        """
-        try:
-            # Remove '#' if present
-            hex_color = hex_color.lstrip('#')
-            
-            # Convert hex to RGB
-            r = int(hex_color[0:2], 16)
-            g = int(hex_color[2:4], 16)
-            b = int(hex_color[4:6], 16)
-            
-            # OpenCV uses BGR format
-            return (b, g, r)
-        except Exception as e:
-            logger.warning(f"🎬 [SIMPLE_COMPOSER] Invalid hex color '{hex_color}': {e}. Using white as default.")
-            return (255, 255, 255)  # Default to white
-    
-    def _apply_circular_mask(self, 
-                           frame: np.ndarray, 
-                           border_width: int = 0,
-                           border_color: str = '#ffffff') -> np.ndarray:
-        """
-        Apply circular mask to avatar frame with transparent background.
-        
-        This method creates a perfect circle from the frame and makes everything
-        outside the circle transparent using an alpha channel.
-        
-        Args:
-            frame: Avatar frame (BGR numpy array)
-            border_width: Border thickness in pixels (optional, default: 0)
-            border_color: Border color in hex format (optional, default: '#ffffff')
-            
-        Returns:
-            Frame with circular mask and alpha channel (BGRA)
-        """
-        try:
-            height, width = frame.shape[:2]
-            
-            # Create circular mask
-            mask = np.zeros((height, width), dtype=np.uint8)
-            center = (width // 2, height // 2)
-            radius = min(width, height) // 2
-            
-            # Draw white circle (255 = visible, 0 = transparent)
-            cv2.circle(mask, center, radius, 255, -1)
-            
-            # Convert to BGRA for alpha channel
-            if frame.shape[2] == 3:  # BGR
-                frame_bgra = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
-            else:
-                frame_bgra = frame.copy()
-            
-            # Apply mask to alpha channel
-            frame_bgra[:, :, 3] = mask
-            
-            # Add border if specified
-            if border_width > 0:
-                bgr_color = self._hex_to_bgr(border_color)
-                # Draw border circle on top of the masked frame
-                cv2.circle(frame_bgra, center, radius, (*bgr_color, 255), border_width)
-                logger.debug(f"🎬 [SIMPLE_COMPOSER] Added circular border: {border_width}px, color: {border_color}")
-            
-            return frame_bgra
-            
-        except Exception as e:
-            logger.error(f"🎬 [SIMPLE_COMPOSER] Circular mask error: {str(e)}")
-            # Fallback: return frame with full opacity
-            if frame.shape[2] == 3:
-                frame_bgra = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
-                frame_bgra[:, :, 3] = 255  # Fully opaque
-                return frame_bgra
-            return frame
-    
-    def _apply_arch_mask(self, 
-                        frame: np.ndarray, 
-                        border_width: int = 0,
-                        border_color: str = '#ffffff') -> np.ndarray:
-        """
-        Apply arch mask to avatar frame with transparent background.
-        
-        This method creates an arch shape (rounded top side, sharp bottom side)
-        matching CSS border-radius: 50% 50% 0 0 (rounded top-left and top-right corners).
-        
-        Args:
-            frame: Avatar frame (BGR numpy array)
-            border_width: Border thickness in pixels (optional, default: 0)
-            border_color: Border color in hex format (optional, default: '#ffffff')
-            
-        Returns:
-            Frame with arch mask and alpha channel (BGRA)
-        """
-        try:
-            height, width = frame.shape[:2]
-            
-            # Create arch mask (rounded top side, sharp bottom side)
-            # CSS equivalent: border-radius: 50% 50% 0 0 (rounded top corners)
-            mask = np.zeros((height, width), dtype=np.uint8)
-            
-            # Calculate radius for rounded corners (50% of width for horizontal rounding)
-            radius = width // 2
-            
-            # Draw rectangle covering bottom portion (straight edges)
-            cv2.rectangle(mask, (0, radius), (width, height), 255, -1)
-            
-            # Add rounded top using two quarter-circles
-            # Top-left quarter-circle (angles: 180 to 270 degrees)
-            cv2.ellipse(mask, (radius, radius), (radius, radius), 0, 180, 270, 255, -1)
-            # Top-right quarter-circle (angles: 270 to 360 degrees)
-            cv2.ellipse(mask, (radius, radius), (radius, radius), 0, 270, 360, 255, -1)
-            
-            # Convert to BGRA for alpha channel
-            if frame.shape[2] == 3:  # BGR
-                frame_bgra = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
-            else:
-                frame_bgra = frame.copy()
-            
-            # Apply mask to alpha channel
-            frame_bgra[:, :, 3] = mask
-            
-            # Add border if specified
-            if border_width > 0:
-                bgr_color = self._hex_to_bgr(border_color)
-                # Draw border along the arch shape
-                # Top-left rounded border
-                cv2.ellipse(frame_bgra, (radius, radius), (radius, radius), 0, 180, 270, (*bgr_color, 255), border_width)
-                # Top-right rounded border
-                cv2.ellipse(frame_bgra, (radius, radius), (radius, radius), 0, 270, 360, (*bgr_color, 255), border_width)
-                # Left side straight border
-                cv2.line(frame_bgra, (0, radius), (0, height), (*bgr_color, 255), border_width)
-                # Right side straight border
-                cv2.line(frame_bgra, (width-1, radius), (width-1, height), (*bgr_color, 255), border_width)
-                # Bottom straight border
-                cv2.line(frame_bgra, (0, height-1), (width, height-1), (*bgr_color, 255), border_width)
-                logger.debug(f"🎬 [SIMPLE_COMPOSER] Added arch border: {border_width}px, color: {border_color}")
-            
-            return frame_bgra
-            
-        except Exception as e:
-            logger.error(f"🎬 [SIMPLE_COMPOSER] Arch mask error: {str(e)}")
-            # Fallback: return frame with full opacity
-            if frame.shape[2] == 3:
-                frame_bgra = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
-                frame_bgra[:, :, 3] = 255  # Fully opaque
-                return frame_bgra
-            return frame
-    
-    def _overlay_with_alpha(self, 
-                          background: np.ndarray, 
-                          overlay: np.ndarray, 
-                          x: int, 
-                          y: int) -> np.ndarray:
-        """
-        Overlay image with alpha channel (transparency) onto background.
-        
-        This method performs proper alpha compositing to blend the overlay
-        with the background, respecting transparency.
-        
-        Args:
-            background: Background frame (BGR)
-            overlay: Overlay frame with alpha channel (BGRA)
-            x: X position to place overlay
-            y: Y position to place overlay
-            
-        Returns:
-            Composite frame (BGR)
-        """
-        try:
-            h, w = overlay.shape[:2]
-            
-            # Ensure we don't go out of bounds
-            if y + h > background.shape[0] or x + w > background.shape[1]:
-                logger.warning(f"🎬 [SIMPLE_COMPOSER] Overlay position ({x}, {y}) with size ({w}, {h}) "
-                             f"exceeds background size {background.shape}")
-                return background
-            
-            # Get region of interest
-            roi = background[y:y+h, x:x+w].copy()
-            
-            # Extract alpha channel and normalize to 0-1 range
-            alpha = overlay[:, :, 3] / 255.0
-            
-            # Create 3-channel alpha for blending
-            alpha_3d = np.stack([alpha, alpha, alpha], axis=2)
-            
-            # Extract BGR channels from overlay
-            overlay_bgr = overlay[:, :, :3]
-            
-            # Alpha compositing: result = foreground * alpha + background * (1 - alpha)
-            blended = (alpha_3d * overlay_bgr + (1 - alpha_3d) * roi).astype(np.uint8)
-            
-            # Place blended region back into background
-            background[y:y+h, x:x+w] = blended
-            
-            return background
-            
-        except Exception as e:
-            logger.error(f"🎬 [SIMPLE_COMPOSER] Alpha overlay error: {str(e)}")
-            return background
-    
-    def _crop_avatar_to_template(self, avatar_frame: np.ndarray, avatar_config: dict = None) -> np.ndarray:
-        """
-        Crop avatar frame to template dimensions while maintaining aspect ratio.
-        
-        This method ensures the avatar maintains its correct height and aspect ratio
-        by cropping excess width from the sides instead of stretching the image.
-        
-        Args:
-            avatar_frame: Input avatar frame (numpy array)
-            avatar_config: Dict with 'width' and 'height' keys for target dimensions
-            
-        Returns:
-            Cropped avatar frame matching template dimensions
-        """
-        # Use provided config or fall back to default
-        if avatar_config is None:
-            avatar_config = self.avatar_template
-            
-        try:
-            # Get input frame dimensions
-            input_height, input_width = avatar_frame.shape[:2]
-            
-            # Target template dimensions from config
-            target_width = avatar_config['width']
-            target_height = avatar_config['height']
-            
-            logger.debug(f"🎬 [SIMPLE_COMPOSER] Cropping avatar frame:")
-            logger.debug(f"  - Input dimensions: {input_width}x{input_height}")
-            logger.debug(f"  - Target dimensions: {target_width}x{target_height}")
-            
-            # Step 1: Scale the frame to match the target height while maintaining aspect ratio
-            scale_factor = target_height / input_height
-            scaled_width = int(input_width * scale_factor)
-            scaled_height = target_height
-            
-            # Resize to target height
-            avatar_scaled = cv2.resize(avatar_frame, (scaled_width, scaled_height))
-            
-            logger.debug(f"  - Scaled dimensions: {scaled_width}x{scaled_height}")
-            
-            # Step 2: Crop from center if scaled width is larger than target width
-            if scaled_width > target_width:
-                # Calculate crop start position (center crop)
-                crop_start_x = (scaled_width - target_width) // 2
-                crop_end_x = crop_start_x + target_width
-                
-                # Crop the frame
-                avatar_cropped = avatar_scaled[:, crop_start_x:crop_end_x]
-                
-                logger.debug(f"  - Cropped from center: x={crop_start_x} to x={crop_end_x}")
-            else:
-                # If scaled width is smaller than target width, pad with background
-                # This should rarely happen with proper aspect ratios
-                logger.warning(f"🎬 [SIMPLE_COMPOSER] Scaled width ({scaled_width}) < target width ({target_width}), padding required")
-                
-                # Create background (dark purple to match theme)
-                background = np.full((target_height, target_width, 3), (17, 12, 53), dtype=np.uint8)
-                
-                # Calculate padding to center the scaled frame
-                pad_start_x = (target_width - scaled_width) // 2
-                pad_end_x = pad_start_x + scaled_width
-                
-                # Place scaled frame in center of background
-                background[:, pad_start_x:pad_end_x] = avatar_scaled
-                avatar_cropped = background
-            
-            # Verify final dimensions
-            final_height, final_width = avatar_cropped.shape[:2]
-            if final_width != target_width or final_height != target_height:
-                logger.error(f"🎬 [SIMPLE_COMPOSER] Cropping failed: got {final_width}x{final_height}, expected {target_width}x{target_height}")
-                # Fallback to resize if cropping fails
-                avatar_cropped = cv2.resize(avatar_frame, (target_width, target_height))
-            
-            logger.debug(f"  - Final dimensions: {final_width}x{final_height}")
-            return avatar_cropped
-            
-        except Exception as e:
-            logger.error(f"🎬 [SIMPLE_COMPOSER] Avatar cropping error: {str(e)}")
-            # Fallback to resize if cropping fails
-            if avatar_config is None:
-                avatar_config = self.avatar_template
-            return cv2.resize(avatar_frame, (avatar_config['width'], avatar_config['height']))
+        """Convert hex color string to BGR tuple for OpenCV."""
+        return _hex_to_bgr(hex_color)
     
     def cleanup(self):
         """Cleanup temporary files and resources."""
@@ -0,0 +1,511 @@
+# custom_extensions/backend/app/services/smartdrive_import.py
+import asyncio
+import hashlib
+import logging
+import os
+import secrets
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.services.nextcloud_gateway import NextcloudCredentials, NextcloudGateway, encode_dav_path
+
+logger = logging.getLogger(__name__)
+
+# Files transferred at once: per user, and across the whole process
+SMARTDRIVE_IMPORT_USER_CONCURRENCY = int(os.getenv("SMARTDRIVE_IMPORT_USER_CONCURRENCY", "3"))
+SMARTDRIVE_IMPORT_GLOBAL_CONCURRENCY = int(os.getenv("SMARTDRIVE_IMPORT_GLOBAL_CONCURRENCY", "12"))
+# A file that failed this many times is no longer resumed automatically
+SMARTDRIVE_IMPORT_MAX_ATTEMPTS = 3
+SMARTDRIVE_IMPORT_CHUNK_BYTES = 256 * 1024
+# A 'transferring' checkpoint older than this is treated as abandoned (its process died)
+SMARTDRIVE_IMPORT_TRANSFER_LEASE_SECONDS = int(os.getenv("SMARTDRIVE_IMPORT_TRANSFER_LEASE_SECONDS", "1800"))
+
+SMARTDRIVE_IMPORT_CHECKPOINTS_DDL = """
+CREATE TABLE IF NOT EXISTS smartdrive_import_checkpoints (
+    onyx_user_id VARCHAR(255) NOT NULL,
+    smartdrive_path VARCHAR(1000) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    etag VARCHAR(255),
+    onyx_file_id VARCHAR(255),
+    bytes_transferred BIGINT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    PRIMARY KEY (onyx_user_id, smartdrive_path)
+);
+CREATE INDEX IF NOT EXISTS idx_smartdrive_import_checkpoints_open
+    ON smartdrive_import_checkpoints (onyx_user_id) WHERE status IN ('pending', 'transferring', 'failed');
+"""
+
+TokenEstimator = Callable[[str, Optional[int], Optional[str]], int]
+
+
+@dataclass
+class ImportOutcome:
+    path: str
+    status: str  # imported | skipped | failed | in_progress (another process is transferring it)
+    record_id: Optional[int] = None
+    onyx_file_id: Optional[str] = None
+    name: Optional[str] = None
+    bytes_transferred: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class _Transfer:
+    onyx_file_id: str
+    etag: Optional[str]
+    content_hash: str
+    size: int
+    mime_type: Optional[str]
+    last_modified: Optional[str]
+
+
+class _Unchanged(Exception):
+    """The file's ETag on download equals the one recorded at its last import."""
+
+
+def _strip_etag(etag: Optional[str]) -> Optional[str]:
+    if not etag:
+        return None
+    etag = etag.strip()
+    if etag.startswith("W/"):
+        etag = etag[2:]
+    return etag.strip('"') or None
+
+
+def _http_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value)
+    except Exception:
+        return None
+
+
+def _onyx_file_id(response_data: Any) -> Optional[str]:
+    # Onyx answers with a list of user files (or a single one)
+    if isinstance(response_data, list) and response_data:
+        return str(response_data[0].get("id"))
+    if isinstance(response_data, dict) and response_data.get("id") is not None:
+        return str(response_data.get("id"))
+    return None
+
+
+def _form_part_header(boundary: str, name: str, filename: Optional[str] = None, content_type: Optional[str] = None) -> bytes:
+    disposition = f'form-data; name="{name}"'
+    if filename is not None:
+        disposition += '; filename="{}"'.format(filename.replace("\\", "\\\\").replace('"', "%22"))
+    header = f"--{boundary}\r\nContent-Disposition: {disposition}\r\n"
+    if content_type:
+        header += f"Content-Type: {content_type}\r\n"
+    return (header + "\r\n").encode("utf-8")
+
+
+class SmartDriveImporter:
+    """
+    Imports SmartDrive (Nextcloud) files into Onyx without buffering them:
+
+    - the WebDAV GET body is streamed chunk by chunk into a multipart upload to
+      the Onyx user-file endpoint (hashed on the way through);
+    - files run concurrently, bounded per user and process-wide;
+    - unchanged files are skipped: same ETag (from the listing, or from the GET
+      headers before any body is read) or same Nextcloud checksum as recorded
+      in smartdrive_imports;
+    - every file has a row in smartdrive_import_checkpoints (pending ->
+      transferring -> done/failed), so an interrupted import leaves the files
+      still to do behind and the next import of that user picks them up;
+    - a file is transferred once at a time: overlapping imports in this process
+      join the transfer in flight, and a row is claimed with a conditional
+      upsert so other processes leave it alone until its lease runs out.
+    """
+
+    def __init__(
+        self,
+        get_pool: Callable[[], Any],
+        gateway: NextcloudGateway,
+        onyx_upload_url: str,
+        estimate_tokens: TokenEstimator,
+    ):
+        self._get_pool = get_pool
+        self._gateway = gateway
+        self._onyx_upload_url = onyx_upload_url
+        self._estimate_tokens = estimate_tokens
+        self._global_slots = asyncio.Semaphore(SMARTDRIVE_IMPORT_GLOBAL_CONCURRENCY)
+        self._user_slots: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._schema_ready = False
+
+    def _pool(self):
+        pool = self._get_pool()
+        if pool is None:
+            raise RuntimeError("Database pool is not available")
+        return pool
+
+    async def ensure_schema(self) -> None:
+        if self._schema_ready:
+            return
+        async with self._pool().acquire() as conn:
+            await conn.execute(SMARTDRIVE_IMPORT_CHECKPOINTS_DDL)
+        self._schema_ready = True
+
+    def _user_semaphore(self, user_id: str) -> asyncio.Semaphore:
+        semaphore = self._user_slots.get(user_id)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(SMARTDRIVE_IMPORT_USER_CONCURRENCY)
+            self._user_slots[user_id] = semaphore
+        return semaphore
+
+    # --- transfer ---
+
+    async def transfer(
+        self,
+        creds: NextcloudCredentials,
+        path: str,
+        file_info: Dict[str, Any],
+        session_cookies: Dict[str, str],
+        skip_if_etag: Optional[str] = None,
+    ) -> _Transfer:
+        """
+        Stream one file from WebDAV into Onyx. Raises _Unchanged (before any body
+        is read) when the download's ETag equals `skip_if_etag`.
+        """
+        download_url = f"{creds.webdav_base}{encode_dav_path(creds.user_root_prefix + path)}"
+        name = file_info.get("name") or path.rsplit("/", 1)[-1] or "file"
+        hasher = hashlib.sha256()
+        size = 0
+
+        async with self._gateway.client(creds.base_url).stream(
+            "GET", download_url, auth=creds.auth, timeout=httpx.Timeout(None, connect=10.0)
+        ) as download:
+            if download.status_code != 200:
+                await download.aread()
+                raise RuntimeError(f"WebDAV GET failed: {download.status_code} {download.text[:200]}")
+            etag = _strip_etag(download.headers.get("etag")) or _strip_etag(file_info.get("etag"))
+            if skip_if_etag and etag and etag == _strip_etag(skip_if_etag):
+                raise _Unchanged()
+            mime_type = file_info.get("mime_type") or download.headers.get("content-type") or "application/octet-stream"
+            boundary = secrets.token_hex(16)
+
+            async def body() -> AsyncIterator[bytes]:
+                nonlocal size
+                yield _form_part_header(boundary, "folder_id")
+                yield b"-1\r\n"  # RECENT_DOCS_FOLDER_ID (default "Recent Documents" folder)
+                yield _form_part_header(boundary, "files", filename=name, content_type=mime_type)
+                async for chunk in download.aiter_bytes(SMARTDRIVE_IMPORT_CHUNK_BYTES):
+                    hasher.update(chunk)
+                    size += len(chunk)
+                    yield chunk
+                yield f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+            upload = await self._gateway.client(self._onyx_upload_url).post(
+                self._onyx_upload_url,
+                content=body(),
+                headers={
+                    "Content-Type": f"multipart/form-data; boundary={boundary}",
+                    # Per-request cookies= on the shared client is deprecated in httpx
+                    "Cookie": "; ".join(f"{name}={value}" for name, value in session_cookies.items() if value),
+                },
+                timeout=httpx.Timeout(None, connect=10.0),
+            )
+            last_modified = file_info.get("modified") or download.headers.get("last-modified")
+
+        if upload.status_code not in (200, 201):
+            raise RuntimeError(f"Onyx upload failed: {upload.status_code} {upload.text[:200]}")
+        onyx_file_id = _onyx_file_id(upload.json())
+        if onyx_file_id is None:
+            raise RuntimeError(f"Unexpected Onyx response format: {upload.text[:200]}")
+        return _Transfer(
+            onyx_file_id=onyx_file_id,
+            etag=etag,
+            content_hash=f"sha256:{hasher.hexdigest()}",
+            size=size,
+            mime_type=mime_type,
+            last_modified=last_modified,
+        )
+
+    # --- bookkeeping ---
+
+    async def _claim(self, user_id: str, path: str, etag: Optional[str]) -> bool:
+        """
+        Mark the file 'transferring' for this import. False when another import
+        holds it (transferring within the lease) or has already finished it.
+        """
+        async with self._pool().acquire() as conn:
+            claimed = await conn.fetchval(
+                """
+                INSERT INTO smartdrive_import_checkpoints (onyx_user_id, smartdrive_path, status, etag, attempts)
+                VALUES ($1, $2, 'transferring', $3, 1)
+                ON CONFLICT (onyx_user_id, smartdrive_path) DO UPDATE SET
+                    status = 'transferring',
+                    etag = COALESCE(EXCLUDED.etag, smartdrive_import_checkpoints.etag),
+                    attempts = smartdrive_import_checkpoints.attempts + 1,
+                    error = NULL,
+                    updated_at = now()
+                WHERE smartdrive_import_checkpoints.status IN ('pending', 'failed')
+                   OR (smartdrive_import_checkpoints.status = 'transferring'
+                       AND smartdrive_import_checkpoints.updated_at < now() - make_interval(secs => $4))
+                RETURNING 1
+                """,
+                user_id,
+                path,
+                etag,
+                SMARTDRIVE_IMPORT_TRANSFER_LEASE_SECONDS,
+            )
+        return claimed is not None
+
+    async def _finished_record(self, user_id: str, path: str) -> Optional[Dict[str, Any]]:
+        async with self._pool().acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                SELECT i.id, i.onyx_file_id FROM smartdrive_imports i
+                INNER JOIN smartdrive_import_checkpoints c
+                    ON c.onyx_user_id = i.onyx_user_id AND c.smartdrive_path = i.smartdrive_path
+                WHERE i.onyx_user_id = $1 AND i.smartdrive_path = $2 AND c.status = 'done'
+                """,
+                user_id,
+                path,
+            )
+        return dict(row) if row else None
+
+    async def _checkpoint(self, user_id: str, path: str, status: str, **fields: Any) -> None:
+        async with self._pool().acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO smartdrive_import_checkpoints
+                    (onyx_user_id, smartdrive_path, status, etag, onyx_file_id, bytes_transferred, attempts, error, updated_at)
+                VALUES ($1, $2, $3, $4, $5, $6, 0, $7, now())
+                ON CONFLICT (onyx_user_id, smartdrive_path) DO UPDATE SET
+                    status = EXCLUDED.status,
+                    etag = COALESCE(EXCLUDED.etag, smartdrive_import_checkpoints.etag),
+                    onyx_file_id = COALESCE(EXCLUDED.onyx_file_id, smartdrive_import_checkpoints.onyx_file_id),
+                    bytes_transferred = COALESCE(EXCLUDED.bytes_transferred, smartdrive_import_checkpoints.bytes_transferred),
+                    error = EXCLUDED.error,
+                    updated_at = now()
+                """,
+                user_id,
+                path,
+                status,
+                fields.get("etag"),
+                fields.get("onyx_file_id"),
+                fields.get("bytes_transferred"),
+                fields.get("error"),
+            )
+
+    async def _record(self, user_id: str, path: str, transfer: _Transfer, checksum: Optional[str]) -> int:
+        async with self._pool().acquire() as conn, conn.transaction():
+            record_id = await conn.fetchval(
+                """
+                INSERT INTO smartdrive_imports
+                    (onyx_user_id, smartdrive_path, onyx_file_id, etag, checksum, imported_at, last_modified, file_size, mime_type, estimated_tokens)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+                ON CONFLICT (onyx_user_id, smartdrive_path) DO UPDATE SET
+                    onyx_file_id = EXCLUDED.onyx_file_id,
+                    etag = EXCLUDED.etag,
+                    checksum = EXCLUDED.checksum,
+                    imported_at = EXCLUDED.imported_at,
+                    last_modified = EXCLUDED.last_modified,
+                    file_size = EXCLUDED.file_size,
+                    mime_type = EXCLUDED.mime_type,
+                    estimated_tokens = EXCLUDED.estimated_tokens
+                RETURNING id
+                """,
+                user_id,
+                path,
+                transfer.onyx_file_id,
+                transfer.etag,
+                checksum or transfer.content_hash,
+                datetime.now(timezone.utc),
+                _http_date(transfer.last_modified),
+                transfer.size,
+                transfer.mime_type,
+                self._estimate_tokens(path, transfer.size, transfer.mime_type),
+            )
+            await conn.execute(
+                """
+                UPDATE smartdrive_import_checkpoints
+                SET status = 'done', etag = $3, onyx_file_id = $4, bytes_transferred = $5, error = NULL, updated_at = now()
+                WHERE onyx_user_id = $1 AND smartdrive_path = $2
+                """,
+                user_id, path, transfer.etag, transfer.onyx_file_id, transfer.size,
+            )
+        return record_id
+
+    async def _open_checkpoints(self, user_id: str) -> List[str]:
+        """Paths of an earlier import of the user that never finished (transfers past their lease only)."""
+        async with self._pool().acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT smartdrive_path FROM smartdrive_import_checkpoints
+                WHERE onyx_user_id = $1
+                  AND (
+                      status = 'pending'
+                      OR (status = 'transferring' AND updated_at < now() - make_interval(secs => $3))
+                      OR (status = 'failed' AND attempts < $2)
+                  )
+                """,
+                user_id,
+                SMARTDRIVE_IMPORT_MAX_ATTEMPTS,
+                SMARTDRIVE_IMPORT_TRANSFER_LEASE_SECONDS,
+            )
+        return [row["smartdrive_path"] for row in rows]
+
+    # --- import ---
+
+    async def _import_one(
+        self,
+        creds: NextcloudCredentials,
+        user_id: str,
+        file_info: Dict[str, Any],
+        existing: Optional[Dict[str, Any]],
+        session_cookies: Dict[str, str],
+    ) -> ImportOutcome:
+        path = file_info["path"]
+        outcome = ImportOutcome(path=path, status="failed", name=file_info.get("name"))
+        async with self._user_semaphore(user_id), self._global_slots:
+            if not await self._claim(user_id, path, _strip_etag(file_info.get("etag"))):
+                finished = await self._finished_record(user_id, path)
+                if finished is None:
+                    logger.info(f"[SmartDrive] {path} is being imported by another process, leaving it to that import")
+                    outcome.status = "in_progress"
+                else:
+                    outcome.status = "skipped"
+                    outcome.record_id = finished["id"]
+                    outcome.onyx_file_id = finished["onyx_file_id"]
+                return outcome
+            try:
+                transfer = await self.transfer(
+                    creds, path, file_info, session_cookies,
+                    skip_if_etag=(existing or {}).get("etag"),
+                )
+            except _Unchanged:
+                await self._checkpoint(user_id, path, "done")
+                outcome.status = "skipped"
+                outcome.record_id = existing["id"]
+                outcome.onyx_file_id = existing["onyx_file_id"]
+                return outcome
+            except asyncio.CancelledError:
+                # Left as 'transferring'; an import of this user resumes it once the lease runs out
+                raise
+            except Exception as e:
+                logger.error(f"[SmartDrive] Import of {path} failed: {e}")
+                await self._checkpoint(user_id, path, "failed", error=str(e)[:1000])
+                outcome.error = str(e)
+                return outcome
+            outcome.record_id = await self._record(user_id, path, transfer, file_info.get("checksum"))
+        outcome.status = "imported"
+        outcome.onyx_file_id = transfer.onyx_file_id
+        outcome.bytes_transferred = transfer.size
+        logger.info(f"[SmartDrive] Imported {path} ({transfer.size} bytes) -> Onyx file {transfer.onyx_file_id}")
+        return outcome
+
+    async def _import_shared(
+        self,
+        creds: NextcloudCredentials,
+        user_id: str,
+        file_info: Dict[str, Any],
+        existing: Optional[Dict[str, Any]],
+        session_cookies: Dict[str, str],
+    ) -> ImportOutcome:
+        """_import_one, joining the transfer of the same file when another import of the user has it in flight."""
+        key = (user_id, file_info["path"])
+        pending = self._in_flight.get(key)
+        if pending is None:
+            # A task of its own, so one caller going away does not cancel it for the others
+            pending = asyncio.ensure_future(self._import_one(creds, user_id, file_info, existing, session_cookies))
+            self._in_flight[key] = pending
+            pending.add_done_callback(lambda task: self._import_done(key, task))
+        else:
+            logger.info(f"[SmartDrive] Joining in-flight import of {file_info['path']} for {user_id}")
+        return await asyncio.shield(pending)
+
+    def _import_done(self, key: Tuple[str, str], task: asyncio.Future) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Every caller may have gone away; mark the exception as retrieved
+            task.exception()
+
+    async def import_files(
+        self,
+        creds: NextcloudCredentials,
+        user_id: str,
+        files: List[Dict[str, Any]],
+        session_cookies: Dict[str, str],
+        resume: bool = True,
+    ) -> List[ImportOutcome]:
+        """
+        Import `files` (listing entries, or at least {"path": ...}) for a user,
+        plus, with `resume`, whatever an interrupted earlier import left open.
+        """
+        user_id = str(user_id)
+        await self.ensure_schema()
+        by_path: Dict[str, Dict[str, Any]] = {}
+        for info in files:
+            if info.get("type") != "directory" and info.get("path"):
+                by_path.setdefault(info["path"], info)
+        if resume:
+            for path in await self._open_checkpoints(user_id):
+                by_path.setdefault(path, {"path": path, "name": path.rsplit("/", 1)[-1], "type": "file"})
+        if not by_path:
+            return []
+
+        async with self._pool().acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT id, smartdrive_path, onyx_file_id, etag, checksum FROM smartdrive_imports
+                WHERE onyx_user_id = $1 AND smartdrive_path = ANY($2::text[])
+                """,
+                user_id,
+                list(by_path),
+            )
+        existing = {row["smartdrive_path"]: dict(row) for row in rows}
+
+        outcomes: List[ImportOutcome] = []
+        to_import: List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]] = []
+        unchanged: List[Tuple[str, str]] = []
+        for path, info in by_path.items():
+            record = existing.get(path)
+            if record is not None and (
+                (info.get("etag") and _strip_etag(info["etag"]) == _strip_etag(record["etag"]))
+                or (info.get("checksum") and info["checksum"] == record["checksum"])
+            ):
+                outcomes.append(ImportOutcome(path=path, status="skipped", record_id=record["id"], onyx_file_id=record["onyx_file_id"], name=info.get("name")))
+                unchanged.append((user_id, path))
+            else:
+                to_import.append((info, record))
+
+        async with self._pool().acquire() as conn:
+            if unchanged:
+                await conn.executemany(
+                    """
+                    UPDATE smartdrive_import_checkpoints SET status = 'done', error = NULL, updated_at = now()
+                    WHERE onyx_user_id = $1 AND smartdrive_path = $2 AND status <> 'done'
+                    """,
+                    unchanged,
+                )
+            if to_import:
+                # Recorded up front: if the process dies mid-import, these are what is left to do
+                await conn.executemany(
+                    """
+                    INSERT INTO smartdrive_import_checkpoints (onyx_user_id, smartdrive_path, status, etag)
+                    VALUES ($1, $2, 'pending', $3)
+                    ON CONFLICT (onyx_user_id, smartdrive_path) DO UPDATE
+                    SET status = 'pending', etag = EXCLUDED.etag, updated_at = now()
+                    WHERE smartdrive_import_checkpoints.status <> 'transferring'
+                    """,
+                    [(user_id, info["path"], _strip_etag(info.get("etag"))) for info, _ in to_import],
+                )
+
+        logger.info(
+            f"[SmartDrive] Import for {user_id}: {len(to_import)} to transfer, {len(unchanged)} unchanged "
+            f"(concurrency user={SMARTDRIVE_IMPORT_USER_CONCURRENCY} global={SMARTDRIVE_IMPORT_GLOBAL_CONCURRENCY})"
+        )
+        outcomes.extend(await asyncio.gather(*(
+            self._import_shared(creds, user_id, info, record, session_cookies) for info, record in to_import
+        )))
+        return outcomes
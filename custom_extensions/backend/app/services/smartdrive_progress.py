@@ -0,0 +1,233 @@
+# custom_extensions/backend/app/services/smartdrive_progress.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# A poll within this window reuses the previous snapshot for the same user and paths
+SMARTDRIVE_PROGRESS_SNAPSHOT_TTL_SECONDS = float(os.getenv("SMARTDRIVE_PROGRESS_SNAPSHOT_TTL_SECONDS", "3"))
+SMARTDRIVE_PROGRESS_MAX_WAIT_SECONDS = 25
+SMARTDRIVE_PROGRESS_ONYX_RETRY_SECONDS = 60
+SMARTDRIVE_PROGRESS_CACHE_MAX_ENTRIES = 2000
+
+# User file -> connector pair -> latest index attempt, for every requested file in one query
+ONYX_FILE_INDEX_STATE_QUERY = """
+    SELECT uf.id, uf.token_count, cc.last_successful_index_time,
+           ia.status, ia.time_started, ia.time_updated, ia.total_docs_indexed
+    FROM user_file uf
+    LEFT JOIN connector_credential_pair cc ON cc.id = uf.cc_pair_id
+    LEFT JOIN LATERAL (
+        SELECT status, time_started, time_updated, total_docs_indexed
+        FROM index_attempt
+        WHERE connector_credential_pair_id = uf.cc_pair_id
+        ORDER BY time_created DESC
+        LIMIT 1
+    ) ia ON TRUE
+    WHERE uf.id = ANY($1::int[])
+"""
+
+# file_id -> is indexed; used when the Onyx database cannot be queried directly
+StatusFallback = Callable[[List[str]], Awaitable[Optional[Dict[str, bool]]]]
+TokenEstimator = Callable[[str, Optional[int], Optional[str]], int]
+Snapshot = Tuple[Dict[str, Any], str]
+
+
+def progress_etag(progress: Dict[str, Any]) -> str:
+    digest = hashlib.sha1(json.dumps(progress, sort_keys=True, default=str).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+class SmartDriveIndexingProgress:
+    """
+    Indexing progress for SmartDrive files, one snapshot per poll:
+
+    - one query on smartdrive_imports for every requested path (with the token
+      estimate stored at import time and whether the file was already seen indexed);
+    - one query on the Onyx database for the files still pending (index state,
+      latest attempt and real token count), or a single batched indexing-status
+      call when that database is not reachable;
+    - files seen indexed are marked (indexed_at), so later polls skip Onyx for them.
+
+    Snapshots are cached per (user, paths) for SMARTDRIVE_PROGRESS_SNAPSHOT_TTL_SECONDS
+    and carry an ETag, so repeated polls and long-polls are cheap.
+    """
+
+    def __init__(self, get_pool: Callable[[], Any], onyx_database_url: Optional[str], estimate_tokens: TokenEstimator):
+        self._get_pool = get_pool
+        self._onyx_database_url = onyx_database_url
+        self._estimate_tokens = estimate_tokens
+        self._onyx_pool: Optional[asyncpg.Pool] = None
+        self._onyx_pool_lock = asyncio.Lock()
+        self._onyx_unavailable_until = 0.0
+        self._snapshots: Dict[Tuple[str, Tuple[str, ...]], Tuple[float, Snapshot]] = {}
+
+    def _pool(self):
+        pool = self._get_pool()
+        if pool is None:
+            raise RuntimeError("Database pool is not available")
+        return pool
+
+    async def _onyx(self) -> Optional[asyncpg.Pool]:
+        if self._onyx_pool is not None or not self._onyx_database_url:
+            return self._onyx_pool
+        if time.monotonic() < self._onyx_unavailable_until:
+            return None
+        async with self._onyx_pool_lock:
+            if self._onyx_pool is None and time.monotonic() >= self._onyx_unavailable_until:
+                try:
+                    self._onyx_pool = await asyncpg.create_pool(
+                        dsn=self._onyx_database_url, min_size=1, max_size=4, command_timeout=10
+                    )
+                    logger.info("[SmartDrive] IndexingProgress: connected to the Onyx database")
+                except Exception as e:
+                    self._onyx_unavailable_until = time.monotonic() + SMARTDRIVE_PROGRESS_ONYX_RETRY_SECONDS
+                    logger.warning(f"[SmartDrive] IndexingProgress: Onyx database unavailable, using the API: {e}")
+        return self._onyx_pool
+
+    async def close(self) -> None:
+        if self._onyx_pool is not None:
+            await self._onyx_pool.close()
+            self._onyx_pool = None
+
+    async def _onyx_file_states(self, file_ids: Sequence[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+        numeric_ids = [int(fid) for fid in file_ids if str(fid).isdigit()]
+        pool = await self._onyx()
+        if pool is None:
+            return None
+        if not numeric_ids:
+            return {}
+        try:
+            async with pool.acquire() as conn:
+                rows = await conn.fetch(ONYX_FILE_INDEX_STATE_QUERY, numeric_ids)
+        except Exception as e:
+            logger.warning(f"[SmartDrive] IndexingProgress: Onyx index state query failed, using the API: {e}")
+            return None
+        return {str(row["id"]): dict(row) for row in rows}
+
+    async def _compute(self, user_id: str, paths: List[str], status_fallback: StatusFallback) -> Dict[str, Any]:
+        async with self._pool().acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT id, smartdrive_path, onyx_file_id, estimated_tokens, file_size, mime_type, indexed_at
+                FROM smartdrive_imports
+                WHERE onyx_user_id = $1 AND smartdrive_path = ANY($2::text[])
+                """,
+                user_id,
+                paths,
+            )
+
+        progress: Dict[str, Any] = {p: None for p in paths}
+        if not rows:
+            return progress
+
+        pending = [row for row in rows if row["indexed_at"] is None]
+        states: Dict[str, Dict[str, Any]] = {}
+        indexed_flags: Optional[Dict[str, bool]] = None
+        if pending:
+            pending_ids = [str(row["onyx_file_id"]) for row in pending]
+            onyx_states = await self._onyx_file_states(pending_ids)
+            if onyx_states is not None:
+                states = onyx_states
+                indexed_flags = {fid: state["last_successful_index_time"] is not None for fid, state in states.items()}
+            else:
+                indexed_flags = await status_fallback(pending_ids)
+                if indexed_flags is None:
+                    # Same as before: without any index state the paths report no data
+                    return progress
+
+        newly_indexed: List[Tuple[int, Optional[int]]] = []
+        for row in rows:
+            path = row["smartdrive_path"]
+            file_id = str(row["onyx_file_id"])
+            state = states.get(file_id, {})
+            tokens = state.get("token_count") or row["estimated_tokens"]
+            if not tokens:
+                tokens = self._estimate_tokens(path, row["file_size"], row["mime_type"])
+
+            if row["indexed_at"] is not None or (indexed_flags or {}).get(file_id):
+                if row["indexed_at"] is None:
+                    newly_indexed.append((row["id"], state.get("token_count")))
+                progress[path] = {
+                    "status": "success",
+                    "time_started": _iso(state.get("time_started")),
+                    "time_updated": _iso(state.get("time_updated")),
+                    "total_docs_indexed": 1,  # Single file = 1 document
+                    "estimated_tokens": tokens,
+                    "is_complete": True,
+                }
+            else:
+                progress[path] = {
+                    "status": "in_progress",
+                    "time_started": _iso(state.get("time_started")),
+                    "time_updated": _iso(state.get("time_updated")),
+                    "total_docs_indexed": state.get("total_docs_indexed") or 0,
+                    "estimated_tokens": tokens,
+                    "is_complete": False,
+                }
+
+        if newly_indexed:
+            async with self._pool().acquire() as conn:
+                await conn.executemany(
+                    """
+                    UPDATE smartdrive_imports
+                    SET indexed_at = now(), estimated_tokens = COALESCE($2, estimated_tokens)
+                    WHERE id = $1
+                    """,
+                    newly_indexed,
+                )
+        return progress
+
+    async def snapshot(self, user_id: str, paths: List[str], status_fallback: StatusFallback) -> Snapshot:
+        """(progress by path, etag); reused for SMARTDRIVE_PROGRESS_SNAPSHOT_TTL_SECONDS."""
+        key = (user_id, tuple(sorted(set(paths))))
+        now = time.monotonic()
+        cached = self._snapshots.get(key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        progress = await self._compute(user_id, list(key[1]), status_fallback)
+        result = (progress, progress_etag(progress))
+        if len(self._snapshots) >= SMARTDRIVE_PROGRESS_CACHE_MAX_ENTRIES:
+            self._snapshots = {k: v for k, v in self._snapshots.items() if v[0] > now}
+        self._snapshots[key] = (time.monotonic() + SMARTDRIVE_PROGRESS_SNAPSHOT_TTL_SECONDS, result)
+        return result
+
+    async def wait_for_change(
+        self,
+        user_id: str,
+        paths: List[str],
+        etag: Optional[str],
+        wait_seconds: float,
+        status_fallback: StatusFallback,
+    ) -> Snapshot:
+        """
+        Long-poll: return as soon as the snapshot's ETag differs from `etag`,
+        every file is complete, or `wait_seconds` have passed.
+        """
+        deadline = time.monotonic() + min(wait_seconds, SMARTDRIVE_PROGRESS_MAX_WAIT_SECONDS)
+        while True:
+            progress, current = await self.snapshot(user_id, paths, status_fallback)
+            if etag is None or current != etag:
+                return progress, current
+            if progress and all(entry is not None and entry.get("is_complete") for entry in progress.values()):
+                return progress, current
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return progress, current
+            await asyncio.sleep(min(SMARTDRIVE_PROGRESS_SNAPSHOT_TTL_SECONDS, remaining))
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop cached snapshots of a user, e.g. after new files were imported."""
+        for key in [k for k in self._snapshots if k[0] == user_id]:
+            del self._snapshots[key]
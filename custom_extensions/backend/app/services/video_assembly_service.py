@@ -7,6 +7,8 @@ import logging
 from typing import List, Optional, Dict, Any
 from pathlib import Path
 
+from app.services.video_encoding import get_x264_crf, get_x264_preset
+
 logger = logging.getLogger(__name__)
 
 class VideoAssemblyService:
@@ -148,21 +150,11 @@ class VideoAssemblyService:
     
     def _get_preset(self, quality: str) -> str:
         """Get FFmpeg preset based on quality."""
-        presets = {
-            "high": "slow",
-            "medium": "medium", 
-            "low": "fast"
-        }
-        return presets.get(quality, "medium")
+        return get_x264_preset(quality)
     
     def _get_crf(self, quality: str) -> int:
         """Get FFmpeg CRF value based on quality."""
-        crf_values = {
-            "high": 18,    # High quality
-            "medium": 23,  # Medium quality
-            "low": 28      # Lower quality
-        }
-        return crf_values.get(quality, 23)
+        return get_x264_crf(quality)
     
     async def create_slide_video_from_props(self,
                                           slides_props: List[Dict[str, Any]],
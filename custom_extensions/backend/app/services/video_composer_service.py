@@ -17,6 +17,8 @@ from dataclasses import dataclass
 import json
 from datetime import datetime
 
+from app.services.video_encoding import X264_PRESETS, get_x264_crf, get_x264_preset
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -50,9 +52,8 @@ class ProfessionalVideoComposer:
         
         # Quality presets for FFmpeg
         self.quality_presets = {
-            'high': {'crf': 18, 'preset': 'slow'},
-            'medium': {'crf': 23, 'preset': 'medium'},
-            'low': {'crf': 28, 'preset': 'fast'}
+            quality: {'crf': get_x264_crf(quality), 'preset': get_x264_preset(quality)}
+            for quality in X264_PRESETS
         }
         
         logger.info("Professional Video Composer initialized")
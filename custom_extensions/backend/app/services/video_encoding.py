@@ -0,0 +1,157 @@
+# custom_extensions/backend/app/services/video_encoding.py
+import logging
+import os
+import subprocess
+import tempfile
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# x264 settings per quality level, shared by every encoder in the video pipeline
+X264_PRESETS = {
+    "high": "slow",
+    "medium": "medium",
+    "low": "fast",
+}
+X264_CRF = {
+    "high": 18,    # High quality
+    "medium": 23,  # Medium quality
+    "low": 28,     # Lower quality
+}
+
+# Browser-compatible H.264 output (see SimpleVideoComposer history: stream copy of mp4v broke playback)
+BROWSER_H264_ARGS = ['-profile:v', 'baseline', '-level', '3.0', '-pix_fmt', 'yuv420p']
+
+
+def get_x264_preset(quality: str) -> str:
+    return X264_PRESETS.get(quality, "medium")
+
+
+def get_x264_crf(quality: str) -> int:
+    return X264_CRF.get(quality, 23)
+
+
+def h264_output_args(quality: str) -> List[str]:
+    return ['-c:v', 'libx264', '-preset', get_x264_preset(quality), '-crf', str(get_x264_crf(quality)), *BROWSER_H264_ARGS]
+
+
+class FfmpegFrameSink:
+    """
+    Encodes raw BGR frames with one ffmpeg process fed over a pipe.
+
+    The H.264 encode, the optional audio mux (AAC from `audio_source_path`) and
+    the faststart relocation all happen in that single pass, so composed
+    frames are never written to an intermediate file. Use as a context
+    manager, or call `open()`, `write()` per frame and `close()`.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        width: int,
+        height: int,
+        fps: float,
+        quality: str = "medium",
+        audio_source_path: Optional[str] = None,
+        faststart: bool = True,
+        threads: Optional[int] = None,
+        ffmpeg_path: str = "ffmpeg",
+    ):
+        self.output_path = output_path
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.quality = quality
+        self.audio_source_path = audio_source_path
+        self.faststart = faststart
+        self.threads = threads
+        self.ffmpeg_path = ffmpeg_path
+        self.frames_written = 0
+
+        self._process: Optional[subprocess.Popen] = None
+        self._stderr = None
+
+    def command(self) -> List[str]:
+        cmd = [
+            self.ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-y',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{self.width}x{self.height}', '-r', str(self.fps),
+            '-i', 'pipe:0',
+        ]
+        if self.audio_source_path:
+            cmd += ['-i', self.audio_source_path]
+        cmd += ['-map', '0:v:0']
+        if self.audio_source_path:
+            cmd += ['-map', '1:a:0?']
+        cmd += h264_output_args(self.quality)
+        if self.threads:
+            cmd += ['-threads', str(self.threads)]
+        if self.audio_source_path:
+            cmd += ['-c:a', 'aac', '-shortest']
+        if self.faststart:
+            cmd += ['-movflags', '+faststart']
+        cmd.append(self.output_path)
+        return cmd
+
+    def open(self) -> "FfmpegFrameSink":
+        # stderr goes to a file so a chatty ffmpeg can never block on a full pipe
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(
+            self.command(), stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._stderr
+        )
+        return self
+
+    def write(self, frame) -> None:
+        """Write one BGR frame (height x width x 3, uint8)."""
+        try:
+            self._process.stdin.write(frame.data if frame.flags.c_contiguous else frame.tobytes())
+        except BrokenPipeError:
+            raise RuntimeError(f"ffmpeg exited while encoding {self.output_path}: {self._error_output()}")
+        self.frames_written += 1
+
+    def close(self) -> None:
+        """Finish the encode; raises RuntimeError if ffmpeg failed."""
+        if self._process is None:
+            return
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = self._process.wait()
+        error_output = self._error_output()
+        self._cleanup()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg failed ({returncode}) encoding {self.output_path}: {error_output}")
+
+    def abort(self) -> None:
+        """Stop the encoder and drop the partial output."""
+        if self._process is None:
+            return
+        self._process.kill()
+        self._process.wait()
+        self._cleanup()
+        try:
+            os.remove(self.output_path)
+        except OSError:
+            pass
+
+    def _error_output(self) -> str:
+        if self._stderr is None:
+            return ""
+        self._stderr.seek(0)
+        return self._stderr.read().decode(errors='replace')[-2000:]
+
+    def _cleanup(self) -> None:
+        self._process = None
+        if self._stderr is not None:
+            self._stderr.close()
+            self._stderr = None
+
+    def __enter__(self) -> "FfmpegFrameSink":
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
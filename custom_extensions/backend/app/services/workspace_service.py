@@ -11,6 +11,7 @@ from app.models.workspace_models import (
     WorkspaceMember, WorkspaceMemberCreate, WorkspaceMemberUpdate,
     WorkspaceWithMembers, MemberStatus
 )
+from app.services.access_index import UserProductAccessIndex
 
 logger = logging.getLogger(__name__)
 
@@ -226,6 +227,7 @@ class WorkspaceService:
                 VALUES ($1, $2, $3, $4)
                 RETURNING id
             """, workspace_id, member_data.user_id, member_data.role_id, member_data.status)
+            await UserProductAccessIndex.refresh_member(workspace_id, member_data.user_id)
             
             return await WorkspaceService.get_workspace_member(workspace_id, member_data.user_id)
             
@@ -360,6 +362,8 @@ class WorkspaceService:
                         SET joined_at = $1
                         WHERE workspace_id = $2 AND user_id = $3 AND joined_at IS NULL
                     """, datetime.now(timezone.utc), workspace_id, user_id)
+                
+                await UserProductAccessIndex.refresh_member(workspace_id, user_id)
             
             return await WorkspaceService.get_workspace_member(workspace_id, user_id)
             
@@ -390,6 +394,7 @@ class WorkspaceService:
                 DELETE FROM workspace_members 
                 WHERE workspace_id = $1 AND user_id = $2
             """, workspace_id, user_id)
+            await UserProductAccessIndex.refresh_member(workspace_id, user_id)
             
             logger.info(f"Member {user_id} removed from workspace {workspace_id} by {removed_by}")
             return True
@@ -417,6 +422,7 @@ class WorkspaceService:
                 DELETE FROM workspace_members 
                 WHERE workspace_id = $1 AND user_id = $2
             """, workspace_id, user_id)
+            await UserProductAccessIndex.refresh_member(workspace_id, user_id)
             
             logger.info(f"User {user_id} left workspace {workspace_id}")
             return True
@@ -8,11 +8,13 @@ from typing import List, Optional, Dict, Any, Union, Type, ForwardRef, Set, Lite
 from pydantic import BaseModel, Field, RootModel
 import re
 import os
+import sys
 import asyncpg
 from datetime import datetime, timezone, date
 import httpx
 from httpx import HTTPStatusError
 import json
+import hashlib
 import uuid
 import shutil
 import logging
@@ -69,6 +71,21 @@ from app.models.workspace_models import (
 from app.services.workspace_service import WorkspaceService
 from app.services.role_service import RoleService
 from app.services.product_access_service import ProductAccessService
+from app.core.session_identity import SessionIdentityResolver
+from app.services.request_analytics_writer import RequestAnalyticsWriter
+from app.services.request_analytics_rollups import RequestAnalyticsRollups, histogram_percentile
+from app.services.file_context_cache import FileContextCache
+from app.services.prompt_registry import PromptRegistry
+from app.services.smartdrive_progress import SmartDriveIndexingProgress
+from app.services.nextcloud_gateway import (
+    PROPFIND_LISTING_BODY,
+    MultiStatusParser,
+    NextcloudCredentials,
+    NextcloudGateway,
+    WebDAVError,
+    encode_dav_path,
+)
+from app.services.smartdrive_import import SmartDriveImporter
 import app.utils.mixpanel_helper as mixpanel_helper
 
 # Product JSON indexing service (for products-as-context feature)
@@ -211,6 +228,10 @@ def get_openai_client():
 async def fetch_current_onyx_user_id_via_me(cookies: Dict[str, str]) -> Optional[str]:
     """Fetch current Onyx user id by calling /me using provided cookies."""
     try:
+        session_cookie_value = cookies.get(ONYX_SESSION_COOKIE_NAME)
+        if session_cookie_value:
+            identity = await SESSION_IDENTITY_RESOLVER.resolve(session_cookie_value)
+            return identity.user_id or None
         async with httpx.AsyncClient(timeout=15.0) as client:
             resp = await client.get(f"{ONYX_API_SERVER_URL}/me", cookies=cookies)
             resp.raise_for_status()
@@ -6164,105 +6185,11 @@ def get_openai_client():
         OPENAI_CLIENT = AsyncOpenAI(api_key=api_key)
     return OPENAI_CLIENT
 
-def get_assistant_instructions(wizard_payload=None):
-    """
-    Load base instructions + product-specific instructions based on wizard payload.
-    
-    Args:
-        wizard_payload: Optional dict with 'product' key to determine which product file to load
-        
-    Returns:
-        Combined system instructions as a string
-    """
-    base_path = "custom_assistants/content_builder_base.txt"
-    
-    # Read base instructions
-    try:
-        with open(base_path, 'r', encoding='utf-8') as f:
-            instructions = f.read()
-    except FileNotFoundError:
-        logger.warning(f"[GET_INSTRUCTIONS] Base file not found: {base_path}")
-        return "You are ContentBuilder.ai assistant. Follow the instructions in the user message exactly."
-    
-    # Detect product type from wizard payload
-    if wizard_payload:
-        product = wizard_payload.get('product', '').lower()
-        try:
-            logger.info(f"[GET_INSTRUCTIONS] wizard_payload.product='{product}' | base_len={len(instructions)}")
-        except Exception:
-            pass
-        
-        # Map product names to file names
-        product_file_map = {
-            'slides deck': 'content_builder_presentation.txt',
-            'lesson presentation': 'content_builder_presentation.txt',
-            'video lesson presentation': 'content_builder_presentation.txt',
-            'video lesson slides deck': 'content_builder_presentation.txt',
-            'text presentation': 'content_builder_onepager.txt',
-            'quiz': 'content_builder_quiz.txt',
-            'course outline': 'content_builder_outline.txt',
-            'video lesson script': 'content_builder_video.txt',
-        }
-        
-        product_file = product_file_map.get(product)
-        if product_file:
-            product_path = f"custom_assistants/{product_file}"
-            try:
-                with open(product_path, 'r', encoding='utf-8') as f:
-                    product_instructions = f.read()
-                    instructions += "\n\n" + product_instructions
-                    try:
-                        logger.info(f"[GET_INSTRUCTIONS] Loaded product file: {product_file} | product_len={len(product_instructions)} | combined_len={len(instructions)}")
-                    except Exception:
-                        pass
-            except FileNotFoundError:
-                logger.warning(f"[GET_INSTRUCTIONS] Product file not found: {product_path}")
-    
-    return instructions
+# Assistant instruction files, preloaded at startup and hot-reloaded on change
+PROMPT_REGISTRY = PromptRegistry("custom_assistants")
 
-async def stream_openai_response(prompt: str, model: str = None, wizard_payload: dict = None, temperature: float = 0.2, max_tokens: int = None):
-    """
-    Stream response directly from OpenAI API.
-    Yields dictionaries with 'type' and 'text' fields compatible with existing frontend.
-    
-    Args:
-        prompt: User/wizard message to send
-        model: OpenAI model to use
-        wizard_payload: Optional wizard payload dict for loading product-specific instructions
-        temperature: Temperature for response generation (default: 0.2)
-        max_tokens: Maximum tokens to generate (if None, uses model default or 16000)
-    """
-    try:
-        client = get_openai_client()
-        model = model or LLM_DEFAULT_MODEL
-        
-        logger.info(f"[OPENAI_STREAM] Starting direct OpenAI streaming with model {model}")
-        logger.info(f"[OPENAI_STREAM] Prompt length: {len(prompt)} chars")
-        if max_tokens:
-            logger.info(f"[OPENAI_STREAM] Using max_tokens: {max_tokens}")
-        
-        # Read assistant instructions (base + product-specific)
-        system_prompt = get_assistant_instructions(wizard_payload=wizard_payload)
-        try:
-            product_logged = (wizard_payload or {}).get('product') if wizard_payload else None
-            logger.info(f"[OPENAI_STREAM] System prompt loaded | product='{product_logged}' | sys_len={len(system_prompt)}")
-        except Exception:
-            pass
-
-        # Check for preservation mode instructions
-        enhanced_message = add_preservation_mode_if_needed(prompt, {"prompt": prompt})
-        
-        # Add educational depth requirements ONLY for non-file generation
-        # DO NOT add these for file-based generation as they could contradict source fidelity
-        educational_enhancement = ""
-        
-        # Check if this is file-based generation (check for source fidelity markers)
-        is_file_based = ("SOURCE DOCUMENTS" in prompt or 
-                        "fromFiles" in prompt or 
-                        "ABSOLUTE SOURCE FIDELITY" in prompt)
-        
-        if not is_file_based:
-            educational_enhancement = """
+# Appended to the system prompt for generation without source files
+EDUCATIONAL_CONTENT_REQUIREMENTS = """
 
 **EDUCATIONAL CONTENT REQUIREMENTS (FOR NON-FILE GENERATION ONLY):**
 
@@ -6302,15 +6229,73 @@ Each bullet point MUST contain 60-100 words structured as:
 5. SKILL PRACTICE: Include 3-5 scenario-based practice items
 
         """
+
+def get_assistant_instructions(wizard_payload=None):
+    """
+    Base instructions + product-specific instructions based on wizard payload.
+    
+    Args:
+        wizard_payload: Optional dict with 'product' key to determine which product file to load
+        
+    Returns:
+        Combined system instructions as a string
+    """
+    product = (wizard_payload or {}).get('product', '') if wizard_payload else None
+    return PROMPT_REGISTRY.system_prompt(product).text
+
+async def stream_openai_response(prompt: str, model: str = None, wizard_payload: dict = None, temperature: float = 0.2, max_tokens: int = None):
+    """
+    Stream response directly from OpenAI API.
+    Yields dictionaries with 'type' and 'text' fields compatible with existing frontend.
+    
+    Args:
+        prompt: User/wizard message to send
+        model: OpenAI model to use
+        wizard_payload: Optional wizard payload dict for loading product-specific instructions
+        temperature: Temperature for response generation (default: 0.2)
+        max_tokens: Maximum tokens to generate (if None, uses model default or 16000)
+    """
+    try:
+        client = get_openai_client()
+        model = model or LLM_DEFAULT_MODEL
+        
+        logger.info(f"[OPENAI_STREAM] Starting direct OpenAI streaming with model {model}")
+        logger.info(f"[OPENAI_STREAM] Prompt length: {len(prompt)} chars")
+        if max_tokens:
+            logger.info(f"[OPENAI_STREAM] Using max_tokens: {max_tokens}")
+        
+        # Check if this is file-based generation (check for source fidelity markers)
+        is_file_based = ("SOURCE DOCUMENTS" in prompt or 
+                        "fromFiles" in prompt or 
+                        "ABSOLUTE SOURCE FIDELITY" in prompt)
+        
+        # Assistant instructions (base + product-specific), plus educational depth requirements
+        # ONLY for non-file generation - they could contradict source fidelity.
+        # Everything request-specific goes in the user message, so the system message
+        # is byte-identical across requests and provider-side prompt caching applies.
+        product_logged = (wizard_payload or {}).get('product') if wizard_payload else None
+        system_prompt = PROMPT_REGISTRY.system_prompt(
+            product_logged,
+            suffix="" if is_file_based else EDUCATIONAL_CONTENT_REQUIREMENTS,
+        )
+        logger.info(
+            f"[OPENAI_STREAM] System prompt | product='{product_logged}' | file_based={is_file_based} "
+            f"| prefix_hash={system_prompt.prefix_hash[:16]} | prefix_tokens={system_prompt.tokens} | sys_len={len(system_prompt.text)}"
+        )
+
+        # Check for preservation mode instructions
+        enhanced_message = add_preservation_mode_if_needed(prompt, {"prompt": prompt})
         
         # Create the streaming chat completion
         api_params = {
             "model": model,
             "messages": [
-                {"role": "system", "content": system_prompt + educational_enhancement},
+                {"role": "system", "content": system_prompt.text},
                 {"role": "user", "content": enhanced_message}
             ],
             "stream": True,
+            # Final chunk carries prompt/cached/completion token counts
+            "stream_options": {"include_usage": True},
             "temperature": temperature
         }
         
@@ -6327,6 +6312,7 @@ Each bullet point MUST contain 60-100 words structured as:
         # DEBUG: Collect full response for logging
         full_response = ""
         chunk_count = 0
+        finish_reason = None
         
         async for chunk in stream:
             chunk_count += 1
@@ -6339,23 +6325,34 @@ Each bullet point MUST contain 60-100 words structured as:
                     full_response += content  # DEBUG: Accumulate full response
                     yield {"type": "delta", "text": content}
                     
-                # Check for finish reason
+                # Check for finish reason; the usage chunk follows it
                 if choice.finish_reason:
                     finish_reason = choice.finish_reason
-                    logger.info(f"[OPENAI_STREAM] Stream finished with reason: {finish_reason}")
-                    logger.info(f"[OPENAI_STREAM] Total chunks received: {chunk_count}")
-                    logger.info(f"[OPENAI_STREAM] Response length: {len(full_response)} chars")
-                    logger.info(f"[OPENAI_STREAM] FULL RESPONSE:\n{full_response}")
-                    
-                    # CRITICAL: Detect truncation due to token limit
-                    if finish_reason == "length":
-                        logger.error(f"⚠️ [OPENAI_STREAM] Response truncated due to max_tokens limit! Response length: {len(full_response)} chars")
-                        logger.error(f"⚠️ [OPENAI_STREAM] This indicates max_tokens ({max_tokens if max_tokens else 'default'}) was insufficient")
-                        yield {"type": "truncated", "text": "Response was truncated due to token limit. Consider increasing max_tokens.", "finish_reason": finish_reason}
-                    else:
-                        logger.info(f"[OPENAI_STREAM] Stream completed successfully with finish_reason: {finish_reason}")
-                        yield {"type": "done", "finish_reason": finish_reason}
-                    break
+            
+            usage = getattr(chunk, "usage", None)
+            if usage:
+                details = getattr(usage, "prompt_tokens_details", None)
+                cached_tokens = getattr(details, "cached_tokens", None) if details else None
+                logger.info(
+                    f"[OPENAI_STREAM] Usage | prefix_hash={system_prompt.prefix_hash[:16]} "
+                    f"| prompt_tokens={usage.prompt_tokens} | cached_tokens={cached_tokens} "
+                    f"| completion_tokens={usage.completion_tokens}"
+                )
+        
+        if finish_reason:
+            logger.info(f"[OPENAI_STREAM] Stream finished with reason: {finish_reason}")
+            logger.info(f"[OPENAI_STREAM] Total chunks received: {chunk_count}")
+            logger.info(f"[OPENAI_STREAM] Response length: {len(full_response)} chars")
+            logger.info(f"[OPENAI_STREAM] FULL RESPONSE:\n{full_response}")
+            
+            # CRITICAL: Detect truncation due to token limit
+            if finish_reason == "length":
+                logger.error(f"⚠️ [OPENAI_STREAM] Response truncated due to max_tokens limit! Response length: {len(full_response)} chars")
+                logger.error(f"⚠️ [OPENAI_STREAM] This indicates max_tokens ({max_tokens if max_tokens else 'default'}) was insufficient")
+                yield {"type": "truncated", "text": "Response was truncated due to token limit. Consider increasing max_tokens.", "finish_reason": finish_reason}
+            else:
+                logger.info(f"[OPENAI_STREAM] Stream completed successfully with finish_reason: {finish_reason}")
+                yield {"type": "done", "finish_reason": finish_reason}
                     
     except Exception as e:
         logger.error(f"[OPENAI_STREAM] Error in OpenAI streaming: {e}", exc_info=True)
@@ -6853,7 +6850,7 @@ AnyQuizQuestion = Union[
 ]
 
 # custom_extensions/backend/main.py
-from fastapi import Body, FastAPI, HTTPException, Depends, Request, status, File, UploadFile, Query
+from fastapi import Body, FastAPI, HTTPException, Depends, Request, Response, status, File, UploadFile, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
@@ -7043,6 +7040,23 @@ async def get_db_pool():
         raise HTTPException(status_code=503, detail=detail_msg)
     return DB_POOL
 
+# Analytics rows are queued here and written in batches by a background task,
+# so the middleware never takes a DB_POOL slot on the request path.
+REQUEST_ANALYTICS_WRITER = RequestAnalyticsWriter(
+    get_pool=lambda: DB_POOL,
+    max_queue_size=int(os.getenv("REQUEST_ANALYTICS_MAX_QUEUE", "10000")),
+    batch_size=int(os.getenv("REQUEST_ANALYTICS_BATCH_SIZE", "500")),
+    flush_interval_ms=int(os.getenv("REQUEST_ANALYTICS_FLUSH_INTERVAL_MS", "1000")),
+    backpressure_sample_rate=float(os.getenv("REQUEST_ANALYTICS_BACKPRESSURE_SAMPLE_RATE", "0.1")),
+)
+
+# Minute/hour rollups read by the analytics dashboard, updated with every written batch
+REQUEST_ANALYTICS_ROLLUPS = RequestAnalyticsRollups(
+    get_pool=lambda: DB_POOL,
+    backfill_settle_seconds=2 * REQUEST_ANALYTICS_WRITER.flush_interval + 5,
+)
+REQUEST_ANALYTICS_WRITER.add_flush_listener(REQUEST_ANALYTICS_ROLLUPS.on_flush)
+
 app = FastAPI(title="Custom Extension Backend")
 
 app.mount(f"/{STATIC_DESIGN_IMAGES_DIR}", StaticFiles(directory=STATIC_DESIGN_IMAGES_DIR), name="static_design_images")
@@ -7061,12 +7075,13 @@ async def track_request_analytics(request: Request, call_next):
     except:
         pass
     
-    # Get request size
+    # Get request size from the header; reading the body here would buffer every upload
     request_size = None
     try:
         if request.method in ['POST', 'PUT', 'PATCH']:
-            body = await request.body()
-            request_size = len(body)
+            content_length = request.headers.get("content-length")
+            if content_length is not None:
+                request_size = int(content_length)
     except:
         pass
     
@@ -7080,23 +7095,16 @@ async def track_request_analytics(request: Request, call_next):
         try:
             if hasattr(response, 'body'):
                 response_size = len(response.body)
+            elif response.headers.get("content-length") is not None:
+                response_size = int(response.headers["content-length"])
         except:
             pass
         
-        # Store analytics in database
-        try:
-            async with DB_POOL.acquire() as conn:
-                await conn.execute("""
-                    INSERT INTO request_analytics (
-                        id, endpoint, method, user_id, status_code, 
-                        response_time_ms, request_size_bytes, response_size_bytes,
-                        error_message, created_at
-                    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
-                """, request_id, request.url.path, request.method, user_id,
-                     response.status_code, response_time_ms, request_size,
-                     response_size, None, datetime.now(timezone.utc))
-        except Exception as e:
-            logger.error(f"Failed to store request analytics: {e}")
+        REQUEST_ANALYTICS_WRITER.record(
+            request_id, request.url.path, request.method, user_id,
+            response.status_code, response_time_ms, request_size,
+            response_size, None, datetime.now(timezone.utc)
+        )
         
         return response
         
@@ -7104,20 +7112,11 @@ async def track_request_analytics(request: Request, call_next):
         end_time = time.time()
         response_time_ms = int((end_time - start_time) * 1000)
         
-        # Store error analytics
-        try:
-            async with DB_POOL.acquire() as conn:
-                await conn.execute("""
-                    INSERT INTO request_analytics (
-                        id, endpoint, method, user_id, status_code, 
-                        response_time_ms, request_size_bytes, response_size_bytes,
-                        error_message, created_at
-                    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
-                """, request_id, request.url.path, request.method, user_id,
-                     500, response_time_ms, request_size, None,
-                     str(e), datetime.now(timezone.utc))
-        except Exception as db_error:
-            logger.error(f"Failed to store error analytics: {db_error}")
+        REQUEST_ANALYTICS_WRITER.record(
+            request_id, request.url.path, request.method, user_id,
+            500, response_time_ms, request_size, None,
+            str(e), datetime.now(timezone.utc)
+        )
         
         raise
 
@@ -7930,6 +7929,26 @@ async def startup_event():
             await connection.execute("CREATE INDEX IF NOT EXISTS idx_smartdrive_imports_onyx_user_id ON smartdrive_imports(onyx_user_id);")
             await connection.execute("CREATE INDEX IF NOT EXISTS idx_smartdrive_imports_onyx_file_id ON smartdrive_imports(onyx_file_id);")
             await connection.execute("CREATE INDEX IF NOT EXISTS idx_smartdrive_imports_imported_at ON smartdrive_imports(imported_at);")
+            # Token estimate computed at import time, and when the imported file was first seen indexed
+            await connection.execute("ALTER TABLE smartdrive_imports ADD COLUMN IF NOT EXISTS estimated_tokens INTEGER;")
+            await connection.execute("ALTER TABLE smartdrive_imports ADD COLUMN IF NOT EXISTS indexed_at TIMESTAMP WITH TIME ZONE;")
+            # A re-import points at a new Onyx file, which has to be indexed again
+            await connection.execute("""
+                CREATE OR REPLACE FUNCTION smartdrive_imports_reset_indexed() RETURNS trigger AS $$
+                BEGIN
+                    IF NEW.onyx_file_id IS DISTINCT FROM OLD.onyx_file_id THEN
+                        NEW.indexed_at := NULL;
+                    END IF;
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql;
+            """)
+            await connection.execute("DROP TRIGGER IF EXISTS trg_smartdrive_imports_reset_indexed ON smartdrive_imports;")
+            await connection.execute("""
+                CREATE TRIGGER trg_smartdrive_imports_reset_indexed
+                BEFORE UPDATE OF onyx_file_id ON smartdrive_imports
+                FOR EACH ROW EXECUTE PROCEDURE smartdrive_imports_reset_indexed();
+            """)
             logger.info("'smartdrive_imports' table ensured.")
 
             # User Connectors: Per-user connector configs and encrypted tokens
@@ -8191,13 +8210,70 @@ async def startup_event():
             except Exception as e:
                 logger.warning(f"Error migrating existing audits (may already be updated): {e}")
 
+            # Project list summary fields, kept in sync with microproduct_content by a trigger so that
+            # GET /api/custom/projects never has to read the content itself
+            try:
+                await connection.execute("ALTER TABLE projects ADD COLUMN IF NOT EXISTS lesson_count INTEGER;")
+                await connection.execute("ALTER TABLE projects ADD COLUMN IF NOT EXISTS total_completion_minutes INTEGER;")
+                await connection.execute(PROJECT_LIST_SUMMARY_TRIGGER_SQL)
+                backfilled = await connection.execute(
+                    "UPDATE projects SET microproduct_content = microproduct_content "
+                    "WHERE lesson_count IS NULL AND microproduct_content IS NOT NULL;"
+                )
+                logger.info(f"Ensured project list summary trigger (backfilled {backfilled.split()[-1]} projects)")
+                await connection.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_projects_owner_list_order "
+                    "ON projects (onyx_user_id, (COALESCE(\"order\", 0)) DESC, created_at DESC, id DESC);"
+                )
+            except Exception as e:
+                logger.warning(f"Error ensuring project list summary columns: {e}")
+
             logger.info("Database schema migration completed successfully.")
+        # Retried by the next flushes if it fails here
+        await REQUEST_ANALYTICS_ROLLUPS.start()
     except Exception as e:
         logger.critical(f"Failed to initialize custom DB pool or ensure tables: {e}", exc_info=not IS_PRODUCTION)
         DB_POOL = None
 
+    # Started even if a startup step above failed; otherwise every row would be queued and then dropped
+    try:
+        REQUEST_ANALYTICS_WRITER.start()
+    except Exception as e:
+        logger.error(f"[ANALYTICS_WRITER] Could not start: {e}")
+
+@app.on_event("startup")
+async def startup_event_pdf_browser_pool():
+    try:
+        from app.services.pdf_generator import BROWSER_POOL, PDF_ASSETS, PDF_ASSET_URL_PREFIX
+        # Load and encode the template fonts once, before the first export needs them
+        PDF_ASSETS.fonts_css()
+        PDF_ASSETS.fonts_css(PDF_ASSET_URL_PREFIX)
+        await BROWSER_POOL.start()
+    except Exception as e:
+        logger.warning(f"PDF browser pool not started (browsers will launch on demand): {e}")
+
 @app.on_event("shutdown")
 async def shutdown_event():
+    await REQUEST_ANALYTICS_WRITER.stop()
+    await SESSION_IDENTITY_RESOLVER.aclose()
+    await SMARTDRIVE_INDEXING_PROGRESS.close()
+    await NEXTCLOUD_GATEWAY.aclose()
+    try:
+        from app.services.access_index import UserProductAccessIndex
+        await UserProductAccessIndex.stop_reconciler()
+    except Exception as e:
+        logger.warning(f"Failed to stop the access index reconciler: {e}")
+    try:
+        from app.services.pdf_generator import BROWSER_POOL
+        await BROWSER_POOL.close()
+    except Exception as e:
+        logger.warning(f"Failed to close PDF browser pool: {e}")
+    # Only loaded (and its worker processes started) once a video has been composed
+    video_composer_module = sys.modules.get("app.services.simple_video_composer")
+    if video_composer_module is not None:
+        video_composer_module.shutdown_composer_pool()
+    if presentation_service:
+        await presentation_service.stop()
     if DB_POOL:
         await DB_POOL.close()
         logger.info("Custom projects DB pool closed.")
@@ -8623,8 +8699,38 @@ class ProjectApiResponse(BaseModel):
     source_chat_session_id: Optional[str] = None
     is_standalone: Optional[bool] = None  # Track whether this is standalone or part of an outline
     course_id: Optional[int] = None  # Track associated course ID for non-standalone products
+    lesson_count: Optional[int] = None  # Precomputed from microproduct_content (outline lessons)
+    total_completion_minutes: Optional[int] = None  # Precomputed sum of lesson completionTime values
+    microproduct_content: Optional[Any] = None  # Only returned when requested with fields=microproduct_content
     model_config = {"from_attributes": True}
 
+# Maintains projects.lesson_count / total_completion_minutes on every write of microproduct_content.
+# completionTime values are "<minutes>m" strings (see calculate_lesson_creation_hours).
+PROJECT_LIST_SUMMARY_TRIGGER_SQL = r"""
+CREATE OR REPLACE FUNCTION projects_list_summary() RETURNS trigger AS $$
+BEGIN
+    IF NEW.microproduct_content IS NULL OR jsonb_typeof(NEW.microproduct_content) <> 'object' THEN
+        NEW.lesson_count := 0;
+        NEW.total_completion_minutes := 0;
+        RETURN NEW;
+    END IF;
+    SELECT count(lesson.value),
+           COALESCE(sum(CASE WHEN lesson.value->>'completionTime' ~ '^\s*\d+\s*m?\s*$'
+                             THEN substring(lesson.value->>'completionTime' from '\d+')::int ELSE 0 END), 0)
+      INTO NEW.lesson_count, NEW.total_completion_minutes
+      FROM jsonb_array_elements(CASE WHEN jsonb_typeof(NEW.microproduct_content->'sections') = 'array'
+                                     THEN NEW.microproduct_content->'sections' ELSE '[]'::jsonb END) AS section(value),
+           jsonb_array_elements(CASE WHEN jsonb_typeof(section.value->'lessons') = 'array'
+                                     THEN section.value->'lessons' ELSE '[]'::jsonb END) AS lesson(value);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS projects_list_summary_trg ON projects;
+CREATE TRIGGER projects_list_summary_trg
+    BEFORE INSERT OR UPDATE OF microproduct_content ON projects
+    FOR EACH ROW EXECUTE PROCEDURE projects_list_summary();
+"""
+
 class ProjectDetailForEditResponse(BaseModel):
     id: int
     projectName: str
@@ -9055,27 +9161,20 @@ async def duckduckgo_company_research(company_name: str, company_desc: str, comp
     )
     return combined
 
-async def get_current_onyx_user_id(request: Request) -> str:
-    session_cookie_value = request.cookies.get(ONYX_SESSION_COOKIE_NAME)
-    if not session_cookie_value:
-        dev_user_id = request.headers.get("X-Dev-Onyx-User-ID")
-        if dev_user_id: return dev_user_id
-        detail_msg = "Authentication required." if IS_PRODUCTION else f"Onyx session cookie '{ONYX_SESSION_COOKIE_NAME}' missing."
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail_msg)
+# Shared /me resolver: pooled client, TTL/LRU cache keyed by a hash of the session
+# cookie, and single-flight coalescing of concurrent lookups for the same cookie.
+SESSION_IDENTITY_RESOLVER = SessionIdentityResolver(
+    base_url=ONYX_API_SERVER_URL,
+    cookie_name=ONYX_SESSION_COOKIE_NAME,
+    ttl_seconds=float(os.getenv("ONYX_IDENTITY_CACHE_TTL_SECONDS", "60")),
+    max_entries=int(os.getenv("ONYX_IDENTITY_CACHE_MAX_ENTRIES", "10000")),
+)
 
+async def _resolve_onyx_identity(session_cookie_value: str, caller: str):
+    """Resolve the session cookie through the shared resolver, mapping failures to HTTPExceptions."""
     onyx_user_info_url = f"{ONYX_API_SERVER_URL}/me"
-    cookies_to_forward = {ONYX_SESSION_COOKIE_NAME: session_cookie_value}
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(onyx_user_info_url, cookies=cookies_to_forward)
-            response.raise_for_status()
-            user_data = response.json()
-            onyx_user_id = user_data.get("userId") or user_data.get("id")
-            if not onyx_user_id:
-                logger.error("Could not extract user ID from Onyx user data.")
-                detail_msg = "User ID extraction failed." if IS_PRODUCTION else "Could not extract user ID from Onyx."
-                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=detail_msg)
-            return str(onyx_user_id)
+        identity = await SESSION_IDENTITY_RESOLVER.resolve(session_cookie_value)
     except httpx.HTTPStatusError as e:
         logger.error(f"Onyx API '{onyx_user_info_url}' call failed. Status: {e.response.status_code}, Response: {e.response.text[:500]}", exc_info=not IS_PRODUCTION)
         detail_msg = "Onyx user validation failed." if IS_PRODUCTION else f"Onyx user validation failed ({e.response.status_code})."
@@ -9085,10 +9184,27 @@ async def get_current_onyx_user_id(request: Request) -> str:
         detail_msg = "Could not connect to Onyx auth service." if IS_PRODUCTION else f"Could not connect to Onyx auth service: {str(e)[:100]}"
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=detail_msg)
     except Exception as e:
-        logger.error(f"Unexpected error in get_current_onyx_user_id: {e}", exc_info=not IS_PRODUCTION)
+        logger.error(f"Unexpected error in {caller}: {e}", exc_info=not IS_PRODUCTION)
         detail_msg = "Internal user validation error." if IS_PRODUCTION else f"Internal user validation error: {str(e)[:100]}"
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=detail_msg)
 
+    if not identity.user_id:
+        logger.error("Could not extract user ID from Onyx user data.")
+        detail_msg = "User ID extraction failed." if IS_PRODUCTION else "Could not extract user ID from Onyx."
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=detail_msg)
+    return identity
+
+async def get_current_onyx_user_id(request: Request) -> str:
+    session_cookie_value = request.cookies.get(ONYX_SESSION_COOKIE_NAME)
+    if not session_cookie_value:
+        dev_user_id = request.headers.get("X-Dev-Onyx-User-ID")
+        if dev_user_id: return dev_user_id
+        detail_msg = "Authentication required." if IS_PRODUCTION else f"Onyx session cookie '{ONYX_SESSION_COOKIE_NAME}' missing."
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail_msg)
+
+    identity = await _resolve_onyx_identity(session_cookie_value, "get_current_onyx_user_id")
+    return identity.user_id
+
 async def get_current_onyx_user_with_email(request: Request) -> tuple[str, str]:
     """Get both user ID and email from Onyx"""
     session_cookie_value = request.cookies.get(ONYX_SESSION_COOKIE_NAME)
@@ -9099,32 +9215,8 @@ async def get_current_onyx_user_with_email(request: Request) -> tuple[str, str]:
         detail_msg = "Authentication required." if IS_PRODUCTION else f"Onyx session cookie '{ONYX_SESSION_COOKIE_NAME}' missing."
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail_msg)
 
-    onyx_user_info_url = f"{ONYX_API_SERVER_URL}/me"
-    cookies_to_forward = {ONYX_SESSION_COOKIE_NAME: session_cookie_value}
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(onyx_user_info_url, cookies=cookies_to_forward)
-            response.raise_for_status()
-            user_data = response.json()
-            onyx_user_id = user_data.get("userId") or user_data.get("id")
-            user_email = user_data.get("email", "")
-            if not onyx_user_id:
-                logger.error("Could not extract user ID from Onyx user data.")
-                detail_msg = "User ID extraction failed." if IS_PRODUCTION else "Could not extract user ID from Onyx."
-                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=detail_msg)
-            return str(onyx_user_id), user_email
-    except httpx.HTTPStatusError as e:
-        logger.error(f"Onyx API '{onyx_user_info_url}' call failed. Status: {e.response.status_code}, Response: {e.response.text[:500]}", exc_info=not IS_PRODUCTION)
-        detail_msg = "Onyx user validation failed." if IS_PRODUCTION else f"Onyx user validation failed ({e.response.status_code})."
-        raise HTTPException(status_code=e.response.status_code, detail=detail_msg)
-    except httpx.RequestError as e:
-        logger.error(f"Error requesting user info from Onyx '{onyx_user_info_url}': {e}", exc_info=not IS_PRODUCTION)
-        detail_msg = "Could not connect to Onyx auth service." if IS_PRODUCTION else f"Could not connect to Onyx auth service: {str(e)[:100]}"
-        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=detail_msg)
-    except Exception as e:
-        logger.error(f"Unexpected error in get_current_onyx_user_with_email: {e}", exc_info=not IS_PRODUCTION)
-        detail_msg = "Internal user validation error." if IS_PRODUCTION else f"Internal user validation error: {str(e)[:100]}"
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=detail_msg)
+    identity = await _resolve_onyx_identity(session_cookie_value, "get_current_onyx_user_with_email")
+    return identity.user_id, identity.email
 
 async def verify_admin_user(request: Request) -> tuple[str, str]:
     """Verify that the current user is an admin using Onyx's built-in role system"""
@@ -9136,44 +9228,51 @@ async def verify_admin_user(request: Request) -> tuple[str, str]:
         detail_msg = "Authentication required." if IS_PRODUCTION else f"Onyx session cookie '{ONYX_SESSION_COOKIE_NAME}' missing."
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail_msg)
 
-    onyx_user_info_url = f"{ONYX_API_SERVER_URL}/me"
-    cookies_to_forward = {ONYX_SESSION_COOKIE_NAME: session_cookie_value}
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(onyx_user_info_url, cookies=cookies_to_forward)
-            response.raise_for_status()
-            user_data = response.json()
-            
-            onyx_user_id = user_data.get("userId") or user_data.get("id")
-            user_email = user_data.get("email", "")
-            user_role = user_data.get("role", "")
-            
-            if not onyx_user_id:
-                logger.error("Could not extract user ID from Onyx user data.")
-                detail_msg = "User ID extraction failed." if IS_PRODUCTION else "Could not extract user ID from Onyx."
-                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=detail_msg)
-            
-            # Check if user has admin role in Onyx
-            if user_role != "admin":
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN, 
-                    detail="Access denied. Admin privileges required."
-                )
-            
-            return str(onyx_user_id), user_email
-            
-    except httpx.HTTPStatusError as e:
-        logger.error(f"Onyx API '{onyx_user_info_url}' call failed. Status: {e.response.status_code}, Response: {e.response.text[:500]}", exc_info=not IS_PRODUCTION)
-        detail_msg = "Onyx user validation failed." if IS_PRODUCTION else f"Onyx user validation failed ({e.response.status_code})."
-        raise HTTPException(status_code=e.response.status_code, detail=detail_msg)
-    except httpx.RequestError as e:
-        logger.error(f"Error requesting user info from Onyx '{onyx_user_info_url}': {e}", exc_info=not IS_PRODUCTION)
-        detail_msg = "Could not connect to Onyx auth service." if IS_PRODUCTION else f"Could not connect to Onyx auth service: {str(e)[:100]}"
-        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=detail_msg)
-    except Exception as e:
-        logger.error(f"Unexpected error in verify_admin_user: {e}", exc_info=not IS_PRODUCTION)
-        detail_msg = "Internal user validation error." if IS_PRODUCTION else f"Internal user validation error: {str(e)[:100]}"
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=detail_msg)
+    identity = await _resolve_onyx_identity(session_cookie_value, "verify_admin_user")
+
+    # Check if user has admin role in Onyx
+    if identity.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, 
+            detail="Access denied. Admin privileges required."
+        )
+
+    return identity.user_id, identity.email
+
+@app.post("/api/custom/auth/logout")
+async def invalidate_current_session_identity(request: Request):
+    """Forget the cached identity of the calling session. The frontend calls this when the user logs out."""
+    session_cookie_value = request.cookies.get(ONYX_SESSION_COOKIE_NAME)
+    if session_cookie_value:
+        SESSION_IDENTITY_RESOLVER.invalidate_session(session_cookie_value)
+    return {"success": True}
+
+@app.post("/api/custom/admin/identity-cache/invalidate")
+async def invalidate_identity_cache(
+    request: Request,
+    user_id: Optional[str] = Query(None, description="Onyx user whose sessions to drop (e.g. after a role change); all entries if omitted"),
+):
+    """Drop cached identities for one user after a role change, or the whole cache."""
+    await verify_admin_user(request)
+    if user_id:
+        removed = SESSION_IDENTITY_RESOLVER.invalidate_user(user_id)
+    else:
+        removed = SESSION_IDENTITY_RESOLVER.stats()["entries"]
+        SESSION_IDENTITY_RESOLVER.clear()
+    return {"success": True, "removed": removed}
+
+@app.get("/api/custom/admin/identity-cache/stats")
+async def get_identity_cache_stats(request: Request):
+    """Hit/miss counters of the session identity cache."""
+    await verify_admin_user(request)
+    return SESSION_IDENTITY_RESOLVER.stats()
+
+@app.get("/api/custom/admin/pdf-cache/stats")
+async def get_pdf_cache_stats(request: Request):
+    """Counters of the rendered PDF caches (whole documents, per-slide fragments) and the template asset registry."""
+    await verify_admin_user(request)
+    from app.services.pdf_generator import PDF_ASSETS, PDF_CACHE, PDF_SLIDE_CACHE
+    return {"documents": PDF_CACHE.stats(), "slides": PDF_SLIDE_CACHE.stats(), "assets": PDF_ASSETS.stats()}
 
 def create_slug(text: Optional[str]) -> str:
     if not text: return "default-slug"
@@ -9706,6 +9805,7 @@ async def auto_provision_nextcloud_user(onyx_user_id: str, pool: asyncpg.Pool) -
                 """,
                 onyx_user_id, userid, encrypted, base_url, datetime.now(timezone.utc)
             )
+            NEXTCLOUD_GATEWAY.invalidate_credentials(str(onyx_user_id))
 
             # Clean default skeleton files using comprehensive cleanup function
             try:
@@ -9825,6 +9925,7 @@ async def auto_provision_nextcloud_user(onyx_user_id: str, pool: asyncpg.Pool) -
                 """,
                 onyx_user_id, userid, encrypted, base_url, datetime.now(timezone.utc)
             )
+            NEXTCLOUD_GATEWAY.invalidate_credentials(str(onyx_user_id))
 
             # Clean default skeleton files using comprehensive cleanup function
             try:
@@ -9944,6 +10045,7 @@ async def auto_provision_nextcloud_user(onyx_user_id: str, pool: asyncpg.Pool) -
                 """,
                 onyx_user_id, userid, encrypted, base_url, datetime.now(timezone.utc)
             )
+            NEXTCLOUD_GATEWAY.invalidate_credentials(str(onyx_user_id))
 
             # Clean default skeleton files using comprehensive cleanup function
             try:
@@ -10054,6 +10156,7 @@ async def provision_smartdrive_for_new_user(onyx_user_id: str, user_name: str, p
                         """,
                         onyx_user_id, userid, encrypted, base_url, datetime.now(timezone.utc)
                     )
+                    NEXTCLOUD_GATEWAY.invalidate_credentials(str(onyx_user_id))
 
                     # Clean default skeleton files using comprehensive cleanup function
                     try:
@@ -10496,6 +10599,7 @@ async def migrate_onyx_users_to_credits_table() -> int:
                                         """,
                                         user['onyx_user_id'], userid, encrypted, base_url, datetime.now(timezone.utc)
                                     )
+                                    NEXTCLOUD_GATEWAY.invalidate_credentials(str(user['onyx_user_id']))
 
                                     # Clean default skeleton files using comprehensive cleanup function
                                     try:
@@ -10908,19 +11012,13 @@ The entire output must be a single, valid JSON object and must include all relev
                     logger.info(f"Response time: {int((time.time() - start_time) * 1000)}ms")
                     logger.info(f"=== END AI PARSER LOGGING DEBUG ===")
                     
-                    async with DB_POOL.acquire() as conn:
-                        logger.info(f"About to insert AI parser record for {project_name}")
-                        try:
-                            result = await conn.execute(
-                                "INSERT INTO request_analytics (id, endpoint, method, user_id, status_code, response_time_ms, request_size_bytes, response_size_bytes, error_message, is_ai_parser_request, ai_parser_tokens, ai_parser_model, ai_parser_project_name, created_at) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14)",
-                                str(uuid.uuid4()), '/ai/parse', 'POST', None, 200, int((time.time() - start_time) * 1000), len(ai_response), len(json.dumps(parsed_json_data)), None, True, total_tokens, LLM_DEFAULT_MODEL, project_name, datetime.now(timezone.utc)
-                            )
-                            logger.info(f"Database insert result: {result}")
-                            logger.info(f"Successfully logged AI parser usage for {project_name}")
-                        except Exception as db_error:
-                            logger.error(f"Database insert failed: {db_error}")
-                            logger.error(f"Insert parameters: endpoint='/ai/parse', method='POST', status_code=200, tokens={total_tokens}, model={LLM_DEFAULT_MODEL}, project={project_name}")
-                            raise
+                    REQUEST_ANALYTICS_WRITER.record(
+                        str(uuid.uuid4()), '/ai/parse', 'POST', None, 200, int((time.time() - start_time) * 1000),
+                        len(ai_response), len(json.dumps(parsed_json_data)), None, datetime.now(timezone.utc),
+                        is_ai_parser_request=True, ai_parser_tokens=total_tokens,
+                        ai_parser_model=LLM_DEFAULT_MODEL, ai_parser_project_name=project_name
+                    )
+                    logger.info(f"Queued AI parser usage record for {project_name}")
                 except Exception as e:
                     logger.warning(f"Failed to log AI parser usage: {e}")
                     logger.error(f"AI Parser logging error details: {str(e)}")
@@ -10950,19 +11048,13 @@ The entire output must be a single, valid JSON object and must include all relev
                     logger.info(f"Error: {str(e)[:200]}")
                     logger.info(f"=== END AI PARSER FAILED LOGGING DEBUG ===")
                     
-                    async with DB_POOL.acquire() as conn:
-                        logger.info(f"About to insert failed AI parser record for {project_name}")
-                        try:
-                            result = await conn.execute(
-                                "INSERT INTO request_analytics (id, endpoint, method, user_id, status_code, response_time_ms, request_size_bytes, response_size_bytes, error_message, is_ai_parser_request, ai_parser_tokens, ai_parser_model, ai_parser_project_name, created_at) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14)",
-                                str(uuid.uuid4()), '/ai/parse', 'POST', None, 500, int((time.time() - start_time) * 1000), len(ai_response), 0, str(e)[:500], True, total_tokens, LLM_DEFAULT_MODEL, project_name, datetime.now(timezone.utc)
-                            )
-                            logger.info(f"Failed attempt database insert result: {result}")
-                            logger.info(f"Successfully logged failed AI parser attempt for {project_name}")
-                        except Exception as db_error:
-                            logger.error(f"Failed attempt database insert failed: {db_error}")
-                            logger.error(f"Failed attempt insert parameters: endpoint='/ai/parse', method='POST', status_code=500, tokens={total_tokens}, model={LLM_DEFAULT_MODEL}, project={project_name}")
-                            raise
+                    REQUEST_ANALYTICS_WRITER.record(
+                        str(uuid.uuid4()), '/ai/parse', 'POST', None, 500, int((time.time() - start_time) * 1000),
+                        len(ai_response), 0, str(e)[:500], datetime.now(timezone.utc),
+                        is_ai_parser_request=True, ai_parser_tokens=total_tokens,
+                        ai_parser_model=LLM_DEFAULT_MODEL, ai_parser_project_name=project_name
+                    )
+                    logger.info(f"Queued failed AI parser attempt record for {project_name}")
                 except Exception as log_error:
                     logger.warning(f"Failed to log AI parser error: {log_error}")
                     logger.error(f"AI Parser failed logging error details: {str(log_error)}")
@@ -11977,69 +12069,75 @@ VERIFICATION: Before finalizing your response, verify that every piece of inform
 
 # --- Enhanced Hybrid Approach Functions ---
 
-# Cache for file contexts to avoid repeated extraction
-FILE_CONTEXT_CACHE: Dict[str, Dict[str, Any]] = {}
-FILE_CONTEXT_CACHE_TTL = 3600  # 1 hour cache
+# Extracted file contexts, shared through Postgres (see app/services/file_context_cache.py)
+FILE_CONTEXT_STORE = FileContextCache(lambda: DB_POOL)
+# Concurrent LLM extractions per request for files that miss the cache
+FILE_CONTEXT_WORKERS = int(os.getenv("FILE_CONTEXT_WORKERS", "6"))
+
+@app.on_event("startup")
+async def startup_event_file_context_cache():
+    # Registered after startup_event, so DB_POOL is ready; without it the cache stays in process memory
+    try:
+        await FILE_CONTEXT_STORE.ensure_schema()
+    except Exception as e:
+        logger.warning(f"[FILE_CONTEXT_CACHE] Could not ensure cache table: {e}")
+
+@app.on_event("startup")
+async def startup_event_prompt_registry():
+    # Read and hash every assistant file once, before the first generation
+    await asyncio.to_thread(PROMPT_REGISTRY.load)
 
 async def process_file_batch_with_progress(
     file_ids: List[int],
     cookies: Dict[str, str],
-    batch_size: int = 8,
+    batch_size: int = FILE_CONTEXT_WORKERS,
     progress_callback: Optional[Callable[[str], Awaitable[None]]] = None
 ) -> List[Optional[Dict[str, Any]]]:
     """
-    Process files in batches to avoid overwhelming the system.
-    Sends progress updates to keep frontend connection alive.
+    Extract file contexts through a bounded worker pool.
+    Cached contexts are returned without an extraction; the remaining files are
+    analyzed by up to `batch_size` concurrent workers, each picking the next file
+    as soon as it is free. Sends a progress update per finished file.
     
     Args:
         file_ids: List of file IDs to process
         cookies: Authentication cookies
-        batch_size: Number of files to process concurrently
+        batch_size: Maximum number of files analyzed concurrently
         progress_callback: Optional async callback for progress updates
         
     Returns:
         List of file contexts in same order as input file_ids.
     """
-    all_results = []
     total_files = len(file_ids)
-    
-    for i in range(0, len(file_ids), batch_size):
-        batch = file_ids[i:i + batch_size]
-        batch_num = i//batch_size + 1
-        total_batches = (total_files + batch_size - 1) // batch_size
-        
-        logger.info(f"[FILE_CONTEXT] Processing batch {batch_num}/{total_batches}: files {i+1} to {i+len(batch)}")
-        
-        # Send progress update to keep connection alive
-        if progress_callback:
-            progress_msg = f"Processing files batch {batch_num}/{total_batches} ({i+1}-{i+len(batch)} of {total_files})..."
-            await progress_callback(progress_msg)
-        
-        # Create tasks for this batch
-        tasks = [extract_single_file_context(file_id, cookies) for file_id in batch]
-        
-        # Execute batch in parallel
-        batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # Process results
-        for file_id, result in zip(batch, batch_results):
-            if isinstance(result, Exception):
-                logger.error(f"[FILE_CONTEXT] Error processing file {file_id}: {result}")
-                all_results.append(None)
-            else:
-                all_results.append(result)
-        
-        # Send progress update after batch completion
-        if progress_callback:
-            completed = min(i + batch_size, total_files)
-            progress_msg = f"Completed {completed}/{total_files} files"
-            await progress_callback(progress_msg)
-        
-        # Brief pause between batches to be gentle on the system
-        if i + batch_size < len(file_ids):
-            await asyncio.sleep(0.5)
-    
-    return all_results
+    results: List[Optional[Dict[str, Any]]] = [None] * total_files
+    if not file_ids:
+        return results
+
+    content_hashes = await fetch_user_file_content_hashes(file_ids, cookies)
+    next_index = 0
+    completed = 0
+
+    async def worker() -> None:
+        nonlocal next_index, completed
+        while next_index < total_files:
+            index = next_index
+            next_index += 1
+            file_id = file_ids[index]
+            try:
+                results[index] = await extract_single_file_context(file_id, cookies, content_hashes.get(file_id))
+            except Exception as e:
+                logger.error(f"[FILE_CONTEXT] Error processing file {file_id}: {e}")
+            completed += 1
+            if progress_callback:
+                await progress_callback(f"Analyzed {completed}/{total_files} files")
+
+    workers = max(1, min(batch_size, total_files))
+    logger.info(f"[FILE_CONTEXT] Processing {total_files} files with {workers} workers")
+    if progress_callback:
+        await progress_callback(f"Processing {total_files} files...")
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    logger.info(f"[FILE_CONTEXT] Cache stats: {FILE_CONTEXT_STORE.stats()}")
+    return results
 
 async def extract_file_context_from_onyx_with_progress(
     file_ids: List[int], 
@@ -12061,18 +12159,6 @@ async def extract_file_context_from_onyx_with_progress(
         Dict with type 'progress' (progress update) or 'complete' (final context)
     """
     try:
-        # Create cache key - convert all IDs to strings to handle mixed int/str types from different sources
-        cache_key = f"{hash(tuple(sorted([str(fid) for fid in file_ids])))}_{hash(tuple(sorted([str(fid) for fid in folder_ids])))}"
-        
-        # Check cache first
-        if cache_key in FILE_CONTEXT_CACHE:
-            cached_data = FILE_CONTEXT_CACHE[cache_key]
-            if time.time() - cached_data["timestamp"] < FILE_CONTEXT_CACHE_TTL:
-                logger.info(f"[FILE_CONTEXT] Using cached context for key: {cache_key[:16]}...")
-                yield {"type": "progress", "message": "Using cached file context..."}
-                yield {"type": "complete", "context": cached_data["context"]}
-                return
-        
         logger.info(f"[FILE_CONTEXT] Extracting context from {len(file_ids)} files and {len(folder_ids)} folders")
         yield {"type": "progress", "message": f"Extracting context from {len(file_ids)} files and {len(folder_ids)} folders..."}
         
@@ -12092,85 +12178,43 @@ async def extract_file_context_from_onyx_with_progress(
         successful_extractions = 0
         
         if file_ids:
-            logger.info(f"[FILE_CONTEXT] Starting batch parallel processing for {len(file_ids)} files")
-            
-            # Process files in batches and yield progress for each batch
-            # Batch size balances speed vs API stability
-            batch_size = 5
-            all_file_results = []
-            total_files = len(file_ids)
-            
-            for i in range(0, len(file_ids), batch_size):
-                batch = file_ids[i:i + batch_size]
-                batch_num = i//batch_size + 1
-                total_batches = (total_files + batch_size - 1) // batch_size
-                
-                progress_msg = f"Processing files batch {batch_num}/{total_batches} ({i+1}-{i+len(batch)} of {total_files})..."
-                logger.info(f"[FILE_CONTEXT] {progress_msg}")
-                yield {"type": "progress", "message": progress_msg}
-                
-                # Create tasks for this batch, maintaining file_id -> task mapping
-                task_to_file_id = {}
-                for file_id in batch:
-                    task = asyncio.create_task(extract_single_file_context(file_id, cookies))
-                    task_to_file_id[task] = file_id
-                
-                tasks_set = set(task_to_file_id.keys())
-                
-                # Execute batch in parallel with periodic keep-alive heartbeats
-                task_results = {}  # Map task to result
-                heartbeat_count = 1
-                start_time = time.time()
-                
-                while tasks_set:
-                    # Wait for tasks with a 10-second timeout
-                    done, tasks_set = await asyncio.wait(
-                        tasks_set, 
-                        timeout=10.0,
-                        return_when=asyncio.FIRST_COMPLETED
-                    )
-                    
-                    # Collect completed results
-                    for task in done:
-                        try:
-                            task_results[task] = task.result()
-                        except Exception as e:
-                            task_results[task] = e
-                    
-                    # If there are still pending tasks, send a keep-alive heartbeat
-                    if tasks_set:
+            # Files run through the cache-aware worker pool; its progress is relayed from a queue,
+            # with a keep-alive heartbeat whenever nothing finished for 10 seconds
+            progress_queue: asyncio.Queue = asyncio.Queue()
+
+            async def report_progress(message: str) -> None:
+                progress_queue.put_nowait(message)
+
+            batch_task = asyncio.create_task(
+                process_file_batch_with_progress(file_ids, cookies, progress_callback=report_progress)
+            )
+            start_time = time.time()
+            try:
+                while not (batch_task.done() and progress_queue.empty()):
+                    if not progress_queue.empty():
+                        yield {"type": "progress", "message": progress_queue.get_nowait()}
+                        continue
+                    next_message = asyncio.ensure_future(progress_queue.get())
+                    done, _ = await asyncio.wait({next_message, batch_task}, timeout=10.0, return_when=asyncio.FIRST_COMPLETED)
+                    if next_message in done:
+                        yield {"type": "progress", "message": next_message.result()}
+                        continue
+                    next_message.cancel()
+                    if not done:
                         elapsed = int(time.time() - start_time)
-                        heartbeat_msg = f"Processing batch {batch_num}/{total_batches}... ({elapsed}s elapsed, {len(task_results)}/{len(batch)} files analyzed)"
+                        heartbeat_msg = f"Analyzing files... ({elapsed}s elapsed)"
                         logger.info(f"[FILE_CONTEXT_HEARTBEAT] {heartbeat_msg}")
                         yield {"type": "progress", "message": heartbeat_msg}
-                        heartbeat_count += 1
-                
-                # Reorder results to match original file_id order
-                for file_id in batch:
-                    task = [t for t, fid in task_to_file_id.items() if fid == file_id][0]
-                    result = task_results.get(task)
-                    if isinstance(result, Exception):
-                        all_file_results.append(None)
-                    else:
-                        all_file_results.append(result)
-                
-                # Yield progress after batch completion
-                completed = min(i + batch_size, total_files)
-                progress_msg = f"Analyzed {completed}/{total_files} files"
-                yield {"type": "progress", "message": progress_msg}
-                
-                # Brief pause between batches
-                if i + batch_size < len(file_ids):
-                    await asyncio.sleep(0.5)
-            
-            file_results = all_file_results
+                file_results = await batch_task
+            finally:
+                if not batch_task.done():
+                    batch_task.cancel()
             
             # Process results
             for file_id, file_context in zip(file_ids, file_results):
                 if file_context and (file_context.get("summary") or file_context.get("content")):
                     # Check if this was a successful extraction
-                    content = file_context.get("content", "")
-                    if not any(phrase in content.lower() for phrase in ["file access issue", "not indexed", "could not access", "file_access_error"]):
+                    if not _has_file_access_issue(file_context):
                         # Success - add to context
                         extracted_context["file_summaries"].append(file_context["summary"])
                         extracted_context["file_contents"].append(file_context["content"])
@@ -12214,12 +12258,6 @@ async def extract_file_context_from_onyx_with_progress(
         # Remove duplicate topics
         extracted_context["key_topics"] = list(set(extracted_context["key_topics"]))
         
-        # Cache the result
-        FILE_CONTEXT_CACHE[cache_key] = {
-            "context": extracted_context,
-            "timestamp": time.time()
-        }
-        
         logger.info(f"[FILE_CONTEXT] Successfully extracted context: {len(extracted_context['file_summaries'])} file summaries, {len(extracted_context['key_topics'])} key topics")
         
         # Yield final complete result
@@ -13082,28 +13120,8 @@ async def extract_knowledge_base_context(topic: str, cookies: Dict[str, str]) ->
             "file_summaries": []
         }
 
-async def extract_single_file_context(file_id: int, cookies: Dict[str, str]) -> Dict[str, Any]:
-    """
-    Extract context from a single file using Onyx's chat API with 100% file attachment guarantee.
-    """
-    try:
-        # Step 1: Verify file exists and is accessible
-        file_info = await verify_file_accessibility(file_id, cookies)
-        if not file_info:
-            return {
-                "file_id": file_id,
-                "summary": f"File {file_id} is not accessible or does not exist",
-                "topics": ["file access error"],
-                "key_info": "File may need to be re-uploaded",
-                "content": f"File {file_id} access verification failed"
-            }
-        
-        # Step 2: Create a temporary chat session with forced file attachment
-        persona_id = await get_contentbuilder_persona_id(cookies)
-        temp_chat_id = await create_onyx_chat_session(persona_id, cookies)
-        
-        # Step 3: Enhanced extraction prompt that gets actual content snippets
-        analysis_prompt = f"""
+# Extraction prompts; FILE_CONTEXT_PROMPT_VERSION changes with them and invalidates cached contexts
+FILE_CONTEXT_ANALYSIS_PROMPT = """
         You are a CONTENT EXTRACTION SPECIALIST. Your task is to extract and reproduce ACTUAL CONTENT from this file.
 
         CRITICAL INSTRUCTIONS:
@@ -13141,8 +13159,8 @@ async def extract_single_file_context(file_id: int, cookies: Dict[str, str]) ->
         Remember: Your goal is to EXTRACT as much useful content as possible, not to summarize it.
         The more detailed and complete your extraction, the better the educational material will be.
         """
-        # Less-invasive prompt (used only if the first attempt is refused or generic)
-        softer_prompt = f"""
+# Less-invasive prompt (used only if the first attempt is refused or generic)
+FILE_CONTEXT_SOFTER_PROMPT = """
         You are a CONTENT ANALYST.
 
         Goal: Provide a faithful, detailed representation of the file's information for educational use.
@@ -13162,6 +13180,85 @@ async def extract_single_file_context(file_id: int, cookies: Dict[str, str]) ->
          - Short quotes where allowed (a few words to short phrases), otherwise detailed paraphrase capturing all substance
          - Numbers, names, dates, and definitions precisely]
         """
+FILE_CONTEXT_PROMPT_VERSION = hashlib.sha256(
+    (FILE_CONTEXT_ANALYSIS_PROMPT + FILE_CONTEXT_SOFTER_PROMPT).encode()
+).hexdigest()[:16]
+
+FILE_ACCESS_ISSUE_PHRASES = ["file access issue", "not indexed", "could not access", "file_access_error"]
+
+def _has_file_access_issue(file_context: Dict[str, Any]) -> bool:
+    content = (file_context.get("content") or "").lower()
+    return any(phrase in content for phrase in FILE_ACCESS_ISSUE_PHRASES)
+
+def _is_cacheable_file_context(file_context: Dict[str, Any]) -> bool:
+    """Only real extractions are cached; access errors and skipped files are retried next time."""
+    return bool(file_context.get("_extracted")) and not _has_file_access_issue(file_context)
+
+async def fetch_user_file_content_hashes(file_ids: List[int], cookies: Dict[str, str]) -> Dict[int, str]:
+    """
+    Content hash per Onyx user file, for the file-context cache.
+    Onyx does not expose file bytes cheaply, so the hash covers what identifies one
+    upload: its file-store key, token count and creation time. Files missing from
+    the listing get no hash and bypass the cache.
+    """
+    wanted = set(file_ids)
+    hashes: Dict[int, str] = {}
+    try:
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            response = await client.get(f"{ONYX_API_SERVER_URL}/user/folder", cookies=cookies)
+            response.raise_for_status()
+            for folder in response.json():
+                for file_info in folder.get("files") or []:
+                    file_id = file_info.get("id")
+                    if file_id in wanted and file_info.get("file_id"):
+                        fingerprint = f"{file_info['file_id']}:{file_info.get('token_count')}:{file_info.get('created_at')}"
+                        hashes[file_id] = hashlib.sha256(fingerprint.encode()).hexdigest()
+    except Exception as e:
+        logger.warning(f"[FILE_CONTEXT_CACHE] Could not fetch file fingerprints, cache bypassed: {e}")
+    return hashes
+
+async def extract_single_file_context(file_id: int, cookies: Dict[str, str], content_hash: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Extract context from a single file, served from FILE_CONTEXT_STORE when the same
+    file content was already extracted with the current prompts.
+    """
+    if content_hash:
+        context = await FILE_CONTEXT_STORE.get_or_extract(
+            file_id,
+            content_hash,
+            FILE_CONTEXT_PROMPT_VERSION,
+            lambda: _extract_single_file_context_uncached(file_id, cookies),
+            _is_cacheable_file_context,
+        )
+    else:
+        context = await _extract_single_file_context_uncached(file_id, cookies)
+    # "_extracted" marks real extractions for the cache only
+    return {key: value for key, value in context.items() if key != "_extracted"}
+
+async def _extract_single_file_context_uncached(file_id: int, cookies: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Extract context from a single file using Onyx's chat API with 100% file attachment guarantee.
+    """
+    try:
+        # Step 1: Verify file exists and is accessible
+        file_info = await verify_file_accessibility(file_id, cookies)
+        if not file_info:
+            return {
+                "file_id": file_id,
+                "summary": f"File {file_id} is not accessible or does not exist",
+                "topics": ["file access error"],
+                "key_info": "File may need to be re-uploaded",
+                "content": f"File {file_id} access verification failed"
+            }
+        
+        # Step 2: Create a temporary chat session with forced file attachment
+        persona_id = await get_contentbuilder_persona_id(cookies)
+        temp_chat_id = await create_onyx_chat_session(persona_id, cookies)
+        
+        # Step 3: Enhanced extraction prompt that gets actual content snippets
+        analysis_prompt = FILE_CONTEXT_ANALYSIS_PROMPT
+        # Less-invasive prompt (used only if the first attempt is refused or generic)
+        softer_prompt = FILE_CONTEXT_SOFTER_PROMPT
         
         # Step 4: Single attempt - skip file if it fails (no retries)
         try:
@@ -13175,14 +13272,14 @@ async def extract_single_file_context(file_id: int, cookies: Dict[str, str]) ->
             ]
             is_refusal = any(m in (result or "").lower() for m in refusal_markers)
             if result and not is_generic_response(result) and not is_refusal:
-                return parse_analysis_result(file_id, result)
+                return {**parse_analysis_result(file_id, result), "_extracted": True}
             # Retry once with less invasive prompt and alternate strategy (attempt 2)
             logger.info(f"[FILE_CONTEXT] Retrying file {file_id} with less invasive prompt")
             retry_result = await attempt_file_analysis_with_retry(
                 temp_chat_id, file_id, softer_prompt, cookies, 1
             )
             if retry_result and not is_generic_response(retry_result):
-                return parse_analysis_result(file_id, retry_result)
+                return {**parse_analysis_result(file_id, retry_result), "_extracted": True}
             logger.warning(f"[FILE_CONTEXT] File {file_id} analysis failed after retry, skipping...")
         except Exception as e:
             logger.error(f"[FILE_CONTEXT] File {file_id} analysis error: {e}, skipping...")
@@ -16305,223 +16402,122 @@ async def get_user_identifiers_for_workspace(request: Request) -> tuple[str, str
                 return dev_user_id, dev_user_id
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication required")
 
-        onyx_user_info_url = f"{ONYX_API_SERVER_URL}/me"
-        cookies_to_forward = {ONYX_SESSION_COOKIE_NAME: session_cookie_value}
-        
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(onyx_user_info_url, cookies=cookies_to_forward)
-            response.raise_for_status()
-            user_data = response.json()
-            
-            user_id = user_data.get("userId") or user_data.get("id")
-            user_email = user_data.get("email")
-            
-            if not user_id:
-                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="User ID extraction failed")
-            
-            return str(user_id), user_email or str(user_id)
+        identity = await _resolve_onyx_identity(session_cookie_value, "get_user_identifiers_for_workspace")
+        return identity.user_id, identity.email or identity.user_id
     except Exception as e:
         logger.error(f"Error getting user identifiers: {e}")
         raise
 
+# Columns the project list returns by default; heavy JSONB is only read when asked for with fields=
+PROJECT_LIST_OPTIONAL_COLUMNS = {
+    "microproduct_content": "p.microproduct_content",
+}
+PROJECT_LIST_MAX_LIMIT = 500
+
+
+def _encode_project_list_cursor(row: dict) -> str:
+    payload = json.dumps([row["sort_order"], row["created_at"].isoformat(), row["id"]])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_project_list_cursor(cursor: str) -> Tuple[int, datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_order, created_at, project_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return int(sort_order), datetime.fromisoformat(created_at), int(project_id)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
 @app.get("/api/custom/projects", response_model=List[ProjectApiResponse])
 async def get_user_projects_list_from_db(
     request: Request,
+    response: Response,
     pool: asyncpg.Pool = Depends(get_db_pool),
-    folder_id: Optional[int] = None
+    folder_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=PROJECT_LIST_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
 ):
-    # Get both UUID and email for the user
+    """
+    Projects the user owns or can access through workspace sharing, newest
+    first by ("order", created_at, id). Without `limit` every project is
+    returned; with it, a page is returned and the cursor for the next page is
+    sent in the X-Next-Cursor header. `fields=microproduct_content` adds the
+    full content, which is left out by default.
+    """
     user_uuid, user_email = await get_user_identifiers_for_workspace(request)
-    
-    # For backward compatibility with existing code
-    onyx_user_id = user_uuid
-    
-    # For backward compatibility with existing code
-    onyx_user_id = user_uuid
-    
-    # First, get projects owned by the user
-    owned_projects_query = """
+
+    requested_fields = {f.strip() for f in (fields or "").split(",") if f.strip()}
+    unknown_fields = requested_fields - PROJECT_LIST_OPTIONAL_COLUMNS.keys()
+    if unknown_fields:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown_fields))}"
+        )
+    optional_columns = "".join(
+        f", {PROJECT_LIST_OPTIONAL_COLUMNS[name]}" for name in sorted(requested_fields)
+    )
+
+    params: List[Any] = [user_uuid, user_email, folder_id]
+    cursor_filter = ""
+    if cursor:
+        params.extend(_decode_project_list_cursor(cursor))
+        cursor_filter = 'AND (COALESCE(p."order", 0), p.created_at, p.id) < ($4, $5, $6)'
+    limit_clause = ""
+    if limit is not None:
+        # One extra row tells us whether there is a next page
+        params.append(limit + 1)
+        limit_clause = f"LIMIT ${len(params)}"
+
+    # Owned and shared projects in one query; UNION also removes projects that are both
+    projects_query = f"""
+        WITH visible_projects AS (
+            SELECT p.id FROM projects p WHERE p.onyx_user_id = $1
+            UNION
+            SELECT upa.product_id FROM user_product_access upa WHERE upa.user_key IN ($1, $2)
+        )
         SELECT p.id, p.project_name, p.microproduct_name, p.created_at, p.design_template_id,
                dt.template_name as design_template_name,
                dt.microproduct_type as design_microproduct_type,
-               p.folder_id, p."order", p.microproduct_content, p.source_chat_session_id, p.is_standalone, p.course_id
-        FROM projects p
-        LEFT JOIN design_templates dt ON p.design_template_id = dt.id
-        WHERE p.onyx_user_id = $1 {folder_filter}
-    """
-    
-    # Then, get projects the user has access to through workspace permissions
-    shared_projects_query = """
-        SELECT DISTINCT p.id, p.project_name, p.microproduct_name, p.created_at, p.design_template_id,
-               dt.template_name as design_template_name,
-               dt.microproduct_type as design_microproduct_type,
-               p.folder_id, p."order", p.microproduct_content, p.source_chat_session_id, p.is_standalone, p.course_id
-        FROM projects p
+               p.folder_id, p."order", COALESCE(p."order", 0) AS sort_order,
+               p.source_chat_session_id, p.is_standalone, p.course_id,
+               p.lesson_count, p.total_completion_minutes{optional_columns}
+        FROM visible_projects v
+        INNER JOIN projects p ON p.id = v.id
         LEFT JOIN design_templates dt ON p.design_template_id = dt.id
-        INNER JOIN product_access pa ON p.id = pa.product_id
-        INNER JOIN workspace_members wm ON pa.workspace_id = wm.workspace_id
-        WHERE (wm.user_id = $1 OR wm.user_id = $2)
-          AND wm.status = 'active'
-          AND pa.access_type IN ('workspace', 'role', 'individual')
-          AND (
-              pa.access_type = 'workspace' 
-              OR (pa.access_type = 'role' AND (pa.target_id = CAST(wm.role_id AS TEXT) OR pa.target_id IN (SELECT name FROM workspace_roles WHERE id = wm.role_id)))
-              OR (pa.access_type = 'individual' AND (pa.target_id = $1 OR pa.target_id = $2))
-          )
-          {folder_filter}
+        WHERE ($3::int IS NULL OR p.folder_id = $3)
+          {cursor_filter}
+        ORDER BY COALESCE(p."order", 0) DESC, p.created_at DESC, p.id DESC
+        {limit_clause}
     """
-    
-    # Get both UUID and email for workspace access
-    try:
-        session_cookie_value = request.cookies.get(ONYX_SESSION_COOKIE_NAME)
-        if not session_cookie_value:
-            dev_user_id = request.headers.get("X-Dev-Onyx-User-ID")
-            if dev_user_id:
-                user_uuid = dev_user_id
-                user_email = dev_user_id  # For dev, assume email format
-            else:
-                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication required")
-        else:
-            onyx_user_info_url = f"{ONYX_API_SERVER_URL}/me"
-            cookies_to_forward = {ONYX_SESSION_COOKIE_NAME: session_cookie_value}
-            
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(onyx_user_info_url, cookies=cookies_to_forward)
-                response.raise_for_status()
-                user_data = response.json()
-                
-                user_uuid = str(user_data.get("userId") or user_data.get("id"))
-                user_email = user_data.get("email") or user_uuid
-    except Exception as e:
-        logger.error(f"Error getting user identifiers: {e}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="User identification failed")
-    
-    folder_filter = ""
-    owned_params = [user_uuid]
-    shared_params = [user_uuid, user_email]
-    
-    if folder_id is not None:
-        folder_filter = "AND p.folder_id = $2"
-        owned_params.append(folder_id)
-        folder_filter_shared = "AND p.folder_id = $3"
-        shared_params.append(folder_id)
-    else:
-        folder_filter_shared = ""
-    
-    owned_query = owned_projects_query.format(folder_filter=folder_filter)
-    shared_query = shared_projects_query.format(folder_filter=folder_filter_shared)
-    
+
     async with pool.acquire() as conn:
-        # Get owned projects (use UUID)
-        owned_rows = await conn.fetch(owned_query, *owned_params)
-        
-        # Get shared projects (use email)
-        shared_rows = await conn.fetch(shared_query, *shared_params)
-        
-        # 🔍 DEBUG: Log workspace access results
-        logger.info(f"🔍 [WORKSPACE ACCESS] User {user_uuid} (email: {user_email}) projects query results:")
-        logger.info(f"   - Owned projects: {len(owned_rows)}")
-        logger.info(f"   - Shared projects: {len(shared_rows)}")
-        logger.info(f"   - Folder filter: {folder_id}")
-        
-        if owned_rows:
-            logger.info(f"   - Owned project IDs: {[row['id'] for row in owned_rows]}")
-        if shared_rows:
-            logger.info(f"   - Shared project IDs: {[row['id'] for row in shared_rows]}")
-        else:
-            # Debug why no shared projects found
-            logger.info(f"🔍 [WORKSPACE DEBUG] No shared projects found for user {onyx_user_id}. Investigating...")
-            
-            # Check workspace memberships using email (not UUID)
-            membership_check = await conn.fetch("""
-                SELECT wm.*, w.name as workspace_name, wr.name as role_name
-                FROM workspace_members wm
-                JOIN workspaces w ON wm.workspace_id = w.id
-                JOIN workspace_roles wr ON wm.role_id = wr.id
-                WHERE wm.user_id = $1
-            """, user_email)
-            
-            logger.info(f"   - User workspace memberships: {len(membership_check)}")
-            for membership in membership_check:
-                logger.info(f"     * Workspace: {membership['workspace_name']} (ID: {membership['workspace_id']})")
-                logger.info(f"       Role: {membership['role_name']} (ID: {membership['role_id']})")
-                logger.info(f"       Status: {membership['status']}")
-            
-            if not membership_check:
-                logger.info(f"   ❌ User {user_uuid} is not a member of any workspace!")
-                logger.info(f"   💡 Add user to a workspace to enable shared project access")
-                logger.info(f"   - User workspace memberships: 0")
-                logger.info(f"   - No workspace memberships found - user needs to be added to a workspace")
-            
-            # Check product access records
-            if membership_check:
-                workspace_ids = [m['workspace_id'] for m in membership_check]
-                access_check = await conn.fetch("""
-                    SELECT pa.*, p.project_name, w.name as workspace_name
-                    FROM product_access pa
-                    JOIN projects p ON pa.product_id = p.id
-                    JOIN workspaces w ON pa.workspace_id = w.id
-                    WHERE pa.workspace_id = ANY($1::int[])
-                """, workspace_ids)
-                
-                logger.info(f"   - Product access records in user's workspaces: {len(access_check)}")
-                for access in access_check:
-                    logger.info(f"     * Project: {access['project_name']} (ID: {access['product_id']})")
-                    logger.info(f"       Workspace: {access['workspace_name']} (ID: {access['workspace_id']})")
-                    logger.info(f"       Access Type: {access['access_type']}")
-                    logger.info(f"       Target ID: {access['target_id']}")
-            else:
-                logger.info(f"   - No workspace memberships found - user needs to be added to a workspace")
-        
-        # Combine and deduplicate projects
-        all_projects = {}
-        
-        # Process owned projects first
-        for row_data in owned_rows:
-            row_dict = dict(row_data)
-            project_slug = create_slug(row_dict.get('project_name'))
-            source_chat_session_id = row_dict.get("source_chat_session_id")
-            if source_chat_session_id:
-                source_chat_session_id = str(source_chat_session_id)
-            
-            all_projects[row_dict["id"]] = ProjectApiResponse(
-                id=row_dict["id"], projectName=row_dict["project_name"], projectSlug=project_slug,
-                microproduct_name=row_dict.get("microproduct_name"),
-                design_template_name=row_dict.get("design_template_name"),
-                design_microproduct_type=row_dict.get("design_microproduct_type"),
-                created_at=row_dict["created_at"], design_template_id=row_dict.get("design_template_id"),
-                folder_id=row_dict.get("folder_id"), order=row_dict.get("order"),
-                microproduct_content=row_dict.get("microproduct_content"),
-                source_chat_session_id=source_chat_session_id,
-                is_standalone=row_dict.get("is_standalone"),
-                course_id=row_dict.get("course_id")
-            )
-        
-        # Process shared projects (will override owned if same ID, which is fine)
-        for row_data in shared_rows:
-            row_dict = dict(row_data)
-            project_slug = create_slug(row_dict.get('project_name'))
-            source_chat_session_id = row_dict.get("source_chat_session_id")
-            if source_chat_session_id:
-                source_chat_session_id = str(source_chat_session_id)
-            
-            all_projects[row_dict["id"]] = ProjectApiResponse(
-                id=row_dict["id"], projectName=row_dict["project_name"], projectSlug=project_slug,
-                microproduct_name=row_dict.get("microproduct_name"),
-                design_template_name=row_dict.get("design_template_name"),
-                design_microproduct_type=row_dict.get("design_microproduct_type"),
-                created_at=row_dict["created_at"], design_template_id=row_dict.get("design_template_id"),
-                folder_id=row_dict.get("folder_id"), order=row_dict.get("order"),
-                microproduct_content=row_dict.get("microproduct_content"),
-                source_chat_session_id=source_chat_session_id,
-                is_standalone=row_dict.get("is_standalone"),
-                course_id=row_dict.get("course_id")
-            )
-    
-    # Convert to list and sort
-    projects_list = list(all_projects.values())
-    projects_list.sort(key=lambda x: (x.order or 0, x.created_at), reverse=True)
-    
+        rows = await conn.fetch(projects_query, *params)
+
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_project_list_cursor(rows[-1])
+
+    logger.info(f"[PROJECTS_LIST] User {user_uuid}: {len(rows)} projects (folder={folder_id}, limit={limit}, fields={sorted(requested_fields)})")
+
+    projects_list = []
+    for row in rows:
+        source_chat_session_id = row["source_chat_session_id"]
+        projects_list.append(ProjectApiResponse(
+            id=row["id"], projectName=row["project_name"], projectSlug=create_slug(row["project_name"]),
+            microproduct_name=row["microproduct_name"],
+            design_template_name=row["design_template_name"],
+            design_microproduct_type=row["design_microproduct_type"],
+            created_at=row["created_at"], design_template_id=row["design_template_id"],
+            folder_id=row["folder_id"], order=row["order"],
+            source_chat_session_id=str(source_chat_session_id) if source_chat_session_id else None,
+            is_standalone=row["is_standalone"],
+            course_id=row["course_id"],
+            lesson_count=row["lesson_count"],
+            total_completion_minutes=row["total_completion_minutes"],
+            microproduct_content=row["microproduct_content"] if "microproduct_content" in requested_fields else None,
+        ))
     return projects_list
 
 @app.get("/api/custom/projects/view/{project_id}", response_model=MicroProductApiResponse, responses={404: {"model": ErrorDetail}})
@@ -16541,17 +16537,8 @@ async def get_project_instance_detail(
         WHERE p.id = $1 AND (
             p.onyx_user_id = $2 
             OR EXISTS (
-                SELECT 1 FROM product_access pa
-                INNER JOIN workspace_members wm ON pa.workspace_id = wm.workspace_id
-                WHERE pa.product_id = p.id 
-                  AND wm.user_id = $3 
-                  AND wm.status = 'active'
-                  AND pa.access_type IN ('workspace', 'role', 'individual')
-                  AND (
-                      pa.access_type = 'workspace' 
-                      OR (pa.access_type = 'role' AND (pa.target_id = CAST(wm.role_id AS TEXT) OR pa.target_id IN (SELECT name FROM workspace_roles WHERE id = wm.role_id)))
-                      OR (pa.access_type = 'individual' AND pa.target_id = $3)
-                  )
+                SELECT 1 FROM user_product_access upa
+                WHERE upa.product_id = p.id AND upa.user_key = $3
             )
         )
     """
@@ -16827,7 +16814,8 @@ async def download_folder_as_pdf(
                     }
                 }
                 
-                pdf_path = await generate_pdf_from_html_template(pdf_template_file, context_for_jinja, unique_output_filename)
+                # Intermediate file removed after merging, so keep it out of the shared PDF cache
+                pdf_path = await generate_pdf_from_html_template(pdf_template_file, context_for_jinja, unique_output_filename, use_cache=False)
                 if os.path.exists(pdf_path):
                     pdf_paths.append(pdf_path)
                     project_names.append(project_name)
@@ -16951,41 +16939,47 @@ async def stream_slide_deck_pdf_generation(
             # Generate PDF with regular function and send progress updates
             from app.services.pdf_generator import generate_slide_deck_pdf_with_dynamic_height
             
-            # Send intermediate progress messages
-            yield f"data: {json.dumps({'type': 'progress', 'message': 'Calculating slide dimensions...', 'current': 1, 'total': total_slides})}\n\n"
-            
-            # Simulate progress for user feedback during long operation
             import asyncio
             
-            # Start PDF generation in background and send periodic updates
+            # Slides are merged as they finish; each finished slide is reported to the client as it happens
+            progress_queue: asyncio.Queue = asyncio.Queue()
+            
+            def on_slide_ready(slides_done: int, slides_total: int, slide_index: int, template_id: str):
+                progress_queue.put_nowait({
+                    'type': 'progress',
+                    'message': f'Generated slide {slide_index + 1}: {template_id}',
+                    'current': slides_done,
+                    'total': slides_total,
+                    'slide_index': slide_index,
+                })
+            
             # CRITICAL FIX: Pass deck_template_version for version-aware rendering
             pdf_task = asyncio.create_task(generate_slide_deck_pdf_with_dynamic_height(
                 slides_data=slide_deck_data['slides'],
                 theme=theme,
                 output_filename=unique_output_filename,
                 use_cache=True,
-                deck_template_version=deck_template_version  # ← Pass version for v1/v2 template selection
+                deck_template_version=deck_template_version,  # ← Pass version for v1/v2 template selection
+                progress_callback=on_slide_ready
             ))
             
-            # Send progress updates while PDF is generating
-            progress_step = 0
-            max_steps = total_slides * 2  # Simulate steps for dimension calc + generation
-            
-            while not pdf_task.done():
-                await asyncio.sleep(2)  # Update every 2 seconds
-                progress_step += 1
-                current_progress = min(progress_step, max_steps - 1)
-                
-                if progress_step <= total_slides:
-                    message = f"Calculating dimensions for slide {progress_step}..."
-                else:
-                    slide_num = progress_step - total_slides
-                    message = f"Generating slide {slide_num}..."
-                
-                yield f"data: {json.dumps({'type': 'progress', 'message': message, 'current': current_progress, 'total': max_steps})}\n\n"
+            try:
+                while not pdf_task.done() or not progress_queue.empty():
+                    try:
+                        update = await asyncio.wait_for(progress_queue.get(), timeout=2)
+                    except asyncio.TimeoutError:
+                        # SSE comment keeps proxies from closing the connection during long renders
+                        yield ": keepalive\n\n"
+                        continue
+                    yield f"data: {json.dumps(update)}\n\n"
+            finally:
+                if not pdf_task.done():
+                    # Client went away; the render keeps going in the PDF cache for the next request
+                    pdf_task.add_done_callback(lambda task: task.exception() if not task.cancelled() else None)
             
             # Wait for PDF generation to complete
             pdf_path = await pdf_task
+            max_steps = total_slides
             
             # Send final progress update
             yield f"data: {json.dumps({'type': 'progress', 'message': 'PDF generation completed!', 'current': max_steps, 'total': max_steps})}\n\n"
@@ -17227,11 +17221,15 @@ async def download_slide_deck_pdf(
         # Generate PDF using the new dynamic height slide deck generation
         from app.services.pdf_generator import generate_slide_deck_pdf_with_dynamic_height
         
+        # Part of the PDF cache key, so v1/v2 renders of the same slides never collide
+        deck_template_version = content_json.get('templateVersion') or content_json.get('template_version') or 'v1'
+        
         pdf_path = await generate_slide_deck_pdf_with_dynamic_height(
             slides_data=slide_deck_data['slides'],
             theme=theme,
             output_filename=unique_output_filename,
-            use_cache=True
+            use_cache=True,
+            deck_template_version=deck_template_version
         )
         
         if not os.path.exists(pdf_path):
@@ -17933,74 +17931,19 @@ async def get_analytics_dashboard(
     status_code: Optional[int] = Query(None, description="Filter by status code"),
     pool: asyncpg.Pool = Depends(get_db_pool)
 ):
-    """Get comprehensive analytics dashboard data"""
-    import json
-    
-    print(f"=== DASHBOARD DEBUG: Incoming parameters ===")
-    print(f"date_from: {date_from}")
-    print(f"date_to: {date_to}")
-    print(f"=== END PARAMETERS ===")
-
-    try:
-        # DEBUG: Print the latest 10 rows from request_analytics
-        async with pool.acquire() as conn:
-            debug_rows = await conn.fetch(
-                "SELECT id, endpoint, method, status_code, created_at FROM request_analytics ORDER BY created_at DESC LIMIT 10"
-            )
-            print("=== DEBUG: Latest 10 rows from request_analytics ===")
-            for row in debug_rows:
-                print(dict(row))
-            print("=== END DEBUG ===")
-            
-            # DEBUG: Check specifically for AI parser records
-            ai_parser_rows = await conn.fetch(
-                "SELECT id, endpoint, method, status_code, is_ai_parser_request, ai_parser_tokens, ai_parser_model, ai_parser_project_name, created_at FROM request_analytics WHERE is_ai_parser_request = true ORDER BY created_at DESC LIMIT 10"
-            )
-            print("=== DEBUG: AI Parser records from request_analytics ===")
-            for row in ai_parser_rows:
-                print(dict(row))
-            print(f"Total AI parser records found: {len(ai_parser_rows)}")
-            print("=== END AI PARSER DEBUG ===")
-            
-            # DEBUG: Check if the columns exist and have any data
-            column_check = await conn.fetch(
-                "SELECT column_name, data_type, is_nullable, column_default FROM information_schema.columns WHERE table_name = 'request_analytics' ORDER BY ordinal_position"
-            )
-            print("=== DEBUG: All request_analytics columns check ===")
-            for row in column_check:
-                print(dict(row))
-            print("=== END COLUMN CHECK ===")
-            
-            # DEBUG: Check for any records with non-null ai_parser fields
-            any_ai_parser_data = await conn.fetch(
-                "SELECT id, endpoint, is_ai_parser_request, ai_parser_tokens, ai_parser_model, ai_parser_project_name FROM request_analytics WHERE is_ai_parser_request IS NOT NULL OR ai_parser_tokens IS NOT NULL OR ai_parser_model IS NOT NULL OR ai_parser_project_name IS NOT NULL ORDER BY created_at DESC LIMIT 5"
-            )
-            print("=== DEBUG: Any AI parser data ===")
-            for row in any_ai_parser_data:
-                print(dict(row))
-            print(f"Total records with any AI parser data: {len(any_ai_parser_data)}")
-            print("=== END ANY AI PARSER DATA ===")
-    except Exception as e:
-        print(f"DEBUG ERROR: Could not fetch request_analytics: {e}")
-
+    """
+    Get comprehensive analytics dashboard data.
+    Aggregates come from the hourly rollups (date filters are whole UTC days,
+    so they align with hour buckets); only recent errors read request_analytics.
+    Percentiles are estimated from the rollups' latency histograms.
+    """
     try:
-        # Build comprehensive filter with proper datetime conversion including timezone
+        # Filters shared by the rollup tables and request_analytics. The date bounds go
+        # last, so the last-hour query can reuse the other placeholders without them.
         conditions = []
         params = []
         param_count = 0
         
-        if date_from:
-            param_count += 1
-            conditions.append(f"created_at >= ${param_count}")
-            start_datetime = datetime.strptime(date_from, '%Y-%m-%d').replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc)
-            params.append(start_datetime)
-        
-        if date_to:
-            param_count += 1
-            conditions.append(f"created_at <= ${param_count}")
-            end_datetime = datetime.strptime(date_to, '%Y-%m-%d').replace(hour=23, minute=59, second=59, microsecond=999999, tzinfo=timezone.utc)
-            params.append(end_datetime)
-        
         if endpoint:
             param_count += 1
             conditions.append(f"endpoint ILIKE ${param_count}")
@@ -18016,82 +17959,80 @@ async def get_analytics_dashboard(
             conditions.append(f"status_code = ${param_count}")
             params.append(status_code)
         
-        where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+        filter_params = list(params)
+        time_conditions = []
+        
+        if date_from:
+            param_count += 1
+            time_conditions.append(f"{{column}} >= ${param_count}")
+            start_datetime = datetime.strptime(date_from, '%Y-%m-%d').replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc)
+            params.append(start_datetime)
         
-        print(f"=== DASHBOARD DEBUG: Filter and params ===")
-        print(f"where_clause: {where_clause}")
-        print(f"params: {params}")
-        print(f"=== END FILTER ===")
+        if date_to:
+            param_count += 1
+            time_conditions.append(f"{{column}} <= ${param_count}")
+            end_datetime = datetime.strptime(date_to, '%Y-%m-%d').replace(hour=23, minute=59, second=59, microsecond=999999, tzinfo=timezone.utc)
+            params.append(end_datetime)
+        
+        def build_where(time_column: str) -> str:
+            clauses = conditions + [c.format(column=time_column) for c in time_conditions]
+            return "WHERE " + " AND ".join(clauses) if clauses else ""
+        
+        where_clause = build_where("bucket")
+        raw_where_clause = build_where("created_at")
 
         async with pool.acquire() as conn:
             # Overall statistics
             stats_query = f"""
                 SELECT 
-                    COUNT(*) as total_requests,
-                    COUNT(CASE WHEN status_code >= 200 AND status_code < 300 THEN 1 END) as successful_requests,
-                    COUNT(CASE WHEN status_code >= 400 THEN 1 END) as failed_requests,
-                    COUNT(CASE WHEN error_message IS NOT NULL THEN 1 END) as error_requests,
-                    AVG(response_time_ms) as avg_response_time,
-                    MAX(response_time_ms) as max_response_time,
-                    MIN(response_time_ms) as min_response_time,
-                    SUM(COALESCE(request_size_bytes, 0) + COALESCE(response_size_bytes, 0)) as total_data_transferred,
-                    COUNT(DISTINCT user_id) as unique_users,
+                    COALESCE(SUM(request_count), 0)::bigint as total_requests,
+                    COALESCE(SUM(request_count) FILTER (WHERE status_code >= 200 AND status_code < 300), 0)::bigint as successful_requests,
+                    COALESCE(SUM(request_count) FILTER (WHERE status_code >= 400), 0)::bigint as failed_requests,
+                    COALESCE(SUM(error_count), 0)::bigint as error_requests,
+                    COALESCE(SUM(timeout_count), 0)::bigint as timeout_requests,
+                    SUM(response_time_sum)::numeric / NULLIF(SUM(request_count), 0) as avg_response_time,
+                    MAX(response_time_max) as max_response_time,
+                    MIN(response_time_min) as min_response_time,
+                    SUM(data_bytes)::bigint as total_data_transferred,
                     COUNT(DISTINCT endpoint) as unique_endpoints,
-                    COUNT(CASE WHEN is_ai_parser_request THEN 1 END) as ai_parser_requests,
-                    AVG(ai_parser_tokens) as avg_ai_parser_tokens,
-                    MAX(ai_parser_tokens) as max_ai_parser_tokens,
-                    MIN(ai_parser_tokens) as min_ai_parser_tokens,
-                    SUM(ai_parser_tokens) as total_ai_parser_tokens
-                FROM request_analytics
+                    COALESCE(SUM(ai_parser_requests), 0)::bigint as ai_parser_requests,
+                    SUM(ai_parser_tokens_sum)::numeric / NULLIF(SUM(ai_parser_token_rows), 0) as avg_ai_parser_tokens,
+                    MAX(ai_parser_tokens_max) as max_ai_parser_tokens,
+                    MIN(ai_parser_tokens_min) as min_ai_parser_tokens,
+                    (SUM(ai_parser_tokens_sum) FILTER (WHERE ai_parser_token_rows > 0))::bigint as total_ai_parser_tokens
+                FROM request_analytics_rollup_hour
                 {where_clause}
             """
-            print(f"=== DASHBOARD DEBUG: Stats query ===")
-            print(f"Query: {stats_query}")
-            print(f"Params: {params}")
             stats_row = await conn.fetchrow(stats_query, *params)
-            print(f"Stats result: {dict(stats_row) if stats_row else 'None'}")
-            
-            # Debug AI parser specific data
-            if stats_row:
-                print(f"=== AI PARSER DEBUG ===")
-                print(f"ai_parser_requests: {stats_row['ai_parser_requests']}")
-                print(f"avg_ai_parser_tokens: {stats_row['avg_ai_parser_tokens']}")
-                print(f"max_ai_parser_tokens: {stats_row['max_ai_parser_tokens']}")
-                print(f"min_ai_parser_tokens: {stats_row['min_ai_parser_tokens']}")
-                print(f"total_ai_parser_tokens: {stats_row['total_ai_parser_tokens']}")
-                print(f"=== END AI PARSER DEBUG ===")
             
-            print(f"=== END STATS ===")
+            unique_users = await conn.fetchval(
+                f"SELECT COUNT(DISTINCT user_id) FROM request_analytics_rollup_user_hour {where_clause}", *params
+            )
             
             # Status code distribution
             status_query = f"""
                 SELECT 
                     status_code,
-                    COUNT(*) as count,
-                    AVG(response_time_ms) as avg_time
-                FROM request_analytics
+                    SUM(request_count)::bigint as count,
+                    SUM(response_time_sum)::numeric / NULLIF(SUM(request_count), 0) as avg_time
+                FROM request_analytics_rollup_hour
                 {where_clause}
                 GROUP BY status_code
                 ORDER BY count DESC
             """
-            print(f"=== DASHBOARD DEBUG: Status query ===")
-            print(f"Query: {status_query}")
-            print(f"Params: {params}")
             status_rows = await conn.fetch(status_query, *params)
-            print(f"Status rows count: {len(status_rows)}")
-            print(f"Status results: {[dict(row) for row in status_rows]}")
-            print(f"=== END STATUS ===")
             
             # Top endpoints by request count
             endpoints_query = f"""
                 SELECT 
                     endpoint,
                     method,
-                    COUNT(*) as request_count,
-                    AVG(response_time_ms) as avg_response_time,
-                    COUNT(CASE WHEN status_code >= 400 THEN 1 END) as error_count,
-                    SUM(COALESCE(request_size_bytes, 0) + COALESCE(response_size_bytes, 0)) as total_data
-                FROM request_analytics
+                    SUM(request_count)::bigint as request_count,
+                    SUM(response_time_sum)::numeric / NULLIF(SUM(request_count), 0) as avg_response_time,
+                    COALESCE(SUM(request_count) FILTER (WHERE status_code >= 400), 0)::bigint as error_count,
+                    SUM(timeout_count)::bigint as timeout_count,
+                    SUM(data_bytes)::bigint as total_data
+                FROM request_analytics_rollup_hour
                 {where_clause}
                 GROUP BY endpoint, method
                 ORDER BY request_count DESC
@@ -18103,13 +18044,12 @@ async def get_analytics_dashboard(
             users_query = f"""
                 SELECT 
                     user_id,
-                    COUNT(*) as request_count,
-                    AVG(response_time_ms) as avg_response_time,
-                    COUNT(CASE WHEN status_code >= 400 THEN 1 END) as error_count,
-                    MAX(created_at) as last_request
-                FROM request_analytics
+                    SUM(request_count)::bigint as request_count,
+                    SUM(response_time_sum)::numeric / NULLIF(SUM(request_count), 0) as avg_response_time,
+                    COALESCE(SUM(request_count) FILTER (WHERE status_code >= 400), 0)::bigint as error_count,
+                    MAX(last_request) as last_request
+                FROM request_analytics_rollup_user_hour
                 {where_clause}
-                {"AND user_id IS NOT NULL" if where_clause else "WHERE user_id IS NOT NULL"}
                 GROUP BY user_id
                 ORDER BY request_count DESC
                 LIMIT 20
@@ -18119,12 +18059,12 @@ async def get_analytics_dashboard(
             # Hourly distribution
             hourly_query = f"""
                 SELECT 
-                    EXTRACT(HOUR FROM created_at) as hour,
-                    COUNT(*) as request_count,
-                    AVG(response_time_ms) as avg_response_time
-                FROM request_analytics
+                    EXTRACT(HOUR FROM bucket) as hour,
+                    SUM(request_count)::bigint as request_count,
+                    SUM(response_time_sum)::numeric / NULLIF(SUM(request_count), 0) as avg_response_time
+                FROM request_analytics_rollup_hour
                 {where_clause}
-                GROUP BY EXTRACT(HOUR FROM created_at)
+                GROUP BY EXTRACT(HOUR FROM bucket)
                 ORDER BY hour
             """
             hourly_rows = await conn.fetch(hourly_query, *params)
@@ -18132,13 +18072,13 @@ async def get_analytics_dashboard(
             # Daily distribution
             daily_query = f"""
                 SELECT 
-                    DATE(created_at) as date,
-                    COUNT(*) as request_count,
-                    AVG(response_time_ms) as avg_response_time,
-                    COUNT(CASE WHEN status_code >= 400 THEN 1 END) as error_count
-                FROM request_analytics
+                    DATE(bucket) as date,
+                    SUM(request_count)::bigint as request_count,
+                    SUM(response_time_sum)::numeric / NULLIF(SUM(request_count), 0) as avg_response_time,
+                    COALESCE(SUM(request_count) FILTER (WHERE status_code >= 400), 0)::bigint as error_count
+                FROM request_analytics_rollup_hour
                 {where_clause}
-                GROUP BY DATE(created_at)
+                GROUP BY DATE(bucket)
                 ORDER BY date DESC
                 LIMIT 30
             """
@@ -18148,17 +18088,33 @@ async def get_analytics_dashboard(
             method_query = f"""
                 SELECT 
                     method,
-                    COUNT(*) as request_count,
-                    AVG(response_time_ms) as avg_response_time,
-                    COUNT(CASE WHEN status_code >= 400 THEN 1 END) as error_count
-                FROM request_analytics
+                    SUM(request_count)::bigint as request_count,
+                    SUM(response_time_sum)::numeric / NULLIF(SUM(request_count), 0) as avg_response_time,
+                    COALESCE(SUM(request_count) FILTER (WHERE status_code >= 400), 0)::bigint as error_count
+                FROM request_analytics_rollup_hour
                 {where_clause}
                 GROUP BY method
                 ORDER BY request_count DESC
             """
             method_rows = await conn.fetch(method_query, *params)
             
-            # Recent errors
+            # Last hour, per minute (date filters do not apply)
+            minute_where = "WHERE " + " AND ".join(conditions + ["bucket >= date_trunc('minute', now()) - interval '59 minutes'"])
+            minute_query = f"""
+                SELECT 
+                    bucket as minute,
+                    SUM(request_count)::bigint as request_count,
+                    SUM(response_time_sum)::numeric / NULLIF(SUM(request_count), 0) as avg_response_time,
+                    COALESCE(SUM(request_count) FILTER (WHERE status_code >= 400), 0)::bigint as error_count,
+                    SUM(timeout_count)::bigint as timeout_count
+                FROM request_analytics_rollup_minute
+                {minute_where}
+                GROUP BY bucket
+                ORDER BY bucket
+            """
+            minute_rows = await conn.fetch(minute_query, *filter_params)
+            
+            # Recent errors (partial index on request_analytics keeps this to the newest error rows)
             errors_query = f"""
                 SELECT 
                     id,
@@ -18172,23 +18128,28 @@ async def get_analytics_dashboard(
                     (status_code IN (408, 504) OR (error_message ILIKE '%timeout%' OR error_message ILIKE '%timed out%' OR error_message ILIKE '%Timeout%')) AS is_timeout,
                     created_at
                 FROM request_analytics
-                {where_clause}
-                {"AND (error_message IS NOT NULL OR status_code >= 400)" if where_clause else "WHERE error_message IS NOT NULL OR status_code >= 400"}
+                {raw_where_clause}
+                {"AND (error_message IS NOT NULL OR status_code >= 400)" if raw_where_clause else "WHERE error_message IS NOT NULL OR status_code >= 400"}
                 ORDER BY created_at DESC
                 LIMIT 50
             """
             errors_rows = await conn.fetch(errors_query, *params)
             
-            # Performance percentiles
-            percentile_query = f"""
-                SELECT 
-                    percentile_cont(0.5) WITHIN GROUP (ORDER BY response_time_ms) as p50,
-                    percentile_cont(0.95) WITHIN GROUP (ORDER BY response_time_ms) as p95,
-                    percentile_cont(0.99) WITHIN GROUP (ORDER BY response_time_ms) as p99
-                FROM request_analytics
+            # Performance percentiles from the merged latency histograms
+            histogram_query = f"""
+                SELECT h.i, SUM(h.n)::bigint as n
+                FROM request_analytics_rollup_hour, unnest(latency_histogram) WITH ORDINALITY AS h(n, i)
                 {where_clause}
+                GROUP BY h.i
+                ORDER BY h.i
             """
-            percentile_row = await conn.fetchrow(percentile_query, *params)
+            histogram_rows = await conn.fetch(histogram_query, *params)
+
+        histogram = [row["n"] for row in histogram_rows]
+        percentiles = {
+            name: histogram_percentile(histogram, q, stats_row["min_response_time"], stats_row["max_response_time"])
+            for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+        }
 
         response_data = {
             "overview": {
@@ -18196,12 +18157,13 @@ async def get_analytics_dashboard(
                 "successful_requests": stats_row["successful_requests"],
                 "failed_requests": stats_row["failed_requests"],
                 "error_requests": stats_row["error_requests"],
+                "timeout_requests": stats_row["timeout_requests"],
                 "success_rate": round((stats_row["successful_requests"] / stats_row["total_requests"]) * 100, 2) if stats_row["total_requests"] > 0 else 0,
                 "avg_response_time": round(stats_row["avg_response_time"], 2) if stats_row["avg_response_time"] else 0,
                 "max_response_time": stats_row["max_response_time"],
                 "min_response_time": stats_row["min_response_time"],
                 "total_data_transferred": stats_row["total_data_transferred"],
-                "unique_users": stats_row["unique_users"],
+                "unique_users": unique_users,
                 "unique_endpoints": stats_row["unique_endpoints"],
                 "ai_parser_requests": stats_row["ai_parser_requests"] or 0,
                 "avg_ai_parser_tokens": round(stats_row["avg_ai_parser_tokens"], 2) if stats_row["avg_ai_parser_tokens"] else 0,
@@ -18217,6 +18179,7 @@ async def get_analytics_dashboard(
                 "avg_response_time": round(row["avg_response_time"], 2) if row["avg_response_time"] else 0,
                 "error_count": row["error_count"],
                 "error_rate": round((row["error_count"] / row["request_count"]) * 100, 2) if row["request_count"] > 0 else 0,
+                "timeout_count": row["timeout_count"],
                 "total_data": row["total_data"]
             } for row in endpoints_rows],
             "top_users": [{
@@ -18239,6 +18202,13 @@ async def get_analytics_dashboard(
                 "avg_response_time": round(row["avg_response_time"], 2) if row["avg_response_time"] else 0,
                 "error_count": row["error_count"]
             } for row in method_rows],
+            "minute_distribution": [{
+                "minute": row["minute"].isoformat(),
+                "request_count": row["request_count"],
+                "avg_response_time": round(row["avg_response_time"], 2) if row["avg_response_time"] else 0,
+                "error_count": row["error_count"],
+                "timeout_count": row["timeout_count"]
+            } for row in minute_rows],
             "recent_errors": [{
                 "id": row["id"],
                 "endpoint": row["endpoint"],
@@ -18252,18 +18222,10 @@ async def get_analytics_dashboard(
                 "created_at": row["created_at"].isoformat()
             } for row in errors_rows],
             "performance_percentiles": {
-                "p50": round(percentile_row["p50"], 2) if percentile_row["p50"] else 0,
-                "p95": round(percentile_row["p95"], 2) if percentile_row["p95"] else 0,
-                "p99": round(percentile_row["p99"], 2) if percentile_row["p99"] else 0
+                name: round(value, 2) if value else 0 for name, value in percentiles.items()
             }
         }
         
-        print(f"=== DASHBOARD DEBUG: Final response ===")
-        print(f"Response overview: {response_data['overview']}")
-        print(f"Status distribution count: {len(response_data['status_distribution'])}")
-        print(f"Top endpoints count: {len(response_data['top_endpoints'])}")
-        print(f"=== END FINAL RESPONSE ===")
-        
         return response_data
     except Exception as e:
         logger.error(f"Error fetching analytics dashboard: {e}")
@@ -18368,6 +18330,9 @@ async def get_analytics_requests(
         raise HTTPException(status_code=500, detail="Failed to fetch request data")
 
 
+# Rows fetched per cursor round trip (and written per response chunk) by the analytics export
+ANALYTICS_EXPORT_BATCH_SIZE = 2000
+
 @app.get("/api/custom/analytics/export")
 async def export_analytics_data(
     date_from: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
@@ -18413,23 +18378,36 @@ async def export_analytics_data(
             params.append(status_code)
         
         where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
-
-        async with pool.acquire() as conn:
-            query = f"""
-                SELECT 
-                    id, endpoint, method, user_id, status_code, 
-                    response_time_ms, request_size_bytes, response_size_bytes,
-                    error_message, created_at
-                FROM request_analytics
-                {where_clause}
-                ORDER BY created_at DESC
-            """
-            rows = await conn.fetch(query, *params)
-            
-            if format.lower() == "csv":
-                import csv
-                import io
-                
+        query = f"""
+            SELECT 
+                id, endpoint, method, user_id, status_code, 
+                response_time_ms, request_size_bytes, response_size_bytes,
+                error_message, created_at
+            FROM request_analytics
+            {where_clause}
+            ORDER BY created_at DESC
+        """
+        
+        async def iter_rows():
+            # Server-side cursor: rows are fetched and sent in chunks instead of loaded at once
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    batch = []
+                    async for row in conn.cursor(query, *params, prefetch=ANALYTICS_EXPORT_BATCH_SIZE):
+                        batch.append(row)
+                        if len(batch) >= ANALYTICS_EXPORT_BATCH_SIZE:
+                            yield batch
+                            batch = []
+                    if batch:
+                        yield batch
+        
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        
+        if format.lower() == "csv":
+            import csv
+            import io
+            
+            async def csv_chunks():
                 output = io.StringIO()
                 writer = csv.writer(output)
                 
@@ -18441,38 +18419,54 @@ async def export_analytics_data(
                 ])
                 
                 # Write data
-                for row in rows:
-                    writer.writerow([
-                        row["id"], row["endpoint"], row["method"], row["user_id"],
-                        row["status_code"], row["response_time_ms"],
-                        row["request_size_bytes"], row["response_size_bytes"],
-                        row["error_message"], row["created_at"].isoformat()
-                    ])
-                
-                return StreamingResponse(
-                    io.BytesIO(output.getvalue().encode()),
-                    media_type="text/csv",
-                    headers={"Content-Disposition": f"attachment; filename=analytics_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"}
-                )
-            else:
-                # JSON format
-                data = [{
-                    "id": row["id"],
-                    "endpoint": row["endpoint"],
-                    "method": row["method"],
-                    "user_id": row["user_id"],
-                    "status_code": row["status_code"],
-                    "response_time_ms": row["response_time_ms"],
-                    "request_size_bytes": row["request_size_bytes"],
-                    "response_size_bytes": row["response_size_bytes"],
-                    "error_message": row["error_message"],
-                    "created_at": row["created_at"].isoformat()
-                } for row in rows]
-                
-                return JSONResponse(
-                    content=data,
-                    headers={"Content-Disposition": f"attachment; filename=analytics_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"}
-                )
+                async for rows in iter_rows():
+                    for row in rows:
+                        writer.writerow([
+                            row["id"], row["endpoint"], row["method"], row["user_id"],
+                            row["status_code"], row["response_time_ms"],
+                            row["request_size_bytes"], row["response_size_bytes"],
+                            row["error_message"], row["created_at"].isoformat()
+                        ])
+                    yield output.getvalue().encode()
+                    output.seek(0)
+                    output.truncate(0)
+                if output.tell():
+                    yield output.getvalue().encode()
+            
+            return StreamingResponse(
+                csv_chunks(),
+                media_type="text/csv",
+                headers={"Content-Disposition": f"attachment; filename=analytics_export_{timestamp}.csv"}
+            )
+        else:
+            # JSON format, written as one array element per row
+            async def json_chunks():
+                yield b"["
+                first = True
+                async for rows in iter_rows():
+                    parts = []
+                    for row in rows:
+                        parts.append(json.dumps({
+                            "id": row["id"],
+                            "endpoint": row["endpoint"],
+                            "method": row["method"],
+                            "user_id": row["user_id"],
+                            "status_code": row["status_code"],
+                            "response_time_ms": row["response_time_ms"],
+                            "request_size_bytes": row["request_size_bytes"],
+                            "response_size_bytes": row["response_size_bytes"],
+                            "error_message": row["error_message"],
+                            "created_at": row["created_at"].isoformat()
+                        }))
+                    yield (("" if first else ",") + ",".join(parts)).encode()
+                    first = False
+                yield b"]"
+            
+            return StreamingResponse(
+                json_chunks(),
+                media_type="application/json",
+                headers={"Content-Disposition": f"attachment; filename=analytics_export_{timestamp}.json"}
+            )
                 
     except Exception as e:
         logger.error(f"Error exporting analytics data: {e}")
@@ -20255,8 +20249,9 @@ async def create_audit_onepager(duckduckgo_summary, example_text_path, payload,
     result = response.choices[0].message.content
     logger.info(f"[AI-Audit] OpenAI result (first 500 chars): {result[:500]}")
 
-    with open("custom_assistants/content_builder_ai.txt", encoding="utf-8") as f:
-        assistant_instructions = f.read()
+    assistant_instructions = PROMPT_REGISTRY.get("content_builder_ai.txt")
+    if assistant_instructions is None:
+        raise FileNotFoundError("custom_assistants/content_builder_ai.txt")
 
     # Compose the parsing prompt
     parsing_prompt = (
@@ -30291,17 +30286,8 @@ async def update_project_in_db(project_id: int, project_update_data: ProjectUpda
                 WHERE p.id = $1 AND (
                     p.onyx_user_id = $2 
                     OR EXISTS (
-                        SELECT 1 FROM product_access pa
-                        INNER JOIN workspace_members wm ON pa.workspace_id = wm.workspace_id
-                        WHERE pa.product_id = p.id 
-                          AND wm.user_id = $3 
-                          AND wm.status = 'active'
-                          AND pa.access_type IN ('workspace', 'role', 'individual')
-                          AND (
-                              pa.access_type = 'workspace' 
-                              OR (pa.access_type = 'role' AND (pa.target_id = CAST(wm.role_id AS TEXT) OR pa.target_id IN (SELECT name FROM workspace_roles WHERE id = wm.role_id)))
-                              OR (pa.access_type = 'individual' AND pa.target_id = $3)
-                          )
+                        SELECT 1 FROM user_product_access upa
+                        WHERE upa.product_id = p.id AND upa.user_key = $3
                     )
                 )
             """, project_id, user_uuid, user_email)
@@ -31347,17 +31333,8 @@ async def get_project_lesson_data(project_id: int, request: Request, pool: async
                 WHERE p.id = $1 AND (
                     p.onyx_user_id = $2 
                     OR EXISTS (
-                        SELECT 1 FROM product_access pa
-                        INNER JOIN workspace_members wm ON pa.workspace_id = wm.workspace_id
-                        WHERE pa.product_id = p.id 
-                          AND wm.user_id = $3 
-                          AND wm.status = 'active'
-                          AND pa.access_type IN ('workspace', 'role', 'individual')
-                          AND (
-                              pa.access_type = 'workspace' 
-                              OR (pa.access_type = 'role' AND (pa.target_id = CAST(wm.role_id AS TEXT) OR pa.target_id IN (SELECT name FROM workspace_roles WHERE id = wm.role_id)))
-                              OR (pa.access_type = 'individual' AND pa.target_id = $3)
-                          )
+                        SELECT 1 FROM user_product_access upa
+                        WHERE upa.product_id = p.id AND upa.user_key = $3
                     )
                 )
             """, project_id, user_uuid, user_email)
@@ -38798,6 +38775,12 @@ except Exception as e:
     logger.warning(f"Presentation service not available: {e}")
     presentation_service = None
 
+@app.on_event("startup")
+async def startup_event_presentation_workers():
+    # Registered after startup_event, so DB_POOL is ready; jobs fall back to memory without it
+    if presentation_service:
+        await presentation_service.start(lambda: DB_POOL)
+
 @app.get("/api/custom/video/avatars")
 async def get_avatars():
     """Get available avatars from Elai API."""
@@ -41056,6 +41039,7 @@ async def get_smartdrive_login_credentials(
                         """,
                         row["onyx_user_id"], userid, encrypted, base_url, datetime.now(timezone.utc)
                     )
+                    NEXTCLOUD_GATEWAY.invalidate_credentials(str(row["onyx_user_id"]))
 
                     # Clean default skeleton files with a single comprehensive pass
                     try:
@@ -41188,6 +41172,7 @@ async def set_smartdrive_credentials(
                 nextcloud_base_url,
                 datetime.now(timezone.utc)
             )
+            NEXTCLOUD_GATEWAY.invalidate_credentials(str(onyx_user_id))
             
         logger.info(f"Updated Nextcloud credentials for user: {onyx_user_id}")
         return {"success": True, "message": "Nextcloud credentials saved successfully"}
@@ -41299,6 +41284,7 @@ async def list_smartdrive_files(
                         """,
                         onyx_user_id, userid, encrypted, base_url, datetime.now(timezone.utc)
                     )
+                    NEXTCLOUD_GATEWAY.invalidate_credentials(str(onyx_user_id))
 
                     # Clean default skeleton files using comprehensive cleanup function
                     try:
@@ -41354,45 +41340,20 @@ async def list_smartdrive_files(
                     raise HTTPException(status_code=500, detail="Failed to auto-provision SmartDrive account")
 
             # Use Nextcloud WebDAV API to list files with the user's individual credentials
-            username, password, base_url, _ = await _get_nextcloud_credentials(conn, onyx_user_id)
-            # Encode DAV path segments to handle special characters like '#'
-            webdav_url = f"{base_url}/remote.php/dav/files/{username}{_encode_dav_path(path)}"
-            auth = (username, password)
-            
+            creds = await _get_nextcloud_credentials_cached(conn, onyx_user_id)
+
             try:
-                async with httpx.AsyncClient() as client:
-                    response = await client.request(
-                        "PROPFIND", 
-                        webdav_url,
-                        auth=auth,
-                        headers={
-                            "Depth": "1",
-                            "Content-Type": "application/xml"
-                        },
-                        content="""<?xml version="1.0"?>
-                        <d:propfind xmlns:d="DAV:" xmlns:oc="http://owncloud.org/ns">
-                            <d:prop>
-                                <d:resourcetype/>
-                                <d:getcontentlength/>
-                                <d:getlastmodified/>
-                                <d:getcontenttype/>
-                            </d:prop>
-                        </d:propfind>"""
-                    )
-                    
-                    if response.status_code == 207:  # Multi-Status response
-                        # Parse WebDAV XML response
-                        files = await parse_webdav_response(response.text, path)
-                        return {
-                            "files": files,
-                            "path": path,
-                            "total_count": len(files)
-                        }
-                    else:
-                        logger.error(f"Nextcloud WebDAV error: {response.status_code} - {response.text}")
-                        # Fallback to mock data if Nextcloud is unavailable
-                        return await get_mock_files_response(path)
-                        
+                # Served from the per-user listing cache while the folder's etag is unchanged
+                files = await NEXTCLOUD_GATEWAY.list_directory(creds, path)
+                return {
+                    "files": files,
+                    "path": path,
+                    "total_count": len(files)
+                }
+            except WebDAVError as dav_error:
+                logger.error(f"Nextcloud WebDAV error: {dav_error}")
+                # Fallback to mock data if Nextcloud is unavailable
+                return await get_mock_files_response(path)
             except Exception as nextcloud_error:
                 logger.error(f"Failed to connect to Nextcloud: {nextcloud_error}")
                 # Fallback to mock data if Nextcloud is unavailable
@@ -41404,98 +41365,13 @@ async def list_smartdrive_files(
 
 async def parse_webdav_response(xml_content: str, base_path: str) -> List[Dict]:
     """Parse WebDAV PROPFIND XML response into file list"""
-    # Simple XML parsing for WebDAV response
-    import xml.etree.ElementTree as ET
-    
-    files = []
+    parser = MultiStatusParser()
     try:
-        root = ET.fromstring(xml_content)
-        
-        for response in root.findall('.//{DAV:}response'):
-            href = response.find('.//{DAV:}href')
-            if href is None:
-                continue
-                
-            file_path = href.text
-            if file_path.endswith('/remote.php/dav/files/'):
-                continue  # Skip the root directory entry
-                
-            # Extract relative path by removing the WebDAV prefix
-            # file_path looks like: /smartdrive/remote.php/dav/files/username/Documents/file.txt
-            # We want just: /Documents/file.txt
-            if '/remote.php/dav/files/' in file_path:
-                # Find the username part and extract everything after it
-                parts = file_path.split('/remote.php/dav/files/')
-                if len(parts) > 1:
-                    # parts[1] is like "username/Documents/file.txt"
-                    username_and_path = parts[1]
-                    # Split by first "/" to separate username from the actual path
-                    path_parts = username_and_path.split('/', 1)
-                    if len(path_parts) > 1:
-                        # This is the actual relative path we want
-                        relative_path = '/' + path_parts[1]
-                    else:
-                        # Just the username, so root path
-                        relative_path = '/'
-                else:
-                    relative_path = '/'
-            else:
-                relative_path = file_path
-                
-            # Decode relative path for human-readable output
-            try:
-                from urllib.parse import unquote as _unquote
-                relative_path = _unquote(relative_path)
-            except Exception:
-                pass
-            # Extract file name
-            name = relative_path.split('/')[-1] if not relative_path.endswith('/') else relative_path.split('/')[-2]
-            # Ensure name is decoded
-            try:
-                from urllib.parse import unquote as _unquote
-                name = _unquote(name)
-            except Exception:
-                pass
-            if not name:
-                continue
-                
-            # Check if it's a directory
-            resourcetype = response.find('.//{DAV:}resourcetype')
-            is_directory = resourcetype is not None and resourcetype.find('.//{DAV:}collection') is not None
-            
-            # Get file size
-            size_elem = response.find('.//{DAV:}getcontentlength')
-            size = int(size_elem.text) if size_elem is not None and size_elem.text else None
-            
-            # Get last modified
-            modified_elem = response.find('.//{DAV:}getlastmodified')
-            modified = modified_elem.text if modified_elem is not None else None
-            
-            # Get content type
-            content_type_elem = response.find('.//{DAV:}getcontenttype')
-            mime_type = content_type_elem.text if content_type_elem is not None else None
-            
-            # Get ETag
-            etag_elem = response.find('.//{DAV:}getetag')
-            etag = etag_elem.text if etag_elem is not None else None
-            # Remove quotes from ETag if present
-            if etag and etag.startswith('"') and etag.endswith('"'):
-                etag = etag[1:-1]
-            
-            files.append({
-                "name": name,
-                "path": relative_path,
-                "type": "directory" if is_directory else "file",
-                "size": size,
-                "modified": modified,
-                "mime_type": mime_type,
-                "etag": etag
-            })
-            
+        parser.feed(xml_content)
+        parser.close()
     except Exception as e:
         logger.error(f"Error parsing WebDAV response: {e}")
-        
-    return files
+    return parser.files
 
 # --- Date Parsing Functions ---
 def parse_http_date(date_string: str) -> datetime:
@@ -41831,8 +41707,8 @@ async def smartdrive_mkdir(
 
         # Create target folder (MKCOL)
         target = _ensure_trailing_slash(_encode_dav_path(user_root_prefix + path))
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            resp = await client.request("MKCOL", f"{webdav_user_base}{target}", auth=(username, password))
+        resp = await NEXTCLOUD_GATEWAY.client(base_url).request("MKCOL", f"{webdav_user_base}{target}", auth=(username, password), timeout=30.0)
+        NEXTCLOUD_GATEWAY.invalidate_listings(username, [user_root_prefix + path])
         if resp.status_code in (201, 405):  # created or already exists
             return {"success": True}
         raise HTTPException(status_code=_map_webdav_status(resp.status_code), detail=_dav_error(resp))
@@ -41862,7 +41738,8 @@ async def smartdrive_upload(
         await _ensure_folder_tree(webdav_user_base, _ensure_trailing_slash(_encode_dav_path(user_root_prefix + norm_dir)), auth=(username, password))
 
         results: List[Dict[str, Any]] = []
-        async with httpx.AsyncClient(timeout=None) as client:
+        client = NEXTCLOUD_GATEWAY.client(base_url)
+        try:
             for f in files:
                 safe_name = _sanitize_filename(f.filename or "upload.bin")
                 # Encode destination path and filename for WebDAV
@@ -41881,7 +41758,7 @@ async def smartdrive_upload(
                         file_size += len(chunk)
                         yield chunk
 
-                resp = await client.put(dest_url, auth=(username, password), content=aiter())
+                resp = await client.put(dest_url, auth=(username, password), content=aiter(), timeout=None)
                 entry: Dict[str, Any] = {"file": safe_name, "success": resp.status_code in (200, 201, 204), "status": resp.status_code, "size": file_size}
                 if not entry["success"]:
                     entry["error"] = _dav_error(resp)
@@ -41900,10 +41777,11 @@ async def smartdrive_upload(
                             async with pool.acquire() as conn2:
                                 await conn2.execute(
                                     """
-                                    INSERT INTO smartdrive_imports (onyx_user_id, smartdrive_path, onyx_file_id, etag, checksum, imported_at)
-                                    VALUES ($1, $2, $3, $4, $5, $6)
+                                    INSERT INTO smartdrive_imports (onyx_user_id, smartdrive_path, onyx_file_id, etag, checksum, imported_at, file_size, mime_type, estimated_tokens)
+                                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
                                     ON CONFLICT (onyx_user_id, smartdrive_path)
-                                    DO UPDATE SET onyx_file_id = EXCLUDED.onyx_file_id, etag = EXCLUDED.etag, checksum = EXCLUDED.checksum, imported_at = EXCLUDED.imported_at
+                                    DO UPDATE SET onyx_file_id = EXCLUDED.onyx_file_id, etag = EXCLUDED.etag, checksum = EXCLUDED.checksum, imported_at = EXCLUDED.imported_at,
+                                                  file_size = EXCLUDED.file_size, mime_type = EXCLUDED.mime_type, estimated_tokens = EXCLUDED.estimated_tokens
                                     """,
                                     str(onyx_user_id),
                                     smart_path,
@@ -41911,7 +41789,11 @@ async def smartdrive_upload(
                                     resp.headers.get("etag", f"etag_{hash(safe_name)}"),
                                     f"imported_{int(time.time())}",
                                     datetime.now(timezone.utc),
+                                    file_size,
+                                    f.content_type,
+                                    _smartdrive_token_estimate(smart_path, file_size, f.content_type),
                                 )
+                            SMARTDRIVE_INDEXING_PROGRESS.invalidate(str(onyx_user_id))
                     except Exception as import_err:
                         logger.warning(f"Post-upload Onyx import failed for {safe_name}: {import_err}")
                     
@@ -41934,6 +41816,8 @@ async def smartdrive_upload(
                     
                     results.append(entry)
                 await f.close()
+        finally:
+            NEXTCLOUD_GATEWAY.invalidate_listings(username, [user_root_prefix + norm_dir])
 
         # If any failed, return 207 multi-status style payload
         if any(not r["success"] for r in results):
@@ -42138,24 +42022,61 @@ def _estimate_tokens_from_file_type(file_path: str) -> int:
         return 1000  # Default for unknown types (2x faster)
 
 
+def _smartdrive_token_estimate(file_path: str, file_size_bytes: Optional[int], mime_type: Optional[str]) -> int:
+    """Token estimate stored with each SmartDrive import (and used for older imports without one)."""
+    if file_size_bytes:
+        return _estimate_tokens_from_file_info(file_path, int(file_size_bytes), mime_type or "")
+    return _estimate_tokens_from_file_type(file_path)
+
+
+# Per-user indexing progress snapshots for the SmartDrive UI poller
+SMARTDRIVE_INDEXING_PROGRESS = SmartDriveIndexingProgress(
+    get_pool=lambda: DB_POOL,
+    onyx_database_url=ONYX_DATABASE_URL,
+    estimate_tokens=_smartdrive_token_estimate,
+)
+
+# Pooled WebDAV clients, cached credentials and folder listings for SmartDrive
+NEXTCLOUD_GATEWAY = NextcloudGateway()
+
+# Streams SmartDrive files into Onyx, with per-file checkpoints in smartdrive_import_checkpoints
+SMARTDRIVE_IMPORTER = SmartDriveImporter(
+    get_pool=lambda: DB_POOL,
+    gateway=NEXTCLOUD_GATEWAY,
+    onyx_upload_url=f"{ONYX_API_SERVER_URL}/user/file/upload",
+    estimate_tokens=_smartdrive_token_estimate,
+)
+
+
+@app.on_event("startup")
+async def startup_event_smartdrive_importer():
+    # Registered after startup_event, so DB_POOL is ready
+    try:
+        await SMARTDRIVE_IMPORTER.ensure_schema()
+    except Exception as e:
+        logger.warning(f"[SmartDrive] Could not ensure import checkpoint table: {e}")
+
+
 @app.get("/api/custom/smartdrive/indexing-progress")
 async def smartdrive_indexing_progress(
     request: Request,
     paths: List[str] = Query([]),
+    wait: float = Query(0, ge=0, le=25, description="Long-poll: seconds to wait for a change from If-None-Match"),
     pool: asyncpg.Pool = Depends(get_db_pool)
 ):
-    """Get detailed indexing progress for SmartDrive files using IndexAttempt data."""
+    """
+    Get detailed indexing progress for SmartDrive files using IndexAttempt data.
+    Responses carry an ETag; a matching If-None-Match gets 304, after waiting up
+    to `wait` seconds for the progress to change.
+    """
     try:
         onyx_user_id = await get_current_onyx_user_id(request)
-        logger.info(f"[SmartDrive] IndexingProgress: user_id={onyx_user_id}, raw_paths={paths}")
         
         # Normalize paths
         norm_paths: List[str] = []
         for p in paths:
             try:
-                norm_p = await _normalize_smartdrive_path(p)
-                norm_paths.append(norm_p)
-                logger.info(f"[SmartDrive] IndexingProgress: normalized '{p}' -> '{norm_p}'")
+                norm_paths.append(await _normalize_smartdrive_path(p))
             except Exception as e:
                 logger.error(f"[SmartDrive] IndexingProgress: failed to normalize path '{p}': {e}")
                 continue
@@ -42164,157 +42085,35 @@ async def smartdrive_indexing_progress(
             logger.warning(f"[SmartDrive] IndexingProgress: no valid normalized paths")
             return {"progress": {}}
 
-        # Lookup Onyx file IDs and get token estimates
-        path_to_file_id: Dict[str, str] = {}
-        path_to_tokens: Dict[str, int] = {}
-        
-        async with pool.acquire() as conn:
-            logger.info(f"[SmartDrive] IndexingProgress: querying database for user_id={onyx_user_id}, paths={norm_paths}")
-            rows = await conn.fetch(
-                """
-                SELECT smartdrive_path, onyx_file_id
-                FROM smartdrive_imports
-                WHERE onyx_user_id = $1 AND smartdrive_path = ANY($2::text[])
-                """,
-                str(onyx_user_id),
-                norm_paths,
-            )
-            logger.info(f"[SmartDrive] IndexingProgress: found {len(rows)} records in database")
-            
-        for r in rows:
-            path = r["smartdrive_path"]
-            file_id = str(r["onyx_file_id"])
-            path_to_file_id[path] = file_id
-            logger.info(f"[SmartDrive] IndexingProgress: mapping path='{path}' -> onyx_file_id='{file_id}'")
-
-        if not path_to_file_id:
-            logger.warning(f"[SmartDrive] IndexingProgress: no file mappings found")
-            return {"progress": {p: None for p in norm_paths}}
+        session_cookies = {ONYX_SESSION_COOKIE_NAME: request.cookies.get(ONYX_SESSION_COOKIE_NAME)}
 
-        # Get token estimates for all files
-        for path in path_to_file_id.keys():
-            try:
-                # Use the existing token-estimate endpoint logic
-                file_id = path_to_file_id[path]
-                async with httpx.AsyncClient(timeout=10.0) as client:
-                    resp = await client.get(
-                        f"{ONYX_API_SERVER_URL}/user/file/token-estimate",
-                        params={"file_ids": file_id},
-                        cookies={ONYX_SESSION_COOKIE_NAME: request.cookies.get(ONYX_SESSION_COOKIE_NAME)},
-                    )
-                if resp.is_success:
-                    data = resp.json() or {}
-                    total_tokens = int(data.get("total_tokens") or 0)
-                    path_to_tokens[path] = total_tokens
-                    logger.info(f"[SmartDrive] IndexingProgress: path='{path}' tokens={total_tokens}")
-                else:
-                    logger.warning(f"[SmartDrive] IndexingProgress: token estimate request failed for path='{path}': {resp.status_code}")
-                    path_to_tokens[path] = 0
-            except Exception as e:
-                logger.warning(f"[SmartDrive] IndexingProgress: failed to get tokens for path='{path}': {e}")
-                path_to_tokens[path] = 0
-            
-            # If we still have 0 tokens, estimate based on file type and size
-            if path_to_tokens[path] == 0:
-                try:
-                    # Get file size from WebDAV HEAD request
-                    async with pool.acquire() as conn:
-                        username, password, base_url, user_root_prefix = await _get_nextcloud_credentials(conn, onyx_user_id)
-                    
-                    base = f"{base_url}/remote.php/dav/files/{username}"
-                    file_url = f"{base}{user_root_prefix}{path}"
-                    
-                    async with httpx.AsyncClient(timeout=10.0) as client:
-                        head = await client.head(file_url, auth=(username, password))
-                    
-                    if head.is_success:
-                        content_length = head.headers.get("content-length")
-                        mime_type = head.headers.get("content-type", "")
-                        
-                        if content_length and content_length.isdigit():
-                            file_size_bytes = int(content_length)
-                            estimated_tokens = _estimate_tokens_from_file_info(path, file_size_bytes, mime_type)
-                            path_to_tokens[path] = estimated_tokens
-                            logger.info(f"[SmartDrive] IndexingProgress: estimated tokens for path='{path}' (size={file_size_bytes} bytes, type={mime_type}): {estimated_tokens}")
-                        else:
-                            # Fallback to file type only
-                            estimated_tokens = _estimate_tokens_from_file_type(path)
-                            path_to_tokens[path] = estimated_tokens
-                            logger.info(f"[SmartDrive] IndexingProgress: fallback token estimate for path='{path}': {estimated_tokens}")
-                    else:
-                        # Fallback to file type only
-                        estimated_tokens = _estimate_tokens_from_file_type(path)
-                        path_to_tokens[path] = estimated_tokens
-                        logger.info(f"[SmartDrive] IndexingProgress: fallback token estimate for path='{path}': {estimated_tokens}")
-                        
-                except Exception as e:
-                    logger.warning(f"[SmartDrive] IndexingProgress: failed to get file size for path='{path}': {e}")
-                    # Final fallback to file type only
-                    estimated_tokens = _estimate_tokens_from_file_type(path)
-                    path_to_tokens[path] = estimated_tokens
-                    logger.info(f"[SmartDrive] IndexingProgress: final fallback token estimate for path='{path}': {estimated_tokens}")
+        async def indexing_status_from_api(file_ids: List[str]) -> Optional[Dict[str, bool]]:
+            # One batched call, only used when the Onyx database cannot be queried
+            async with httpx.AsyncClient(timeout=15.0) as client:
+                resp = await client.get(
+                    f"{ONYX_API_SERVER_URL}/user/file/indexing-status",
+                    params=[("file_ids", fid) for fid in file_ids],
+                    cookies=session_cookies,
+                )
+            if not resp.is_success:
+                logger.error(f"[SmartDrive] IndexingProgress: Onyx indexing status request failed: {resp.status_code}")
+                return None
+            return {str(k): bool(v) for k, v in (resp.json() or {}).items()}
 
-        # First, get the basic indexing status using the existing endpoint
-        file_ids = list(path_to_file_id.values())
-        query_params = []
-        for fid in file_ids:
-            query_params.append(("file_ids", fid))
-        
-        onyx_status_url = f"{ONYX_API_SERVER_URL}/user/file/indexing-status"
-        logger.info(f"[SmartDrive] IndexingProgress: querying Onyx indexing status at {onyx_status_url} with file_ids={file_ids}")
-        
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.get(
-                onyx_status_url,
-                params=query_params,
-                cookies={ONYX_SESSION_COOKIE_NAME: request.cookies.get(ONYX_SESSION_COOKIE_NAME)},
+        if_none_match = request.headers.get("if-none-match")
+        if wait and if_none_match:
+            progress_data, etag = await SMARTDRIVE_INDEXING_PROGRESS.wait_for_change(
+                str(onyx_user_id), norm_paths, if_none_match, wait, indexing_status_from_api
+            )
+        else:
+            progress_data, etag = await SMARTDRIVE_INDEXING_PROGRESS.snapshot(
+                str(onyx_user_id), norm_paths, indexing_status_from_api
             )
-        
-        if not resp.is_success:
-            logger.error(f"[SmartDrive] IndexingProgress: Onyx indexing status request failed: {resp.status_code}")
-            return {"progress": {p: None for p in norm_paths}}
-        
-        status_map = resp.json()  # {file_id: bool}
-        logger.info(f"[SmartDrive] IndexingProgress: Onyx indexing status response: {status_map}")
-
-        # Build progress data based on indexing status
-        progress_data = {}
-        for path, file_id in path_to_file_id.items():
-            is_indexed = bool(status_map.get(str(file_id)))
-            estimated_tokens = path_to_tokens.get(path, 0)
-            
-            if is_indexed:
-                # File is fully indexed
-                progress_data[path] = {
-                    "status": "success",
-                    "time_started": None,
-                    "time_updated": None,
-                    "total_docs_indexed": 1,  # Single file = 1 document
-                    "estimated_tokens": estimated_tokens,
-                    "is_complete": True
-                }
-                logger.info(f"[SmartDrive] IndexingProgress: path='{path}' is fully indexed")
-            else:
-                # File is still being indexed - provide enhanced progress data
-                # For now, we'll use a simple status with token-based estimation
-                progress_data[path] = {
-                    "status": "in_progress",
-                    "time_started": None,  # We don't have this from the basic endpoint
-                    "time_updated": None,
-                    "total_docs_indexed": 0,
-                    "estimated_tokens": estimated_tokens,
-                    "is_complete": False
-                }
-                logger.info(f"[SmartDrive] IndexingProgress: path='{path}' is still being indexed")
 
-        # Fill in missing paths
-        for p in norm_paths:
-            if p not in progress_data:
-                progress_data[p] = None
-                logger.info(f"[SmartDrive] IndexingProgress: no data for path='{p}' -> None")
-        
-        logger.info(f"[SmartDrive] IndexingProgress: returning progress data for {len(progress_data)} paths")
-        return {"progress": progress_data}
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if if_none_match == etag:
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(content={"progress": progress_data}, headers=headers)
         
     except HTTPException:
         raise
@@ -42358,8 +42157,9 @@ async def smartdrive_move(
         
         logger.info(f"[SmartDrive] MOVE: {source_url} -> Destination: {dest_url}")
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            resp = await client.request("MOVE", source_url, auth=(username, password), headers=headers)
+        client = NEXTCLOUD_GATEWAY.client(base_url)
+        resp = await client.request("MOVE", source_url, auth=(username, password), headers=headers, timeout=60.0)
+        NEXTCLOUD_GATEWAY.invalidate_listings(username, [user_root_prefix + src, user_root_prefix + dst])
         
         logger.info(f"[SmartDrive] MOVE response: status={resp.status_code}")
         
@@ -42391,8 +42191,8 @@ async def smartdrive_move(
             headers_retry = {"Destination": adjusted_dest, "Overwrite": "T"}
             logger.info(f"[SmartDrive] MOVE retry: {source_url} -> Destination: {adjusted_dest}")
             
-            async with httpx.AsyncClient(timeout=60.0) as client2:
-                resp2 = await client2.request("MOVE", source_url, auth=(username, password), headers=headers_retry)
+            resp2 = await client.request("MOVE", source_url, auth=(username, password), headers=headers_retry, timeout=60.0)
+            NEXTCLOUD_GATEWAY.invalidate_listings(username, [user_root_prefix + src, user_root_prefix + dst])
             
             logger.info(f"[SmartDrive] MOVE retry response: status={resp2.status_code}")
             if resp2.status_code in (200, 201, 204):
@@ -42460,8 +42260,9 @@ async def smartdrive_copy(
         
         logger.info(f"[SmartDrive] COPY: {source_url} -> Destination: {dest_url}")
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            resp = await client.request("COPY", source_url, auth=(username, password), headers=headers)
+        client = NEXTCLOUD_GATEWAY.client(base_url)
+        resp = await client.request("COPY", source_url, auth=(username, password), headers=headers, timeout=60.0)
+        NEXTCLOUD_GATEWAY.invalidate_listings(username, [user_root_prefix + dst, user_root_prefix + dst])
         
         logger.info(f"[SmartDrive] COPY response: status={resp.status_code}")
         
@@ -42479,8 +42280,8 @@ async def smartdrive_copy(
             headers_retry = {"Destination": adjusted_dest, "Overwrite": "T"}
             logger.info(f"[SmartDrive] COPY retry: {source_url} -> Destination: {adjusted_dest}")
             
-            async with httpx.AsyncClient(timeout=60.0) as client2:
-                resp2 = await client2.request("COPY", source_url, auth=(username, password), headers=headers_retry)
+            resp2 = await client.request("COPY", source_url, auth=(username, password), headers=headers_retry, timeout=60.0)
+            NEXTCLOUD_GATEWAY.invalidate_listings(username, [user_root_prefix + dst, user_root_prefix + dst])
             
             logger.info(f"[SmartDrive] COPY retry response: status={resp2.status_code}")
             if resp2.status_code in (200, 201, 204):
@@ -42516,11 +42317,14 @@ async def smartdrive_delete(
             username, password, base_url, user_root_prefix = await _get_nextcloud_credentials(conn, onyx_user_id)
         base = f"{base_url}/remote.php/dav/files/{username}"
         results: List[Dict[str, Any]] = []
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        client = NEXTCLOUD_GATEWAY.client(base_url)
+        try:
             for p in norm_paths:
-                resp = await client.delete(f"{base}{_encode_dav_path(user_root_prefix + p)}", auth=(username, password))
+                resp = await client.delete(f"{base}{_encode_dav_path(user_root_prefix + p)}", auth=(username, password), timeout=60.0)
                 ok = resp.status_code in (200, 204)
                 results.append({"path": p, "success": ok, "status": resp.status_code, "error": None if ok else _dav_error(resp)})
+        finally:
+            NEXTCLOUD_GATEWAY.invalidate_listings(username, [user_root_prefix + p for p in norm_paths])
         if any(not r["success"] for r in results):
             return JSONResponse(status_code=207, content={"results": results})
         return {"success": True, "results": results}
@@ -42575,8 +42379,7 @@ async def smartdrive_token_estimate(
         # Otherwise use HEAD to get Content-Length and approximate
         base = f"{base_url}/remote.php/dav/files/{username}"
         file_url = f"{base}{_encode_dav_path(user_root_prefix + norm_path)}"
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            head = await client.head(file_url, auth=(username, password))
+        head = await NEXTCLOUD_GATEWAY.client(base_url).head(file_url, auth=(username, password), timeout=15.0)
         if not head.is_success:
             raise HTTPException(status_code=_map_webdav_status(head.status_code), detail=_dav_error(head))
         content_length = head.headers.get("content-length")
@@ -42617,8 +42420,17 @@ async def smartdrive_download(
         
         logger.info(f"[SmartDrive] Creating download link for path={norm_path}")
         
+        async with pool.acquire() as conn:
+            creds = await _get_nextcloud_credentials_cached(conn, onyx_user_id)
+
         # Create public download link with short expiry (1 day for direct downloads)
-        download_link = await create_public_download_link(onyx_user_id, norm_path, expiry_days=1)
+        download_link = await create_public_download_link(
+            onyx_user_id,
+            norm_path,
+            expiry_days=1,
+            credentials=(creds.username, creds.password, creds.base_url),
+            client=NEXTCLOUD_GATEWAY.client(creds.base_url),
+        )
         
         logger.info(f"[SmartDrive] Download link created: {download_link}")
         
@@ -42664,28 +42476,40 @@ async def _check_rate_limit(operation: str, user_id: str) -> None:
         raise HTTPException(status_code=429, detail="Rate limit exceeded")
     bucket.append(now)
 
-async def _get_nextcloud_credentials(conn: asyncpg.Connection, onyx_user_id: str) -> Tuple[str, str, str, str]:
+async def _get_nextcloud_credentials_cached(conn: asyncpg.Connection, onyx_user_id: str) -> NextcloudCredentials:
     """
-    Returns (username, password, base_url, user_root_prefix)
-    - Requires per-user credentials stored in smartdrive_accounts
+    Per-user credentials stored in smartdrive_accounts, decrypted once and
+    reused through NEXTCLOUD_GATEWAY until they change or expire.
     """
-    account = await conn.fetchrow(
-        "SELECT onyx_user_id, nextcloud_username, nextcloud_password_encrypted, nextcloud_base_url FROM smartdrive_accounts WHERE onyx_user_id = $1",
-        onyx_user_id,
-    )
-    if not account or not account.get("nextcloud_username") or not account.get("nextcloud_password_encrypted"):
-        raise HTTPException(status_code=401, detail="SmartDrive account not connected")
+    async def _load() -> NextcloudCredentials:
+        account = await conn.fetchrow(
+            "SELECT onyx_user_id, nextcloud_username, nextcloud_password_encrypted, nextcloud_base_url FROM smartdrive_accounts WHERE onyx_user_id = $1",
+            onyx_user_id,
+        )
+        if not account or not account.get("nextcloud_username") or not account.get("nextcloud_password_encrypted"):
+            raise HTTPException(status_code=401, detail="SmartDrive account not connected")
 
-    base_url = (account.get("nextcloud_base_url") or os.environ.get("NEXTCLOUD_BASE_URL") or "").rstrip("/")
-    if not base_url:
-        raise HTTPException(status_code=400, detail="Nextcloud base URL not configured")
+        base_url = (account.get("nextcloud_base_url") or os.environ.get("NEXTCLOUD_BASE_URL") or "").rstrip("/")
+        if not base_url:
+            raise HTTPException(status_code=400, detail="Nextcloud base URL not configured")
 
-    try:
-        password = decrypt_password(account["nextcloud_password_encrypted"])  # type: ignore
-    except Exception:
-        raise HTTPException(status_code=500, detail="Failed to decrypt SmartDrive credentials")
+        try:
+            password = decrypt_password(account["nextcloud_password_encrypted"])  # type: ignore
+        except Exception:
+            raise HTTPException(status_code=500, detail="Failed to decrypt SmartDrive credentials")
+
+        return NextcloudCredentials(account["nextcloud_username"], password, base_url, "")
+
+    return await NEXTCLOUD_GATEWAY.credentials(onyx_user_id, _load)
 
-    return account["nextcloud_username"], password, base_url, ""
+
+async def _get_nextcloud_credentials(conn: asyncpg.Connection, onyx_user_id: str) -> Tuple[str, str, str, str]:
+    """
+    Returns (username, password, base_url, user_root_prefix)
+    - Requires per-user credentials stored in smartdrive_accounts
+    """
+    creds = await _get_nextcloud_credentials_cached(conn, onyx_user_id)
+    return creds.username, creds.password, creds.base_url, creds.user_root_prefix
 
 
 def _ensure_trailing_slash(p: str) -> str:
@@ -42723,37 +42547,30 @@ def _encode_dav_path(path: str) -> str:
     Ensures leading/trailing slash semantics are kept.
     """
     try:
-        from urllib.parse import quote
-        if path is None:
-            return "/"
-        is_abs = path.startswith("/")
-        is_dir = path.endswith("/")
-        parts = [seg for seg in path.split("/") if seg != ""]
-        encoded = "/".join(quote(seg, safe="") for seg in parts)
-        return ("/" if is_abs else "") + encoded + ("/" if is_dir and encoded else "")
+        return encode_dav_path(path)
     except Exception:
         return path
 
 async def _ensure_folder_tree(base: str, full_path: str, auth: Tuple[str, str]) -> None:
     """Ensure the full folder tree exists using MKCOL on each segment."""
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        # Only directories
-        path = _ensure_trailing_slash(full_path)
-        segments = [s for s in path.strip("/").split("/") if s]
-        cumulative = ""
-        for seg in segments:
-            cumulative += f"/{seg}"
-            url = f"{base}{_ensure_trailing_slash(_encode_dav_path(cumulative))}"
-            try:
-                r = await client.request("MKCOL", url, auth=auth)
-                if r.status_code in (201, 405):
-                    continue
-                elif 200 <= r.status_code < 300:
-                    continue
-                else:
-                    logger.warning(f"MKCOL {url} -> {r.status_code} {r.text[:120]}")
-            except Exception as e:
-                logger.warning(f"MKCOL failed {url}: {e}")
+    client = NEXTCLOUD_GATEWAY.client(base)
+    # Only directories
+    path = _ensure_trailing_slash(full_path)
+    segments = [s for s in path.strip("/").split("/") if s]
+    cumulative = ""
+    for seg in segments:
+        cumulative += f"/{seg}"
+        url = f"{base}{_ensure_trailing_slash(_encode_dav_path(cumulative))}"
+        try:
+            r = await client.request("MKCOL", url, auth=auth, timeout=30.0)
+            if r.status_code in (201, 405):
+                continue
+            elif 200 <= r.status_code < 300:
+                continue
+            else:
+                logger.warning(f"MKCOL {url} -> {r.status_code} {r.text[:120]}")
+        except Exception as e:
+            logger.warning(f"MKCOL failed {url}: {e}")
 
 
 def _map_webdav_status(status: int) -> int:
@@ -42801,109 +42618,34 @@ async def import_smartdrive_files(
         onyx_user_id = await get_current_onyx_user_id(request)
         logger.info(f"Importing SmartDrive files for user: {onyx_user_id}, paths: {file_paths}")
 
-        imported_file_ids = []
-        
-        # Get SmartDrive account details for the user
         async with pool.acquire() as conn:
-            account = await conn.fetchrow(
-                "SELECT nextcloud_username, nextcloud_password_encrypted, nextcloud_base_url FROM smartdrive_accounts WHERE onyx_user_id = $1",
-                onyx_user_id
-            )
-            
-            if not account:
-                logger.error(f"No SmartDrive account found for user {onyx_user_id}")
-                raise HTTPException(status_code=400, detail="SmartDrive not configured for this user")
-            
-            # Decrypt password (simplified - you may need proper decryption)
-            # For now, assuming password is stored in plain text or you have decryption logic
-            nextcloud_username = account['nextcloud_username']
-            nextcloud_password = account['nextcloud_password_encrypted']  # TODO: Implement proper decryption
-            nextcloud_base_url = account.get('nextcloud_base_url', 'http://nc1.contentbuilder.ai:8080')
-            
-            logger.info(f"Using SmartDrive account: {nextcloud_username} at {nextcloud_base_url}")
+            creds = await _get_nextcloud_credentials_cached(conn, onyx_user_id)
+        logger.info(f"Using SmartDrive account: {creds.username} at {creds.base_url}")
 
-        # Process each file
-            for file_path in file_paths:
-                try:
-                    logger.info(f"Processing SmartDrive file: {file_path}")
-                    
-                    # Download file from Nextcloud
-                    file_url = f"{nextcloud_base_url}/remote.php/dav/files/{nextcloud_username}{file_path}"
-                    
-                    async with httpx.AsyncClient(timeout=30.0) as client:
-                        response = await client.get(
-                            file_url,
-                            auth=(nextcloud_username, nextcloud_password)
-                        )
-                        response.raise_for_status()
-                        
-                        file_content = response.content
-                        file_name = os.path.basename(file_path)
-                        
-                        logger.info(f"Downloaded {file_name} ({len(file_content)} bytes)")
-                    
-                    # Create a temporary UploadFile object for Onyx
-                    file_obj = io.BytesIO(file_content)
-                    temp_file = UploadFile(
-                        file=file_obj,
-                        filename=file_name,
-                        headers={"content-type": response.headers.get("content-type", "application/octet-stream")}
-                    )
-                    
-                    # Import into Onyx using the standard process
-                    # This will create real Onyx file records and return proper file IDs
-                    from onyx.server.documents.connector import upload_files
-                    from onyx.db.engine import get_session_with_tenant
-                    
-                    # Get a database session for Onyx operations
-                    db_session = next(get_session_with_tenant())
-                    
-                    try:
-                        # Upload file to Onyx file store
-                        upload_response = upload_files([temp_file], db_session)
-                        real_file_id = upload_response.file_paths[0]  # Get the real Onyx file ID
-                        
-                        logger.info(f"Uploaded to Onyx with file ID: {real_file_id}")
-                        
-                        # Store mapping in smartdrive_imports with REAL file ID
-                        async with pool.acquire() as conn:
-                            import_record_id = await conn.fetchval(
-                    """
-                    INSERT INTO smartdrive_imports (onyx_user_id, smartdrive_path, onyx_file_id, etag, checksum, imported_at)
-                    VALUES ($1, $2, $3, $4, $5, $6)
-                                ON CONFLICT (onyx_user_id, smartdrive_path) 
-                                DO UPDATE SET 
-                                    onyx_file_id = EXCLUDED.onyx_file_id,
-                                    etag = EXCLUDED.etag,
-                                    checksum = EXCLUDED.checksum,
-                                    imported_at = EXCLUDED.imported_at
-                    RETURNING id
-                    """,
-                    onyx_user_id,
-                    file_path,
-                                real_file_id,  # REAL Onyx file ID!
-                                response.headers.get("etag", f"etag_{hash(file_path)}"),
-                                f"imported_{int(time.time())}",  # Simple checksum
-                    datetime.now(timezone.utc)
-                )
-                        
-                        imported_file_ids.append(import_record_id)
-                        logger.info(f"✅ Successfully imported {file_path} -> Onyx file ID: {real_file_id}")
-                        
-                    finally:
-                        db_session.close()
-                        
-                except Exception as e:
-                    logger.error(f"❌ Failed to import {file_path}: {e}", exc_info=True)
-                    # Continue with other files even if one fails
-                    continue
+        requested = [await _normalize_smartdrive_path(p) for p in file_paths]
+        session_cookies = {ONYX_SESSION_COOKIE_NAME: request.cookies.get(ONYX_SESSION_COOKIE_NAME)}
+        # Unchanged files are skipped; files an interrupted import left open are left to /import-new
+        outcomes = await SMARTDRIVE_IMPORTER.import_files(
+            creds,
+            str(onyx_user_id),
+            [{"path": p, "name": p.rsplit("/", 1)[-1], "type": "file"} for p in requested],
+            session_cookies,
+            resume=False,
+        )
+        SMARTDRIVE_INDEXING_PROGRESS.invalidate(str(onyx_user_id))
 
+        imported_file_ids = [o.record_id for o in outcomes if o.record_id is not None]
         return {
             "success": True,
             "fileIds": imported_file_ids,
-            "imported_count": len(imported_file_ids)
+            # len(fileIds), as before; skipped_count says how many of them were already up to date
+            "imported_count": len(imported_file_ids),
+            "skipped_count": sum(1 for o in outcomes if o.status == "skipped"),
+            "failed": [{"path": o.path, "error": o.error} for o in outcomes if o.status == "failed"],
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error importing SmartDrive files: {e}")
         raise HTTPException(status_code=500, detail="Failed to import SmartDrive files")
@@ -42944,104 +42686,28 @@ async def import_new_smartdrive_files(
             sync_cursor = json.loads(account['sync_cursor']) if account['sync_cursor'] else {}
             last_sync = sync_cursor.get('last_sync') if sync_cursor else None
             
-            # Get list of all files from user's individual Nextcloud account
-            all_files = await get_all_nextcloud_files_individual(nextcloud_username, nextcloud_password, nextcloud_base_url, "/")
-            
-            imported_count = 0
-            imported_files = []
-            
-            logger.info(f"Processing {len(all_files)} items from Nextcloud")
-            
-            for file_info in all_files:
-                logger.debug(f"Processing item: {file_info}")
-                
-                if file_info['type'] == 'directory':
-                    logger.debug(f"Skipping directory: {file_info['path']}")
-                    continue  # Skip directories for now
-                    
-                file_path = file_info['path']
-                file_modified = file_info['modified']
-                file_etag = file_info.get('etag')
-                
-                logger.info(f"Processing file: {file_path} (type: {file_info['type']}, etag: {file_etag}, modified: {file_modified})")
-                
-                # Check if already imported
-                existing = await conn.fetchrow(
-                    "SELECT id, etag FROM smartdrive_imports WHERE onyx_user_id = $1 AND smartdrive_path = $2",
-                    onyx_user_id, file_path
-                )
-                
-                logger.info(f"Existing record for {file_path}: {existing}")
-                
-                # Skip if already imported with same etag (only if both etags exist and match)
-                if existing and existing.get('etag') and file_etag and existing['etag'] == file_etag:
-                    logger.info(f"Skipping {file_path} - already imported with same etag: {file_etag}")
-                    continue
-                
-                # For debugging: let's import all files for now and check the etag logic later
-                logger.info(f"Will import file: {file_path} (etag: {file_etag}, existing_etag: {existing.get('etag') if existing else None})")
-                
-                # Try to import the file into Onyx
-                try:
-                    # Extract session cookies for Onyx authentication from the request object
-                    session_cookies = {ONYX_SESSION_COOKIE_NAME: request.cookies.get(ONYX_SESSION_COOKIE_NAME)}
-                    
-                    onyx_file_id = await import_file_to_onyx_individual(
-                        nextcloud_username,
-                        nextcloud_password,
-                        nextcloud_base_url, 
-                        file_path, 
-                        file_info, 
-                        onyx_user_id,
-                        session_cookies
-                    )
-                    
-                    if onyx_file_id:
-                        # Update or insert import record
-                        if existing:
-                            await conn.execute(
-                                """
-                                UPDATE smartdrive_imports 
-                                SET onyx_file_id = $1, etag = $2, checksum = $3, imported_at = $4, last_modified = $5
-                                WHERE id = $6
-                                """,
-                                onyx_file_id,
-                                file_info.get('etag', ''),
-                                file_info.get('checksum', ''),
-                                datetime.now(timezone.utc),
-                                parse_http_date(file_modified) if file_modified else None,
-                                existing['id']
-                            )
-                        else:
-                            await conn.execute(
-                                """
-                                INSERT INTO smartdrive_imports 
-                                (onyx_user_id, smartdrive_path, onyx_file_id, etag, checksum, file_size, mime_type, imported_at, last_modified)
-                                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-                                """,
-                                onyx_user_id,
-                                file_path,
-                                onyx_file_id,
-                                file_info.get('etag', ''),
-                                file_info.get('checksum', ''),
-                                file_info.get('size'),
-                                file_info.get('mime_type'),
-                                datetime.now(timezone.utc),
-                                parse_http_date(file_modified) if file_modified else None
-                            )
-                        
-                        imported_count += 1
-                        imported_files.append({
-                            "name": file_info['name'],
-                            "path": file_path,
-                            "onyx_file_id": onyx_file_id
-                        })
-                        logger.info(f"Successfully imported {file_path} as Onyx file {onyx_file_id}")
-                        
-                except Exception as import_error:
-                    logger.error(f"Failed to import {file_path}: {import_error}")
-                    continue
+        # No pooled connection is held while files are transferred
+        # Get list of all files from user's individual Nextcloud account
+        all_files = await get_all_nextcloud_files_individual(nextcloud_username, nextcloud_password, nextcloud_base_url, "/")
+        
+        logger.info(f"Processing {len(all_files)} items from Nextcloud")
+        
+        # Files whose etag/checksum match their last import are skipped; the rest are
+        # streamed into Onyx concurrently, resuming anything an interrupted import left open
+        creds = NextcloudCredentials(nextcloud_username, nextcloud_password, nextcloud_base_url)
+        outcomes = await SMARTDRIVE_IMPORTER.import_files(creds, str(onyx_user_id), all_files, session_cookies)
+        SMARTDRIVE_INDEXING_PROGRESS.invalidate(str(onyx_user_id))
+        
+        imported_files = [
+            {"name": o.name, "path": o.path, "onyx_file_id": o.onyx_file_id}
+            for o in outcomes if o.status == "imported"
+        ]
+        imported_count = len(imported_files)
+        failed_count = sum(1 for o in outcomes if o.status == "failed")
+        if failed_count:
+            logger.warning(f"{failed_count} SmartDrive files failed to import for user {onyx_user_id}; they are retried on the next import")
 
+        async with pool.acquire() as conn:
             # Update sync cursor
             await conn.execute(
                 "UPDATE smartdrive_accounts SET sync_cursor = $1, updated_at = $2 WHERE onyx_user_id = $3",
@@ -43050,12 +42716,13 @@ async def import_new_smartdrive_files(
                 onyx_user_id
             )
             
-            logger.info(f"Import completed: {imported_count} files imported for user {onyx_user_id}")
+        logger.info(f"Import completed: {imported_count} files imported for user {onyx_user_id}")
 
         return {
             "success": True,
             "imported_count": imported_count,
             "imported_files": imported_files,
+            "failed_count": failed_count,
             "message": f"Imported {imported_count} new files"
         }
         
@@ -43093,69 +42760,9 @@ async def ensure_user_folder_exists(nextcloud_username: str, nextcloud_password:
 
 async def get_all_nextcloud_files_individual(nextcloud_username: str, nextcloud_password: str, nextcloud_base_url: str, base_path: str = "/") -> List[Dict]:
     """Get all files from user's individual Nextcloud account recursively"""
-    all_files = []
-    visited_paths = set()  # Prevent infinite recursion
-    
-    async def traverse_directory(path: str, depth: int = 0):
-        # Prevent infinite recursion
-        if depth > 10:  # Max depth limit
-            logger.warning(f"Max recursion depth reached for path: {path}")
-            return
-            
-        if path in visited_paths:
-            logger.warning(f"Already visited path, skipping: {path}")
-            return
-            
-        visited_paths.add(path)
-        
-        try:
-            webdav_url = f"{nextcloud_base_url}/remote.php/dav/files/{nextcloud_username}{path}"
-            auth = (nextcloud_username, nextcloud_password)
-            
-            logger.debug(f"Traversing directory: {path} (depth: {depth}, URL: {webdav_url})")
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.request(
-                    "PROPFIND", 
-                    webdav_url, 
-                    auth=auth, 
-                    headers={"Depth": "1", "Content-Type": "application/xml"},
-                    content="""<?xml version="1.0"?>
-                    <d:propfind xmlns:d="DAV:" xmlns:oc="http://owncloud.org/ns">
-                        <d:prop>
-                            <d:resourcetype/>
-                            <d:getcontentlength/>
-                            <d:getlastmodified/>
-                            <d:getcontenttype/>
-                            <d:getetag/>
-                        </d:prop>
-                    </d:propfind>"""
-                )
-                
-                if response.status_code == 404:
-                    logger.warning(f"Directory not found: {path}")
-                    return
-                elif response.status_code != 207:
-                    logger.error(f"WebDAV PROPFIND failed: {response.status_code} - {response.text}")
-                    return
-                    
-                files = await parse_webdav_response(response.text, nextcloud_base_url)
-                logger.debug(f"Found {len(files)} items in {path}")
-                
-                for file_info in files:
-                    if file_info['name'] != '.' and file_info['name'] != '..':  # Skip current and parent directory entries
-                        all_files.append(file_info)
-                        
-                        if file_info['type'] == 'directory':
-                            # For subdirectories, traverse recursively
-                            subdir_path = file_info['path']
-                            logger.debug(f"Found subdirectory: {file_info['name']} -> {subdir_path}")
-                            await traverse_directory(subdir_path, depth + 1)
-                            
-        except Exception as e:
-            logger.error(f"Error traversing directory {path}: {e}")
-    
-    await traverse_directory(base_path)
+    creds = NextcloudCredentials(nextcloud_username, nextcloud_password, nextcloud_base_url)
+    # Unchanged subfolders (same etag as in the cached listing) are not fetched again
+    all_files = await NEXTCLOUD_GATEWAY.walk(creds, base_path, max_depth=10)
     logger.info(f"Directory traversal completed. Found {len(all_files)} total items.")
     return all_files
 
@@ -43172,30 +42779,24 @@ async def get_all_nextcloud_files(nextcloud_user_folder: str, base_path: str = "
         webdav_url = f"http://nc1.contentbuilder.ai:8080/remote.php/dav/files/{nextcloud_username}/{nextcloud_user_folder}{base_path}"
         auth = (nextcloud_username, nextcloud_password)
         
-        async with httpx.AsyncClient() as client:
-            response = await client.request(
-                "PROPFIND",
-                webdav_url,
-                auth=auth,
-                headers={
-                    "Depth": "infinity",  # Get all files recursively
-                    "Content-Type": "application/xml"
-                },
-                content="""<?xml version="1.0"?>
-                <d:propfind xmlns:d="DAV:" xmlns:oc="http://owncloud.org/ns">
-                    <d:prop>
-                        <d:resourcetype/>
-                        <d:getcontentlength/>
-                        <d:getlastmodified/>
-                        <d:getcontenttype/>
-                        <d:getetag/>
-                    </d:prop>
-                </d:propfind>"""
-            )
-            
+        client = NEXTCLOUD_GATEWAY.client(webdav_url)
+        async with client.stream(
+            "PROPFIND",
+            webdav_url,
+            auth=auth,
+            headers={
+                "Depth": "infinity",  # Get all files recursively
+                "Content-Type": "application/xml"
+            },
+            content=PROPFIND_LISTING_BODY,
+        ) as response:
             if response.status_code == 207:
-                files = await parse_webdav_response(response.text, base_path)
-                all_files.extend(files)
+                # Parsed as the body streams in; a whole-tree listing can be large
+                parser = MultiStatusParser()
+                async for chunk in response.aiter_bytes():
+                    parser.feed(chunk)
+                parser.close()
+                all_files.extend(parser.files)
                 
     except Exception as e:
         logger.error(f"Error getting files from Nextcloud: {e}")
@@ -43208,54 +42809,12 @@ async def import_file_to_onyx(nextcloud_user_folder: str, file_path: str, file_i
         # Download file from Nextcloud using shared account
         nextcloud_username = os.getenv("NEXTCLOUD_USERNAME", "smart_drive_user")
         nextcloud_password = os.getenv("NEXTCLOUD_PASSWORD", "nextcloud_password")
-        
-        download_url = f"http://nc1.contentbuilder.ai:8080/remote.php/dav/files/{nextcloud_username}/{nextcloud_user_folder}{file_path}"
-        auth = (nextcloud_username, nextcloud_password)
-        
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            download_response = await client.get(download_url, auth=auth)
-            
-            if download_response.status_code != 200:
-                logger.error(f"Failed to download {file_path}: {download_response.status_code}")
-                return None
-                
-            file_content = download_response.content
-            file_name = file_info['name']
-            mime_type = file_info.get('mime_type', 'application/octet-stream')
-            
-            # Upload to Onyx using the user file upload endpoint (same as frontend)
-            onyx_upload_url = f"{ONYX_API_SERVER_URL}/user/file/upload"
-            
-            # Create multipart form data with folder_id parameter
-            files = {
-                'files': (file_name, file_content, mime_type)
-            }
-            data = {
-                'folder_id': '-1'  # Use RECENT_DOCS_FOLDER_ID (default "Recent Documents" folder)
-            }
-            
-            # Upload to Onyx with session authentication
-            upload_response = await client.post(
-                onyx_upload_url,
-                files=files,
-                data=data,
-                timeout=60.0
-            )
-            
-            if upload_response.status_code in [200, 201]:
-                response_data = upload_response.json()
-                # Extract file ID from Onyx response
-                if isinstance(response_data, list) and len(response_data) > 0:
-                    return str(response_data[0].get('id'))
-                elif isinstance(response_data, dict):
-                    return str(response_data.get('id'))
-                else:
-                    logger.error(f"Unexpected Onyx response format: {response_data}")
-                    return None
-            else:
-                logger.error(f"Failed to upload to Onyx: {upload_response.status_code} - {upload_response.text}")
-                return None
-                
+        creds = NextcloudCredentials(
+            nextcloud_username, nextcloud_password, "http://nc1.contentbuilder.ai:8080", f"/{nextcloud_user_folder}"
+        )
+        # Streamed from WebDAV straight into the Onyx upload
+        transfer = await SMARTDRIVE_IMPORTER.transfer(creds, file_path, file_info, {})
+        return transfer.onyx_file_id
     except Exception as e:
         logger.error(f"Error importing file {file_path} to Onyx: {e}")
         return None
@@ -43272,55 +42831,10 @@ async def import_file_to_onyx_individual(
 ) -> str:
     """Download file from individual Nextcloud account and upload to Onyx"""
     try:
-        # Build download URL for individual account
-        download_url = f"{nextcloud_base_url}/remote.php/dav/files/{nextcloud_username}{file_path}"
-        auth = (nextcloud_username, nextcloud_password)
-        
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            download_response = await client.get(download_url, auth=auth)
-            
-            if download_response.status_code != 200:
-                logger.error(f"Failed to download {file_path}: {download_response.status_code}")
-                return None
-                
-            file_content = download_response.content
-            file_name = file_info['name']
-            mime_type = file_info.get('mime_type', 'application/octet-stream')
-            
-            # Upload to Onyx using the user file upload endpoint (same as frontend)
-            onyx_upload_url = f"{ONYX_API_SERVER_URL}/user/file/upload"
-            
-            # Create multipart form data with folder_id parameter
-            files = {
-                'files': (file_name, file_content, mime_type)
-            }
-            data = {
-                'folder_id': '-1'  # Use RECENT_DOCS_FOLDER_ID (default "Recent Documents" folder)
-            }
-            
-            # Upload to Onyx with session authentication
-            upload_response = await client.post(
-                onyx_upload_url,
-                files=files,
-                data=data,
-                cookies=session_cookies,
-                timeout=60.0
-            )
-            
-            if upload_response.status_code in [200, 201]:
-                response_data = upload_response.json()
-                # Extract file ID from Onyx response
-                if isinstance(response_data, list) and len(response_data) > 0:
-                    return str(response_data[0].get('id'))
-                elif isinstance(response_data, dict):
-                    return str(response_data.get('id'))
-                else:
-                    logger.error(f"Unexpected Onyx response format: {response_data}")
-                    return None
-            else:
-                logger.error(f"Failed to upload to Onyx: {upload_response.status_code} - {upload_response.text}")
-                return None
-                
+        creds = NextcloudCredentials(nextcloud_username, nextcloud_password, nextcloud_base_url)
+        # Streamed from WebDAV straight into the Onyx upload
+        transfer = await SMARTDRIVE_IMPORTER.transfer(creds, file_path, file_info, session_cookies)
+        return transfer.onyx_file_id
     except Exception as e:
         logger.error(f"Error importing individual file {file_path}: {e}")
         return None
@@ -43336,9 +42850,12 @@ async def smartdrive_webhook(
         payload = await request.json()
         logger.info(f"Received SmartDrive webhook: {payload}")
 
-        # TODO: Implement webhook processing
-        # This would handle notifications from Nextcloud about file changes
-        
+        # File changes made outside this backend (Nextcloud web UI, desktop sync)
+        # invalidate the cached folder listings they touch
+        nextcloud_username = NEXTCLOUD_GATEWAY.invalidate_from_webhook(payload)
+        if nextcloud_username:
+            logger.info(f"[SmartDrive] Webhook invalidated listings for {nextcloud_username}")
+
         return {"success": True, "message": "Webhook processed"}
         
     except Exception as e:
@@ -45901,6 +45418,8 @@ async def log_static_file_requests(request: Request, call_next):
     
     return response
     
+SCORM_EXPORT_CHUNK_SIZE = 1024 * 1024
+
 class SCORMExportRequest(BaseModel):
     courseOutlineId: int
 
@@ -45942,17 +45461,19 @@ async def export_scorm_package(
                         yield (json.dumps(progress_packet) + "\n").encode()
                         logger.info(f"[SCORM_EXPORT_PROGRESS] {update['message']}")
                     elif update["type"] == "complete":
-                        # Send the actual ZIP file
+                        # Stream the spooled ZIP file in chunks
                         filename = update["filename"]
-                        zip_bytes = update["zip_bytes"]
-                        
-                        # Send completion message with filename
-                        completion_packet = {"type": "complete", "filename": filename, "size": len(zip_bytes)}
-                        yield (json.dumps(completion_packet) + "\n").encode()
-                        
-                        # Send the ZIP bytes
-                        yield zip_bytes
-                        logger.info(f"[SCORM_EXPORT_COMPLETE] {filename} ({len(zip_bytes)} bytes)")
+                        with update["file"] as package_file:
+                            # Send completion message with filename
+                            completion_packet = {"type": "complete", "filename": filename, "size": update["size"]}
+                            yield (json.dumps(completion_packet) + "\n").encode()
+                            
+                            while True:
+                                chunk = package_file.read(SCORM_EXPORT_CHUNK_SIZE)
+                                if not chunk:
+                                    break
+                                yield chunk
+                        logger.info(f"[SCORM_EXPORT_COMPLETE] {filename} ({update['size']} bytes)")
                         break
                     
         except HTTPException as he:
@@ -21,8 +21,9 @@ from app.services.pdf_generator import (
     generate_slide_deck_pdf_with_dynamic_height,
     PDF_MIN_SLIDE_HEIGHT,
     PDF_MAX_SLIDE_HEIGHT,
-    MAX_CONCURRENT_SLIDES
+    get_browser_launch_options
 )
+from app.services.browser_pool import BrowserPool
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -231,21 +232,21 @@ async def test_slide_deck_pdf():
         raise
 
 async def test_batch_processing():
-    """Test batch processing with different batch sizes."""
+    """Test rendering with different page concurrency limits."""
     logger.info("Testing batch processing...")
     
-    # Test with different batch sizes
-    for batch_size in [1, 2, 3, 5]:
-        logger.info(f"Testing with batch size: {batch_size}")
+    # Test with different concurrency limits (PDF_BROWSER_CONCURRENCY in production)
+    for concurrency in [1, 2, 3, 5]:
+        logger.info(f"Testing with concurrency: {concurrency}")
         
-        # Temporarily modify the MAX_CONCURRENT_SLIDES
-        original_batch_size = MAX_CONCURRENT_SLIDES
+        # Temporarily swap in a browser pool limited to this many concurrent pages
         import app.services.pdf_generator as pdf_module
-        pdf_module.MAX_CONCURRENT_SLIDES = batch_size
+        original_pool = pdf_module.BROWSER_POOL
+        pdf_module.BROWSER_POOL = BrowserPool(get_browser_launch_options, concurrency=concurrency)
         
         try:
             start_time = time.time()
-            output_filename = f"test_batch_{batch_size}_{int(time.time())}.pdf"
+            output_filename = f"test_batch_{concurrency}_{int(time.time())}.pdf"
             
             pdf_path = await generate_slide_deck_pdf_with_dynamic_height(
                 slides_data=test_slides[:6],  # Use first 6 slides for batch testing
@@ -258,16 +259,17 @@ async def test_batch_processing():
             
             if os.path.exists(pdf_path):
                 file_size = os.path.getsize(pdf_path)
-                logger.info(f"Batch {batch_size} PDF: {file_size} bytes (generated in {end_time - start_time:.2f}s)")
+                logger.info(f"Concurrency {concurrency} PDF: {file_size} bytes (generated in {end_time - start_time:.2f}s)")
                 os.remove(pdf_path)
             else:
-                logger.error(f"Batch {batch_size} PDF file not found")
+                logger.error(f"Concurrency {concurrency} PDF file not found")
                 
         except Exception as e:
-            logger.error(f"Failed to test batch size {batch_size}: {e}")
+            logger.error(f"Failed to test concurrency {concurrency}: {e}")
         finally:
-            # Restore original batch size
-            pdf_module.MAX_CONCURRENT_SLIDES = original_batch_size
+            # Restore the shared pool
+            await pdf_module.BROWSER_POOL.close()
+            pdf_module.BROWSER_POOL = original_pool
 
 async def test_error_handling():
     """Test error handling with invalid data."""